@@ -1,16 +1,16 @@
-from typing import Dict, Sequence
+from typing import Dict, List, Sequence
 
 
 class AssistantChatService:
     @classmethod
-    def chat_with_assistant(
+    def build_messages(
         cls,
         ai,
         bot,
         history_messages: Sequence[Dict[str, str]],
         user_message: str,
         student_context: str = '',
-    ):
+    ) -> List[Dict[str, str]]:
         system_prompt = ai.get_template('ai_assistant', 'system_prompt.txt') or '你是一位专业助教。'
         assistant_prompt = ai.get_template('ai_assistant', 'base_assistant_prompt.txt') or ''
 
@@ -33,10 +33,56 @@ class AssistantChatService:
                 messages.append({'role': role, 'content': content})
 
         messages.append({'role': 'user', 'content': user_message})
+        return messages
 
+    @classmethod
+    def chat_with_assistant(
+        cls,
+        ai,
+        bot,
+        history_messages: Sequence[Dict[str, str]],
+        user_message: str,
+        student_context: str = '',
+    ):
+        messages = cls.build_messages(ai, bot, history_messages, user_message, student_context)
         return ai.call_ai(
             messages,
             temperature=0.6,
             max_tokens=2500,
             operation='assistant.chat',
         )
+
+    @classmethod
+    async def achat_with_assistant(
+        cls,
+        ai,
+        bot,
+        history_messages: Sequence[Dict[str, str]],
+        user_message: str,
+        student_context: str = '',
+    ):
+        messages = cls.build_messages(ai, bot, history_messages, user_message, student_context)
+        return await ai.acall_ai(
+            messages,
+            temperature=0.6,
+            max_tokens=2500,
+            operation='assistant.chat',
+        )
+
+    @classmethod
+    def astream_chat_with_assistant(
+        cls,
+        ai,
+        bot,
+        history_messages: Sequence[Dict[str, str]],
+        user_message: str,
+        student_context: str = '',
+    ):
+        messages = cls.build_messages(ai, bot, history_messages, user_message, student_context)
+        return ai.astream_ai(
+            messages,
+            temperature=0.6,
+            max_tokens=2500,
+            operation='assistant.chat',
+        )
+
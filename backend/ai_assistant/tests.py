@@ -1,3 +1,154 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from ai_engine import ledger
+from ai_engine.models import TokenUsage
+from ai_engine.service import AICallError
+from users.models import User
+from .models import AIChatMessage, Bot
+
+
+class AIChatStreamViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="stream_user", password="testpass123", is_member=True)
+        self.client.force_authenticate(user=self.user)
+        self.bot = Bot.objects.create(name="助教", system_prompt="你是助教")
+
+    def _consume(self, response):
+        async def _collect():
+            return b"".join([part async for part in response.streaming_content])
+        return async_to_sync(_collect)().decode("utf-8")
+
+    @patch("ai_assistant.views.sync_bot_prompt")
+    @patch("ai_assistant.views.AIService.achat_with_assistant_stream")
+    def test_stream_pushes_deltas_and_persists_single_reply(self, mock_stream, _mock_sync):
+        async def _chunks(*args, **kwargs):
+            yield {"delta": "根据公式 \\(MV=PY\\)", "finish_reason": None}
+            yield {"delta": "，货币数量上升。", "finish_reason": "stop"}
+
+        mock_stream.side_effect = _chunks
+
+        response = self.client.post("/api/ai/chat/stream/", {"message": "解释一下", "bot_id": self.bot.id}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/event-stream"))
+        body = self._consume(response)
+        self.assertEqual(body.count("event: delta"), 2)
+        self.assertIn("event: done", body)
+
+        replies = AIChatMessage.objects.filter(user=self.user, role="assistant")
+        self.assertEqual(replies.count(), 1)
+        self.assertEqual(replies.first().content, "根据公式  $ MV=PY $ ，货币数量上升。")
+        self.assertEqual(AIChatMessage.objects.filter(user=self.user, role="user").count(), 1)
+
+    @patch("ai_assistant.views.sync_bot_prompt")
+    @patch("ai_assistant.views.AIService.achat_with_assistant_stream")
+    def test_stream_error_emits_error_event_and_saves_message(self, mock_stream, _mock_sync):
+        mock_stream.side_effect = AICallError("AI 服务暂时不可用，请稍后重试。", status_code=503, retryable=True)
+
+        response = self.client.post("/api/ai/chat/stream/", {"message": "你好", "bot_id": self.bot.id}, format="json")
+        body = self._consume(response)
+
+        self.assertIn("event: error", body)
+        self.assertIn("event: done", body)
+        reply = AIChatMessage.objects.get(user=self.user, role="assistant")
+        self.assertEqual(reply.content, "AI 服务暂时不可用，请稍后重试。")
+
+    @override_settings(AI_DAILY_TOKEN_QUOTA=100)
+    @patch("ai_assistant.views.AIService.achat_with_assistant_stream")
+    def test_stream_rejected_when_daily_quota_exhausted(self, mock_stream):
+        cache.clear()
+        TokenUsage.objects.create(
+            day=ledger.today(), user=self.user, bot_id=self.bot.id, operation="assistant.chat",
+            calls=3, prompt_tokens=90, completion_tokens=30,
+        )
+
+        response = self.client.post("/api/ai/chat/stream/", {"message": "你好", "bot_id": self.bot.id}, format="json")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.data["category"], "quota_exceeded")
+        mock_stream.assert_not_called()
+        self.assertFalse(AIChatMessage.objects.filter(user=self.user).exists())
+
+
+class AIChatStreamASGITests(APITransactionTestCase):
+    """经由 school_system.asgi.application 驱动：首段增量须在模型输出结束前送达客户端。
+
+    视图在 asgiref 的线程敏感线程中访问数据库，需用 TransactionTestCase 使测试数据对其可见。
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="asgi_user", password="testpass123", is_member=True)
+        self.token = Token.objects.create(user=self.user)
+        self.bot = Bot.objects.create(name="助教", system_prompt="你是助教")
+
+    async def _drive(self, release):
+        from school_system.asgi import application
+
+        body = json.dumps({"message": "你好", "bot_id": self.bot.id}).encode("utf-8")
+        communicator = ApplicationCommunicator(application, {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/api/ai/chat/stream/",
+            "raw_path": b"/api/ai/chat/stream/",
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"authorization", f"Token {self.token.key}".encode()),
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        })
+        await communicator.send_input({"type": "http.request", "body": body, "more_body": False})
+
+        start = await communicator.receive_output(timeout=5)
+        first = await communicator.receive_output(timeout=5)
+        release.set()
+        rest = []
+        while True:
+            message = await communicator.receive_output(timeout=5)
+            rest.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        await communicator.wait(timeout=5)
+        return start, first["body"].decode("utf-8"), b"".join(rest).decode("utf-8")
+
+    @patch("ai_assistant.views.sync_bot_prompt")
+    @patch("ai_assistant.views.AIService.achat_with_assistant_stream")
+    def test_first_delta_is_sent_before_stream_finishes(self, mock_stream, _mock_sync):
+        release = None
+
+        async def _chunks(*args, **kwargs):
+            yield {"delta": "第一段", "finish_reason": None}
+            # 客户端收到第一段之前不会放行：若响应被整体缓冲，这里会一直等待直到超时
+            await release.wait()
+            yield {"delta": "第二段", "finish_reason": "stop"}
+
+        async def _run():
+            nonlocal release
+            release = asyncio.Event()
+            return await self._drive(release)
+
+        mock_stream.side_effect = _chunks
+        start, first, rest = async_to_sync(_run)()
+
+        self.assertEqual(start["status"], 200)
+        self.assertIn("第一段", first)
+        self.assertNotIn("第二段", first)
+        self.assertIn("event: done", rest)
+        reply = AIChatMessage.objects.get(user=self.user, role="assistant")
+        self.assertEqual(reply.content, "第一段第二段")
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import AIChatView, AIChatListView, AIChatResetView, BotListCreateView, BotDetailView
+from .views import AIChatView, AIChatStreamView, AIChatListView, AIChatResetView, BotListCreateView, BotDetailView
 
 urlpatterns = [
     path('chat/', AIChatView.as_view(), name='ai-chat'),
+    path('chat/stream/', AIChatStreamView.as_view(), name='ai-chat-stream'),
     path('history/', AIChatListView.as_view(), name='ai-chat-history'),
     path('reset/', AIChatResetView.as_view(), name='ai-chat-reset'),
     path('bots/', BotListCreateView.as_view(), name='bot-list'),
@@ -1,6 +1,9 @@
+import json
 import threading
 import logging
+from asgiref.sync import sync_to_async
 from django.db import connections
+from django.http import StreamingHttpResponse
 from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -15,51 +18,131 @@ from .prompt_sync import (
 )
 from users.views import IsMember
 from ai_service import AIService
+from ai_engine import ledger
+from ai_engine.service import AICallError
+from notifications.push import push_on_commit
 
 logger = logging.getLogger(__name__)
 
+PENDING_PLACEHOLDER = "[Thinking...]"
 
-def process_ai_chat(user, bot, user_message, pending_msg_id, history_limit=10):
+
+def _build_history(user, bot, history_limit=10):
     # Filter out pending messages from history
     history_objs = AIChatMessage.objects.filter(user=user, bot=bot).order_by('-timestamp')[:history_limit]
-    history_msgs = [{"role": h.role, "content": h.content} for h in reversed(history_objs) if h.content != "[Thinking...]"]
+    return [{"role": h.role, "content": h.content} for h in reversed(history_objs) if h.content != PENDING_PLACEHOLDER]
+
+
+def _format_ai_content(ai_content, finish_reason=None):
+    # Format math
+    ai_content = ai_content.replace('\\[', ' $$ ').replace('\\]', ' $$ ').replace('\\(', ' $ ').replace('\\)', ' $ ')
+
+    if finish_reason == 'length':
+        ai_content += "\n\n(已达到单次回复上限...)"
+    return ai_content
+
+
+def _complete_pending_message(pending_msg, content):
+    if not pending_msg:
+        return
+    pending_msg.content = content
+    pending_msg.save()
+    # 回复就绪后主动推送，前端无需轮询历史接口
+    push_on_commit(pending_msg.user_id, 'ai_chat_reply', {
+        'bot_id': pending_msg.bot_id,
+        'message': AIChatMessageSerializer(pending_msg).data,
+    })
+
+
+def _quota_error(user, bot):
+    # 额度用尽时直接拒绝，不落库用户消息，也不占用后台线程
+    try:
+        ledger.check_quota('assistant.chat', ledger.scope_for(user, bot))
+    except ledger.QuotaExceeded as e:
+        return Response({'error': e.message, 'category': 'quota_exceeded'}, status=429)
+    return None
+
+
+def process_ai_chat(user, bot, user_message, pending_msg_id, history_limit=10):
+    history_msgs = _build_history(user, bot, history_limit)
     
     student_context = ""
     if bot and bot.is_exclusive:
         student_context = get_student_academic_context(user)
 
     try:
-        res = AIService.chat_with_assistant(bot, history_msgs, user_message, student_context)
+        with ledger.attribute(user=user, bot=bot):
+            res = AIService.chat_with_assistant(bot, history_msgs, user_message, student_context)
         
         pending_msg = AIChatMessage.objects.filter(id=pending_msg_id).first()
         
         if res and 'choices' in res:
-            ai_content = res['choices'][0]['message']['content']
-            finish_reason = res['choices'][0].get('finish_reason')
-            
-            # Format math
-            ai_content = ai_content.replace('\\[', ' $$ ').replace('\\]', ' $$ ').replace('\\(', ' $ ').replace('\\)', ' $ ')
-            
-            if finish_reason == 'length':
-                ai_content += "\n\n(已达到单次回复上限...)"
-            
-            if pending_msg:
-                pending_msg.content = ai_content
-                pending_msg.save()
+            ai_content = _format_ai_content(
+                res['choices'][0]['message']['content'],
+                res['choices'][0].get('finish_reason'),
+            )
+            _complete_pending_message(pending_msg, ai_content)
         else:
-            if pending_msg:
-                pending_msg.content = "AI 助教暂时无法响应，请稍后再试。"
-                pending_msg.save()
+            _complete_pending_message(pending_msg, "AI 助教暂时无法响应，请稍后再试。")
                 
     except Exception as e:
         logger.exception("AI Chat Thread Error: %s", e)
         pending_msg = AIChatMessage.objects.filter(id=pending_msg_id).first()
-        if pending_msg:
-            pending_msg.content = f"抱歉，连接中断: {str(e)}"
-            pending_msg.save()
+        _complete_pending_message(pending_msg, f"抱歉，连接中断: {str(e)}")
     finally:
         connections.close_all()
 
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def astream_ai_chat(user, bot, user_message, history_msgs, student_context=""):
+    """
+    逐段推送模型输出（SSE），结束时一次性落库助手消息。
+    异步生成器：ASGI 下 StreamingHttpResponse 逐段发送，不会像同步迭代器那样先缓冲完整回复；
+    客户端中途断开时同样保存已生成的部分，保证历史记录完整。
+    """
+    parts = []
+    finish_reason = None
+    error_text = ""
+    saved = False
+
+    @sync_to_async
+    def _persist():
+        content = "".join(parts).strip()
+        if content:
+            content = _format_ai_content(content, finish_reason)
+        else:
+            content = error_text or "AI 助教暂时无法响应，请稍后再试。"
+        return AIChatMessage.objects.create(user=user, role='assistant', content=content, bot=bot)
+
+    try:
+        try:
+            # 流式生成器在首次迭代时才发起调用，归属需在生成器内部声明
+            with ledger.attribute(user=user, bot=bot):
+                stream = AIService.achat_with_assistant_stream(bot, history_msgs, user_message, student_context)
+                async for chunk in stream:
+                    delta = chunk.get('delta') or ''
+                    finish_reason = chunk.get('finish_reason') or finish_reason
+                    if delta:
+                        parts.append(delta)
+                        yield _sse('delta', {'content': delta})
+        except AICallError as e:
+            error_text = e.message
+            yield _sse('error', {'error': e.message, 'category': e.error_category})
+        except Exception as e:
+            logger.exception("AI Chat Stream Error: %s", e)
+            error_text = f"抱歉，连接中断: {str(e)}"
+            yield _sse('error', {'error': error_text, 'category': 'unexpected'})
+
+        msg = await _persist()
+        saved = True
+        yield _sse('done', {'id': msg.id, 'role': msg.role, 'content': msg.content, 'timestamp': msg.timestamp.isoformat()})
+    finally:
+        if not saved and parts:
+            await _persist()
+
 class BotListCreateView(generics.ListCreateAPIView):
     serializer_class = BotSerializer
     def get_permissions(self):
@@ -106,13 +189,15 @@ class AIChatView(APIView):
         if not user_message: return Response({'error': 'Message is required'}, status=400)
 
         bot = Bot.objects.filter(id=bot_id).first()
+        quota_error = _quota_error(request.user, bot)
+        if quota_error: return quota_error
         if bot: sync_bot_prompt(bot) 
 
         # 1. Save User Message
         AIChatMessage.objects.create(user=request.user, role='user', content=user_message, bot=bot)
         
         # 2. Create Pending Assistant Message
-        pending_msg = AIChatMessage.objects.create(user=request.user, role='assistant', content="[Thinking...]", bot=bot)
+        pending_msg = AIChatMessage.objects.create(user=request.user, role='assistant', content=PENDING_PLACEHOLDER, bot=bot)
         
         # 3. Start Background Thread
         thread = threading.Thread(
@@ -124,6 +209,37 @@ class AIChatView(APIView):
 
         return Response({'status': 'pending'})
 
+class AIChatStreamView(APIView):
+    """
+    流式对话：以 text/event-stream 推送增量文本（event: delta），
+    结束时推送 event: done（含已落库的完整消息），无需再轮询历史接口。
+    DRF 的认证与校验是同步的，只在这里做；响应体由异步生成器经 AIEngine.astream_ai 产出。
+    """
+    permission_classes = [IsMember]
+
+    def post(self, request):
+        user_message = request.data.get('message')
+        bot_id = request.data.get('bot_id')
+        if not user_message: return Response({'error': 'Message is required'}, status=400)
+
+        bot = Bot.objects.filter(id=bot_id).first()
+        quota_error = _quota_error(request.user, bot)
+        if quota_error: return quota_error
+        if bot: sync_bot_prompt(bot)
+
+        history_msgs = _build_history(request.user, bot)
+        student_context = get_student_academic_context(request.user) if bot and bot.is_exclusive else ""
+
+        AIChatMessage.objects.create(user=request.user, role='user', content=user_message, bot=bot)
+
+        response = StreamingHttpResponse(
+            astream_ai_chat(request.user, bot, user_message, history_msgs, student_context),
+            content_type='text/event-stream; charset=utf-8',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
 class AIChatListView(generics.ListAPIView):
     serializer_class = AIChatMessageSerializer
     permission_classes = [IsMember]
@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import AIOperationRollup, TokenUsage
+
+
+@admin.register(AIOperationRollup)
+class AIOperationRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket', 'operation', 'calls', 'failures', 'retries', 'prompt_tokens', 'completion_tokens')
+    list_filter = ('operation',)
+    ordering = ('-bucket', 'operation')
+
+
+@admin.register(TokenUsage)
+class TokenUsageAdmin(admin.ModelAdmin):
+    list_display = ('day', 'user', 'bot_id', 'operation', 'calls', 'prompt_tokens', 'completion_tokens')
+    list_filter = ('operation',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+    ordering = ('-day', 'operation')
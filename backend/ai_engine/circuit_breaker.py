@@ -0,0 +1,130 @@
+"""
+上游熔断与路由：状态经由 settings.CACHES 跨进程共享。
+
+- closed：正常放行，按时间窗口统计调用数与失败数（仅超时、网络、5xx 计为上游故障）；
+- open：窗口内失败数与失败率均超过阈值后打开，LLM_BREAKER_OPEN_SECONDS 内不再向该上游发请求；
+- half-open：冷却结束后只放行一个探测请求，成功则关闭，失败则重新打开。
+
+route() 在可用上游之间按权重随机排序，所有上游都熔断时返回空列表，调用方据此快速失败。
+"""
+import logging
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import cache as shared_cache
+
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# 计入熔断的错误类别（见 service._Failure.category）；4xx、格式异常等属于请求本身的问题
+TRIP_CATEGORIES = frozenset({'timeout', 'network', 'upstream_5xx'})
+# 可以换一个上游重试的错误类别：除熔断类别外，限流也值得立即切换
+FAILOVER_CATEGORIES = TRIP_CATEGORIES | {'rate_limit'}
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, 'LLM_BREAKER_ENABLED', True))
+
+
+def _window_seconds() -> int:
+    return max(5, int(getattr(settings, 'LLM_BREAKER_WINDOW_SECONDS', 60) or 60))
+
+
+def _open_seconds() -> int:
+    return max(1, int(getattr(settings, 'LLM_BREAKER_OPEN_SECONDS', 30) or 30))
+
+
+def _key(name: str, *parts: Any) -> str:
+    return shared_cache.make_key('ai:cb', name, *parts)
+
+
+def _opened_at(name: str) -> Optional[float]:
+    value = cache.get(_key(name, 'opened_at'))
+    return float(value) if value is not None else None
+
+
+def state(name: str) -> str:
+    opened_at = _opened_at(name)
+    if opened_at is None:
+        return STATE_CLOSED
+    return STATE_OPEN if time.time() - opened_at < _open_seconds() else STATE_HALF_OPEN
+
+
+def _open(name: str, reason: str) -> None:
+    # opened_at 保留到冷却结束后一段时间，期间处于 half-open，只放行探测请求
+    cache.set(_key(name, 'opened_at'), time.time(), _open_seconds() * 10 + _window_seconds())
+    cache.delete(_key(name, 'probe'))
+    logger.warning("ai.breaker opened: provider=%s reason=%s", name, reason)
+
+
+def _close(name: str) -> None:
+    cache.delete_many([_key(name, 'opened_at'), _key(name, 'probe')])
+    logger.info("ai.breaker closed: provider=%s", name)
+
+
+def _acquire_probe(name: str) -> bool:
+    return bool(cache.add(_key(name, 'probe'), uuid.uuid4().hex, _open_seconds()))
+
+
+def record_success(name: str) -> None:
+    if not is_enabled():
+        return
+    try:
+        shared_cache.incr(_key(name, 'calls', int(time.time() // _window_seconds())), timeout=_window_seconds() * 2)
+        if _opened_at(name) is not None:
+            _close(name)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("ai.breaker unavailable: %s", exc)
+
+
+def record_failure(name: str, category: str) -> None:
+    if not is_enabled() or category not in TRIP_CATEGORIES:
+        return
+    try:
+        if _opened_at(name) is not None:
+            # 探测请求（或熔断前已发出的请求）失败，重新计时
+            _open(name, f'probe failed: {category}')
+            return
+        window = int(time.time() // _window_seconds())
+        calls = shared_cache.incr(_key(name, 'calls', window), timeout=_window_seconds() * 2)
+        failures = shared_cache.incr(_key(name, 'failures', window), timeout=_window_seconds() * 2)
+        min_failures = max(1, int(getattr(settings, 'LLM_BREAKER_MIN_FAILURES', 5) or 5))
+        ratio = max(1, int(getattr(settings, 'LLM_BREAKER_FAILURE_RATIO_PERCENT', 50) or 50)) / 100
+        if failures >= min_failures and failures >= calls * ratio:
+            _open(name, f'{failures}/{calls} failed, last={category}')
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("ai.breaker unavailable: %s", exc)
+
+
+def _weighted_order(providers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # 按权重无放回抽样（Efraimidis-Spirakis），权重越大越可能排在前面
+    return sorted(providers, key=lambda p: random.random() ** (1.0 / max(1, p['weight'])), reverse=True)
+
+
+def route(providers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """返回本次调用依次尝试的上游；half-open 的上游拿到探测权时排在最前。"""
+    if not is_enabled():
+        return _weighted_order(providers)
+    probing, healthy = [], []
+    for provider in providers:
+        try:
+            current = state(provider['name'])
+            if current == STATE_CLOSED:
+                healthy.append(provider)
+            elif current == STATE_HALF_OPEN and _acquire_probe(provider['name']):
+                probing.append(provider)
+        except Exception as exc:  # noqa: BLE001
+            # 缓存后端故障时放行，熔断器不能成为单点
+            logger.warning("ai.breaker unavailable, routing without breaker: %s", exc)
+            healthy.append(provider)
+    return probing + _weighted_order(healthy)
+
@@ -1,6 +1,12 @@
+import json
+import logging
 import os
+from typing import Any, Dict, List
+
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 # 基础模型配置：修正为 V3.2 模型
 DEFAULT_MODEL = 'deepseek-ai/DeepSeek-V3.2'
 DEFAULT_BASE_URL = 'https://api.siliconflow.cn/v1/chat/completions'
@@ -12,3 +18,43 @@ def get_llm_config():
         "base_url": getattr(settings, 'LLM_BASE_URL', os.getenv('LLM_BASE_URL', DEFAULT_BASE_URL)),
         "model": getattr(settings, 'LLM_MODEL', os.getenv('LLM_MODEL', DEFAULT_MODEL)),
     }
+
+
+def _provider_entries() -> List[Dict[str, Any]]:
+    entries = getattr(settings, 'LLM_PROVIDERS', None)
+    if entries is None:
+        raw = os.getenv('LLM_PROVIDERS', '')
+        try:
+            entries = json.loads(raw) if raw.strip() else []
+        except ValueError:
+            logger.error("LLM_PROVIDERS 不是合法的 JSON，已忽略")
+            entries = []
+    return [entry for entry in entries or [] if isinstance(entry, dict)]
+
+
+def get_llm_providers() -> List[Dict[str, Any]]:
+    """
+    上游注册表（均为 OpenAI 兼容接口），按配置顺序返回：
+    [{"name", "api_key", "base_url", "model", "weight"}, ...]。
+
+    LLM_PROVIDERS（settings 或 JSON 环境变量）中的每一项可省略 base_url/model/api_key，
+    缺省取 LLM_BASE_URL/LLM_MODEL/LLM_API_KEY；api_key_env 指定从哪个环境变量读取密钥。
+    未配置时以 get_llm_config() 作为唯一上游。缺少密钥或权重为 0 的上游不参与路由。
+    """
+    default = get_llm_config()
+    entries = _provider_entries() or [{'name': 'default'}]
+    providers = []
+    for index, entry in enumerate(entries):
+        api_key = entry.get('api_key')
+        if not api_key and entry.get('api_key_env'):
+            api_key = os.getenv(str(entry['api_key_env']), '')
+        provider = {
+            'name': str(entry.get('name') or f'provider{index + 1}'),
+            'api_key': api_key or default['api_key'],
+            'base_url': entry.get('base_url') or default['base_url'],
+            'model': entry.get('model') or default['model'],
+            'weight': max(0, int(entry.get('weight', 1) or 0)),
+        }
+        if provider['api_key'] and provider['weight'] > 0:
+            providers.append(provider)
+    return providers
@@ -0,0 +1,272 @@
+"""
+LLM 调用准入控制：跨进程共享（经由 settings.CACHES）的并发上限与每分钟请求数/token 预算。
+
+- 并发：每个模型 LLM_MAX_CONCURRENCY 个租约槽位（cache.add + TTL），进程崩溃后租约自动过期；
+- 速率：按分钟窗口累计请求数与 token 数，请求前按“提示词估算 + max_tokens”预占，响应后按实际用量退还；
+- 优先级：interactive（助教对话）> grading（判分）> bulk（批量命题/解析），
+  低优先级只能使用预算的一部分，为交互请求保留余量；排队超过各自的截止时间后放弃；
+- 上游返回 429 后进入冷却期，冷却期内只放行交互请求。
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+from typing import Any, Dict, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import cache as shared_cache
+
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_GRADING = 'grading'
+PRIORITY_BULK = 'bulk'
+
+# 按 operation 前缀匹配（含派生的 *.schema_repair），未匹配的按判分优先级处理
+_OPERATION_PRIORITIES = (
+    ('assistant.', PRIORITY_INTERACTIVE),
+    ('quizzes.generate_ai_answer', PRIORITY_INTERACTIVE),
+    ('quizzes.grade_question', PRIORITY_GRADING),
+    ('quizzes.bulk_generate', PRIORITY_BULK),
+    ('quizzes.preview_parse', PRIORITY_BULK),
+    ('quizzes.generate_from_text', PRIORITY_BULK),
+)
+
+# 各优先级可使用的预算比例与排队截止时间
+_DEFAULT_PRIORITY_SHARES = {PRIORITY_INTERACTIVE: 1.0, PRIORITY_GRADING: 0.8, PRIORITY_BULK: 0.5}
+_DEFAULT_PRIORITY_DEADLINES = {PRIORITY_INTERACTIVE: 15, PRIORITY_GRADING: 180, PRIORITY_BULK: 600}
+
+_WINDOW_SECONDS = 60
+_POLL_SECONDS = (0.05, 0.25)
+
+
+class AdmissionTimeout(Exception):
+    """排队超过截止时间仍未获准调用。"""
+
+    def __init__(self, model: str, priority: str, waited_seconds: float):
+        super().__init__(f'LLM admission timed out: model={model} priority={priority} waited={waited_seconds:.1f}s')
+        self.model = model
+        self.priority = priority
+        self.waited_seconds = waited_seconds
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, 'LLM_GOVERNOR_ENABLED', True))
+
+
+def priority_for(operation: str) -> str:
+    op = str(operation or '')
+    for prefix, priority in _OPERATION_PRIORITIES:
+        if op.startswith(prefix):
+            return priority
+    return PRIORITY_GRADING
+
+
+def estimate_prompt_tokens(messages: Sequence[Dict[str, Any]]) -> int:
+    # 中文约 1~2 字符/token，按 2 字符粗估并计入每条消息的格式开销
+    chars = sum(len(str(m.get('content') or '')) for m in messages or [])
+    return chars // 2 + 4 * len(messages or [])
+
+
+def _share(priority: str) -> float:
+    shares = getattr(settings, 'LLM_PRIORITY_SHARES', None) or _DEFAULT_PRIORITY_SHARES
+    return max(0.05, min(1.0, float(shares.get(priority, _DEFAULT_PRIORITY_SHARES[PRIORITY_GRADING]))))
+
+
+def _deadline(priority: str) -> float:
+    deadlines = getattr(settings, 'LLM_PRIORITY_DEADLINES_SECONDS', None) or _DEFAULT_PRIORITY_DEADLINES
+    return max(0.0, float(deadlines.get(priority, _DEFAULT_PRIORITY_DEADLINES[PRIORITY_GRADING])))
+
+
+def _limits(model: str) -> Dict[str, int]:
+    overrides = (getattr(settings, 'LLM_MODEL_RATE_LIMITS', None) or {}).get(model) or {}
+    return {
+        'concurrency': int(overrides.get('concurrency', getattr(settings, 'LLM_MAX_CONCURRENCY', 32)) or 0),
+        'rpm': int(overrides.get('rpm', getattr(settings, 'LLM_RPM_LIMIT', 0)) or 0),
+        'tpm': int(overrides.get('tpm', getattr(settings, 'LLM_TPM_LIMIT', 0)) or 0),
+    }
+
+
+def _lease_seconds() -> int:
+    # 租约需覆盖最长的单次请求超时（按类别配置，见 retry_policy）
+    timeouts = [getattr(settings, 'LLM_REQUEST_TIMEOUT_SECONDS', 120) or 120]
+    timeouts.extend((getattr(settings, 'LLM_OPERATION_TIMEOUTS', None) or {}).values())
+    return max(10, *(int(t or 0) for t in timeouts)) + 30
+
+
+def _key(model: str, *parts: Any) -> str:
+    return shared_cache.make_key('ai:gov', model, *parts)
+
+
+def note_rate_limited(model: str, seconds: Optional[float] = None) -> None:
+    """上游返回 429 时调用：冷却期内暂停后台优先级的准入。"""
+    cooldown = seconds if seconds is not None else getattr(settings, 'LLM_RATE_LIMIT_COOLDOWN_SECONDS', 5)
+    cooldown = max(1, int(cooldown or 1))
+    try:
+        cache.set(_key(model, 'cooldown'), 1, cooldown)
+    except Exception:
+        logger.warning("ai.governor cooldown write failed: model=%s", model)
+
+
+class Ticket:
+    """一次准入的凭证：持有并发租约与预占的 token，调用结束后 release。"""
+
+    def __init__(self, model: str, priority: str, slot_key: Optional[str], token: str, reserved: int, window: int):
+        self.model = model
+        self.priority = priority
+        self.slot_key = slot_key
+        self.token = token
+        self.reserved = reserved
+        self.window = window
+        self.waited_ms = 0
+        self._released = False
+
+    def settle(self, payload: Any) -> None:
+        """按响应中的实际 token 用量退还多预占的部分。"""
+        usage = payload.get('usage') if isinstance(payload, dict) else None
+        total = usage.get('total_tokens') if isinstance(usage, dict) else None
+        if not self.reserved or not isinstance(total, int):
+            return
+        refund = self.reserved - total
+        if refund > 0:
+            try:
+                shared_cache.incr(_key(self.model, 'tpm', self.window), -refund, timeout=_WINDOW_SECONDS * 2)
+            except Exception:
+                pass
+        self.reserved = total
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        if self.slot_key:
+            try:
+                if cache.get(self.slot_key) == self.token:
+                    cache.delete(self.slot_key)
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+
+def _take_budget(key: str, amount: int, cap: int) -> bool:
+    if amount <= 0:
+        return True
+    amount = min(amount, cap)
+    used = shared_cache.incr(key, amount, timeout=_WINDOW_SECONDS * 2)
+    if used <= cap:
+        return True
+    shared_cache.incr(key, -amount, timeout=_WINDOW_SECONDS * 2)
+    return False
+
+
+def _try_admit(model: str, priority: str, tokens: int) -> Optional[Ticket]:
+    if priority != PRIORITY_INTERACTIVE and cache.get(_key(model, 'cooldown')):
+        return None
+
+    limits = _limits(model)
+    share = _share(priority)
+    token = uuid.uuid4().hex
+    slot_key = None
+    if limits['concurrency'] > 0:
+        slots = max(1, int(limits['concurrency'] * share))
+        for index in range(slots):
+            candidate = _key(model, 'slot', index)
+            if cache.add(candidate, token, _lease_seconds()):
+                slot_key = candidate
+                break
+        if slot_key is None:
+            return None
+
+    window = int(time.time() // _WINDOW_SECONDS)
+    ticket = Ticket(model, priority, slot_key, token, 0, window)
+    if limits['rpm'] > 0 and not _take_budget(_key(model, 'rpm', window), 1, max(1, int(limits['rpm'] * share))):
+        ticket.release()
+        return None
+    if limits['tpm'] > 0:
+        if not _take_budget(_key(model, 'tpm', window), tokens, max(1, int(limits['tpm'] * share))):
+            if limits['rpm'] > 0:
+                shared_cache.incr(_key(model, 'rpm', window), -1, timeout=_WINDOW_SECONDS * 2)
+            ticket.release()
+            return None
+        ticket.reserved = min(tokens, int(limits['tpm'] * share))
+    return ticket
+
+
+def _unlimited_ticket(model: str, priority: str) -> Ticket:
+    return Ticket(model, priority, None, '', 0, 0)
+
+
+def _admit_or_none(model: str, priority: str, tokens: int) -> Optional[Ticket]:
+    try:
+        return _try_admit(model, priority, tokens)
+    except Exception as exc:  # noqa: BLE001
+        # 缓存后端故障时放行，准入控制不能成为单点
+        logger.warning("ai.governor unavailable, admitting without limits: %s", exc)
+        return _unlimited_ticket(model, priority)
+
+
+def _log_wait(ticket: Ticket, operation: str) -> None:
+    if ticket.waited_ms >= 1000:
+        logger.info(
+            "ai.governor queued: model=%s operation=%s priority=%s waited_ms=%s",
+            ticket.model,
+            operation,
+            ticket.priority,
+            ticket.waited_ms,
+        )
+
+
+def try_admit(model: str, operation: str, messages: Sequence[Dict[str, Any]], max_tokens: int) -> Optional[Ticket]:
+    """不排队的准入：对冲等可放弃的请求使用，额度不足时返回 None。"""
+    priority = priority_for(operation)
+    if not is_enabled():
+        return _unlimited_ticket(model, priority)
+    return _admit_or_none(model, priority, estimate_prompt_tokens(messages) + max(0, int(max_tokens or 0)))
+
+
+def admit(model: str, operation: str, messages: Sequence[Dict[str, Any]], max_tokens: int) -> Ticket:
+    """阻塞直到获准调用或超过该优先级的截止时间（抛出 AdmissionTimeout）。"""
+    priority = priority_for(operation)
+    if not is_enabled():
+        return _unlimited_ticket(model, priority)
+    tokens = estimate_prompt_tokens(messages) + max(0, int(max_tokens or 0))
+    started = time.monotonic()
+    deadline = started + _deadline(priority)
+    while True:
+        ticket = _admit_or_none(model, priority, tokens)
+        if ticket is not None:
+            ticket.waited_ms = int((time.monotonic() - started) * 1000)
+            _log_wait(ticket, operation)
+            return ticket
+        if time.monotonic() >= deadline:
+            raise AdmissionTimeout(model, priority, time.monotonic() - started)
+        time.sleep(random.uniform(*_POLL_SECONDS))
+
+
+async def aadmit(model: str, operation: str, messages: Sequence[Dict[str, Any]], max_tokens: int) -> Ticket:
+    """admit 的 asyncio 版本，排队期间让出事件循环。"""
+    priority = priority_for(operation)
+    if not is_enabled():
+        return _unlimited_ticket(model, priority)
+    tokens = estimate_prompt_tokens(messages) + max(0, int(max_tokens or 0))
+    started = time.monotonic()
+    deadline = started + _deadline(priority)
+    while True:
+        ticket = _admit_or_none(model, priority, tokens)
+        if ticket is not None:
+            ticket.waited_ms = int((time.monotonic() - started) * 1000)
+            _log_wait(ticket, operation)
+            return ticket
+        if time.monotonic() >= deadline:
+            raise AdmissionTimeout(model, priority, time.monotonic() - started)
+        await asyncio.sleep(random.uniform(*_POLL_SECONDS))
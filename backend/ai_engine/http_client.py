@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import weakref
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from django.conf import settings
+
+
+# 连接池按 scheme://host[:port] 维度复用，同一 LLM 网关的不同路径共享 keep-alive 连接。
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_transport_factory: Optional[Callable[[str], BaseAdapter]] = None
+
+# httpx 的连接绑定在创建它的事件循环上，异步客户端按 (事件循环, pool_key) 维护；
+# 事件循环被回收后其客户端随弱引用字典一并释放。
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]' = (
+    weakref.WeakKeyDictionary()
+)
+_async_transport_factory: Optional[Callable[[str], httpx.AsyncBaseTransport]] = None
+
+
+def _pool_key(base_url: str) -> str:
+    parts = urlsplit(str(base_url or '').strip())
+    if not parts.scheme or not parts.netloc:
+        return str(base_url or '').strip()
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+def _default_adapter(pool_key: str) -> BaseAdapter:
+    pool_size = max(1, int(getattr(settings, 'LLM_HTTP_POOL_MAXSIZE', 16) or 16))
+    pool_connections = max(1, int(getattr(settings, 'LLM_HTTP_POOL_CONNECTIONS', 4) or 4))
+    # 重试由 AIEngine 统一控制，这里禁用 urllib3 层面的隐式重试，避免重复计费。
+    return HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_size,
+        max_retries=0,
+        pool_block=False,
+    )
+
+
+def _build_session(pool_key: str) -> requests.Session:
+    session = requests.Session()
+    factory = _transport_factory or _default_adapter
+    adapter = factory(pool_key)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Connection': 'keep-alive'})
+    return session
+
+
+def get_http_session(base_url: str) -> requests.Session:
+    """返回进程内共享的、按 base_url 复用连接池的 Session（线程安全）。"""
+    key = _pool_key(base_url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _build_session(key)
+            _sessions[key] = session
+        return session
+
+
+def set_transport_factory(factory: Optional[Callable[[str], BaseAdapter]]) -> None:
+    """
+    替换底层传输适配器（测试可挂载本地替身服务），传 None 恢复默认连接池。
+    已创建的 Session 会被关闭并在下次调用时按新传输重建。
+    """
+    global _transport_factory
+    with _sessions_lock:
+        _transport_factory = factory
+        _close_all_locked()
+
+
+def close_http_sessions() -> None:
+    with _sessions_lock:
+        _close_all_locked()
+
+
+def _close_all_locked() -> None:
+    for session in _sessions.values():
+        try:
+            session.close()
+        except Exception:
+            continue
+    _sessions.clear()
+
+
+# ---------------------------------------------------------------------------
+# asyncio 客户端
+# ---------------------------------------------------------------------------
+
+def _default_async_transport(pool_key: str) -> httpx.AsyncBaseTransport:
+    max_connections = max(1, int(getattr(settings, 'LLM_ASYNC_MAX_CONNECTIONS', 100) or 100))
+    keepalive = max(1, int(getattr(settings, 'LLM_HTTP_POOL_MAXSIZE', 16) or 16))
+    # 与同步连接池一致：传输层不做隐式重试
+    return httpx.AsyncHTTPTransport(
+        retries=0,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=keepalive),
+    )
+
+
+def get_async_client(base_url: str) -> httpx.AsyncClient:
+    """返回当前事件循环内共享的 AsyncClient，单个循环即可复用连接承载大量并发请求。"""
+    loop = asyncio.get_running_loop()
+    key = _pool_key(base_url)
+    with _sessions_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            factory = _async_transport_factory or _default_async_transport
+            client = httpx.AsyncClient(transport=factory(key), headers={'Connection': 'keep-alive'})
+            clients[key] = client
+        return client
+
+
+def set_async_transport_factory(factory: Optional[Callable[[str], httpx.AsyncBaseTransport]]) -> None:
+    """替换异步传输（测试可挂载 httpx.MockTransport），传 None 恢复默认连接池；已创建的客户端被丢弃。"""
+    global _async_transport_factory
+    with _sessions_lock:
+        _async_transport_factory = factory
+        _async_clients.clear()
+
+
+async def aclose_async_clients() -> None:
+    """关闭当前事件循环持有的异步客户端（ASGI lifespan 结束或 worker 退出时调用）。"""
+    loop = asyncio.get_running_loop()
+    with _sessions_lock:
+        clients = _async_clients.pop(loop, {})
+    for client in clients.values():
+        try:
+            await client.aclose()
+        except Exception:
+            continue
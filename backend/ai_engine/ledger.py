@@ -0,0 +1,282 @@
+"""
+Token 用量台账与每日配额：按 天 × 用户 × 助教 × operation 累计 prompt/completion token。
+
+- 归属：调用方用 attribute(user=..., bot=...) 声明后续 LLM 调用的归属（contextvars，
+  线程池需经 contextvars.copy_context 传递）；未声明归属的调用记入 user 为空的行，不受配额限制；
+- 记账：成功调用后按响应中的 usage 累加（流式响应未带 usage 时按字符数估算），
+  同时累加缓存中的当日计数，供调用前的配额检查使用；缓存缺失时从台账回源；
+- 配额：AI_DAILY_TOKEN_QUOTA 为每个用户每日总量，AI_OPERATION_DAILY_TOKEN_QUOTAS 按 operation 前缀
+  单独限制（含派生的 *.schema_repair），0 或未配置表示不限；管理员默认豁免。
+"""
+import contextlib
+import contextvars
+import datetime
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from core import cache as shared_cache
+
+
+logger = logging.getLogger(__name__)
+
+COUNTER_TTL_SECONDS = 36 * 3600
+TOTAL_QUOTA = '*'
+
+
+class Scope:
+    """一次调用的归属：用户、助教与是否豁免配额。"""
+
+    __slots__ = ('user_id', 'bot_id', 'exempt')
+
+    def __init__(self, user_id: Optional[int] = None, bot_id: Optional[int] = None, exempt: bool = False):
+        self.user_id = user_id
+        self.bot_id = bot_id
+        self.exempt = exempt
+
+
+_scope: contextvars.ContextVar[Optional[Scope]] = contextvars.ContextVar('ai_usage_scope', default=None)
+
+
+class QuotaExceeded(Exception):
+    """归属用户当日 token 用量已达配额。"""
+
+    def __init__(self, operation: str, quota: str, limit: int, used: int):
+        self.message = "今日 AI 使用额度已用完，请明天再试。"
+        super().__init__(self.message)
+        self.operation = operation
+        self.quota = quota
+        self.limit = limit
+        self.used = used
+
+
+def scope_for(user: Any = None, bot: Any = None, user_id: Optional[int] = None, bot_id: Optional[int] = None) -> Scope:
+    exempt = False
+    if user is not None:
+        user_id = user.pk
+        exempt = bool(getattr(user, 'is_staff', False)) and bool(getattr(settings, 'AI_TOKEN_QUOTA_EXEMPT_STAFF', True))
+    if bot is not None:
+        bot_id = bot.pk
+    return Scope(user_id, bot_id, exempt)
+
+
+@contextlib.contextmanager
+def attribute(user: Any = None, bot: Any = None, user_id: Optional[int] = None, bot_id: Optional[int] = None) -> Iterator[Scope]:
+    """在 with 块内发起的 LLM 调用计入指定用户（与助教）名下。"""
+    scope = scope_for(user, bot, user_id, bot_id)
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def current() -> Optional[Scope]:
+    return _scope.get()
+
+
+def today() -> datetime.date:
+    return timezone.localdate()
+
+
+def _quotas(operation: str) -> List[Tuple[str, int]]:
+    quotas = []
+    total = int(getattr(settings, 'AI_DAILY_TOKEN_QUOTA', 0) or 0)
+    if total > 0:
+        quotas.append((TOTAL_QUOTA, total))
+    for prefix, limit in (getattr(settings, 'AI_OPERATION_DAILY_TOKEN_QUOTAS', None) or {}).items():
+        if int(limit or 0) > 0 and operation.startswith(prefix):
+            quotas.append((prefix, int(limit)))
+    return quotas
+
+
+def _counter_key(user_id: int, day: datetime.date, quota: str) -> str:
+    return shared_cache.make_key('ai:quota', user_id, day.isoformat(), quota)
+
+
+def _load_used(user_id: int, day: datetime.date, quota: str) -> int:
+    from .models import TokenUsage
+
+    qs = TokenUsage.objects.filter(user_id=user_id, day=day)
+    if quota != TOTAL_QUOTA:
+        qs = qs.filter(operation__startswith=quota)
+    totals = qs.aggregate(prompt=Sum('prompt_tokens'), completion=Sum('completion_tokens'))
+    return int(totals['prompt'] or 0) + int(totals['completion'] or 0)
+
+
+def used_today(user_id: int, quota: str = TOTAL_QUOTA) -> int:
+    day = today()
+    return int(shared_cache.get_or_set(
+        _counter_key(user_id, day, quota),
+        lambda: _load_used(user_id, day, quota),
+        COUNTER_TTL_SECONDS,
+    ))
+
+
+def needs_check(operation: str, scope: Optional[Scope] = None) -> bool:
+    """不访问缓存与数据库的快速判断：有归属、未豁免且配置了适用的配额。"""
+    scope = scope or current()
+    return bool(scope and scope.user_id and not scope.exempt and _quotas(operation))
+
+
+def check_quota(operation: str, scope: Optional[Scope] = None) -> None:
+    """调用前检查归属用户的当日用量，任一适用配额用尽时抛出 QuotaExceeded。"""
+    scope = scope or current()
+    if not needs_check(operation, scope):
+        return
+    for quota, limit in _quotas(operation):
+        try:
+            used = used_today(scope.user_id, quota)
+        except Exception as exc:  # noqa: BLE001
+            # 缓存与数据库均不可用时放行，配额不能成为单点
+            logger.warning("ai.ledger quota check unavailable: %s", exc)
+            return
+        if used >= limit:
+            raise QuotaExceeded(operation, quota, limit, used)
+
+
+def _as_tokens(value: Any) -> int:
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _upsert(lookup: Dict[str, Any], prompt_tokens: int, completion_tokens: int) -> None:
+    from .models import TokenUsage
+
+    # user/bot 为空时唯一约束不生效，按主键更新以免并发插入的重复行被重复累加
+    pk = TokenUsage.objects.filter(**lookup).values_list('pk', flat=True).first()
+    if pk is None:
+        try:
+            with transaction.atomic():
+                TokenUsage.objects.create(
+                    **lookup, calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+                )
+            return
+        except IntegrityError:
+            pk = TokenUsage.objects.filter(**lookup).values_list('pk', flat=True).first()
+    TokenUsage.objects.filter(pk=pk).update(
+        calls=F('calls') + 1,
+        prompt_tokens=F('prompt_tokens') + prompt_tokens,
+        completion_tokens=F('completion_tokens') + completion_tokens,
+    )
+
+
+def record(operation: str, usage: Optional[Dict[str, Any]], scope: Optional[Scope] = None) -> None:
+    """按一次成功调用的 usage 记账；写入失败只记日志，不影响调用结果。"""
+    scope = scope or current()
+    usage = usage if isinstance(usage, dict) else {}
+    prompt_tokens = _as_tokens(usage.get('prompt_tokens'))
+    completion_tokens = _as_tokens(usage.get('completion_tokens'))
+    if not prompt_tokens + completion_tokens:
+        # 上游未返回 usage，调用次数已由 observability 统计
+        return
+    day = today()
+    user_id = scope.user_id if scope else None
+    lookup = {
+        'day': day,
+        'user_id': user_id,
+        'bot_id': scope.bot_id if scope else None,
+        'operation': str(operation or 'general')[:100],
+    }
+    try:
+        _upsert(lookup, prompt_tokens, completion_tokens)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("ai.ledger record failed: operation=%s err=%s", operation, exc)
+        return
+
+    if not user_id:
+        return
+    for quota, _limit in _quotas(lookup['operation']):
+        # 计数缺失时不初始化：下次检查从台账回源，已包含本次写入
+        try:
+            cache.incr(_counter_key(user_id, day, quota), prompt_tokens + completion_tokens)
+        except ValueError:
+            pass
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("ai.ledger counter update failed: %s", exc)
+
+
+# ---------------------------------------------------------------------------
+# 报表
+# ---------------------------------------------------------------------------
+
+_SUM_FIELDS = ('calls', 'prompt_tokens', 'completion_tokens', 'total_tokens')
+
+
+def _sums() -> Dict[str, Any]:
+    # total_tokens 放在最前：之后同名的聚合别名会遮蔽模型字段
+    return {
+        'total_tokens': Sum(F('prompt_tokens') + F('completion_tokens')),
+        'calls': Sum('calls'),
+        'prompt_tokens': Sum('prompt_tokens'),
+        'completion_tokens': Sum('completion_tokens'),
+    }
+
+
+def _clean(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: (value or 0) if key in _SUM_FIELDS else value for key, value in row.items()}
+
+
+def summarize(
+    days: int = 7,
+    user_id: Optional[int] = None,
+    operation: Optional[str] = None,
+    top: int = 20,
+) -> Dict[str, Any]:
+    """最近 days 天（含今天）的 token 用量：总计、按 operation（附延迟指标）、用户、助教与天聚合。"""
+    from .metrics import summarize as summarize_metrics
+    from .models import TokenUsage
+
+    days = max(1, int(days))
+    since = today() - datetime.timedelta(days=days - 1)
+    rows = TokenUsage.objects.filter(day__gte=since)
+    if user_id:
+        rows = rows.filter(user_id=user_id)
+    if operation:
+        rows = rows.filter(operation__startswith=operation)
+
+    latency = {item['operation']: item for item in summarize_metrics(hours=days * 24)['operations']}
+    by_operation = []
+    for row in rows.values('operation').annotate(**_sums()).order_by('-total_tokens'):
+        stats = latency.get(row['operation']) or {}
+        by_operation.append({
+            **_clean(row),
+            'failures': stats.get('failures'),
+            'avg_ms': stats.get('avg_ms'),
+            'p50_ms': stats.get('p50_ms'),
+            'p95_ms': stats.get('p95_ms'),
+        })
+
+    return {
+        'since': since,
+        'days': days,
+        'totals': _clean(rows.aggregate(**_sums())),
+        'by_operation': by_operation,
+        'top_users': [
+            _clean(row)
+            for row in rows.filter(user__isnull=False)
+            .values('user_id', 'user__username')
+            .annotate(**_sums())
+            .order_by('-total_tokens')[:max(1, top)]
+        ],
+        'by_bot': [
+            _clean(row)
+            for row in rows.filter(bot_id__isnull=False).values('bot_id').annotate(**_sums()).order_by('-total_tokens')
+        ],
+        'daily': [_clean(row) for row in rows.values('day').annotate(**_sums()).order_by('day')],
+        'quotas': {
+            'daily': int(getattr(settings, 'AI_DAILY_TOKEN_QUOTA', 0) or 0),
+            'operations': {
+                prefix: int(limit)
+                for prefix, limit in (getattr(settings, 'AI_OPERATION_DAILY_TOKEN_QUOTAS', None) or {}).items()
+                if int(limit or 0) > 0
+            },
+        },
+    }
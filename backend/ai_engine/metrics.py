@@ -0,0 +1,306 @@
+"""
+AI 调用指标的汇总与查询。
+
+observability 把每次调用的计数累加到共享缓存的小时桶里；rollup_recent 定期把最近几个小时的累计值
+覆盖写入 AIOperationRollup（幂等，可重复执行）。过期的小时行在 prune_rollups 中并入每个 operation
+的归档行（bucket 为 ARCHIVE_BUCKET），使 Prometheus 导出的累计计数始终单调递增。
+"""
+import datetime
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core import cache as shared_cache
+
+from . import circuit_breaker
+from .config import get_llm_providers
+from .models import AIOperationRollup
+from .observability import (
+    ERROR_CATEGORIES,
+    LATENCY_BUCKETS_MS,
+    SCHEMA_STAGES,
+    hour_bucket,
+    ops_key,
+    operations_for,
+    schema_key,
+)
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BUCKET = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+QUANTILES = (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99))
+_PROMETHEUS_CACHE_SECONDS = 15
+
+
+def _bucket_start(bucket: str) -> datetime.datetime:
+    return datetime.datetime.strptime(bucket, '%Y%m%d%H').replace(tzinfo=datetime.timezone.utc)
+
+
+def _read_hour(operation: str, bucket: str) -> Dict[str, Any]:
+    """从缓存读取某 operation 某小时的全部计数，一次 get_many 完成。"""
+    keys = {
+        'calls': ops_key(operation, bucket, 'total'),
+        'successes': ops_key(operation, bucket, 'success'),
+        'failures': ops_key(operation, bucket, 'fail'),
+        'duration_ms_sum': ops_key(operation, bucket, 'duration_ms'),
+        'retries': ops_key(operation, bucket, 'retries'),
+        'prompt_tokens': ops_key(operation, bucket, 'prompt_tokens'),
+        'completion_tokens': ops_key(operation, bucket, 'completion_tokens'),
+    }
+    for category in ERROR_CATEGORIES:
+        keys[f'err:{category}'] = ops_key(operation, bucket, 'err', category)
+    for index in range(len(LATENCY_BUCKETS_MS) + 1):
+        keys[f'lat:{index}'] = ops_key(operation, bucket, 'lat', index)
+    for stage in SCHEMA_STAGES:
+        for result in ('success', 'fail'):
+            keys[f'schema:{stage}:{result}'] = schema_key(operation, bucket, stage, result)
+
+    values = cache.get_many(list(keys.values()))
+    counts = {name: int(values.get(key) or 0) for name, key in keys.items()}
+    fields = {
+        name: counts[name]
+        for name in ('calls', 'successes', 'failures', 'duration_ms_sum', 'retries', 'prompt_tokens', 'completion_tokens')
+    }
+    fields['errors'] = {c: counts[f'err:{c}'] for c in ERROR_CATEGORIES if counts[f'err:{c}']}
+    fields['latency_buckets'] = [counts[f'lat:{i}'] for i in range(len(LATENCY_BUCKETS_MS) + 1)]
+    fields['schema'] = {
+        stage: {'success': counts[f'schema:{stage}:success'], 'fail': counts[f'schema:{stage}:fail']}
+        for stage in SCHEMA_STAGES
+        if counts[f'schema:{stage}:success'] or counts[f'schema:{stage}:fail']
+    }
+    return fields
+
+
+def rollup_hour(when: Optional[datetime.datetime] = None) -> int:
+    bucket = hour_bucket(when)
+    start = _bucket_start(bucket)
+    written = 0
+    for operation in operations_for(bucket):
+        fields = _read_hour(operation, bucket)
+        if not fields['calls'] and not fields['schema']:
+            continue
+        AIOperationRollup.objects.update_or_create(bucket=start, operation=operation, defaults=fields)
+        written += 1
+    return written
+
+
+def rollup_recent(hours: int = 2, now: Optional[datetime.datetime] = None) -> int:
+    """汇总当前及之前 hours-1 个小时（上一小时在整点后仍可能有迟到的计数）。"""
+    now = now or timezone.now()
+    return sum(rollup_hour(now - datetime.timedelta(hours=offset)) for offset in range(max(1, hours)))
+
+
+# ---------------------------------------------------------------------------
+# 聚合
+# ---------------------------------------------------------------------------
+
+def _empty() -> Dict[str, Any]:
+    return {
+        'calls': 0,
+        'successes': 0,
+        'failures': 0,
+        'duration_ms_sum': 0,
+        'retries': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'errors': {},
+        'latency_buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        'schema': {},
+    }
+
+
+def _accumulate(acc: Dict[str, Any], row: AIOperationRollup) -> Dict[str, Any]:
+    for name in ('calls', 'successes', 'failures', 'duration_ms_sum', 'retries', 'prompt_tokens', 'completion_tokens'):
+        acc[name] += getattr(row, name) or 0
+    for category, count in (row.errors or {}).items():
+        acc['errors'][category] = acc['errors'].get(category, 0) + int(count or 0)
+    for index, count in enumerate((row.latency_buckets or [])[:len(acc['latency_buckets'])]):
+        acc['latency_buckets'][index] += int(count or 0)
+    for stage, results in (row.schema or {}).items():
+        target = acc['schema'].setdefault(stage, {'success': 0, 'fail': 0})
+        for result in ('success', 'fail'):
+            target[result] += int((results or {}).get(result) or 0)
+    return acc
+
+
+def _by_operation(rows: Iterable[AIOperationRollup]) -> Dict[str, Dict[str, Any]]:
+    merged: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        _accumulate(merged.setdefault(row.operation, _empty()), row)
+    return merged
+
+
+def histogram_quantile(buckets: Sequence[int], q: float) -> Optional[float]:
+    """按桶内线性插值估算分位数（毫秒），落在溢出桶时取最大上界。"""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for index, count in enumerate(buckets):
+        if count and cumulative + count >= rank:
+            if index >= len(LATENCY_BUCKETS_MS):
+                break
+            lower = LATENCY_BUCKETS_MS[index - 1] if index else 0
+            upper = LATENCY_BUCKETS_MS[index]
+            return round(lower + (upper - lower) * (rank - cumulative) / count, 1)
+        cumulative += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def _ratio(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def describe(stats: Dict[str, Any]) -> Dict[str, Any]:
+    calls = stats['calls']
+    validate = stats['schema'].get('validate', {'success': 0, 'fail': 0})
+    repair = stats['schema'].get('repair', {'success': 0, 'fail': 0})
+    summary = {
+        'calls': calls,
+        'successes': stats['successes'],
+        'failures': stats['failures'],
+        'success_rate': _ratio(stats['successes'], calls),
+        'errors': stats['errors'],
+        'avg_ms': round(stats['duration_ms_sum'] / calls, 1) if calls else None,
+        'retries': stats['retries'],
+        'retry_rate': _ratio(stats['retries'], calls),
+        'prompt_tokens': stats['prompt_tokens'],
+        'completion_tokens': stats['completion_tokens'],
+        'schema_checks': validate['success'] + validate['fail'],
+        'schema_repair_rate': _ratio(validate['fail'], validate['success'] + validate['fail']),
+        'schema_repair_success_rate': _ratio(repair['success'], repair['success'] + repair['fail']),
+    }
+    for name, q in QUANTILES:
+        summary[name] = histogram_quantile(stats['latency_buckets'], q)
+    return summary
+
+
+def summarize(hours: int = 24, operation: Optional[str] = None, now: Optional[datetime.datetime] = None) -> Dict[str, Any]:
+    """最近 hours 小时按 operation 聚合的指标；指定 operation 时附带逐小时序列。"""
+    now = now or timezone.now()
+    since = _bucket_start(hour_bucket(now - datetime.timedelta(hours=max(1, hours) - 1)))
+    rows = AIOperationRollup.objects.filter(bucket__gte=since).order_by('bucket')
+    if operation:
+        rows = rows.filter(operation=operation)
+    rows = list(rows)
+
+    result: Dict[str, Any] = {
+        'since': since,
+        'operations': [
+            {'operation': op, **describe(stats)}
+            for op, stats in sorted(_by_operation(rows).items(), key=lambda item: -item[1]['calls'])
+        ],
+    }
+    if operation:
+        result['series'] = [
+            {'bucket': row.bucket, **describe(_accumulate(_empty(), row))}
+            for row in rows
+        ]
+    return result
+
+
+# ---------------------------------------------------------------------------
+# 归档
+# ---------------------------------------------------------------------------
+
+def prune_rollups(now: Optional[datetime.datetime] = None, days: Optional[int] = None) -> int:
+    """把超过保留期的小时行并入归档行后删除，返回删除的行数。"""
+    now = now or timezone.now()
+    days = days or max(1, int(getattr(settings, 'AI_METRICS_RETENTION_DAYS', 90) or 90))
+    expired = AIOperationRollup.objects.filter(
+        bucket__gt=ARCHIVE_BUCKET, bucket__lt=now - datetime.timedelta(days=days)
+    )
+    with transaction.atomic():
+        rows = list(expired.select_for_update())
+        if not rows:
+            return 0
+        for op, stats in _by_operation(rows).items():
+            archive, _ = AIOperationRollup.objects.select_for_update().get_or_create(
+                bucket=ARCHIVE_BUCKET, operation=op
+            )
+            for name, value in _accumulate(stats, archive).items():
+                setattr(archive, name, value)
+            archive.save()
+        AIOperationRollup.objects.filter(pk__in=[row.pk for row in rows]).delete()
+    return len(rows)
+
+
+# ---------------------------------------------------------------------------
+# Prometheus 文本格式
+# ---------------------------------------------------------------------------
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels: Any) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _render_prometheus() -> str:
+    totals = _by_operation(AIOperationRollup.objects.all())
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str) -> None:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    family('ai_operation_requests_total', 'counter', 'AI calls by operation and result.')
+    for op, stats in sorted(totals.items()):
+        lines.append(f'ai_operation_requests_total{_labels(operation=op, result="success")} {stats["successes"]}')
+        lines.append(f'ai_operation_requests_total{_labels(operation=op, result="failure")} {stats["failures"]}')
+
+    family('ai_operation_errors_total', 'counter', 'Failed AI calls by error category.')
+    for op, stats in sorted(totals.items()):
+        for category, count in sorted(stats['errors'].items()):
+            lines.append(f'ai_operation_errors_total{_labels(operation=op, category=category)} {count}')
+
+    family('ai_operation_duration_seconds', 'histogram', 'End-to-end AI call latency including retries.')
+    for op, stats in sorted(totals.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, stats['latency_buckets']):
+            cumulative += count
+            lines.append(f'ai_operation_duration_seconds_bucket{_labels(operation=op, le=bound / 1000)} {cumulative}')
+        lines.append(
+            f'ai_operation_duration_seconds_bucket{_labels(operation=op, le="+Inf")} {sum(stats["latency_buckets"])}'
+        )
+        lines.append(f'ai_operation_duration_seconds_sum{_labels(operation=op)} {stats["duration_ms_sum"] / 1000}')
+        lines.append(f'ai_operation_duration_seconds_count{_labels(operation=op)} {sum(stats["latency_buckets"])}')
+
+    family('ai_operation_retries_total', 'counter', 'Retried upstream requests.')
+    for op, stats in sorted(totals.items()):
+        lines.append(f'ai_operation_retries_total{_labels(operation=op)} {stats["retries"]}')
+
+    family('ai_operation_tokens_total', 'counter', 'Tokens reported by the upstream usage field.')
+    for op, stats in sorted(totals.items()):
+        lines.append(f'ai_operation_tokens_total{_labels(operation=op, type="prompt")} {stats["prompt_tokens"]}')
+        lines.append(f'ai_operation_tokens_total{_labels(operation=op, type="completion")} {stats["completion_tokens"]}')
+
+    family('ai_schema_checks_total', 'counter', 'Structured output validation and repair outcomes.')
+    for op, stats in sorted(totals.items()):
+        for stage, results in sorted(stats['schema'].items()):
+            for result in ('success', 'fail'):
+                lines.append(f'ai_schema_checks_total{_labels(operation=op, stage=stage, result=result)} {results[result]}')
+
+    family('ai_provider_circuit_open', 'gauge', '1 when the provider circuit breaker is open or half-open.')
+    for provider in get_llm_providers():
+        state = circuit_breaker.state(provider['name'])
+        lines.append(
+            f'ai_provider_circuit_open{_labels(provider=provider["name"])} {int(state != circuit_breaker.STATE_CLOSED)}'
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def render_prometheus() -> str:
+    """累计计数覆盖全部保留期与归档行；结果短暂缓存，避免高频抓取反复扫表。"""
+    return shared_cache.get_or_set(
+        shared_cache.make_key('ai:metrics', 'prometheus'),
+        _render_prometheus,
+        timeout=_PROMETHEUS_CACHE_SECONDS,
+    )
@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="AIOperationRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField(help_text="小时起点（UTC）")),
+                ("operation", models.CharField(max_length=100)),
+                ("calls", models.PositiveIntegerField(default=0)),
+                ("successes", models.PositiveIntegerField(default=0)),
+                ("failures", models.PositiveIntegerField(default=0)),
+                ("errors", models.JSONField(blank=True, default=dict)),
+                ("duration_ms_sum", models.BigIntegerField(default=0)),
+                ("latency_buckets", models.JSONField(blank=True, default=list)),
+                ("retries", models.PositiveIntegerField(default=0)),
+                ("prompt_tokens", models.BigIntegerField(default=0)),
+                ("completion_tokens", models.BigIntegerField(default=0)),
+                ("schema", models.JSONField(blank=True, default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["operation", "bucket"], name="ai_engine_rollup_op_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("bucket", "operation"),
+                        name="ai_engine_rollup_bucket_op_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.db import models
+
+
+class AIOperationRollup(models.Model):
+    """
+    AI 调用指标的小时汇总：由缓存中的小时计数定期覆盖写入（同一小时可多次汇总，取最新累计值）。
+    latency_buckets 与 observability.LATENCY_BUCKETS_MS 对齐，最后一格为溢出桶；
+    errors 为 {错误类别: 次数}，schema 为 {阶段: {"success": n, "fail": n}}。
+    """
+    bucket = models.DateTimeField(help_text="小时起点（UTC）")
+    operation = models.CharField(max_length=100)
+    calls = models.PositiveIntegerField(default=0)
+    successes = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=dict, blank=True)
+    duration_ms_sum = models.BigIntegerField(default=0)
+    latency_buckets = models.JSONField(default=list, blank=True)
+    retries = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    schema = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'operation'], name='ai_engine_rollup_bucket_op_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['operation', 'bucket'], name='ai_engine_rollup_op_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.operation}@{self.bucket:%Y-%m-%d %H}:00 ({self.calls})"
+
+
+class TokenUsage(models.Model):
+    """
+    Token 用量台账：按 天 × 用户 × 助教 × operation 累计（见 ai_engine.ledger）。
+    user 为空表示未声明归属的后台调用；bot_id 不建外键，避免 ai_engine 反向依赖 ai_assistant。
+    """
+    day = models.DateField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='ai_token_usage'
+    )
+    bot_id = models.PositiveIntegerField(null=True, blank=True)
+    operation = models.CharField(max_length=100)
+    calls = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'user', 'bot_id', 'operation'], name='ai_engine_token_usage_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day'], name='ai_engine_token_user_day_idx'),
+            models.Index(fields=['day', 'operation'], name='ai_engine_token_day_op_idx'),
+        ]
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def __str__(self):
+        return f"{self.day} user={self.user_id} {self.operation} ({self.total_tokens})"
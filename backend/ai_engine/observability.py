@@ -1,22 +1,98 @@
+"""
+AI 调用观测：按小时把计数、延迟直方图、token 用量、重试次数与 schema 校验结果累加到共享缓存，
+由 ai_engine.metrics.rollup_recent 定期汇总落库（缓存计数保留 48 小时，足够覆盖汇总间隔）。
+"""
+import bisect
+import datetime
 import logging
-from typing import Any, Dict, Optional
+import threading
+from typing import Any, Dict, List, Optional
 
 from django.core.cache import cache
 from django.utils import timezone
 
+from core import cache as shared_cache
+from core.cache import incr
+
 
 logger = logging.getLogger(__name__)
 
+COUNTER_TTL_SECONDS = 48 * 3600
+# 延迟直方图上界（毫秒），最后一格为溢出桶
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 5000, 10000, 20000, 30000, 60000, 120000)
+ERROR_CATEGORIES = (
+    'timeout', 'network', 'upstream_5xx', 'upstream_4xx', 'upstream_http', 'rate_limit',
+    'invalid_json', 'unexpected', 'throttled', 'circuit_open', 'config', 'quota_exceeded',
+)
+SCHEMA_STAGES = ('validate', 'repair', 'validate_after_repair', 'cache_hit')
+
+_announced: set = set()
+_announced_lock = threading.Lock()
 
-def _safe_incr(key: str, timeout_seconds: int = 48 * 3600) -> None:
+
+def _safe_incr(key: str, delta: int = 1, timeout_seconds: int = COUNTER_TTL_SECONDS) -> None:
+    if not delta:
+        return
     try:
-        cache.incr(key)
+        incr(key, delta, timeout=timeout_seconds)
     except Exception:
-        try:
-            cache.set(key, 1, timeout_seconds)
-        except Exception:
-            # 观测不能影响业务链路
-            return
+        # 观测不能影响业务链路
+        return
+
+
+def _as_count(value: Any) -> int:
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def hour_bucket(when: Optional[datetime.datetime] = None) -> str:
+    return (when or timezone.now()).astimezone(datetime.timezone.utc).strftime('%Y%m%d%H')
+
+
+def ops_key(operation: str, bucket: str, *parts: Any) -> str:
+    return ':'.join(['ai:ops', operation, bucket, *(str(p) for p in parts)])
+
+
+def schema_key(operation: str, bucket: str, stage: str, *parts: Any) -> str:
+    return ':'.join(['ai:schema', operation, bucket, stage, *(str(p) for p in parts)])
+
+
+def index_key(bucket: str) -> str:
+    return f'ai:ops:index:{bucket}'
+
+
+def latency_bucket_index(duration_ms: int) -> int:
+    return bisect.bisect_left(LATENCY_BUCKETS_MS, max(0, int(duration_ms or 0)))
+
+
+def operations_for(bucket: str) -> List[str]:
+    try:
+        return list(cache.get(index_key(bucket)) or [])
+    except Exception:
+        return []
+
+
+def _announce(operation: str, bucket: str) -> None:
+    """登记该小时出现过的 operation，汇总任务据此读取计数；每个进程每小时每个 operation 只写一次。"""
+    marker = (bucket, operation)
+    if marker in _announced:
+        return
+    try:
+        key = index_key(bucket)
+        with shared_cache.lock(key, timeout=5, wait=1.0) as acquired:
+            if not acquired:
+                return
+            known = cache.get(key) or []
+            if operation not in known:
+                cache.set(key, known + [operation], COUNTER_TTL_SECONDS)
+    except Exception:
+        return
+    with _announced_lock:
+        if len(_announced) > 4096:
+            _announced.clear()
+        _announced.add(marker)
 
 
 def _as_text_dict(payload: Optional[Dict[str, Any]]) -> Dict[str, str]:
@@ -36,25 +112,37 @@ def record_ai_operation(
     duration_ms: int,
     error_category: str = 'none',
     metadata: Optional[Dict[str, Any]] = None,
+    retries: int = 0,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
 ) -> None:
     op = str(operation or 'unknown').strip() or 'unknown'
     err = str(error_category or 'none').strip() or 'none'
-    now = timezone.now()
-    bucket = now.strftime('%Y%m%d%H')
-
-    base = f'ai:ops:{op}:{bucket}'
-    _safe_incr(f'{base}:total')
-    _safe_incr(f'{base}:success' if success else f'{base}:fail')
+    duration = _as_count(duration_ms)
+    prompt_tokens = _as_count(prompt_tokens)
+    completion_tokens = _as_count(completion_tokens)
+    bucket = hour_bucket()
+
+    _announce(op, bucket)
+    _safe_incr(ops_key(op, bucket, 'total'))
+    _safe_incr(ops_key(op, bucket, 'success' if success else 'fail'))
     if not success:
-        _safe_incr(f'{base}:err:{err}')
+        _safe_incr(ops_key(op, bucket, 'err', err))
+    _safe_incr(ops_key(op, bucket, 'duration_ms'), duration)
+    _safe_incr(ops_key(op, bucket, 'lat', latency_bucket_index(duration)))
+    _safe_incr(ops_key(op, bucket, 'retries'), _as_count(retries))
+    _safe_incr(ops_key(op, bucket, 'prompt_tokens'), prompt_tokens)
+    _safe_incr(ops_key(op, bucket, 'completion_tokens'), completion_tokens)
 
     meta = _as_text_dict(metadata)
     logger.info(
-        "ai.obs operation=%s success=%s duration_ms=%s error=%s meta=%s",
+        "ai.obs operation=%s success=%s duration_ms=%s error=%s tokens=%s/%s meta=%s",
         op,
         success,
-        max(0, int(duration_ms or 0)),
+        duration,
         err,
+        prompt_tokens,
+        completion_tokens,
         meta,
     )
 
@@ -68,11 +156,11 @@ def record_schema_event(
 ) -> None:
     op = str(operation or 'unknown').strip() or 'unknown'
     stg = str(stage or 'validate').strip() or 'validate'
-    bucket = timezone.now().strftime('%Y%m%d%H')
+    bucket = hour_bucket()
 
-    base = f'ai:schema:{op}:{bucket}:{stg}'
-    _safe_incr(f'{base}:total')
-    _safe_incr(f'{base}:success' if success else f'{base}:fail')
+    _announce(op, bucket)
+    _safe_incr(schema_key(op, bucket, stg, 'total'))
+    _safe_incr(schema_key(op, bucket, stg, 'success' if success else 'fail'))
 
     meta = _as_text_dict(metadata)
     if detail:
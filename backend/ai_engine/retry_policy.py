@@ -0,0 +1,128 @@
+"""
+LLM 调用的重试与超时策略。
+
+- 按 governor 的优先级类别（interactive / grading / bulk）区分单次超时与整体时间预算；
+- 退避采用 decorrelated jitter：sleep = min(cap, uniform(base, prev * 3))，避免同一批失败请求同步重试；
+- 上游给出 Retry-After 时以其为准，超出剩余预算则直接放弃；
+- 对尾延迟敏感的操作可开启对冲：首个请求超过近期延迟分位数仍未返回时再发一份，取先成功者。
+"""
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from django.conf import settings
+
+from .governor import PRIORITY_BULK, PRIORITY_GRADING, PRIORITY_INTERACTIVE, priority_for
+
+
+_DEFAULT_TIMEOUTS = {PRIORITY_INTERACTIVE: 60, PRIORITY_GRADING: 90, PRIORITY_BULK: 180}
+_DEFAULT_BUDGETS = {PRIORITY_INTERACTIVE: 90, PRIORITY_GRADING: 240, PRIORITY_BULK: 420}
+_MIN_ATTEMPT_TIMEOUT_SECONDS = 5.0
+
+_LATENCY_WINDOW = 200
+_HEDGE_MIN_SAMPLES = 20
+
+_latencies: Dict[str, Deque[float]] = {}
+_latencies_lock = threading.Lock()
+
+
+def _setting_map(name: str, defaults: Dict[str, int]) -> Dict[str, int]:
+    return {**defaults, **(getattr(settings, name, None) or {})}
+
+
+class RetryPolicy:
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.priority = priority_for(operation)
+        fallback = max(10, int(getattr(settings, 'LLM_REQUEST_TIMEOUT_SECONDS', 120) or 120))
+        self.timeout = float(_setting_map('LLM_OPERATION_TIMEOUTS', _DEFAULT_TIMEOUTS).get(self.priority) or fallback)
+        self.budget = max(
+            self.timeout,
+            float(_setting_map('LLM_RETRY_BUDGET_SECONDS', _DEFAULT_BUDGETS).get(self.priority) or self.timeout),
+        )
+        retries = getattr(settings, 'LLM_REQUEST_MAX_RETRIES', 1)
+        self.max_attempts = max(0, int(1 if retries is None else retries)) + 1
+        self.backoff_base = max(0.0, int(getattr(settings, 'LLM_RETRY_BACKOFF_BASE_MS', 500) or 0) / 1000)
+        self.backoff_cap = max(self.backoff_base, int(getattr(settings, 'LLM_RETRY_BACKOFF_CAP_MS', 8000) or 0) / 1000)
+        self.started_at = time.monotonic()
+        self._last_delay = self.backoff_base
+
+    def remaining(self) -> float:
+        return self.budget - (time.monotonic() - self.started_at)
+
+    def attempt_timeout(self) -> float:
+        return max(_MIN_ATTEMPT_TIMEOUT_SECONDS, min(self.timeout, self.remaining()))
+
+    def next_delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """下一次重试前的等待秒数；次数或时间预算用尽时返回 None。"""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            delay = max(0.0, retry_after)
+        else:
+            delay = min(self.backoff_cap, random.uniform(self.backoff_base, max(self.backoff_base, self._last_delay * 3)))
+            self._last_delay = delay
+        # 等待后至少还要留出一次有意义的请求时间
+        if delay + _MIN_ATTEMPT_TIMEOUT_SECONDS > self.remaining():
+            return None
+        return delay
+
+    # ------------------------------------------------------------------
+    # 对冲
+    # ------------------------------------------------------------------
+
+    def hedge_delay(self) -> Optional[float]:
+        """开启对冲且样本充足时，返回发出对冲请求前的等待秒数。"""
+        if not getattr(settings, 'LLM_HEDGE_ENABLED', False):
+            return None
+        operations = getattr(settings, 'LLM_HEDGE_OPERATIONS', None) or ()
+        if not any(self.operation.startswith(prefix) for prefix in operations):
+            return None
+        with _latencies_lock:
+            samples = sorted(_latencies.get(self.operation) or ())
+        if len(samples) < _HEDGE_MIN_SAMPLES:
+            return None
+        percentile = min(99, max(50, int(getattr(settings, 'LLM_HEDGE_PERCENTILE', 95) or 95)))
+        threshold = samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+        floor = max(0, int(getattr(settings, 'LLM_HEDGE_MIN_DELAY_MS', 2000) or 0)) / 1000
+        delay = max(floor, threshold)
+        return delay if delay < self.attempt_timeout() else None
+
+
+def policy_for(operation: str) -> RetryPolicy:
+    return RetryPolicy(str(operation or 'general'))
+
+
+def observe_latency(operation: str, seconds: float) -> None:
+    with _latencies_lock:
+        window = _latencies.get(operation)
+        if window is None:
+            window = _latencies[operation] = deque(maxlen=_LATENCY_WINDOW)
+        window.append(max(0.0, seconds))
+
+
+def reset_latencies() -> None:
+    with _latencies_lock:
+        _latencies.clear()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After 可以是秒数或 HTTP 日期。"""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed is None:
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
@@ -1,10 +1,22 @@
+import asyncio
+import contextvars
 import json
 import re
 import logging
+import functools
+import threading
 import time
+from concurrent import futures
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from .config import get_llm_config
+from django.db import connections
+from . import circuit_breaker, governor, ledger, retry_policy
+from .config import get_llm_providers
+from .http_client import get_async_client, get_http_session
 from .observability import record_ai_operation
 
 
@@ -30,6 +42,530 @@ class AICallError(Exception):
         self.upstream_status = int(upstream_status or 0)
 
 
+def _is_retryable_status(status: int) -> bool:
+    return status in {408, 409, 425, 429} or status >= 500
+
+
+def _http_error_category(status: int) -> str:
+    if status == 429:
+        return 'rate_limit'
+    if status >= 500:
+        return 'upstream_5xx'
+    if status >= 400:
+        return 'upstream_4xx'
+    return 'upstream_http'
+
+
+def _auth_headers(config) -> dict:
+    return {
+        "Authorization": f"Bearer {config['api_key'].strip()}",
+        "Content-Type": "application/json"
+    }
+
+
+def _request_body(config, messages, temperature, max_tokens, stream=False) -> dict:
+    body = {
+        "model": config['model'],
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    if stream:
+        body["stream"] = True
+        if getattr(settings, 'LLM_STREAM_INCLUDE_USAGE', False):
+            # OpenAI 兼容接口在最后一个片段返回 usage；不支持的上游按字符数估算
+            body["stream_options"] = {"include_usage": True}
+    return body
+
+
+def _elapsed_ms(started_at: float) -> int:
+    return int((time.monotonic() - started_at) * 1000)
+
+
+# ---------------------------------------------------------------------------
+# 错误分类（同步 requests 与异步 httpx 共用同一套分类与文案）
+# ---------------------------------------------------------------------------
+
+class _Failure:
+    """一次失败请求的归类结果；retry 表示是否值得在本次调用内重试。"""
+
+    def __init__(
+        self,
+        message: str,
+        status_code: int,
+        retryable: bool,
+        category: str,
+        upstream_status: int = 0,
+        retry: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+        retry_after: Optional[float] = None,
+    ):
+        self.message = message
+        self.status_code = status_code
+        self.retryable = retryable
+        self.category = category
+        self.upstream_status = upstream_status
+        self.retry = retry
+        self.metadata = metadata or {}
+        self.retry_after = retry_after
+
+    def to_error(self) -> AICallError:
+        return AICallError(
+            self.message,
+            status_code=self.status_code,
+            retryable=self.retryable,
+            error_category=self.category,
+            upstream_status=self.upstream_status,
+        )
+
+
+def _timeout_failure(timeout_seconds: float) -> _Failure:
+    return _Failure(f"AI 服务响应超时（>{timeout_seconds:.0f}s），请稍后重试。", 504, True, 'timeout', retry=True)
+
+
+def _http_failure(status: int, detail: str = '', retry_after: Optional[float] = None) -> _Failure:
+    retryable = _is_retryable_status(status)
+    logger.error("AI HTTP异常: status=%s retryable=%s retry_after=%s detail=%s", status, retryable, retry_after, detail)
+    metadata: Dict[str, Any] = {'status': status}
+    if retry_after is not None:
+        metadata['retry_after'] = retry_after
+    return _Failure(
+        "AI 服务暂时不可用，请稍后重试。" if retryable else "AI 服务请求失败，请检查模型配置。",
+        503 if retryable else 502,
+        retryable,
+        _http_error_category(status),
+        upstream_status=status,
+        retry=retryable,
+        metadata=metadata,
+        retry_after=retry_after,
+    )
+
+
+def _network_failure() -> _Failure:
+    return _Failure("AI 网络连接异常，请稍后重试。", 503, True, 'network', retry=True)
+
+
+def _invalid_json_failure() -> _Failure:
+    return _Failure("AI 服务返回格式异常，请稍后重试。", 502, True, 'invalid_json')
+
+
+def _unexpected_failure() -> _Failure:
+    return _Failure("AI 服务内部异常，请稍后重试。", 500, False, 'unexpected')
+
+
+def _circuit_open_failure() -> _Failure:
+    return _Failure("AI 服务暂时不可用，请稍后重试。", 503, True, 'circuit_open')
+
+
+def _quota_failure(exc: ledger.QuotaExceeded) -> _Failure:
+    return _Failure(
+        exc.message,
+        429,
+        False,
+        'quota_exceeded',
+        metadata={'quota': exc.quota, 'limit': exc.limit, 'used': exc.used},
+    )
+
+
+def _throttled_failure(exc: governor.AdmissionTimeout) -> _Failure:
+    # 已在准入队列中等到截止时间，不再在本次调用内重试
+    return _Failure(
+        "AI 服务繁忙，请稍后重试。",
+        503,
+        True,
+        'throttled',
+        metadata={'priority': exc.priority, 'queued_ms': int(exc.waited_seconds * 1000)},
+    )
+
+
+def _classify_requests_error(exc: Exception, timeout_seconds: float) -> _Failure:
+    if isinstance(exc, governor.AdmissionTimeout):
+        return _throttled_failure(exc)
+    if isinstance(exc, requests.Timeout):
+        return _timeout_failure(timeout_seconds)
+    if isinstance(exc, requests.HTTPError):
+        response = getattr(exc, "response", None)
+        if response is None:
+            return _http_failure(502)
+        retry_after = retry_policy.parse_retry_after(response.headers.get('Retry-After'))
+        return _http_failure(response.status_code, (response.text or "")[:500], retry_after)
+    # requests 的 JSONDecodeError 同时继承 RequestException，需先于网络异常判断
+    if isinstance(exc, (requests.exceptions.InvalidJSONError, ValueError)):
+        return _invalid_json_failure()
+    if isinstance(exc, requests.RequestException):
+        return _network_failure()
+    return _unexpected_failure()
+
+
+def _classify_httpx_error(exc: Exception, timeout_seconds: float) -> _Failure:
+    if isinstance(exc, governor.AdmissionTimeout):
+        return _throttled_failure(exc)
+    if isinstance(exc, httpx.TimeoutException):
+        return _timeout_failure(timeout_seconds)
+    if isinstance(exc, httpx.HTTPStatusError):
+        try:
+            detail = (exc.response.text or "")[:500]
+        except Exception:
+            # 流式响应未读取正文时无法取 text
+            detail = ""
+        retry_after = retry_policy.parse_retry_after(exc.response.headers.get('Retry-After'))
+        return _http_failure(exc.response.status_code, detail, retry_after)
+    if isinstance(exc, httpx.RequestError):
+        return _network_failure()
+    if isinstance(exc, ValueError):
+        return _invalid_json_failure()
+    return _unexpected_failure()
+
+
+def _observe_failure(failure: _Failure, exc: Exception, attempt: int, max_retries: int, model: str = '') -> None:
+    if failure.category == 'rate_limit' and model:
+        governor.note_rate_limited(model, failure.retry_after)
+    if failure.category in ('invalid_json', 'unexpected'):
+        logger.exception("AI 调用异常: category=%s err=%s", failure.category, exc)
+    elif failure.category in ('timeout', 'network'):
+        logger.warning(
+            "AI 调用失败: category=%s attempt=%s/%s err=%s",
+            failure.category,
+            attempt + 1,
+            max_retries + 1,
+            exc,
+        )
+
+
+def _missing_api_key(operation: str, started_at: float, raise_on_error: bool, stream: bool = False):
+    msg = "LLM_API_KEY 未设置，AI 调用被跳过。"
+    logger.error(msg)
+    metadata = {'reason': 'missing_api_key'}
+    if stream:
+        metadata['stream'] = True
+    record_ai_operation(
+        operation=operation,
+        success=False,
+        duration_ms=_elapsed_ms(started_at),
+        error_category='config',
+        metadata=metadata,
+    )
+    if raise_on_error:
+        raise AICallError(msg, status_code=500, retryable=False, error_category='config')
+    return None
+
+
+def _circuit_open(operation: str, started_at: float, raise_on_error: bool, stream: bool = False):
+    # 所有上游都在熔断期：不发请求直接失败，避免调用方线程堆积在超时与重试上
+    failure = _circuit_open_failure()
+    logger.warning("AI 上游全部熔断，快速失败: operation=%s", operation)
+    metadata = {'attempts': 0, 'stream': True} if stream else {'attempts': 0}
+    record_ai_operation(
+        operation=operation,
+        success=False,
+        duration_ms=_elapsed_ms(started_at),
+        error_category=failure.category,
+        metadata=metadata,
+    )
+    if raise_on_error:
+        raise failure.to_error()
+    return None
+
+
+def _quota_exceeded(operation: str, scope, started_at: float, raise_on_error: bool, stream: bool = False) -> bool:
+    """调用前检查归属用户的当日配额；用尽时记录失败并抛出 AICallError（或返回 True 由调用方返回 None）。"""
+    try:
+        ledger.check_quota(operation, scope)
+    except ledger.QuotaExceeded as exc:
+        failure = _quota_failure(exc)
+        logger.info(
+            "AI 调用超出配额: operation=%s user=%s quota=%s used=%s/%s",
+            operation,
+            scope.user_id,
+            exc.quota,
+            exc.used,
+            exc.limit,
+        )
+        metadata = {'attempts': 0, **failure.metadata}
+        if stream:
+            metadata['stream'] = True
+        record_ai_operation(
+            operation=operation,
+            success=False,
+            duration_ms=_elapsed_ms(started_at),
+            error_category=failure.category,
+            metadata=metadata,
+        )
+        if raise_on_error:
+            raise failure.to_error()
+        return True
+    return False
+
+
+def _estimated_usage(messages, completion_chars: int) -> Dict[str, int]:
+    # 流式响应未返回 usage 时的粗估，与准入控制的估算口径一致
+    return {
+        'prompt_tokens': governor.estimate_prompt_tokens(messages),
+        'completion_tokens': completion_chars // 2,
+    }
+
+
+def _route(operation: str, started_at: float, raise_on_error: bool, stream: bool = False):
+    """返回本次调用依次尝试的上游；没有可用上游时按缺少密钥或熔断处理并返回 None。"""
+    providers = get_llm_providers()
+    if not providers:
+        return _missing_api_key(operation, started_at, raise_on_error, stream=stream)
+    route = circuit_breaker.route(providers)
+    if not route:
+        return _circuit_open(operation, started_at, raise_on_error, stream=stream)
+    return route
+
+
+def _note_failure(failure: _Failure, exc: Exception, provider: Dict[str, Any], attempt: int, max_retries: int) -> None:
+    failure.metadata['provider'] = provider['name']
+    circuit_breaker.record_failure(provider['name'], failure.category)
+    _observe_failure(failure, exc, attempt, max_retries, provider['model'])
+
+
+def _retry_delay(policy, failure: _Failure, attempt: int, switching: bool) -> Optional[float]:
+    """换到另一个上游时立即重试；同一上游按 Retry-After 或退避等待。"""
+    if not failure.retry:
+        return None
+    if switching and failure.category in circuit_breaker.FAILOVER_CATEGORIES:
+        return policy.next_delay(attempt, 0.0)
+    return policy.next_delay(attempt, failure.retry_after)
+
+
+def _record_success(
+    operation: str,
+    started_at: float,
+    attempt: int,
+    max_retries: int,
+    status: int,
+    queued_ms: int = 0,
+    hedged: bool = False,
+    provider: str = '',
+    usage: Optional[Dict[str, Any]] = None,
+) -> None:
+    usage = usage if isinstance(usage, dict) else {}
+    metadata = {
+        'attempts': attempt + 1,
+        'max_retries': max_retries,
+        'status': status,
+        'queued_ms': queued_ms,
+        'provider': provider,
+    }
+    if hedged:
+        metadata['hedged'] = True
+    record_ai_operation(
+        operation=operation,
+        success=True,
+        duration_ms=_elapsed_ms(started_at),
+        metadata=metadata,
+        retries=attempt,
+        prompt_tokens=usage.get('prompt_tokens') or 0,
+        completion_tokens=usage.get('completion_tokens') or 0,
+    )
+
+
+def _give_up(
+    failure: _Failure,
+    exc: Exception,
+    operation: str,
+    started_at: float,
+    attempt: int,
+    max_retries: int,
+    raise_on_error: bool,
+):
+    record_ai_operation(
+        operation=operation,
+        success=False,
+        duration_ms=_elapsed_ms(started_at),
+        error_category=failure.category,
+        metadata={'attempts': attempt + 1, 'max_retries': max_retries, **failure.metadata},
+        retries=attempt,
+    )
+    if raise_on_error:
+        raise failure.to_error() from exc
+    return None
+
+
+def _stream_failure(failure: _Failure, operation: str, started_at: float, metadata=None) -> AICallError:
+    record_ai_operation(
+        operation=operation,
+        success=False,
+        duration_ms=_elapsed_ms(started_at),
+        error_category=failure.category,
+        metadata={'stream': True, **failure.metadata, **(metadata or {})},
+    )
+    return failure.to_error()
+
+
+# ---------------------------------------------------------------------------
+# 对冲请求：首个请求超过延迟阈值仍未返回时再发一份，取先成功者
+# ---------------------------------------------------------------------------
+
+_hedge_pool: Optional[futures.ThreadPoolExecutor] = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _hedge_executor() -> futures.ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                workers = max(2, int(getattr(settings, 'LLM_HEDGE_MAX_WORKERS', 16) or 16))
+                _hedge_pool = futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-hedge')
+    return _hedge_pool
+
+
+def _log_hedge(operation: str, hedge_delay: float, launched: bool) -> None:
+    logger.info(
+        "AI 对冲请求: operation=%s delay_ms=%s launched=%s",
+        operation,
+        int(hedge_delay * 1000),
+        launched,
+    )
+
+
+def _record_discarded_usage(operation: str, scope: Optional[ledger.Scope], result: Any) -> None:
+    """落败请求同样消耗了上游 token，照常记账；在请求线程中执行时，结束后释放该线程的数据库连接。"""
+    payload = result[0] if isinstance(result, tuple) else result
+    usage = payload.get('usage') if isinstance(payload, dict) else None
+    try:
+        ledger.record(operation, usage, scope)
+    finally:
+        # 两份同时完成时回调可能在调用方线程上执行，不能关闭调用方（可能在事务中）的连接
+        if threading.current_thread().name.startswith(('llm-primary', 'llm-hedge')):
+            connections.close_all()
+
+
+def _start_primary(fn: Callable[[Optional[governor.Ticket]], Any]) -> futures.Future:
+    """首个请求在独立线程上执行，不在 llm-hedge 线程池排队（判分并发扇出时排队时间会被计入延迟）。"""
+    future: futures.Future = futures.Future()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(fn, None))
+        except BaseException as exc:  # noqa: BLE001
+            future.set_exception(exc)
+
+    threading.Thread(target=run, name='llm-primary', daemon=True).start()
+    return future
+
+
+def _send_hedged(
+    send: Callable[[Optional[governor.Ticket]], Any],
+    send_hedge: Callable[[Optional[governor.Ticket]], Any],
+    admit_hedge: Callable[[], Optional[governor.Ticket]],
+    hedge_delay: Optional[float],
+    operation: str,
+    on_discarded: Optional[Callable[[Any], None]] = None,
+) -> Tuple[Any, bool]:
+    """
+    返回 (结果, 是否由对冲请求胜出)；两份都失败时抛出首个请求的异常。
+    同步请求无法中途取消：落败的一方在后台跑完，成功时把结果交给 on_discarded（用于补记 token 用量）。
+    """
+    if hedge_delay is None:
+        return send(None), False
+    primary = _start_primary(send)
+    done, _ = futures.wait([primary], timeout=hedge_delay)
+    if done:
+        return primary.result(), False
+
+    # 对冲请求不排队：额度不足时继续等首个请求
+    ticket = admit_hedge()
+    _log_hedge(operation, hedge_delay, ticket is not None)
+    if ticket is None:
+        return primary.result(), False
+    hedge = _hedge_executor().submit(contextvars.copy_context().run, send_hedge, ticket)
+
+    pending = {primary, hedge}
+    while pending:
+        done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                loser = hedge if future is primary else primary
+                if on_discarded is not None:
+                    loser.add_done_callback(functools.partial(_discard, on_discarded))
+                return future.result(), future is hedge
+    raise primary.exception()
+
+
+def _discard(on_discarded: Callable[[Any], None], future: futures.Future) -> None:
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        on_discarded(future.result())
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("AI 对冲落败结果处理失败: %s", exc)
+
+
+async def _asend_hedged(
+    send: Callable[[Optional[governor.Ticket]], Awaitable[Any]],
+    send_hedge: Callable[[Optional[governor.Ticket]], Awaitable[Any]],
+    admit_hedge: Callable[[], Optional[governor.Ticket]],
+    hedge_delay: Optional[float],
+    operation: str,
+) -> Tuple[Any, bool]:
+    """_send_hedged 的 asyncio 版本，落败的一方会被取消。"""
+    if hedge_delay is None:
+        return await send(None), False
+    primary = asyncio.ensure_future(send(None))
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if done:
+            return primary.result(), False
+
+        ticket = admit_hedge()
+        _log_hedge(operation, hedge_delay, ticket is not None)
+        if ticket is None:
+            return await primary, False
+        hedge = asyncio.ensure_future(send_hedge(ticket))
+        tasks.append(hedge)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is hedge
+        raise primary.exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+_SSE_DONE = object()
+
+
+def _parse_sse_line(raw_line) -> Any:
+    """
+    解析一行 SSE：返回 {'delta', 'finish_reason'}、_SSE_DONE 或 None（忽略该行）；
+    片段带 usage（通常是最后一个、choices 为空的片段）时附带 'usage' 键。
+    """
+    if not raw_line or not raw_line.startswith('data:'):
+        return None
+    data = raw_line[5:].strip()
+    if data == '[DONE]':
+        return _SSE_DONE
+    try:
+        event = json.loads(data)
+    except ValueError:
+        logger.warning("AI 流式片段解析失败: %s", data[:200])
+        return None
+
+    usage = event.get('usage') if isinstance(event.get('usage'), dict) else None
+    choices = event.get('choices') or []
+    choice = (choices[0] or {}) if choices else {}
+    delta = (choice.get('delta') or {}).get('content') or ''
+    if not (delta or choice.get('finish_reason') or usage):
+        return None
+    parsed = {'delta': delta, 'finish_reason': choice.get('finish_reason')}
+    if usage:
+        parsed['usage'] = usage
+    return parsed
+
+
 class AIEngine:
     """底层的 AI 引擎服务类，负责通用的 AI 模型调用逻辑"""
 
@@ -44,177 +580,228 @@ class AIEngine:
     ):
         """通用的 AI 模型调用接口"""
         started_at = time.monotonic()
-        config = get_llm_config()
-        if not config['api_key']:
-            msg = "LLM_API_KEY 未设置，AI 调用被跳过。"
-            logger.error(msg)
-            duration_ms = int((time.monotonic() - started_at) * 1000)
-            record_ai_operation(
-                operation=operation,
-                success=False,
-                duration_ms=duration_ms,
-                error_category='config',
-                metadata={'reason': 'missing_api_key'},
-            )
-            if raise_on_error:
-                raise AICallError(msg, status_code=500, retryable=False, error_category='config')
+        scope = ledger.current()
+        if _quota_exceeded(operation, scope, started_at, raise_on_error):
+            return None
+        route = _route(operation, started_at, raise_on_error)
+        if not route:
             return None
 
-        timeout_seconds = max(10, int(getattr(settings, "LLM_REQUEST_TIMEOUT_SECONDS", 120) or 120))
-        max_retries = max(0, int(getattr(settings, "LLM_REQUEST_MAX_RETRIES", 1) or 1))
+        policy = retry_policy.policy_for(operation)
+        max_retries = policy.max_attempts - 1
 
-        for attempt in range(max_retries + 1):
-            try:
-                r = requests.post(
+        def send(config, ticket):
+            ticket = ticket or governor.admit(config['model'], operation, messages, max_tokens)
+            with ticket:
+                r = get_http_session(config['base_url']).post(
                     config['base_url'],
-                    headers={
-                        "Authorization": f"Bearer {config['api_key'].strip()}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": config['model'],
-                        "messages": messages,
-                        "temperature": temperature,
-                        "max_tokens": max_tokens
-                    },
+                    headers=_auth_headers(config),
+                    json=_request_body(config, messages, temperature, max_tokens),
                     timeout=timeout_seconds
                 )
                 r.raise_for_status()
                 payload = r.json()
-                duration_ms = int((time.monotonic() - started_at) * 1000)
-                record_ai_operation(
-                    operation=operation,
-                    success=True,
-                    duration_ms=duration_ms,
-                    metadata={
-                        'attempts': attempt + 1,
-                        'max_retries': max_retries,
-                        'status': r.status_code,
-                    },
-                )
-                return payload
-            except requests.Timeout as e:
-                logger.warning(
-                    "AI 调用超时: attempt=%s/%s timeout=%ss err=%s",
-                    attempt + 1,
-                    max_retries + 1,
-                    timeout_seconds,
-                    e,
+                ticket.settle(payload)
+            return payload, r.status_code, ticket.waited_ms
+
+        for attempt in range(policy.max_attempts):
+            timeout_seconds = policy.attempt_timeout()
+            # 重试与对冲依次轮换到下一个上游
+            provider = route[attempt % len(route)]
+            alternate = route[(attempt + 1) % len(route)]
+
+            attempt_started = time.monotonic()
+            try:
+                (payload, status, queued_ms), hedged = _send_hedged(
+                    functools.partial(send, provider),
+                    functools.partial(send, alternate),
+                    lambda: governor.try_admit(alternate['model'], operation, messages, max_tokens),
+                    policy.hedge_delay(),
+                    operation,
+                    on_discarded=functools.partial(_record_discarded_usage, operation, scope),
                 )
-                if attempt < max_retries:
-                    time.sleep(min(2 ** attempt, 4))
+            except Exception as e:
+                failure = _classify_requests_error(e, timeout_seconds)
+                _note_failure(failure, e, provider, attempt, max_retries)
+                delay = _retry_delay(policy, failure, attempt, alternate is not provider)
+                if delay is not None:
+                    if delay:
+                        time.sleep(delay)
                     continue
-                msg = f"AI 服务响应超时（>{timeout_seconds}s），请稍后重试。"
-                duration_ms = int((time.monotonic() - started_at) * 1000)
-                record_ai_operation(
-                    operation=operation,
-                    success=False,
-                    duration_ms=duration_ms,
-                    error_category='timeout',
-                    metadata={'attempts': attempt + 1, 'max_retries': max_retries},
+                return _give_up(failure, e, operation, started_at, attempt, max_retries, raise_on_error)
+            winner = alternate if hedged else provider
+            circuit_breaker.record_success(winner['name'])
+            retry_policy.observe_latency(operation, time.monotonic() - attempt_started - queued_ms / 1000)
+            usage = payload.get('usage') if isinstance(payload, dict) else None
+            _record_success(
+                operation, started_at, attempt, max_retries, status, queued_ms, hedged, winner['name'], usage=usage,
+            )
+            ledger.record(operation, usage, scope)
+            return payload
+
+    @classmethod
+    async def acall_ai(
+        cls,
+        messages,
+        temperature=0.7,
+        max_tokens=8192,
+        raise_on_error=False,
+        operation='general',
+    ):
+        """call_ai 的 asyncio 版本：重试、错误分类与观测埋点一致，等待期间不占用线程。"""
+        started_at = time.monotonic()
+        scope = ledger.current()
+        if ledger.needs_check(operation, scope) and await sync_to_async(_quota_exceeded)(
+            operation, scope, started_at, raise_on_error
+        ):
+            return None
+        route = _route(operation, started_at, raise_on_error)
+        if not route:
+            return None
+
+        policy = retry_policy.policy_for(operation)
+        max_retries = policy.max_attempts - 1
+
+        async def send(config, ticket):
+            ticket = ticket or await governor.aadmit(config['model'], operation, messages, max_tokens)
+            with ticket:
+                r = await get_async_client(config['base_url']).post(
+                    config['base_url'],
+                    headers=_auth_headers(config),
+                    json=_request_body(config, messages, temperature, max_tokens),
+                    timeout=timeout_seconds,
                 )
-                if raise_on_error:
-                    raise AICallError(
-                        msg,
-                        status_code=504,
-                        retryable=True,
-                        error_category='timeout',
-                    ) from e
-                return None
-            except requests.HTTPError as e:
-                response = getattr(e, "response", None)
-                status = response.status_code if response is not None else 502
-                detail = (response.text or "")[:500] if response is not None else ""
-                retryable = status in {408, 409, 425, 429} or status >= 500
-                logger.error("AI HTTP异常: status=%s retryable=%s detail=%s", status, retryable, detail)
-                if retryable and attempt < max_retries:
-                    time.sleep(min(2 ** attempt, 4))
-                    continue
-                if status == 429:
-                    error_category = 'rate_limit'
-                elif status >= 500:
-                    error_category = 'upstream_5xx'
-                elif status >= 400:
-                    error_category = 'upstream_4xx'
-                else:
-                    error_category = 'upstream_http'
-                duration_ms = int((time.monotonic() - started_at) * 1000)
-                record_ai_operation(
-                    operation=operation,
-                    success=False,
-                    duration_ms=duration_ms,
-                    error_category=error_category,
-                    metadata={'attempts': attempt + 1, 'status': status},
+                r.raise_for_status()
+                payload = r.json()
+                ticket.settle(payload)
+            return payload, r.status_code, ticket.waited_ms
+
+        for attempt in range(policy.max_attempts):
+            timeout_seconds = policy.attempt_timeout()
+            provider = route[attempt % len(route)]
+            alternate = route[(attempt + 1) % len(route)]
+
+            attempt_started = time.monotonic()
+            try:
+                (payload, status, queued_ms), hedged = await _asend_hedged(
+                    functools.partial(send, provider),
+                    functools.partial(send, alternate),
+                    lambda: governor.try_admit(alternate['model'], operation, messages, max_tokens),
+                    policy.hedge_delay(),
+                    operation,
                 )
-                msg = "AI 服务暂时不可用，请稍后重试。" if retryable else "AI 服务请求失败，请检查模型配置。"
-                if raise_on_error:
-                    raise AICallError(
-                        msg,
-                        status_code=503 if retryable else 502,
-                        retryable=retryable,
-                        error_category=error_category,
-                        upstream_status=status,
-                    ) from e
-                return None
-            except requests.RequestException as e:
-                logger.warning("AI 网络异常: attempt=%s/%s err=%s", attempt + 1, max_retries + 1, e)
-                if attempt < max_retries:
-                    time.sleep(min(2 ** attempt, 4))
+            except Exception as e:
+                failure = _classify_httpx_error(e, timeout_seconds)
+                _note_failure(failure, e, provider, attempt, max_retries)
+                delay = _retry_delay(policy, failure, attempt, alternate is not provider)
+                if delay is not None:
+                    if delay:
+                        await asyncio.sleep(delay)
                     continue
-                msg = "AI 网络连接异常，请稍后重试。"
-                duration_ms = int((time.monotonic() - started_at) * 1000)
-                record_ai_operation(
-                    operation=operation,
-                    success=False,
-                    duration_ms=duration_ms,
-                    error_category='network',
-                    metadata={'attempts': attempt + 1, 'max_retries': max_retries},
-                )
-                if raise_on_error:
-                    raise AICallError(
-                        msg,
-                        status_code=503,
-                        retryable=True,
-                        error_category='network',
-                    ) from e
-                return None
-            except ValueError as e:
-                logger.exception("AI 返回 JSON 解析失败: %s", e)
-                msg = "AI 服务返回格式异常，请稍后重试。"
-                duration_ms = int((time.monotonic() - started_at) * 1000)
-                record_ai_operation(
-                    operation=operation,
-                    success=False,
-                    duration_ms=duration_ms,
-                    error_category='invalid_json',
-                    metadata={'attempts': attempt + 1},
-                )
-                if raise_on_error:
-                    raise AICallError(
-                        msg,
-                        status_code=502,
-                        retryable=True,
-                        error_category='invalid_json',
-                    ) from e
-                return None
+                return _give_up(failure, e, operation, started_at, attempt, max_retries, raise_on_error)
+            winner = alternate if hedged else provider
+            circuit_breaker.record_success(winner['name'])
+            retry_policy.observe_latency(operation, time.monotonic() - attempt_started - queued_ms / 1000)
+            usage = payload.get('usage') if isinstance(payload, dict) else None
+            _record_success(
+                operation, started_at, attempt, max_retries, status, queued_ms, hedged, winner['name'], usage=usage,
+            )
+            await sync_to_async(ledger.record)(operation, usage, scope)
+            return payload
+
+    @classmethod
+    async def astream_ai(
+        cls,
+        messages,
+        temperature=0.7,
+        max_tokens=8192,
+        operation='general',
+    ):
+        """
+        流式调用（OpenAI 兼容 SSE，异步生成器）：逐段产出 {'delta': str, 'finish_reason': Optional[str]}。
+        建连失败按与 call_ai 相同的错误分类抛出 AICallError，上游故障时换下一个上游建连；
+        开始输出后不再重试。
+        """
+        started_at = time.monotonic()
+        scope = ledger.current()
+        if ledger.needs_check(operation, scope):
+            await sync_to_async(_quota_exceeded)(operation, scope, started_at, raise_on_error=True, stream=True)
+        route = _route(operation, started_at, raise_on_error=True, stream=True)
+        timeout_seconds = retry_policy.policy_for(operation).attempt_timeout()
+
+        for index, provider in enumerate(route):
+            client = get_async_client(provider['base_url'])
+            request = client.build_request(
+                'POST',
+                provider['base_url'],
+                headers={**_auth_headers(provider), "Accept": "text/event-stream"},
+                json=_request_body(provider, messages, temperature, max_tokens, stream=True),
+                timeout=timeout_seconds,
+            )
+            # 并发租约覆盖整个流式输出过程
+            r = None
+            ticket = None
+            try:
+                ticket = await governor.aadmit(provider['model'], operation, messages, max_tokens)
+                r = await client.send(request, stream=True)
+                r.raise_for_status()
             except Exception as e:
-                logger.exception("AI 调用异常: %s", e)
-                duration_ms = int((time.monotonic() - started_at) * 1000)
-                record_ai_operation(
-                    operation=operation,
-                    success=False,
-                    duration_ms=duration_ms,
-                    error_category='unexpected',
-                    metadata={'attempts': attempt + 1},
-                )
-                if raise_on_error:
-                    raise AICallError(
-                        "AI 服务内部异常，请稍后重试。",
-                        status_code=500,
-                        retryable=False,
-                        error_category='unexpected',
-                    ) from e
-                return None
+                if r is not None:
+                    await r.aclose()
+                if ticket is not None:
+                    ticket.release()
+                failure = _classify_httpx_error(e, timeout_seconds)
+                _note_failure(failure, e, provider, index, len(route) - 1)
+                if failure.category in circuit_breaker.FAILOVER_CATEGORIES and index + 1 < len(route):
+                    continue
+                raise _stream_failure(failure, operation, started_at) from e
+            break
+        circuit_breaker.record_success(provider['name'])
+
+        chunks = 0
+        finish_reason = None
+        completion_chars = 0
+        usage = None
+        try:
+            async for raw_line in r.aiter_lines():
+                event = _parse_sse_line(raw_line)
+                if event is _SSE_DONE:
+                    break
+                if event is None:
+                    continue
+                usage = event.pop('usage', None) or usage
+                if not (event['delta'] or event['finish_reason']):
+                    continue
+                chunks += 1
+                completion_chars += len(event['delta'])
+                finish_reason = event['finish_reason'] or finish_reason
+                yield event
+        except httpx.RequestError as e:
+            circuit_breaker.record_failure(provider['name'], 'network')
+            raise _stream_failure(
+                _network_failure(), operation, started_at, {'chunks': chunks, 'provider': provider['name']}
+            ) from e
+        finally:
+            await r.aclose()
+            ticket.release()
+            # 客户端中途断开同样计入已消耗的 token
+            usage = usage or _estimated_usage(messages, completion_chars)
+            await sync_to_async(ledger.record)(operation, usage, scope)
+
+        record_ai_operation(
+            operation=operation,
+            success=True,
+            duration_ms=_elapsed_ms(started_at),
+            metadata={
+                'stream': True,
+                'chunks': chunks,
+                'finish_reason': finish_reason,
+                'status': r.status_code,
+                'provider': provider['name'],
+            },
+            prompt_tokens=usage.get('prompt_tokens') or 0,
+            completion_tokens=usage.get('completion_tokens') or 0,
+        )
 
     @classmethod
     def extract_json(cls, text):
@@ -245,3 +832,14 @@ class AIEngine:
         if res and 'choices' in res:
             return res['choices'][0]['message']['content'].strip()
         return None
+
+    @classmethod
+    async def asimple_chat(cls, system_prompt, user_prompt, temperature=0.7, max_tokens=3000):
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        res = await cls.acall_ai(messages, temperature=temperature, max_tokens=max_tokens)
+        if res and 'choices' in res:
+            return res['choices'][0]['message']['content'].strip()
+        return None
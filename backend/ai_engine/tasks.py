@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from ai_engine.metrics import prune_rollups, rollup_recent
+
+
+@shared_task(name='ai_engine.rollup_metrics_task')
+def rollup_metrics_task():
+    return {'rolled_up': rollup_recent(), 'pruned': prune_rollups()}
@@ -0,0 +1,669 @@
+import asyncio
+import datetime
+import email.utils
+import io
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+from asgiref.sync import async_to_sync
+import requests
+from requests.adapters import BaseAdapter
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ai_engine import circuit_breaker, governor, ledger, metrics, observability, retry_policy
+
+from ai_engine.config import get_llm_providers
+from ai_engine.http_client import get_http_session, set_async_transport_factory, set_transport_factory
+from ai_engine.models import AIOperationRollup, TokenUsage
+from ai_engine.service import AICallError, AIEngine
+from users.models import User
+
+
+class _StubTransport(BaseAdapter):
+    """本地替身传输：不走网络，按队列返回预设响应。"""
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        status_code, payload, *headers = self.responses.pop(0)
+        resp = requests.Response()
+        resp.status_code = status_code
+        resp.headers.update(headers[0] if headers else {})
+        if isinstance(payload, bytes):
+            resp.raw = io.BytesIO(payload)
+            resp.headers['Content-Type'] = 'text/event-stream'
+        else:
+            resp._content = json.dumps(payload).encode('utf-8')
+            resp.raw = io.BytesIO(resp._content)
+            resp.headers['Content-Type'] = 'application/json'
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+    def close(self):
+        return None
+
+
+class _LedgerStubMixin:
+    """
+    SimpleTestCase 不允许访问数据库：引擎调用后的台账写入改为桩，
+    否则写入失败只会被 ledger.record 记日志吞掉；真实写入由 TokenLedgerTests 覆盖。
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._ledger_patcher = patch('ai_engine.service.ledger.record')
+        cls.ledger_record = cls._ledger_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._ledger_patcher.stop()
+        super().tearDownClass()
+
+
+@override_settings(
+    LLM_API_KEY='test-key',
+    LLM_BASE_URL='https://llm.local/v1/chat/completions',
+    LLM_MODEL='test-model',
+    LLM_REQUEST_MAX_RETRIES=1,
+)
+class AIEngineHttpPoolTests(_LedgerStubMixin, SimpleTestCase):
+    def tearDown(self):
+        set_transport_factory(None)
+
+    def _install(self, responses):
+        transport = _StubTransport(responses)
+        set_transport_factory(lambda pool_key: transport)
+        return transport
+
+    def test_call_ai_reuses_pooled_session(self):
+        ok = {'choices': [{'message': {'content': 'ok'}}]}
+        transport = self._install([(200, ok), (200, ok)])
+
+        first = AIEngine.call_ai([{'role': 'user', 'content': 'hi'}], operation='test.pool')
+        session = get_http_session('https://llm.local/other/path')
+        second = AIEngine.call_ai([{'role': 'user', 'content': 'hi'}], operation='test.pool')
+
+        self.assertEqual(first, ok)
+        self.assertEqual(second, ok)
+        self.assertIs(session, get_http_session('https://llm.local/v1/chat/completions'))
+        self.assertEqual(len(transport.requests), 2)
+        self.assertEqual(transport.requests[0].headers['Authorization'], 'Bearer test-key')
+
+    @patch('ai_engine.service.time.sleep')
+    def test_call_ai_retries_on_5xx_through_transport(self, _mock_sleep):
+        ok = {'choices': [{'message': {'content': 'ok'}}]}
+        transport = self._install([(502, {'error': 'bad gateway'}), (200, ok)])
+
+        result = AIEngine.call_ai([{'role': 'user', 'content': 'hi'}], operation='test.pool')
+
+        self.assertEqual(result, ok)
+        self.assertEqual(len(transport.requests), 2)
+
+
+@override_settings(
+    LLM_API_KEY='test-key',
+    LLM_BASE_URL='https://llm.local/v1/chat/completions',
+    LLM_MODEL='test-model',
+    LLM_REQUEST_MAX_RETRIES=1,
+)
+class AIEngineAsyncTests(_LedgerStubMixin, SimpleTestCase):
+    def tearDown(self):
+        set_async_transport_factory(None)
+
+    def _install(self, handler):
+        requests_seen = []
+
+        def record(request):
+            requests_seen.append(request)
+            return handler(request, len(requests_seen))
+
+        set_async_transport_factory(lambda pool_key: httpx.MockTransport(record))
+        return requests_seen
+
+    @patch('ai_engine.service.asyncio.sleep')
+    def test_acall_ai_multiplexes_calls_and_retries_5xx(self, mock_sleep):
+        mock_sleep.return_value = None
+        ok = {'choices': [{'message': {'content': 'ok'}}]}
+
+        def handler(request, n):
+            if n == 1:
+                return httpx.Response(502, json={'error': 'bad gateway'})
+            return httpx.Response(200, json=ok)
+
+        seen = self._install(handler)
+
+        async def main():
+            return await asyncio.gather(*[
+                AIEngine.acall_ai([{'role': 'user', 'content': f'q{i}'}], operation='test.async') for i in range(5)
+            ])
+
+        results = asyncio.run(main())
+
+        self.assertEqual(results, [ok] * 5)
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(seen[0].headers['Authorization'], 'Bearer test-key')
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    def test_acall_ai_raises_same_error_taxonomy(self):
+        self._install(lambda request, n: httpx.Response(400, json={'error': 'bad model'}))
+
+        with self.assertRaises(AICallError) as ctx:
+            asyncio.run(AIEngine.acall_ai([{'role': 'user', 'content': 'hi'}], raise_on_error=True))
+
+        self.assertEqual(
+            (ctx.exception.status_code, ctx.exception.retryable, ctx.exception.error_category, ctx.exception.upstream_status),
+            (502, False, 'upstream_4xx', 400),
+        )
+
+    def test_astream_ai_yields_sse_deltas(self):
+        body = (
+            'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n'
+            'data: {"choices": [{"delta": {"content": "你好"}}]}\n\n'
+            ': keep-alive\n\n'
+            'data: {"choices": [{"delta": {"content": "，同学"}, "finish_reason": "stop"}]}\n\n'
+            'data: [DONE]\n\n'
+        ).encode('utf-8')
+        seen = self._install(lambda request, n: httpx.Response(200, content=body))
+
+        async def collect():
+            return [chunk async for chunk in AIEngine.astream_ai([{'role': 'user', 'content': 'hi'}])]
+
+        chunks = asyncio.run(collect())
+
+        self.assertEqual(''.join(c['delta'] for c in chunks), '你好，同学')
+        self.assertEqual(chunks[-1]['finish_reason'], 'stop')
+        self.assertTrue(json.loads(seen[0].content)['stream'])
+
+
+@override_settings(
+    LLM_API_KEY='test-key',
+    LLM_BASE_URL='https://llm.local/v1/chat/completions',
+    LLM_MODEL='test-model',
+    LLM_MAX_CONCURRENCY=4,
+    LLM_TPM_LIMIT=1000,
+    LLM_PRIORITY_DEADLINES_SECONDS={'interactive': 0, 'grading': 0, 'bulk': 0},
+)
+class LLMGovernorTests(SimpleTestCase):
+    messages = [{'role': 'user', 'content': 'hi'}]
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        set_transport_factory(None)
+
+    def test_background_priorities_leave_headroom_for_interactive(self):
+        bulk = [governor.admit('m', 'quizzes.bulk_generate', self.messages, 10) for _ in range(2)]
+        with self.assertRaises(governor.AdmissionTimeout):
+            governor.admit('m', 'quizzes.preview_parse', self.messages, 10)
+        grading = governor.admit('m', 'quizzes.grade_question', self.messages, 10)
+        chat = governor.admit('m', 'assistant.chat', self.messages, 10)
+        self.assertEqual((grading.priority, chat.priority), ('grading', 'interactive'))
+
+        bulk[0].release()
+        governor.admit('m', 'quizzes.bulk_generate', self.messages, 10).release()
+        for ticket in bulk + [grading, chat]:
+            ticket.release()
+
+    def test_token_budget_is_refunded_from_actual_usage(self):
+        first = governor.admit('m', 'assistant.chat', self.messages, 600)
+        with self.assertRaises(governor.AdmissionTimeout):
+            governor.admit('m', 'assistant.chat', self.messages, 600)
+        first.settle({'usage': {'total_tokens': 120}})
+        first.release()
+        governor.admit('m', 'assistant.chat', self.messages, 600).release()
+
+    @patch('ai_engine.service.time.sleep')
+    def test_upstream_429_pauses_background_work(self, _mock_sleep):
+        transport = _StubTransport([(429, {'error': 'slow down'})] * 2)
+        set_transport_factory(lambda pool_key: transport)
+        self.assertIsNone(AIEngine.call_ai(self.messages, max_tokens=10, operation='assistant.chat'))
+
+        with self.assertRaises(AICallError) as ctx:
+            AIEngine.call_ai(self.messages, max_tokens=10, raise_on_error=True, operation='quizzes.grade_question')
+        self.assertEqual(ctx.exception.error_category, 'throttled')
+        # 交互请求在冷却期内仍可重试，判分请求直接被拦下
+        self.assertEqual(len(transport.requests), 2)
+        governor.admit('test-model', 'assistant.chat', self.messages, 10).release()
+
+
+
+@override_settings(
+    LLM_API_KEY='test-key',
+    LLM_BASE_URL='https://llm.local/v1/chat/completions',
+    LLM_MODEL='test-model',
+    LLM_REQUEST_MAX_RETRIES=2,
+    LLM_GOVERNOR_ENABLED=False,
+    LLM_HEDGE_OPERATIONS=['quizzes.grade_question'],
+    LLM_HEDGE_MIN_DELAY_MS=0,
+)
+class AIEngineRetryPolicyTests(_LedgerStubMixin, SimpleTestCase):
+    messages = [{'role': 'user', 'content': 'hi'}]
+    ok = {'choices': [{'message': {'content': 'ok'}}]}
+
+    def setUp(self):
+        retry_policy.reset_latencies()
+
+    def tearDown(self):
+        retry_policy.reset_latencies()
+        set_transport_factory(None)
+        set_async_transport_factory(None)
+
+    def _warm_latencies(self, operation, seconds=0.01):
+        for _ in range(30):
+            retry_policy.observe_latency(operation, seconds)
+
+    def test_timeouts_follow_operation_class(self):
+        self.assertEqual(retry_policy.policy_for('assistant.chat').timeout, 60)
+        self.assertEqual(retry_policy.policy_for('quizzes.grade_question').timeout, 90)
+        self.assertEqual(retry_policy.policy_for('quizzes.bulk_generate').timeout, 180)
+
+    def test_decorrelated_jitter_stays_within_bounds(self):
+        policy = retry_policy.policy_for('quizzes.grade_question')
+        policy.max_attempts = 50
+        delays = [policy.next_delay(attempt) for attempt in range(10)]
+        self.assertTrue(all(0.5 <= d <= 8.0 for d in delays))
+        # 首次退避上界为 base * 3，之后随上一次等待增长
+        self.assertLessEqual(delays[0], 1.5)
+
+    def test_parse_retry_after_accepts_seconds_and_http_date(self):
+        self.assertEqual(retry_policy.parse_retry_after('7'), 7.0)
+        when = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(retry_policy.parse_retry_after(when), 30, delta=2)
+        self.assertIsNone(retry_policy.parse_retry_after('soon'))
+
+    @patch('ai_engine.service.time.sleep')
+    def test_call_ai_honours_retry_after(self, mock_sleep):
+        transport = _StubTransport([(503, {'error': 'busy'}, {'Retry-After': '3'}), (200, self.ok)])
+        set_transport_factory(lambda pool_key: transport)
+
+        self.assertEqual(AIEngine.call_ai(self.messages, operation='quizzes.grade_question'), self.ok)
+        mock_sleep.assert_called_once_with(3.0)
+
+    @patch('ai_engine.service.time.sleep')
+    def test_call_ai_gives_up_when_retry_after_exceeds_budget(self, mock_sleep):
+        transport = _StubTransport([(429, {'error': 'slow down'}, {'Retry-After': '3600'}), (200, self.ok)])
+        set_transport_factory(lambda pool_key: transport)
+
+        with self.assertRaises(AICallError) as ctx:
+            AIEngine.call_ai(self.messages, raise_on_error=True, operation='assistant.chat')
+        self.assertEqual(ctx.exception.error_category, 'rate_limit')
+        self.assertEqual(len(transport.requests), 1)
+        mock_sleep.assert_not_called()
+
+    @override_settings(LLM_HEDGE_ENABLED=True)
+    def test_call_ai_hedges_slow_grading_request(self):
+        release = threading.Event()
+        fast = {'choices': [{'message': {'content': 'fast'}}], 'usage': {'prompt_tokens': 5, 'completion_tokens': 1}}
+        slow = {'choices': [{'message': {'content': 'slow'}}], 'usage': {'prompt_tokens': 7, 'completion_tokens': 2}}
+
+        class SlowFirst(_StubTransport):
+            def send(self, request, **kwargs):
+                if not self.requests:
+                    self.requests.append(request)
+                    # 首个请求最终会成功，但比对冲请求慢
+                    release.wait(5)
+                    return _StubTransport([(200, slow)]).send(request, **kwargs)
+                return super().send(request, **kwargs)
+
+        transport = SlowFirst([(200, fast)])
+        set_transport_factory(lambda pool_key: transport)
+        self._warm_latencies('quizzes.grade_question')
+        self.ledger_record.reset_mock()
+        started = time.monotonic()
+        try:
+            result = AIEngine.call_ai(self.messages, operation='quizzes.grade_question')
+            elapsed = time.monotonic() - started
+        finally:
+            release.set()
+        self.assertEqual(result, fast)
+        self.assertLess(elapsed, 2)
+
+        # 胜出方与落败方的 token 用量都计入台账
+        deadline = time.monotonic() + 5
+        while self.ledger_record.call_count < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        usages = sorted(call.args[1]['prompt_tokens'] for call in self.ledger_record.call_args_list)
+        self.assertEqual(usages, [5, 7])
+
+    @override_settings(LLM_HEDGE_ENABLED=True)
+    def test_fast_primary_does_not_use_the_hedge_pool(self):
+        transport = _StubTransport([(200, self.ok)])
+        set_transport_factory(lambda pool_key: transport)
+        self._warm_latencies('quizzes.grade_question', seconds=5)
+
+        with patch('ai_engine.service._hedge_executor', side_effect=AssertionError('pool used')):
+            self.assertEqual(AIEngine.call_ai(self.messages, operation='quizzes.grade_question'), self.ok)
+        self.assertEqual(len(transport.requests), 1)
+
+    @override_settings(LLM_HEDGE_ENABLED=True)
+    def test_acall_ai_hedge_cancels_the_slow_request(self):
+        async def handler(request):
+            if len(seen) == 0:
+                seen.append('slow')
+                await asyncio.sleep(5)
+            seen.append('fast')
+            return httpx.Response(200, json=self.ok)
+
+        seen = []
+        set_async_transport_factory(lambda pool_key: httpx.MockTransport(handler))
+        self._warm_latencies('quizzes.grade_question')
+
+        started = time.monotonic()
+        result = asyncio.run(AIEngine.acall_ai(self.messages, operation='quizzes.grade_question'))
+        self.assertEqual(result, self.ok)
+        self.assertEqual(seen, ['slow', 'fast'])
+        self.assertLess(time.monotonic() - started, 2)
+
+    @override_settings(LLM_HEDGE_ENABLED=True)
+    def test_interactive_operations_are_not_hedged(self):
+        self._warm_latencies('assistant.chat')
+        self._warm_latencies('quizzes.grade_question')
+        self.assertIsNone(retry_policy.policy_for('assistant.chat').hedge_delay())
+        self.assertAlmostEqual(retry_policy.policy_for('quizzes.grade_question').hedge_delay(), 0.01)
+
+
+@override_settings(
+    LLM_API_KEY='test-key',
+    LLM_BASE_URL='https://llm.local/v1/chat/completions',
+    LLM_MODEL='test-model',
+    LLM_REQUEST_MAX_RETRIES=1,
+    LLM_GOVERNOR_ENABLED=False,
+    LLM_BREAKER_MIN_FAILURES=2,
+    LLM_PROVIDERS=[
+        {'name': 'primary', 'weight': 3},
+        {'name': 'backup', 'base_url': 'https://backup.local/v1/chat/completions', 'model': 'backup-model'},
+    ],
+)
+class LLMProviderFailoverTests(_LedgerStubMixin, SimpleTestCase):
+    messages = [{'role': 'user', 'content': 'hi'}]
+    ok = {'choices': [{'message': {'content': 'ok'}}]}
+
+    def setUp(self):
+        cache.clear()
+        patcher = patch('ai_engine.circuit_breaker._weighted_order', side_effect=list)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        set_transport_factory(None)
+
+    def _install(self, responses):
+        transport = _StubTransport(responses)
+        set_transport_factory(lambda pool_key: transport)
+        return transport
+
+    @override_settings(LLM_PROVIDERS=[
+        {'name': 'a', 'api_key_env': 'LLM_TEST_MISSING_KEY_ENV', 'weight': 2},
+        {'name': 'b', 'weight': 0},
+        {'model': 'other-model'},
+    ])
+    def test_registry_fills_defaults_and_skips_disabled_providers(self):
+        providers = get_llm_providers()
+        self.assertEqual([p['name'] for p in providers], ['a', 'provider3'])
+        self.assertEqual(providers[0]['api_key'], 'test-key')
+        self.assertEqual(providers[1]['base_url'], 'https://llm.local/v1/chat/completions')
+        self.assertEqual(providers[1]['model'], 'other-model')
+
+    @patch('ai_engine.service.time.sleep')
+    def test_upstream_failure_fails_over_without_backoff(self, mock_sleep):
+        transport = self._install([(503, {'error': 'down'}), (200, self.ok)])
+
+        self.assertEqual(AIEngine.call_ai(self.messages, operation='quizzes.grade_question'), self.ok)
+        self.assertEqual([r.url for r in transport.requests], [
+            'https://llm.local/v1/chat/completions',
+            'https://backup.local/v1/chat/completions',
+        ])
+        self.assertEqual(json.loads(transport.requests[1].body)['model'], 'backup-model')
+        mock_sleep.assert_not_called()
+
+    @override_settings(LLM_PROVIDERS=None, LLM_REQUEST_MAX_RETRIES=0)
+    def test_breaker_opens_fails_fast_and_recovers_through_probe(self):
+        transport = self._install([(502, {'error': 'bad gateway'})] * 2 + [(200, self.ok)])
+        for _ in range(2):
+            self.assertIsNone(AIEngine.call_ai(self.messages, operation='quizzes.grade_question'))
+
+        with self.assertRaises(AICallError) as ctx:
+            AIEngine.call_ai(self.messages, raise_on_error=True, operation='quizzes.grade_question')
+        self.assertEqual((ctx.exception.error_category, ctx.exception.status_code), ('circuit_open', 503))
+        self.assertEqual(len(transport.requests), 2)
+
+        later = time.time() + 31
+        with patch('ai_engine.circuit_breaker.time.time', return_value=later):
+            self.assertEqual(AIEngine.call_ai(self.messages, operation='quizzes.grade_question'), self.ok)
+        self.assertEqual(len(transport.requests), 3)
+        self.assertEqual(circuit_breaker.state('default'), circuit_breaker.STATE_CLOSED)
+
+    def test_stream_connect_failure_fails_over(self):
+        body = b'data: {"choices": [{"delta": {"content": "ok"}, "finish_reason": "stop"}]}\n\ndata: [DONE]\n\n'
+        responses = [httpx.Response(500, json={'error': 'boom'}), httpx.Response(200, content=body)]
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return responses.pop(0)
+
+        set_async_transport_factory(lambda pool_key: httpx.MockTransport(handler))
+        self.addCleanup(set_async_transport_factory, None)
+
+        async def collect():
+            return [chunk async for chunk in AIEngine.astream_ai(self.messages, operation='assistant.chat')]
+
+        chunks = asyncio.run(collect())
+
+        self.assertEqual([c['delta'] for c in chunks], ['ok'])
+        self.assertEqual(str(seen[1].url), 'https://backup.local/v1/chat/completions')
+
+
+@override_settings(
+    LLM_API_KEY='test-key',
+    LLM_BASE_URL='https://llm.local/v1/chat/completions',
+    LLM_MODEL='test-model',
+    LLM_GOVERNOR_ENABLED=False,
+    AI_METRICS_SCRAPE_TOKEN='scrape-secret',
+)
+class AIMetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        observability._announced.clear()
+
+    def tearDown(self):
+        set_transport_factory(None)
+
+    def _record_calls(self):
+        for duration in (80, 300, 400, 1500, 45000):
+            observability.record_ai_operation('quizzes.grade_question', True, duration, prompt_tokens=100, completion_tokens=20)
+        observability.record_ai_operation('quizzes.grade_question', False, 90000, error_category='timeout', retries=1)
+        for success in (True, True, False):
+            observability.record_schema_event('quizzes.grade_question', 'validate', success)
+        observability.record_schema_event('quizzes.grade_question', 'repair', True)
+
+    def test_rollup_summarizes_latency_tokens_and_schema_repairs(self):
+        self._record_calls()
+        self.assertEqual(metrics.rollup_recent(), 1)
+        self.assertEqual(metrics.rollup_recent(), 1)
+
+        summary = metrics.summarize(hours=1)['operations'][0]
+        self.assertEqual(summary['operation'], 'quizzes.grade_question')
+        self.assertEqual((summary['calls'], summary['failures'], summary['retries']), (6, 1, 1))
+        self.assertEqual((summary['prompt_tokens'], summary['completion_tokens']), (500, 100))
+        self.assertEqual(summary['errors'], {'timeout': 1})
+        self.assertEqual(summary['schema_repair_rate'], round(1 / 3, 4))
+        self.assertEqual(summary['schema_repair_success_rate'], 1.0)
+        self.assertTrue(250 <= summary['p50_ms'] <= 500)
+        self.assertTrue(30000 <= summary['p95_ms'] <= 120000)
+
+    def test_call_ai_records_usage_tokens(self):
+        payload = {'choices': [{'message': {'content': 'ok'}}], 'usage': {'prompt_tokens': 12, 'completion_tokens': 3}}
+        transport = _StubTransport([(200, payload)])
+        set_transport_factory(lambda pool_key: transport)
+
+        AIEngine.call_ai([{'role': 'user', 'content': 'hi'}], operation='assistant.chat')
+        metrics.rollup_recent(hours=1)
+
+        row = AIOperationRollup.objects.get(operation='assistant.chat')
+        self.assertEqual((row.calls, row.prompt_tokens, row.completion_tokens), (1, 12, 3))
+
+    def test_prune_folds_expired_hours_into_archive(self):
+        self._record_calls()
+        metrics.rollup_recent()
+        later = timezone.now() + datetime.timedelta(days=100)
+
+        self.assertEqual(metrics.prune_rollups(now=later, days=90), 1)
+        archive = AIOperationRollup.objects.get()
+        self.assertEqual((archive.bucket, archive.calls, archive.prompt_tokens), (metrics.ARCHIVE_BUCKET, 6, 500))
+
+    def test_prometheus_endpoint_accepts_scrape_token(self):
+        self._record_calls()
+        metrics.rollup_recent()
+
+        self.assertIn(self.client.get('/api/ai-engine/metrics/prometheus/').status_code, (401, 403))
+        response = self.client.get('/api/ai-engine/metrics/prometheus/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('ai_operation_duration_seconds_bucket{operation="quizzes.grade_question",le="+Inf"} 6', body)
+        self.assertIn('ai_operation_tokens_total{operation="quizzes.grade_question",type="prompt"} 500', body)
+        self.assertIn('ai_provider_circuit_open{provider="default"} 0', body)
+
+    def test_admin_metrics_view_requires_staff(self):
+        self._record_calls()
+        user = User.objects.create_user(username='teacher', password='pass12345')
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get('/api/ai-engine/metrics/').status_code, 403)
+
+        user.is_staff = True
+        user.save(update_fields=['is_staff'])
+        response = self.client.get('/api/ai-engine/metrics/', {'operation': 'quizzes.grade_question'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['operations'][0]['calls'], 6)
+        self.assertEqual(len(response.data['series']), 1)
+
+
+@override_settings(
+    LLM_API_KEY='test-key',
+    LLM_BASE_URL='https://llm.local/v1/chat/completions',
+    LLM_MODEL='test-model',
+    LLM_GOVERNOR_ENABLED=False,
+    AI_DAILY_TOKEN_QUOTA=0,
+    AI_OPERATION_DAILY_TOKEN_QUOTAS={},
+)
+class TokenLedgerTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        observability._announced.clear()
+        self.student = User.objects.create_user(username='ledger_student', password='pass12345', is_member=True)
+
+    def tearDown(self):
+        set_transport_factory(None)
+
+    def _install(self, responses):
+        transport = _StubTransport(responses)
+        set_transport_factory(lambda pool_key: transport)
+        return transport
+
+    def _reply(self, prompt_tokens=12, completion_tokens=3):
+        payload = {
+            'choices': [{'message': {'content': 'ok'}}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens},
+        }
+        return (200, payload)
+
+    def test_call_ai_records_usage_per_user_bot_and_operation(self):
+        self._install([self._reply(), self._reply(20, 5), self._reply()])
+        messages = [{'role': 'user', 'content': 'hi'}]
+
+        # 台账写入失败只会记日志，这里要求没有失败日志
+        with self.assertNoLogs('ai_engine.ledger', level='WARNING'):
+            with ledger.attribute(user=self.student, bot_id=7):
+                AIEngine.call_ai(messages, operation='assistant.chat')
+                AIEngine.call_ai(messages, operation='assistant.chat')
+            AIEngine.call_ai(messages, operation='quizzes.bulk_generate')
+
+        row = TokenUsage.objects.get(user=self.student)
+        self.assertEqual((row.bot_id, row.operation, row.day), (7, 'assistant.chat', ledger.today()))
+        self.assertEqual((row.calls, row.prompt_tokens, row.completion_tokens), (2, 32, 8))
+        self.assertEqual(TokenUsage.objects.get(user__isnull=True).operation, 'quizzes.bulk_generate')
+
+    def test_stream_records_reported_usage(self):
+        body = (
+            'data: {"choices": [{"delta": {"content": "你好"}, "finish_reason": "stop"}]}\n\n'
+            'data: {"choices": [], "usage": {"prompt_tokens": 30, "completion_tokens": 2}}\n\n'
+            'data: [DONE]\n\n'
+        ).encode('utf-8')
+        set_async_transport_factory(lambda pool_key: httpx.MockTransport(lambda request: httpx.Response(200, content=body)))
+        self.addCleanup(set_async_transport_factory, None)
+
+        async def collect():
+            stream = AIEngine.astream_ai([{'role': 'user', 'content': 'hi'}], operation='assistant.chat')
+            return [chunk async for chunk in stream]
+
+        # async_to_sync 让 sync_to_async 的台账写入回到测试线程，落在同一个测试事务里
+        with ledger.attribute(user=self.student):
+            chunks = async_to_sync(collect)()
+
+        self.assertEqual([c['delta'] for c in chunks], ['你好'])
+        row = TokenUsage.objects.get(user=self.student)
+        self.assertEqual((row.prompt_tokens, row.completion_tokens), (30, 2))
+
+    def test_quota_blocks_calls_before_reaching_upstream(self):
+        transport = self._install([self._reply(), self._reply()])
+        messages = [{'role': 'user', 'content': 'hi'}]
+
+        with self.settings(AI_OPERATION_DAILY_TOKEN_QUOTAS={'quizzes.grade_question': 10}):
+            with ledger.attribute(user=self.student):
+                self.assertIsNotNone(AIEngine.call_ai(messages, operation='quizzes.grade_question'))
+                # 派生的结构修复调用计入同一配额
+                self.assertIsNone(AIEngine.call_ai(messages, operation='quizzes.grade_question.schema_repair'))
+                # 计数缓存丢失后从台账回源
+                cache.clear()
+                with self.assertRaises(AICallError) as ctx:
+                    AIEngine.call_ai(messages, operation='quizzes.grade_question', raise_on_error=True)
+                self.assertIsNotNone(AIEngine.call_ai(messages, operation='assistant.chat'))
+
+        self.assertEqual((ctx.exception.status_code, ctx.exception.error_category), (429, 'quota_exceeded'))
+        self.assertEqual(len(transport.requests), 2)
+
+    def test_staff_are_exempt_from_quota(self):
+        self._install([self._reply(), self._reply()])
+        admin = User.objects.create_user(username='ledger_admin', password='pass12345', is_staff=True)
+        messages = [{'role': 'user', 'content': 'hi'}]
+
+        with self.settings(AI_DAILY_TOKEN_QUOTA=1), ledger.attribute(user=admin):
+            AIEngine.call_ai(messages, operation='assistant.chat')
+            self.assertIsNotNone(AIEngine.call_ai(messages, operation='assistant.chat'))
+
+    def test_report_endpoint_aggregates_usage_with_latency(self):
+        self._install([self._reply(100, 20), self._reply(10, 5)])
+        messages = [{'role': 'user', 'content': 'hi'}]
+        with ledger.attribute(user=self.student):
+            AIEngine.call_ai(messages, operation='quizzes.grade_question')
+            AIEngine.call_ai(messages, operation='assistant.chat')
+        metrics.rollup_recent(hours=1)
+
+        self.client.force_authenticate(user=self.student)
+        self.assertEqual(self.client.get('/api/users/admin/bi/tokens/').status_code, 403)
+
+        admin = User.objects.create_user(username='ledger_report_admin', password='pass12345', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/users/admin/bi/tokens/', {'days': 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['total_tokens'], 135)
+        top = response.data['by_operation'][0]
+        self.assertEqual((top['operation'], top['total_tokens'], top['calls']), ('quizzes.grade_question', 120, 1))
+        self.assertIsNotNone(top['avg_ms'])
+        self.assertEqual(response.data['top_users'][0]['user__username'], 'ledger_student')
+        self.assertEqual(response.data['daily'][0]['day'], ledger.today())
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .views import AIMetricsPrometheusView, AIMetricsView
+
+urlpatterns = [
+    path('metrics/', AIMetricsView.as_view(), name='ai-metrics'),
+    path('metrics/prometheus/', AIMetricsPrometheusView.as_view(), name='ai-metrics-prometheus'),
+]
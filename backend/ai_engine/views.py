@@ -0,0 +1,41 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .metrics import render_prometheus, rollup_recent, summarize
+
+
+class IsAdminOrScrapeToken(permissions.BasePermission):
+    """管理员，或携带 AI_METRICS_SCRAPE_TOKEN 的 Prometheus 抓取请求。"""
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = getattr(settings, 'AI_METRICS_SCRAPE_TOKEN', '')
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+class AIMetricsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            hours = min(24 * 31, max(1, int(request.query_params.get('hours', 24))))
+        except (TypeError, ValueError):
+            hours = 24
+        operation = (request.query_params.get('operation') or '').strip() or None
+        # 先汇总当前小时，管理端看到的是近实时数据
+        rollup_recent(hours=1)
+        return Response({'hours': hours, **summarize(hours=hours, operation=operation)})
+
+
+class AIMetricsPrometheusView(APIView):
+    permission_classes = [IsAdminOrScrapeToken]
+
+    def get(self, request):
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
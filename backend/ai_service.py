@@ -1,3 +1,5 @@
+import asyncio
+import contextvars
 import json
 import logging
 import re
@@ -5,6 +7,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.db import transaction
 
@@ -122,6 +125,82 @@ class AIService:
         )
         return cls.extract_content(res)
 
+    # ------------------------------------------------------------------
+    # asyncio 版本：供 ASGI 视图与异步 worker 在单个事件循环上并发大量 LLM 调用
+    # ------------------------------------------------------------------
+
+    @classmethod
+    async def acall_ai(
+        cls,
+        messages: Sequence[Dict[str, str]],
+        temperature: float = 0.4,
+        max_tokens: int = 4096,
+        raise_on_error: bool = False,
+        operation: str = 'general',
+    ):
+        return await AIEngine.acall_ai(
+            list(messages),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            raise_on_error=raise_on_error,
+            operation=operation,
+        )
+
+    @classmethod
+    def astream_ai(
+        cls,
+        messages: Sequence[Dict[str, str]],
+        temperature: float = 0.4,
+        max_tokens: int = 4096,
+        operation: str = 'general',
+    ):
+        return AIEngine.astream_ai(
+            list(messages),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            operation=operation,
+        )
+
+    @classmethod
+    async def asimple_chat(
+        cls,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.4,
+        max_tokens: int = 4096,
+        raise_on_error: bool = False,
+        operation: str = 'general',
+    ):
+        messages = [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': user_prompt},
+        ]
+        return await cls.acall_ai(
+            messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            raise_on_error=raise_on_error,
+            operation=operation,
+        )
+
+    @classmethod
+    async def asimple_chat_text(
+        cls,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.4,
+        max_tokens: int = 4096,
+        operation: str = 'general',
+    ) -> Optional[str]:
+        res = await cls.asimple_chat(
+            system_prompt,
+            user_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            operation=operation,
+        )
+        return cls.extract_content(res)
+
     @classmethod
     def extract_json(cls, text: Optional[str]):
         if not text:
@@ -354,14 +433,14 @@ class AIService:
         return max(2200, min(5600, 1200 + c * 1200))
 
     @classmethod
-    def _request_bulk_generate_once(
+    def _bulk_generate_chat_kwargs(
         cls,
         kps_data: Sequence[Dict[str, Any]],
         count_per_kp: int,
         target_types: Optional[List[str]],
         target_difficulty: str,
         target_type_ratio_text: str,
-    ) -> List[Dict[str, Any]]:
+    ) -> Dict[str, Any]:
         template = cls.get_template('quizzes', 'bulk_generate_prompt.txt') or ''
         prompt = cls.format_template(
             template,
@@ -383,19 +462,21 @@ class AIService:
             len(prompt),
         )
 
-        response = cls.simple_chat(
-            system_prompt=cls._get_system_prompt(
+        return {
+            'system_prompt': cls._get_system_prompt(
                 'quizzes',
                 'system_bulk_generate_prompt.txt',
                 '你是431金融命题专家。只输出可被 json.loads 解析的 JSON 数组，不输出其他文字。',
             ),
-            user_prompt=prompt,
-            temperature=0.35,
-            max_tokens=cls._estimate_bulk_generate_max_tokens(count_per_kp),
-            raise_on_error=True,
-            operation='quizzes.bulk_generate',
-        )
+            'user_prompt': prompt,
+            'temperature': 0.35,
+            'max_tokens': cls._estimate_bulk_generate_max_tokens(count_per_kp),
+            'raise_on_error': True,
+            'operation': 'quizzes.bulk_generate',
+        }
 
+    @classmethod
+    def _parse_bulk_generate_response(cls, response) -> List[Dict[str, Any]]:
         content = cls.extract_content(response)
         from quizzes.services.ai_task_service import QuizAITaskService
 
@@ -414,6 +495,35 @@ class AIService:
             )
         return data
 
+    @classmethod
+    def _request_bulk_generate_once(
+        cls,
+        kps_data: Sequence[Dict[str, Any]],
+        count_per_kp: int,
+        target_types: Optional[List[str]],
+        target_difficulty: str,
+        target_type_ratio_text: str,
+    ) -> List[Dict[str, Any]]:
+        response = cls.simple_chat(**cls._bulk_generate_chat_kwargs(
+            kps_data, count_per_kp, target_types, target_difficulty, target_type_ratio_text,
+        ))
+        return cls._parse_bulk_generate_response(response)
+
+    @classmethod
+    async def _arequest_bulk_generate_once(
+        cls,
+        kps_data: Sequence[Dict[str, Any]],
+        count_per_kp: int,
+        target_types: Optional[List[str]],
+        target_difficulty: str,
+        target_type_ratio_text: str,
+    ) -> List[Dict[str, Any]]:
+        response = await cls.asimple_chat(**cls._bulk_generate_chat_kwargs(
+            kps_data, count_per_kp, target_types, target_difficulty, target_type_ratio_text,
+        ))
+        # 结构校验失败时的修复调用较少发生，放到线程中执行同步版本
+        return await sync_to_async(cls._parse_bulk_generate_response)(response)
+
     @classmethod
     def _question_type_key_from_clean_data(cls, question: Dict[str, Any]) -> str:
         return cls._canonical_question_type_key(question.get('q_type'), question.get('subjective_type'))
@@ -714,36 +824,31 @@ class AIService:
         return clean_data
 
     @classmethod
-    def preview_generate_questions(
+    def _plan_bulk_generate(
         cls,
         kp_ids: Iterable[int],
-        count_per_kp: int = 1,
-        target_types: Optional[List[str]] = None,
-        target_difficulty: Any = 'normal',
-        target_type_ratio: Optional[Dict[str, Any]] = None,
-    ):
+        count_per_kp: int,
+        target_types: Optional[List[str]],
+        target_difficulty: Any,
+        target_type_ratio: Optional[Dict[str, Any]],
+    ) -> Optional[Dict[str, Any]]:
+        """查询知识点并把命题任务拆成 (知识点, 批次) 作业；同步与异步命题共用。"""
         kps = list(KnowledgePoint.objects.filter(id__in=list(kp_ids), level='kp').order_by('id'))
         if not kps:
-            return []
+            return None
 
         normalized_target_difficulty = cls._normalize_target_difficulty(target_difficulty)
-        normalized_target_types = cls._normalize_target_types(target_types)
         normalized_type_ratio = cls._normalize_target_type_ratio(target_type_ratio, target_types)
         target_type_ratio_text = cls._render_target_type_ratio(
             normalized_type_ratio,
             max(1, int(count_per_kp or 1)),
         )
 
-        kp_by_code = {kp.code: kp for kp in kps if kp.code}
-        kp_by_id = {kp.id: kp for kp in kps}
         max_per_request = max(1, int(getattr(settings, 'AI_BULK_GENERATE_MAX_PER_REQUEST', 3) or 3))
         max_concurrency = max(1, int(getattr(settings, 'AI_BULK_GENERATE_CONCURRENCY', 2) or 2))
         total_per_kp = max(1, int(count_per_kp or 1))
 
-        normalized: List[Dict[str, Any]] = []
-        normalized_all: List[Dict[str, Any]] = []
         jobs: List[Tuple[KnowledgePoint, int, int]] = []
-
         for kp in kps:
             remaining = total_per_kp
             batch_index = 0
@@ -761,26 +866,90 @@ class AIService:
             max_per_request,
             max_concurrency,
         )
+        return {
+            'kp_by_code': {kp.code: kp for kp in kps if kp.code},
+            'kp_by_id': {kp.id: kp for kp in kps},
+            'jobs': jobs,
+            'max_concurrency': max_concurrency,
+            'target_types': target_types,
+            'normalized_target_types': cls._normalize_target_types(target_types),
+            'target_difficulty': normalized_target_difficulty,
+            'type_ratio': normalized_type_ratio,
+            'type_ratio_text': target_type_ratio_text,
+        }
+
+    @classmethod
+    def _bulk_generate_job_args(cls, plan: Dict[str, Any], kp: KnowledgePoint, batch_count: int) -> tuple:
+        kp_payload = [{
+            'id': kp.id,
+            'code': kp.code,
+            'name': kp.name,
+            'description': kp.description,
+        }]
+        return (kp_payload, batch_count, plan['target_types'], plan['target_difficulty'], plan['type_ratio_text'])
+
+    @classmethod
+    def _as_bulk_generate_error(cls, exc: BaseException) -> AICallError:
+        if isinstance(exc, AICallError):
+            return exc
+        error = AICallError('AI 命题服务异常，请稍后重试。', status_code=500, retryable=False)
+        error.__cause__ = exc
+        return error
+
+    @classmethod
+    def _collect_bulk_generate(
+        cls,
+        plan: Dict[str, Any],
+        job_results: Dict[Tuple[int, int], List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        normalized_target_types = plan['normalized_target_types']
+        normalized: List[Dict[str, Any]] = []
+        normalized_all: List[Dict[str, Any]] = []
+        for kp, batch_index, _ in plan['jobs']:
+            data_batch = job_results.get((kp.id, batch_index), [])
+            for item in data_batch:
+                clean = cls._normalize_generated_question(
+                    item, plan['kp_by_code'], plan['kp_by_id'], kp, include_explanation=False
+                )
+                if not clean:
+                    continue
+                normalized_all.append(clean)
+                clean_type_key = cls._question_type_key_from_clean_data(clean)
+                if normalized_target_types and clean_type_key not in normalized_target_types:
+                    continue
+                normalized.append(clean)
 
+        if not normalized and normalized_target_types:
+            normalized = normalized_all
+
+        normalized = cls._apply_type_ratio_filter(normalized, plan['type_ratio'])
+        normalized = cls._apply_difficulty_regression_validation(normalized, plan['target_difficulty'])
+        return normalized
+
+    @classmethod
+    def preview_generate_questions(
+        cls,
+        kp_ids: Iterable[int],
+        count_per_kp: int = 1,
+        target_types: Optional[List[str]] = None,
+        target_difficulty: Any = 'normal',
+        target_type_ratio: Optional[Dict[str, Any]] = None,
+    ):
+        plan = cls._plan_bulk_generate(kp_ids, count_per_kp, target_types, target_difficulty, target_type_ratio)
+        if plan is None:
+            return []
+
+        jobs = plan['jobs']
         job_results: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
         if jobs:
             first_error: Optional[BaseException] = None
-            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(jobs))) as executor:
+            with ThreadPoolExecutor(max_workers=min(plan['max_concurrency'], len(jobs))) as executor:
                 future_map = {}
                 for kp, batch_index, batch_count in jobs:
-                    kp_payload = [{
-                        'id': kp.id,
-                        'code': kp.code,
-                        'name': kp.name,
-                        'description': kp.description,
-                    }]
                     future = executor.submit(
+                        contextvars.copy_context().run,
                         cls._request_bulk_generate_once,
-                        kp_payload,
-                        batch_count,
-                        target_types,
-                        normalized_target_difficulty,
-                        target_type_ratio_text,
+                        *cls._bulk_generate_job_args(plan, kp, batch_count),
                     )
                     future_map[future] = (kp.id, batch_index)
 
@@ -796,28 +965,49 @@ class AIService:
                         break
 
             if first_error:
-                if isinstance(first_error, AICallError):
-                    raise first_error
-                raise AICallError('AI 命题服务异常，请稍后重试。', status_code=500, retryable=False) from first_error
+                raise cls._as_bulk_generate_error(first_error)
 
-        for kp, batch_index, _ in jobs:
-            data_batch = job_results.get((kp.id, batch_index), [])
-            for item in data_batch:
-                clean = cls._normalize_generated_question(item, kp_by_code, kp_by_id, kp, include_explanation=False)
-                if not clean:
-                    continue
-                normalized_all.append(clean)
-                clean_type_key = cls._question_type_key_from_clean_data(clean)
-                if normalized_target_types and clean_type_key not in normalized_target_types:
-                    continue
-                normalized.append(clean)
+        return cls._collect_bulk_generate(plan, job_results)
 
-        if not normalized and normalized_target_types:
-            normalized = normalized_all
+    @classmethod
+    async def apreview_generate_questions(
+        cls,
+        kp_ids: Iterable[int],
+        count_per_kp: int = 1,
+        target_types: Optional[List[str]] = None,
+        target_difficulty: Any = 'normal',
+        target_type_ratio: Optional[Dict[str, Any]] = None,
+    ):
+        """preview_generate_questions 的 asyncio 版本：各批次在同一事件循环上并发，任一失败即取消其余批次。"""
+        plan = await sync_to_async(cls._plan_bulk_generate)(
+            list(kp_ids), count_per_kp, target_types, target_difficulty, target_type_ratio
+        )
+        if plan is None:
+            return []
 
-        normalized = cls._apply_type_ratio_filter(normalized, normalized_type_ratio)
-        normalized = cls._apply_difficulty_regression_validation(normalized, normalized_target_difficulty)
-        return normalized
+        semaphore = asyncio.Semaphore(plan['max_concurrency'])
+
+        async def run(kp, batch_count):
+            async with semaphore:
+                return await cls._arequest_bulk_generate_once(*cls._bulk_generate_job_args(plan, kp, batch_count))
+
+        tasks = {
+            asyncio.ensure_future(run(kp, batch_count)): (kp.id, batch_index)
+            for kp, batch_index, batch_count in plan['jobs']
+        }
+        job_results: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        if tasks:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            for task in done:
+                if task.exception() is not None:
+                    raise cls._as_bulk_generate_error(task.exception())
+                job_results[tasks[task]] = task.result()
+
+        return cls._collect_bulk_generate(plan, job_results)
 
     @classmethod
     def batch_generate_questions(
@@ -873,6 +1063,7 @@ class AIService:
         max_score: float,
         grading_points: Optional[str] = None,
         subjective_type: str = '主观题',
+        question_id: Optional[int] = None,
     ) -> Dict[str, Any]:
         from quizzes.services.ai_task_service import QuizAITaskService
 
@@ -885,6 +1076,7 @@ class AIService:
             max_score=max_score,
             grading_points=grading_points,
             subjective_type=subjective_type,
+            question_id=question_id,
         )
 
     @classmethod
@@ -932,3 +1124,77 @@ class AIService:
             user_message=user_message,
             student_context=student_context,
         )
+
+    @classmethod
+    async def agenerate_ai_answer(cls, question: Question) -> str:
+        from quizzes.services.ai_task_service import QuizAITaskService
+
+        return await QuizAITaskService.agenerate_ai_answer(cls, question)
+
+    @classmethod
+    async def agrade_question(
+        cls,
+        question_text: str,
+        user_answer: Any,
+        correct_answer: Any,
+        q_type: str,
+        max_score: float,
+        grading_points: Optional[str] = None,
+        subjective_type: str = '主观题',
+        question_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        from quizzes.services.ai_task_service import QuizAITaskService
+
+        return await QuizAITaskService.agrade_question(
+            cls,
+            question_text=question_text,
+            user_answer=user_answer,
+            correct_answer=correct_answer,
+            q_type=q_type,
+            max_score=max_score,
+            grading_points=grading_points,
+            subjective_type=subjective_type,
+            question_id=question_id,
+        )
+
+    @classmethod
+    async def aparse_questions_from_text(cls, raw_text: str) -> List[Dict[str, Any]]:
+        from quizzes.services.ai_task_service import QuizAITaskService
+
+        return await QuizAITaskService.aparse_questions_from_text(cls, raw_text=raw_text)
+
+    @classmethod
+    async def achat_with_assistant(
+        cls,
+        bot,
+        history_messages: Sequence[Dict[str, str]],
+        user_message: str,
+        student_context: str = '',
+    ):
+        from ai_assistant.services.chat_service import AssistantChatService
+
+        return await AssistantChatService.achat_with_assistant(
+            cls,
+            bot=bot,
+            history_messages=history_messages,
+            user_message=user_message,
+            student_context=student_context,
+        )
+
+    @classmethod
+    def achat_with_assistant_stream(
+        cls,
+        bot,
+        history_messages: Sequence[Dict[str, str]],
+        user_message: str,
+        student_context: str = '',
+    ):
+        from ai_assistant.services.chat_service import AssistantChatService
+
+        return AssistantChatService.astream_chat_with_assistant(
+            cls,
+            bot=bot,
+            history_messages=history_messages,
+            user_message=user_message,
+            student_context=student_context,
+        )
@@ -0,0 +1,121 @@
+"""
+跨应用共享的缓存工具，后端由 settings.CACHES 决定（生产为 Redis，各 worker 共享）。
+
+- make_key：命名空间键，超长或含空白的片段取摘要，兼容各后端的键限制；
+- get_version / bump_version / versioned_key：版本号失效，推进版本后旧键自然过期，无需枚举删除；
+- lock / get_or_set：基于 cache.add 的单飞锁，缓存失效时只有一个进程回源，其余等待结果。
+"""
+import hashlib
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+logger = logging.getLogger(__name__)
+
+_MAX_KEY_PART_LENGTH = 64
+_LOCK_POLL_SECONDS = 0.05
+_MISSING = object()
+
+
+def make_key(namespace: str, *parts: Any) -> str:
+    pieces = [str(namespace)]
+    for part in parts:
+        text = str(part)
+        if len(text) > _MAX_KEY_PART_LENGTH or any(ch.isspace() for ch in text):
+            text = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        pieces.append(text)
+    return ':'.join(pieces)
+
+
+def incr(key: str, delta: int = 1, timeout: Optional[float] = None) -> int:
+    """原子自增；键不存在时以 delta 初始化（并发初始化由 cache.add 裁决）。"""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout):
+            return delta
+        return cache.incr(key, delta)
+
+
+# ---------------------------------------------------------------------------
+# 版本号失效
+# ---------------------------------------------------------------------------
+
+def _version_key(namespace: str) -> str:
+    return make_key(namespace, 'version')
+
+
+def get_version(namespace: str) -> int:
+    return int(cache.get(_version_key(namespace)) or 0)
+
+
+def bump_version(namespace: str) -> int:
+    return incr(_version_key(namespace))
+
+
+def versioned_key(namespace: str, *parts: Any) -> str:
+    return make_key(namespace, f'v{get_version(namespace)}', *parts)
+
+
+# ---------------------------------------------------------------------------
+# 单飞锁
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def lock(name: str, timeout: float = 30, wait: float = 0.0) -> Iterator[bool]:
+    """
+    尝试获取分布式锁，wait 秒内拿不到则以 False 进入上下文，由调用方决定降级方式。
+    timeout 是锁的自动过期时间，防止持有者崩溃后死锁。
+    """
+    key = make_key('lock', name)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    acquired = cache.add(key, token, timeout)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(_LOCK_POLL_SECONDS)
+        acquired = cache.add(key, token, timeout)
+    try:
+        yield acquired
+    finally:
+        # 仅释放自己持有的锁（锁已过期并被他人获取时不误删）
+        if acquired and cache.get(key) == token:
+            cache.delete(key)
+
+
+def get_or_set(
+    key: str,
+    producer: Callable[[], Any],
+    timeout: Any = DEFAULT_TIMEOUT,
+    lock_timeout: float = 30,
+    wait: float = 5.0,
+) -> Any:
+    """
+    读缓存，未命中时只允许一个调用方执行 producer 回源，其余调用方轮询等待其写入的结果；
+    等待超时（持有者过慢或崩溃）后自行回源，保证不会无限阻塞。
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    with lock(key, timeout=lock_timeout) as acquired:
+        if acquired:
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = producer()
+                cache.set(key, value, timeout)
+            return value
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(_LOCK_POLL_SECONDS)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    logger.warning("core.cache single-flight wait timed out: key=%s", key)
+    return producer()
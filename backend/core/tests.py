@@ -0,0 +1,62 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core import cache as shared_cache
+
+
+class SharedCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_keys_are_namespaced_and_bounded(self):
+        self.assertEqual(shared_cache.make_key('quizzes:kp_tree', 'v3', 7), 'quizzes:kp_tree:v3:7')
+        long_key = shared_cache.make_key('ns', 'x' * 300, 'a b')
+        self.assertLess(len(long_key), 100)
+        self.assertNotIn(' ', long_key)
+
+    def test_bump_version_invalidates_versioned_keys(self):
+        first = shared_cache.versioned_key('ns', 'total')
+        cache.set(first, 1)
+        self.assertEqual(shared_cache.bump_version('ns'), 1)
+        self.assertEqual(shared_cache.bump_version('ns'), 2)
+        second = shared_cache.versioned_key('ns', 'total')
+        self.assertNotEqual(first, second)
+        self.assertIsNone(cache.get(second))
+
+    def test_get_or_set_runs_producer_once_under_concurrency(self):
+        calls = []
+        start = threading.Barrier(6, timeout=5)
+        results = []
+
+        def produce():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'value': 42}
+
+        def worker():
+            start.wait()
+            results.append(shared_cache.get_or_set('ns:hot', produce, 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 42}] * 6)
+        # None 也会被缓存，不会反复回源
+        self.assertIsNone(shared_cache.get_or_set('ns:none', lambda: None, 60))
+        self.assertIsNone(shared_cache.get_or_set('ns:none', lambda: calls.append(1), 60))
+        self.assertEqual(len(calls), 1)
+
+    def test_lock_is_exclusive_and_released(self):
+        with shared_cache.lock('job') as first:
+            with shared_cache.lock('job') as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+        with shared_cache.lock('job') as again:
+            self.assertTrue(again)
@@ -4,7 +4,7 @@ from rest_framework.views import APIView
 from django.db.models import Q
 from .models import Question, Answer
 from .serializers import QuestionSerializer, AnswerSerializer
-from notifications.models import Notification
+from notifications.models import Notification, push_notifications_created
 from users.views import IsMember
 
 class QuestionListCreateView(generics.ListCreateAPIView):
@@ -118,7 +118,7 @@ class AnswerCreateView(generics.CreateAPIView):
                     link=f'/qa'
                 ) for f in followers
             ]
-            Notification.objects.bulk_create(notifs)
+            push_notifications_created(Notification.objects.bulk_create(notifs))
         
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
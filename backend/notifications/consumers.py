@@ -1,12 +1,15 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from .push import BROADCAST_GROUP, user_group_name
+
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
         if self.user.is_authenticated:
-            self.group_name = f"user_{self.user.id}_notifications"
+            self.group_name = user_group_name(self.user.id)
             await self.channel_layer.group_add(self.group_name, self.channel_name)
+            await self.channel_layer.group_add(BROADCAST_GROUP, self.channel_name)
             await self.accept()
         else:
             await self.close()
@@ -14,7 +17,13 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.channel_layer.group_discard(BROADCAST_GROUP, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # 客户端心跳，防止代理层断开空闲连接
+        if text_data == 'ping':
+            await self.send(text_data='pong')
 
     async def send_notification(self, event):
         # 发送通知到客户端
-        await self.send(text_data=json.dumps(event["data"]))
+        await self.send(text_data=json.dumps(event["data"], ensure_ascii=False))
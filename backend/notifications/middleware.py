@@ -0,0 +1,46 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.authtoken.models import Token
+
+
+@database_sync_to_async
+def _get_user_for_token(key):
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return AnonymousUser()
+    return token.user
+
+
+def _extract_token(scope):
+    # 浏览器 WebSocket 无法自定义请求头，优先从 ?token= 读取；其他客户端可用 Authorization: Token <key>
+    query = parse_qs(scope.get('query_string', b'').decode('utf-8', errors='ignore'))
+    token = (query.get('token') or [''])[0].strip()
+    if token:
+        return token
+
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode('utf-8', errors='ignore').split()
+            if len(parts) == 2 and parts[0].lower() == 'token':
+                return parts[1]
+    return ''
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    与 REST 接口一致的 DRF Token 认证。
+    不回退到会话 Cookie：WebSocket 握手不受同源策略约束，任意站点都能带着受害者的 Cookie 发起连接。
+    """
+
+    async def __call__(self, scope, receive, send):
+        key = _extract_token(scope)
+        scope = dict(scope)
+        scope['user'] = await _get_user_for_token(key) if key else AnonymousUser()
+        return await super().__call__(scope, receive, send)
+
+
+def TokenAuthMiddlewareStack(inner):
+    return TokenAuthMiddleware(inner)
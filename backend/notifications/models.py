@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 
+from .push import push_on_commit, push_to_user
+
 class Notification(models.Model):
     TYPES = (
         ('qa_reply', '答疑回复'),
@@ -21,3 +23,41 @@ class Notification(models.Model):
 
     def __str__(self):
         return f"{self.recipient.username} - {self.title}"
+
+    def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        super().save(*args, **kwargs)
+        if is_new:
+            push_notification_created(self)
+
+    def to_push_payload(self):
+        return {
+            "id": self.id,
+            "ntype": self.ntype,
+            "title": self.title,
+            "content": self.content,
+            "link": self.link,
+            "is_read": self.is_read,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+def push_notification_created(notification):
+    push_on_commit(
+        notification.recipient_id,
+        "notification",
+        {"notification": notification.to_push_payload()},
+    )
+
+
+def push_notifications_created(notifications):
+    """bulk_create 不经过 save()：提交后逐个接收者补发推送，只注册一个提交回调。"""
+    payloads = [(n.recipient_id, {"notification": n.to_push_payload()}) for n in notifications]
+    if not payloads:
+        return
+
+    def _push():
+        for user_id, payload in payloads:
+            push_to_user(user_id, "notification", payload)
+
+    transaction.on_commit(_push)
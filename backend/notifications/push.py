@@ -0,0 +1,61 @@
+import logging
+from typing import Any, Dict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+# 所有已认证连接都会加入的组，全站广播只需一次 group_send
+BROADCAST_GROUP = "broadcast_notifications"
+
+
+def user_group_name(user_id: int) -> str:
+    return f"user_{user_id}_notifications"
+
+
+def _group_send(group: str, event: str, payload: Dict[str, Any]) -> bool:
+    if not getattr(settings, 'REALTIME_PUSH_ENABLED', True):
+        return False
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return False
+
+    try:
+        async_to_sync(channel_layer.group_send)(
+            group,
+            {"type": "send_notification", "data": {"event": event, **payload}},
+        )
+        return True
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("notifications.push failed: group=%s event=%s err=%s", group, event, exc)
+        return False
+
+
+def push_to_user(user_id: int, event: str, payload: Dict[str, Any]) -> bool:
+    """
+    通过 Channel Layer 向用户的 WebSocket 组推送一条消息。
+    推送是尽力而为的：通道层不可用时只记录日志，客户端重连后会重新拉取未读数。
+    """
+    if not user_id:
+        return False
+    return _group_send(user_group_name(user_id), event, payload)
+
+
+def broadcast(event: str, payload: Dict[str, Any]) -> bool:
+    """向所有在线用户推送同一条消息。"""
+    return _group_send(BROADCAST_GROUP, event, payload)
+
+
+def push_on_commit(user_id: int, event: str, payload: Dict[str, Any]) -> None:
+    # 事务提交后再推送，避免客户端收到推送后查询不到尚未提交的数据
+    transaction.on_commit(lambda: push_to_user(user_id, event, payload))
+
+
+def broadcast_on_commit(event: str, payload: Dict[str, Any]) -> None:
+    transaction.on_commit(lambda: broadcast(event, payload))
@@ -0,0 +1,97 @@
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from school_system.asgi import application
+from users.models import User
+from .models import Notification, push_notifications_created
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class NotificationPushTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ws_user", password="testpass123")
+        self.token = Token.objects.create(user=self.user)
+
+    def test_anonymous_socket_is_rejected(self):
+        async def run():
+            communicator = WebsocketCommunicator(application, "/ws/notifications/?token=invalid")
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+            return connected
+
+        self.assertFalse(async_to_sync(run)())
+
+    def test_session_cookie_alone_does_not_authenticate(self):
+        # 跨站页面可以携带受害者的会话 Cookie 发起握手，WebSocket 只接受 Token
+        self.client.force_login(self.user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        async def run():
+            communicator = WebsocketCommunicator(
+                application,
+                "/ws/notifications/",
+                headers=[(b"cookie", cookie.encode()), (b"origin", b"http://evil.example")],
+            )
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+            return connected
+
+        self.assertFalse(async_to_sync(run)())
+
+    def test_notification_created_is_pushed_after_commit(self):
+        def create_notification():
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(recipient=self.user, title="评估完成", content="得分：8/10")
+
+        async def run():
+            communicator = WebsocketCommunicator(application, f"/ws/notifications/?token={self.token.key}")
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await database_sync_to_async(create_notification)()
+            payload = await communicator.receive_json_from(timeout=2)
+            await communicator.disconnect()
+            return payload
+
+        payload = async_to_sync(run)()
+        self.assertEqual(payload["event"], "notification")
+        self.assertEqual(payload["notification"]["title"], "评估完成")
+
+    @patch("notifications.push.push_to_user")
+    @patch("notifications.push.broadcast")
+    def test_admin_broadcast_sends_single_group_message(self, mock_broadcast, mock_push_to_user):
+        admin = User.objects.create_superuser(username="admin_bc", password="testpass123")
+        User.objects.create_user(username="other_user", password="testpass123")
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/notifications/broadcast/", {"title": "停课通知", "content": "明日停课"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Notification.objects.filter(title="停课通知").count(), User.objects.count())
+        mock_broadcast.assert_called_once()
+        self.assertEqual(mock_broadcast.call_args[0][1]["notification"]["title"], "停课通知")
+        mock_push_to_user.assert_not_called()
+
+    @patch("notifications.models.push_to_user")
+    def test_bulk_created_notifications_are_pushed_after_commit(self, mock_push_to_user):
+        other = User.objects.create_user(username="follower", password="testpass123")
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            created = Notification.objects.bulk_create([
+                Notification(recipient=user, title="关注的问题有新回复", content="有人回复了", ntype="qa_reply")
+                for user in (self.user, other)
+            ])
+            push_notifications_created(created)
+            mock_push_to_user.assert_not_called()
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual([c.args[0] for c in mock_push_to_user.call_args_list], [self.user.id, other.id])
+        self.assertEqual(mock_push_to_user.call_args.args[2]["notification"]["id"], created[1].id)
@@ -2,6 +2,7 @@ from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import Notification
+from .push import broadcast_on_commit
 from .serializers import NotificationSerializer
 from users.models import User
 
@@ -41,6 +42,10 @@ class AdminBroadcastView(APIView):
             for u in users
         ]
         Notification.objects.bulk_create(notifications)
+        # bulk_create 不经过 save()；各用户的通知内容相同，提交后一次广播即可，客户端收到后刷新列表
+        broadcast_on_commit("notification", {
+            "notification": {"id": None, "ntype": "system", "title": title, "content": content, "link": None, "is_read": False},
+        })
         
         return Response({'status': 'ok', 'count': len(notifications)})
 
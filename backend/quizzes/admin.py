@@ -1,5 +1,5 @@
 from django.contrib import admin, messages
-from .models import KnowledgePoint, Question, QuizAttempt, UserQuestionStatus, QuizExam, ExamQuestionResult
+from .models import KnowledgePoint, Question, QuizAttempt, UserQuestionStatus, QuizExam, ExamQuestionResult, FSRSWeights, GradingCacheEntry, UserQuizStats, TaskJob
 
 from ai_service import AIService 
 
@@ -46,3 +46,7 @@ admin.site.register(QuizAttempt)
 admin.site.register(UserQuestionStatus)
 admin.site.register(QuizExam)
 admin.site.register(ExamQuestionResult)
+admin.site.register(GradingCacheEntry)
+admin.site.register(FSRSWeights)
+admin.site.register(UserQuizStats)
+admin.site.register(TaskJob)
@@ -1,15 +1,25 @@
-from typing import Any, Dict, Iterable, List
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
-from django.db import transaction
+from django.conf import settings
+from django.db import connections, transaction
 from django.utils import timezone
 
 from ai_service import AIService
 from notifications.models import Notification
+from notifications.push import push_on_commit
+from quizzes import fsrs_batch
 from quizzes.fsrs import FSRS
-from quizzes.models import ExamQuestionResult, Question, QuizExam, UserQuestionStatus
+from quizzes.models import ExamQuestionResult, Question, QuizExam, UserQuestionStatus, UserQuizStats
+from quizzes.services.fsrs_tuning import get_weights_for_cohort, question_cohort
 from users.models import User
 
 
+logger = logging.getLogger(__name__)
+
+
 def _clamp_score(score: float, max_score: float) -> float:
     return max(0.0, min(float(max_score or 0), float(score or 0)))
 
@@ -27,28 +37,94 @@ def _subjective_type_label(question: Question) -> str:
     return '客观题'
 
 
-def _apply_fsrs_status(user: User, question: Question, normalized_score: float, fsrs_rating: int, review_time=None) -> UserQuestionStatus:
-    status_obj, _ = UserQuestionStatus.objects.get_or_create(user=user, question=question)
-    status_obj = FSRS.update_status(status_obj, fsrs_rating)
-    if review_time is not None:
-        status_obj.last_review = review_time
+_FSRS_STATUS_FIELDS = [
+    'stability',
+    'difficulty',
+    'reps',
+    'lapses',
+    'last_review',
+    'next_review_at',
+    'wrong_count',
+    'last_correct',
+]
 
+
+def _mark_correctness(status_obj: UserQuestionStatus, normalized_score: float) -> None:
     if normalized_score < 0.6:
         status_obj.wrong_count += 1
         status_obj.last_correct = False
     else:
         status_obj.last_correct = True
 
+
+def _update_fsrs_in_memory(status_obj: UserQuestionStatus, normalized_score: float, fsrs_rating: int, review_time=None, weights=None) -> UserQuestionStatus:
+    status_obj = FSRS.update_status(status_obj, fsrs_rating, w=weights)
+    if review_time is not None:
+        status_obj.last_review = review_time
+    _mark_correctness(status_obj, normalized_score)
+    return status_obj
+
+
+def _apply_fsrs_reviews(reviews: List[Tuple[UserQuestionStatus, float, int, Any]], review_time) -> None:
+    """
+    用 fsrs_batch.update_statuses 一次性更新整张试卷的 FSRS 状态（不落库）。
+    reviews 为 (状态, 归一化得分, 评级, 分群参数)；同一批内状态须互不相同，
+    同一题在试卷中重复出现时按出现顺序分轮应用，与逐条累积更新的结果一致。
+    """
+    rounds: List[List[Tuple[UserQuestionStatus, float, int, Any]]] = []
+    seen: Dict[int, int] = {}
+    for review in reviews:
+        occurrence = seen.get(id(review[0]), 0)
+        seen[id(review[0])] = occurrence + 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(review)
+
+    for batch in rounds:
+        fsrs_batch.update_statuses(
+            [status_obj for status_obj, _, _, _ in batch],
+            [rating for _, _, rating, _ in batch],
+            now=review_time,
+            row_weights=[weights for _, _, _, weights in batch],
+        )
+        for status_obj, normalized_score, _, _ in batch:
+            _mark_correctness(status_obj, normalized_score)
+
+
+def _apply_fsrs_status(user: User, question: Question, normalized_score: float, fsrs_rating: int, review_time=None) -> UserQuestionStatus:
+    status_obj, _ = UserQuestionStatus.objects.get_or_create(user=user, question=question)
+    weights = get_weights_for_cohort(question_cohort(question))
+    status_obj = _update_fsrs_in_memory(status_obj, normalized_score, fsrs_rating, review_time, weights=weights)
     status_obj.save()
     return status_obj
 
 
+def _load_status_map(user: User, question_ids: Iterable[int]) -> Dict[int, UserQuestionStatus]:
+    """批量取出（缺失则批量创建）用户对若干题目的 FSRS 状态，按 question_id 索引。"""
+    ids = set(question_ids)
+    status_map = {
+        s.question_id: s
+        for s in UserQuestionStatus.objects.filter(user=user, question_id__in=ids)
+    }
+    missing = ids - set(status_map)
+    if missing:
+        UserQuestionStatus.objects.bulk_create(
+            [UserQuestionStatus(user=user, question_id=q_id) for q_id in missing],
+            ignore_conflicts=True,
+        )
+        # ignore_conflicts 模式下拿不到主键，回查一次（同时兜住并发创建的行）
+        for s in UserQuestionStatus.objects.filter(user=user, question_id__in=missing):
+            status_map[s.question_id] = s
+    return status_map
+
+
 def _calc_elo_change(user_elo: int, score_ratio: float, difficulty: float) -> int:
     expected_score = 1 / (1 + 10 ** ((difficulty - user_elo) / 400))
     return int(32 * (score_ratio - expected_score))
 
 
-def grade_answer_for_user(user: User, question: Question, user_answer: Any, set_last_review: bool = True) -> Dict[str, Any]:
+def _grade_answer(question: Question, user_answer: Any) -> Dict[str, Any]:
+    """只做判分计算，不写库；可安全地在线程池中并发执行。"""
     max_score = question.get_max_score()
     grade_data = AIService.grade_question(
         question_text=question.text,
@@ -58,6 +134,7 @@ def grade_answer_for_user(user: User, question: Question, user_answer: Any, set_
         max_score=max_score,
         grading_points=question.grading_points,
         subjective_type=_subjective_type_label(question),
+        question_id=question.id,
     )
 
     score_val = _clamp_score(float(grade_data.get('score', 0)), max_score)
@@ -72,14 +149,6 @@ def grade_answer_for_user(user: User, question: Question, user_answer: Any, set_
     fsrs_rating = _safe_int(grade_data.get('fsrs_rating', 2), 2)
     fsrs_rating = min(4, max(1, fsrs_rating))
 
-    _apply_fsrs_status(
-        user=user,
-        question=question,
-        normalized_score=normalized_score,
-        fsrs_rating=fsrs_rating,
-        review_time=timezone.now() if set_last_review else None,
-    )
-
     return {
         'score': score_val,
         'max_score': max_score,
@@ -91,6 +160,20 @@ def grade_answer_for_user(user: User, question: Question, user_answer: Any, set_
     }
 
 
+def grade_answer_for_user(user: User, question: Question, user_answer: Any, set_last_review: bool = True) -> Dict[str, Any]:
+    result = _grade_answer(question, user_answer)
+
+    _apply_fsrs_status(
+        user=user,
+        question=question,
+        normalized_score=result['normalized_score'],
+        fsrs_rating=result['fsrs_rating'],
+        review_time=timezone.now() if set_last_review else None,
+    )
+
+    return result
+
+
 def grade_single_question_submission(user: User, question: Question, user_answer: Any) -> Dict[str, Any]:
     result = grade_answer_for_user(user=user, question=question, user_answer=user_answer)
 
@@ -113,35 +196,127 @@ def mark_questions_reviewed(user: User, question_ids: Iterable[int], review_time
             continue
 
 
+def _grade_answer_in_worker(question: Question, user_answer: Any) -> Dict[str, Any]:
+    try:
+        return _grade_answer(question, user_answer)
+    finally:
+        # 工作线程若意外触发了 DB 访问，需释放线程私有连接
+        connections.close_all()
+
+
+def grade_exam_items(items: List[Tuple[Question, Any]]) -> List[Union[Dict[str, Any], Exception]]:
+    """
+    并发判分：客观题本地直接比对，主观题按有界并发扇出到 LLM。
+    返回值与 items 一一对应（保持提交顺序），单题失败以异常对象占位。
+    """
+    results: List[Optional[Union[Dict[str, Any], Exception]]] = [None] * len(items)
+    subjective_indexes: List[int] = []
+
+    for idx, (question, user_answer) in enumerate(items):
+        if question.q_type == 'objective':
+            try:
+                results[idx] = _grade_answer(question, user_answer)
+            except Exception as exc:  # noqa: BLE001
+                results[idx] = exc
+        else:
+            subjective_indexes.append(idx)
+
+    if subjective_indexes:
+        max_concurrency = max(1, int(getattr(settings, 'QUIZ_EXAM_GRADING_CONCURRENCY', 4) or 4))
+        workers = min(max_concurrency, len(subjective_indexes))
+        logger.info(
+            "quizzes.exam_grading dispatch: total=%s subjective=%s workers=%s",
+            len(items),
+            len(subjective_indexes),
+            workers,
+        )
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            future_map = {
+                # 复制上下文，工作线程中的 LLM 调用仍计入提交者的 token 台账
+                executor.submit(
+                    contextvars.copy_context().run, _grade_answer_in_worker, items[idx][0], items[idx][1]
+                ): idx
+                for idx in subjective_indexes
+            }
+            for future in as_completed(future_map):
+                idx = future_map[future]
+                try:
+                    results[idx] = future.result()
+                except Exception as exc:  # noqa: BLE001
+                    logger.exception("quizzes.exam_grading item failed: question_id=%s", items[idx][0].id)
+                    results[idx] = exc
+
+    return [item if item is not None else RuntimeError('grading_skipped') for item in results]
+
+
 def run_exam_grading(user_id: int, exam_id: int, questions_data: List[Dict[str, Any]]):
     user = User.objects.filter(id=user_id).first()
     exam = QuizExam.objects.filter(id=exam_id).first()
     if not user or not exam:
         return
+    # 回收器可能重新派发判分任务；结果已落库说明上次执行已完成
+    if ExamQuestionResult.objects.filter(exam=exam).exists():
+        return
 
     total_score = 0.0
     max_total_score = 0.0
     total_difficulty = 0.0
     question_count = 0
 
+    question_map = Question.objects.select_related('knowledge_point').in_bulk(
+        [item.get('question_id') for item in questions_data if item.get('question_id') is not None]
+    )
+    items: List[Tuple[Question, Any]] = []
     for item in questions_data:
-        q_id = item.get('question_id')
-        user_answer = item.get('answer')
-
-        question = Question.objects.filter(id=q_id).first()
+        question = question_map.get(_safe_int(item.get('question_id'), 0))
         if not question:
             continue
+        items.append((question, item.get('answer')))
 
-        max_score = question.get_max_score()
-        max_total_score += max_score
-        total_difficulty += float(question.difficulty or 1000)
-        question_count += 1
+    graded_items = grade_exam_items(items)
+    review_time = timezone.now()
 
-        try:
-            graded = grade_answer_for_user(user=user, question=question, user_answer=user_answer)
+    exam_results: List[ExamQuestionResult] = []
+    touched_statuses: Dict[int, UserQuestionStatus] = {}
+    reviews: List[Tuple[UserQuestionStatus, float, int, Any]] = []
+
+    with transaction.atomic():
+        status_map = _load_status_map(
+            user,
+            [question.id for (question, _), graded in zip(items, graded_items) if not isinstance(graded, Exception)],
+        )
+
+        for (question, user_answer), graded in zip(items, graded_items):
+            max_score = question.get_max_score()
+            max_total_score += max_score
+            total_difficulty += float(question.difficulty or 1000)
+            question_count += 1
+
+            if isinstance(graded, Exception):
+                exam_results.append(ExamQuestionResult(
+                    exam=exam,
+                    question=question,
+                    user_answer=user_answer or '',
+                    score=0,
+                    max_score=max_score,
+                    feedback='评分服务异常',
+                    analysis=f'错误详情: {str(graded)}',
+                    is_correct=False,
+                ))
+                continue
+
+            status_obj = status_map.get(question.id)
+            if status_obj is not None:
+                touched_statuses[question.id] = status_obj
+                reviews.append((
+                    status_obj,
+                    graded['normalized_score'],
+                    graded['fsrs_rating'],
+                    get_weights_for_cohort(question_cohort(question)),
+                ))
             total_score += graded['score']
 
-            ExamQuestionResult.objects.create(
+            exam_results.append(ExamQuestionResult(
                 exam=exam,
                 question=question,
                 user_answer=user_answer or '',
@@ -150,18 +325,14 @@ def run_exam_grading(user_id: int, exam_id: int, questions_data: List[Dict[str,
                 feedback=graded['feedback'],
                 analysis=graded['analysis'],
                 is_correct=graded['is_correct'],
-            )
-        except Exception as exc:
-            ExamQuestionResult.objects.create(
-                exam=exam,
-                question=question,
-                user_answer=user_answer or '',
-                score=0,
-                max_score=max_score,
-                feedback='评分服务异常',
-                analysis=f'错误详情: {str(exc)}',
-                is_correct=False,
-            )
+            ))
+
+        if touched_statuses:
+            _apply_fsrs_reviews(reviews, review_time)
+            UserQuestionStatus.objects.bulk_update(list(touched_statuses.values()), _FSRS_STATUS_FIELDS)
+            UserQuizStats.mark_dirty(user.id)
+        if exam_results:
+            ExamQuestionResult.objects.bulk_create(exam_results)
 
     avg_score = total_score / max_total_score if max_total_score > 0 else 0
     avg_difficulty = total_difficulty / question_count if question_count > 0 else 1000
@@ -189,20 +360,24 @@ def run_exam_grading(user_id: int, exam_id: int, questions_data: List[Dict[str,
         content=content,
         link=f'/tests?action=view_report&exam_id={exam.id}',
     )
+    push_on_commit(user.id, 'exam_graded', {
+        'exam_id': exam.id,
+        'total_score': total_score,
+        'max_score': max_total_score,
+        'elo_change': elo_change,
+        'elo_score': user.elo_score,
+    })
 
 
 def save_confirmed_questions(questions_data: List[Dict[str, Any]]) -> int:
+    from quizzes.services.question_import import build_question_fields
+
     created_count = 0
 
     with transaction.atomic():
         for q_data in questions_data:
-            q_type, subjective_type = AIService.normalize_question_type(
-                q_data.get('q_type') or q_data.get('type'),
-                q_data.get('subjective_type'),
-            )
-
-            text = str(q_data.get('question') or q_data.get('text') or '').strip()
-            if not text:
+            fields = build_question_fields(q_data)
+            if not fields['text']:
                 continue
 
             kp_id = q_data.get('kp_id') or q_data.get('knowledge_point_id')
@@ -211,31 +386,7 @@ def save_confirmed_questions(questions_data: List[Dict[str, Any]]) -> int:
             except Exception:
                 kp_id = None
 
-            options = AIService.normalize_options(q_data.get('options')) if q_type == 'objective' else {}
-            answer = q_data.get('answer') or q_data.get('correct_answer') or ''
-            if q_type == 'objective':
-                answer = AIService.normalize_objective_answer(answer, options)
-
-            difficulty_level = AIService.normalize_difficulty_level(
-                q_data.get('difficulty_level'), q_data.get('difficulty')
-            )
-
-            if q_type == 'objective':
-                grading_points = '无'
-            else:
-                grading_points = str(q_data.get('grading_points') or '').strip() or AIService.default_grading_points(subjective_type)
-
-            Question.objects.create(
-                knowledge_point_id=kp_id,
-                text=text,
-                q_type=q_type,
-                subjective_type=subjective_type if q_type == 'subjective' else None,
-                options=options if q_type == 'objective' else {},
-                correct_answer=str(answer).strip(),
-                grading_points=grading_points,
-                ai_answer='',
-                difficulty_level=difficulty_level,
-            )
+            Question.objects.create(knowledge_point_id=kp_id, ai_answer='', **fields)
             created_count += 1
 
     return created_count
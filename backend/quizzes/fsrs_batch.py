@@ -0,0 +1,272 @@
+"""
+FSRS 批量（NumPy 向量化）实现与离线参数拟合。
+
+与 quizzes.fsrs.FSRS.update_status 逐条更新的公式保持一致，用于：
+1. 试卷判分后一次性更新整张试卷的复习状态；
+2. 按需批量估算当前留存率 R（不落库，由 stability/last_review 现算）；
+3. 基于历史作答序列按分群拟合 w 参数。
+"""
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.utils import timezone
+
+from quizzes.fsrs import FSRS
+
+
+DEFAULT_WEIGHTS = np.asarray(FSRS.w, dtype=float)
+
+# 拟合时的参数取值范围；w15/w16（Hard 惩罚/Easy 奖励）当前调度未使用，固定为默认值
+WEIGHT_LOWER = np.array([0.1, 0.1, 0.1, 0.1, 1.0, 0.1, 0.1, 0.0, 0.0, 0.0, 0.01, 0.1, 0.01, 0.01, 0.01, 0.0, 1.0])
+WEIGHT_UPPER = np.array([100.0, 100.0, 100.0, 100.0, 10.0, 4.0, 4.0, 0.5, 3.0, 0.8, 2.5, 5.0, 0.2, 0.9, 3.0, 1.0, 6.0])
+FITTED_WEIGHT_COUNT = 15
+
+_MIN_STABILITY = 0.01
+
+
+def _as_weights(w: Optional[Sequence[float]]) -> np.ndarray:
+    if w is None:
+        return DEFAULT_WEIGHTS
+    arr = np.asarray(w, dtype=float)
+    if arr.shape[-1] != DEFAULT_WEIGHTS.shape[0]:
+        raise ValueError(f'FSRS weights must have {DEFAULT_WEIGHTS.shape[0]} items, got {arr.shape[-1]}')
+    return arr
+
+
+def retrievability(stability, elapsed_days) -> np.ndarray:
+    """R(t) = (1 + F * t / S) ^ -0.5，S<=0（未学习）时视为 0。"""
+    s = np.asarray(stability, dtype=float)
+    t = np.maximum(np.asarray(elapsed_days, dtype=float), 0.0)
+    safe_s = np.where(s > 0, s, 1.0)
+    r = np.power(1.0 + FSRS.F * t / safe_s, -0.5)
+    return np.where(s > 0, r, 0.0)
+
+
+def next_interval_days(stability, desired_retention: float = 0.9) -> np.ndarray:
+    """反解遗忘曲线：I = S / F * (R^-2 - 1)，取整且至少 1 天；R=0.9 时 I = S。"""
+    s = np.asarray(stability, dtype=float)
+    factor = (desired_retention ** -2 - 1.0) / FSRS.F
+    return np.maximum(1, np.round(s * factor)).astype(int)
+
+
+def apply_reviews(stability, difficulty, reps, lapses, elapsed_days, ratings, w=None) -> Dict[str, np.ndarray]:
+    """
+    对一批状态同时应用一次复习。
+    w 可以是 (17,) 的公共参数，也可以是 (N, 17) 的逐行参数（不同分群混排）。
+    返回新的 stability/difficulty/reps/lapses/interval_days 数组。
+    """
+    w = _as_weights(w)
+    s = np.asarray(stability, dtype=float)
+    d = np.asarray(difficulty, dtype=float)
+    reps = np.asarray(reps, dtype=int)
+    lapses = np.asarray(lapses, dtype=int)
+    t = np.maximum(np.asarray(elapsed_days, dtype=float), 0.0)
+    rating = np.clip(np.asarray(ratings, dtype=int), 1, 4)
+
+    def col(i):
+        return w[..., i]
+
+    is_new = reps == 0
+
+    # === 初始学习 ===
+    init_s = np.take_along_axis(w, (rating - 1)[:, None], axis=1)[:, 0] if w.ndim == 2 else w[rating - 1]
+    init_d = np.clip(col(4) - (rating - 3) * col(5), 1, 10)
+
+    # === 复习 ===
+    safe_s = np.maximum(s, _MIN_STABILITY)
+    r = np.power(1.0 + FSRS.F * t / safe_s, -0.5)
+    review_d = d - col(6) * (rating - 3)
+    review_d = np.clip(col(7) * col(4) + (1 - col(7)) * review_d, 1, 10)
+    forget_s = col(11) * np.power(review_d, -col(12)) * (np.power(safe_s + 1, col(13)) - 1) * np.exp(col(14) * (1 - r))
+    recall_s = safe_s * (1 + np.exp(col(8)) * (11 - review_d) * np.power(safe_s, -col(9)) * (np.exp(col(10) * (1 - r)) - 1))
+    review_s = np.where(rating == 1, forget_s, recall_s)
+
+    new_s = np.where(is_new, init_s, review_s)
+    new_d = np.where(is_new, init_d, review_d)
+    new_reps = reps + 1
+    new_lapses = lapses + ((~is_new) & (rating == 1)).astype(int)
+
+    return {
+        'stability': new_s,
+        'difficulty': new_d,
+        'reps': new_reps,
+        'lapses': new_lapses,
+        'interval_days': next_interval_days(new_s),
+    }
+
+
+def update_statuses(
+    statuses: Sequence[Any],
+    ratings: Sequence[int],
+    now=None,
+    weights: Optional[Sequence[float]] = None,
+    row_weights: Optional[Sequence[Optional[Sequence[float]]]] = None,
+) -> List[Any]:
+    """
+    FSRS.update_status 的批量版本：一次性更新多个（互不相同的）状态对象，不落库。
+    weights 为公共参数；row_weights 与 statuses 等长，逐行指定参数（None 表示默认参数）。
+    """
+    if not statuses:
+        return []
+    now = now or timezone.now()
+    elapsed = [
+        max(0, (now - (st.last_review or now)).days) if st.reps else 0
+        for st in statuses
+    ]
+    w = weights
+    if row_weights is not None:
+        w = np.asarray([list(x) if x else FSRS.w for x in row_weights], dtype=float)
+
+    out = apply_reviews(
+        stability=[st.stability for st in statuses],
+        difficulty=[st.difficulty for st in statuses],
+        reps=[st.reps for st in statuses],
+        lapses=[st.lapses for st in statuses],
+        elapsed_days=elapsed,
+        ratings=ratings,
+        w=w,
+    )
+    for i, st in enumerate(statuses):
+        st.stability = float(out['stability'][i])
+        st.difficulty = float(out['difficulty'][i])
+        st.reps = int(out['reps'][i])
+        st.lapses = int(out['lapses'][i])
+        st.last_review = now
+        st.next_review_at = now + timedelta(days=int(out['interval_days'][i]))
+    return list(statuses)
+
+
+# ---------------------------------------------------------------------------
+# 离线拟合
+# ---------------------------------------------------------------------------
+
+def build_review_tensor(sequences: Iterable[Sequence[Tuple[float, int]]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    把若干条复习序列 [(距上次复习天数, 评级), ...] 对齐为 (N, T) 的矩阵与掩码。
+    每条序列的第一项为首次学习，其间隔被忽略。
+    """
+    seqs = [list(seq) for seq in sequences if seq]
+    n = len(seqs)
+    width = max((len(seq) for seq in seqs), default=0)
+    t = np.zeros((n, width), dtype=float)
+    r = np.full((n, width), 3, dtype=int)
+    mask = np.zeros((n, width), dtype=bool)
+    for i, seq in enumerate(seqs):
+        k = len(seq)
+        t[i, :k] = [max(0.0, float(x[0])) for x in seq]
+        r[i, :k] = [min(4, max(1, int(x[1]))) for x in seq]
+        mask[i, :k] = True
+    return t, r, mask
+
+
+def replay_log_loss(w, t: np.ndarray, r: np.ndarray, mask: np.ndarray) -> Tuple[float, int]:
+    """
+    按时间步并行回放所有序列：每一步先用当前状态预测 R，与实际是否记住（评级>1）比对计算对数损失，
+    再按实际评级更新状态。间隔不足 1 天的复习只更新状态、不计入损失（长期记忆模型不刻画当日重复）。
+    """
+    w = _as_weights(w)
+    if mask.size == 0:
+        return 0.0, 0
+
+    r0 = r[:, 0]
+    s = w[r0 - 1]
+    d = np.clip(w[4] - (r0 - 3) * w[5], 1, 10)
+
+    loss_sum = 0.0
+    count = 0
+    for k in range(1, mask.shape[1]):
+        m = mask[:, k]
+        if not m.any():
+            break
+        tk = t[:, k]
+        rk = r[:, k]
+        pred = np.power(1.0 + FSRS.F * tk / s, -0.5)
+
+        scored = m & (tk >= 1)
+        if scored.any():
+            p = np.clip(pred[scored], 1e-6, 1 - 1e-6)
+            y = (rk[scored] > 1).astype(float)
+            loss_sum += float(-(y * np.log(p) + (1 - y) * np.log(1 - p)).sum())
+            count += int(scored.sum())
+
+        new_d = np.clip(w[7] * w[4] + (1 - w[7]) * (d - w[6] * (rk - 3)), 1, 10)
+        forget_s = w[11] * np.power(new_d, -w[12]) * (np.power(s + 1, w[13]) - 1) * np.exp(w[14] * (1 - pred))
+        recall_s = s * (1 + np.exp(w[8]) * (11 - new_d) * np.power(s, -w[9]) * (np.exp(w[10] * (1 - pred)) - 1))
+        new_s = np.maximum(np.where(rk == 1, forget_s, recall_s), _MIN_STABILITY)
+
+        s = np.where(m, new_s, s)
+        d = np.where(m, new_d, d)
+
+    if not count:
+        return 0.0, 0
+    return loss_sum / count, count
+
+
+def fit_weights(
+    sequences: Iterable[Sequence[Tuple[float, int]]],
+    initial: Optional[Sequence[float]] = None,
+    iterations: int = 200,
+    learning_rate: float = 0.05,
+    prior_strength: float = 0.01,
+) -> Dict[str, Any]:
+    """
+    以默认参数为先验，用投影 Adam + 有限差分梯度最小化回放对数损失。
+    返回 {'weights', 'log_loss', 'baseline_log_loss', 'sample_size', 'improved'}。
+    """
+    t, r, mask = build_review_tensor(sequences)
+    w0 = np.clip(_as_weights(initial).copy(), WEIGHT_LOWER, WEIGHT_UPPER)
+    baseline, sample_size = replay_log_loss(DEFAULT_WEIGHTS, t, r, mask)
+    if not sample_size:
+        return {
+            'weights': [float(x) for x in w0],
+            'log_loss': 0.0,
+            'baseline_log_loss': 0.0,
+            'sample_size': 0,
+            'improved': False,
+        }
+
+    scale = np.maximum(np.abs(DEFAULT_WEIGHTS), 0.1)
+
+    def objective(w):
+        loss, _ = replay_log_loss(w, t, r, mask)
+        prior = prior_strength * float(np.mean(((w[:FITTED_WEIGHT_COUNT] - DEFAULT_WEIGHTS[:FITTED_WEIGHT_COUNT]) / scale[:FITTED_WEIGHT_COUNT]) ** 2))
+        return loss + prior
+
+    w = w0.copy()
+    best_w, best_obj = w.copy(), objective(w)
+    m1 = np.zeros(FITTED_WEIGHT_COUNT)
+    m2 = np.zeros(FITTED_WEIGHT_COUNT)
+    beta1, beta2 = 0.9, 0.999
+
+    for step in range(1, max(1, iterations) + 1):
+        current = objective(w)
+        grad = np.zeros(FITTED_WEIGHT_COUNT)
+        for i in range(FITTED_WEIGHT_COUNT):
+            eps = 1e-4 * scale[i]
+            probe = w.copy()
+            probe[i] = min(WEIGHT_UPPER[i], probe[i] + eps)
+            step_size = probe[i] - w[i]
+            if step_size <= 0:
+                probe[i] = max(WEIGHT_LOWER[i], w[i] - eps)
+                step_size = probe[i] - w[i]
+            if step_size:
+                grad[i] = (objective(probe) - current) / step_size
+
+        m1 = beta1 * m1 + (1 - beta1) * grad
+        m2 = beta2 * m2 + (1 - beta2) * grad ** 2
+        update = learning_rate * scale[:FITTED_WEIGHT_COUNT] * (m1 / (1 - beta1 ** step)) / (np.sqrt(m2 / (1 - beta2 ** step)) + 1e-8)
+        w[:FITTED_WEIGHT_COUNT] = np.clip(w[:FITTED_WEIGHT_COUNT] - update, WEIGHT_LOWER[:FITTED_WEIGHT_COUNT], WEIGHT_UPPER[:FITTED_WEIGHT_COUNT])
+
+        obj = objective(w)
+        if obj < best_obj:
+            best_w, best_obj = w.copy(), obj
+
+    log_loss, _ = replay_log_loss(best_w, t, r, mask)
+    return {
+        'weights': [float(x) for x in best_w],
+        'log_loss': float(log_loss),
+        'baseline_log_loss': float(baseline),
+        'sample_size': int(sample_size),
+        'improved': bool(log_loss < baseline),
+    }
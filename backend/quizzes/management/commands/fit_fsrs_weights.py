@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from quizzes.services.fsrs_tuning import fit_cohort_weights
+
+
+class Command(BaseCommand):
+    help = '基于考试作答历史按学科前缀分群拟合 FSRS 参数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cohort', action='append', dest='cohorts', help='只拟合指定分群（可多次传入），默认全部分群 + 全局')
+        parser.add_argument('--min-reviews', type=int, default=getattr(settings, 'QUIZ_FSRS_FIT_MIN_REVIEWS', 200), help='分群最少复习样本数')
+        parser.add_argument('--iterations', type=int, default=200, help='优化迭代次数')
+        parser.add_argument('--dry-run', action='store_true', help='只输出拟合结果，不写入数据库')
+
+    def handle(self, *args, **kwargs):
+        summaries = fit_cohort_weights(
+            cohorts=kwargs.get('cohorts'),
+            min_reviews=max(1, kwargs['min_reviews']),
+            dry_run=kwargs['dry_run'],
+            iterations=max(1, kwargs['iterations']),
+        )
+        if not summaries:
+            self.stdout.write(self.style.WARNING('没有可用的作答历史。'))
+            return
+
+        for item in summaries:
+            line = (
+                f"[{item['cohort'] or 'global'}] n={item['sample_size']} "
+                f"loss={item['log_loss']:.4f} baseline={item['baseline_log_loss']:.4f}"
+            )
+            if item['saved']:
+                self.stdout.write(self.style.SUCCESS(f'{line} 已保存'))
+            else:
+                self.stdout.write(f"{line} 跳过（{item.get('skipped', 'dry_run')}）")
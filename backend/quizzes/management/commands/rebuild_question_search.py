@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from quizzes.services.question_search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = '全量重建题库全文检索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='每批索引的题目数')
+
+    def handle(self, *args, **kwargs):
+        backend = get_backend()
+        count = rebuild_index(chunk_size=max(1, kwargs['chunk_size']))
+        self.stdout.write(self.style.SUCCESS(f'已使用 {backend.name} 后端重建 {count} 道题目的索引。'))
@@ -0,0 +1,45 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quizzes", "0012_remove_knowledgepoint_structural_data_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GradingCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cache_key", models.CharField(max_length=64, unique=True)),
+                (
+                    "result",
+                    models.JSONField(
+                        help_text="判分结果 score/feedback/analysis/fsrs_rating"
+                    ),
+                ),
+                ("hit_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("last_hit_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "question",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="grading_cache_entries",
+                        to="quizzes.question",
+                    ),
+                ),
+            ],
+        ),
+    ]
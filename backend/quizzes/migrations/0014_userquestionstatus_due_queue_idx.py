@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quizzes", "0013_gradingcacheentry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userquestionstatus",
+            index=models.Index(
+                fields=["user", "is_mastered", "next_review_at"],
+                name="quizzes_uqs_due_queue_idx",
+            ),
+        ),
+    ]
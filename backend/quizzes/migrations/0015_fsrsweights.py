@@ -0,0 +1,55 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quizzes", "0014_userquestionstatus_due_queue_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FSRSWeights",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "cohort",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=20,
+                        unique=True,
+                        verbose_name="分群",
+                    ),
+                ),
+                ("weights", models.JSONField(help_text="FSRS w 参数（17 个）")),
+                (
+                    "sample_size",
+                    models.IntegerField(default=0, help_text="参与拟合的复习次数"),
+                ),
+                (
+                    "log_loss",
+                    models.FloatField(
+                        default=0.0, help_text="拟合参数在历史上的对数损失"
+                    ),
+                ),
+                (
+                    "baseline_log_loss",
+                    models.FloatField(
+                        default=0.0, help_text="默认参数在同一历史上的对数损失"
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                ("fitted_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quizzes", "0015_fsrsweights"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserQuizStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "review_count",
+                    models.IntegerField(default=0, help_text="已到期待复习题数"),
+                ),
+                (
+                    "at_risk_count",
+                    models.IntegerField(
+                        default=0, help_text="3 天内到期且稳定性 < 7 天的题数"
+                    ),
+                ),
+                (
+                    "attempted_count",
+                    models.IntegerField(default=0, help_text="有作答状态的题数"),
+                ),
+                ("is_dirty", models.BooleanField(default=True)),
+                ("computed_at", models.DateTimeField(blank=True, null=True)),
+                ("valid_until", models.DateTimeField(blank=True, null=True)),
+                (
+                    "last_reminder_date",
+                    models.DateField(
+                        blank=True, help_text="最近一次发送复习提醒的日期", null=True
+                    ),
+                ),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="quiz_stats",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,154 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:56
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = "quizzes_question_fts"
+PG_INDEX = "quizzes_questionsearchdocument_tokens_gin"
+
+# 迁移时的分词规则快照：之后修改 quizzes.services.question_search.tokenize 不影响本迁移的回填结果
+_CJK_RANGES = (
+    (0x3040, 0x30FF),
+    (0x3400, 0x4DBF),
+    (0x4E00, 0x9FFF),
+    (0xAC00, 0xD7AF),
+    (0xF900, 0xFAFF),
+    (0x20000, 0x2FA1F),
+)
+_WORD_RE = re.compile(r"[0-9a-z]+")
+
+
+def _is_cjk(ch):
+    code = ord(ch)
+    return any(lo <= code <= hi for lo, hi in _CJK_RANGES)
+
+
+def _runs(text):
+    text = unicodedata.normalize("NFKC", str(text or "")).lower()
+    buf = []
+    buf_cjk = False
+    for ch in text:
+        cjk = _is_cjk(ch)
+        if cjk or ch.isalnum():
+            if buf and cjk != buf_cjk:
+                yield buf_cjk, "".join(buf)
+                buf = []
+            buf_cjk = cjk
+            buf.append(ch)
+        elif buf:
+            yield buf_cjk, "".join(buf)
+            buf = []
+    if buf:
+        yield buf_cjk, "".join(buf)
+
+
+def tokenize(text):
+    tokens = []
+    for is_cjk, run in _runs(text):
+        if not is_cjk:
+            tokens.extend(_WORD_RE.findall(run) or [run])
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        tokens.extend(run)
+    return tokens
+
+
+def create_search_backend(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(tokens, tokenize='unicode61')"
+            )
+        except Exception:
+            # SQLite 未编译 FTS5 时退回纯 Python 检索
+            return
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON quizzes_questionsearchdocument "
+            "USING GIN (to_tsvector('simple', tokens))"
+        )
+
+
+def drop_search_backend(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+
+
+def backfill_documents(apps, schema_editor):
+    Question = apps.get_model("quizzes", "Question")
+    QuestionSearchDocument = apps.get_model("quizzes", "QuestionSearchDocument")
+    has_fts = False
+    if schema_editor.connection.vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=%s",
+                [FTS_TABLE],
+            )
+            has_fts = cursor.fetchone() is not None
+
+    batch = []
+    qs = Question.objects.select_related("knowledge_point").order_by("id")
+    for question in qs.iterator(chunk_size=500):
+        kp_name = question.knowledge_point.name if question.knowledge_point_id else ""
+        tokens = " ".join(
+            tokenize(" ".join([question.text, question.correct_answer or "", kp_name]))
+        )
+        batch.append((question.id, tokens))
+        if len(batch) >= 500:
+            _write_batch(schema_editor, QuestionSearchDocument, batch, has_fts)
+            batch = []
+    _write_batch(schema_editor, QuestionSearchDocument, batch, has_fts)
+
+
+def _write_batch(schema_editor, QuestionSearchDocument, batch, has_fts):
+    if not batch:
+        return
+    QuestionSearchDocument.objects.bulk_create(
+        [
+            QuestionSearchDocument(question_id=qid, tokens=tokens)
+            for qid, tokens in batch
+        ]
+    )
+    if has_fts:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE}(rowid, tokens) VALUES (%s, %s)", batch
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quizzes", "0016_userquizstats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestionSearchDocument",
+            fields=[
+                (
+                    "question",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="quizzes.question",
+                    ),
+                ),
+                ("tokens", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_backend, drop_search_backend),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quizzes", "0017_questionsearchdocument"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="quizzes_q_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                fields=["knowledge_point", "-created_at", "-id"],
+                name="quizzes_q_kp_created_id_idx",
+            ),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 
 class KnowledgePoint(models.Model):
@@ -22,11 +22,49 @@ class KnowledgePoint(models.Model):
             parts = self.code.split('-')
             if len(parts) > 1:
                 self.prefix_category = parts[0].strip().upper()
+        old_name = None
+        if self.pk:
+            old_name = KnowledgePoint.objects.filter(pk=self.pk).values_list('name', flat=True).first()
         super().save(*args, **kwargs)
+        _knowledge_tree_changed()
+        if old_name is not None and old_name != self.name:
+            # 知识点名称参与题目检索，改名后重建其下题目的索引
+            from quizzes.services.question_search import reindex_knowledge_point
+            reindex_knowledge_point(self.pk)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        _knowledge_tree_changed()
+        return result
 
     def __str__(self):
         return f"[{self.code}] {self.name}" if self.code else self.name
 
+def _knowledge_tree_changed():
+    # 事务内提前换代会让并发请求把旧数据按新版本号写回缓存，提交后再换代
+    from quizzes.services.knowledge_tree import bump_tree_version
+    transaction.on_commit(bump_tree_version)
+
+def _question_bank_changed(count_changed=True):
+    from quizzes.services.question_listing import bump_list_version
+    from quizzes.services.quiz_stats import invalidate_question_total
+    transaction.on_commit(bump_list_version)
+    if count_changed:
+        transaction.on_commit(invalidate_question_total)
+
+def questions_bulk_written(questions, created=True):
+    """bulk_create / bulk_update 绕过了 Question.save，批量写入后由调用方补做同样的失效与索引。"""
+    questions = [q for q in questions if q.pk]
+    if not questions:
+        return
+    if not created:
+        # 题目被编辑后，历史判分缓存全部作废
+        GradingCacheEntry.objects.filter(question_id__in=[q.pk for q in questions]).delete()
+    _question_bank_changed(count_changed=created)
+    _knowledge_tree_changed()
+    from quizzes.services.question_search import index_questions
+    index_questions(questions)
+
 class Question(models.Model):
     QUESTION_TYPES = (
         ('objective', '客观题'),
@@ -65,11 +103,43 @@ class Question(models.Model):
     difficulty = models.IntegerField(default=1200, help_text="基准 ELO 分值")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # 参与全文检索的字段，仅这些字段变化时才重建索引
+    SEARCH_FIELDS = {'text', 'correct_answer', 'knowledge_point', 'knowledge_point_id'}
+
+    class Meta:
+        indexes = [
+            # 管理端列表按 (created_at, id) 键集分页
+            models.Index(fields=['-created_at', '-id'], name='quizzes_q_created_id_idx'),
+            models.Index(fields=['knowledge_point', '-created_at', '-id'], name='quizzes_q_kp_created_id_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # 自动同步标签到分值 (如果难度分值为默认或未手动指定，则根据级别映射)
         if self.difficulty_level and (self._state.adding or self.difficulty == 1200):
             self.difficulty = self.DIFFICULTY_MAP.get(self.difficulty_level, 1200)
+        is_update = not self._state.adding
         super().save(*args, **kwargs)
+        if is_update:
+            # 题目被编辑后，历史判分缓存全部作废
+            GradingCacheEntry.objects.filter(question_id=self.pk).delete()
+        _question_bank_changed(count_changed=not is_update)
+
+        update_fields = kwargs.get('update_fields')
+        if not is_update or update_fields is None or set(update_fields) & {'knowledge_point', 'knowledge_point_id'}:
+            # 题目数按知识点聚合展示在知识树上
+            _knowledge_tree_changed()
+        if update_fields is None or set(update_fields) & self.SEARCH_FIELDS:
+            from quizzes.services.question_search import index_question
+            index_question(self)
+
+    def delete(self, *args, **kwargs):
+        question_id = self.pk
+        result = super().delete(*args, **kwargs)
+        _question_bank_changed()
+        _knowledge_tree_changed()
+        from quizzes.services.question_search import remove_questions
+        remove_questions([question_id])
+        return result
 
     def get_max_score(self):
         if self.q_type == 'objective': return 10
@@ -88,6 +158,12 @@ class QuizAttempt(models.Model):
     is_initial_placement = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+class QuestionSearchDocument(models.Model):
+    """题目检索文档：规范化后的词元（CJK 二元组 + 单字、拉丁词），空格分隔。"""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    tokens = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
 class UserQuestionStatus(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
@@ -105,8 +181,41 @@ class UserQuestionStatus(models.Model):
     next_review_at = models.DateTimeField(auto_now_add=True)
     last_correct = models.BooleanField(default=False)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        UserQuizStats.mark_dirty(self.user_id)
+
+    def delete(self, *args, **kwargs):
+        user_id = self.user_id
+        result = super().delete(*args, **kwargs)
+        UserQuizStats.mark_dirty(user_id)
+        return result
+
     class Meta:
         unique_together = ('user', 'question')
+        indexes = [
+            # 到期复习队列：按 (user, is_mastered) 定位后沿 next_review_at 有序扫描
+            models.Index(fields=['user', 'is_mastered', 'next_review_at'], name='quizzes_uqs_due_queue_idx'),
+        ]
+
+class UserQuizStats(models.Model):
+    """
+    练习看板统计的物化结果：作答事件置脏，读取时按需重算；
+    valid_until 记录“仅因时间推移”计数会变化的最早时刻，过期后同样重算。
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_stats')
+    review_count = models.IntegerField(default=0, help_text="已到期待复习题数")
+    at_risk_count = models.IntegerField(default=0, help_text="3 天内到期且稳定性 < 7 天的题数")
+    attempted_count = models.IntegerField(default=0, help_text="有作答状态的题数")
+    is_dirty = models.BooleanField(default=True)
+    computed_at = models.DateTimeField(null=True, blank=True)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    last_reminder_date = models.DateField(null=True, blank=True, help_text="最近一次发送复习提醒的日期")
+
+    @classmethod
+    def mark_dirty(cls, user_id):
+        if user_id:
+            cls.objects.filter(user_id=user_id, is_dirty=False).update(is_dirty=True)
 
 class QuizExam(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='exams')
@@ -128,3 +237,64 @@ class ExamQuestionResult(models.Model):
     feedback = models.TextField(blank=True)
     analysis = models.TextField(blank=True, help_text="思维链分析")
     is_correct = models.BooleanField(default=False)
+
+class FSRSWeights(models.Model):
+    """按学科前缀（KnowledgePoint.prefix_category）分群离线拟合的 FSRS 参数，空字符串为全局参数。"""
+    cohort = models.CharField(max_length=20, unique=True, blank=True, default='', verbose_name="分群")
+    weights = models.JSONField(help_text="FSRS w 参数（17 个）")
+    sample_size = models.IntegerField(default=0, help_text="参与拟合的复习次数")
+    log_loss = models.FloatField(default=0.0, help_text="拟合参数在历史上的对数损失")
+    baseline_log_loss = models.FloatField(default=0.0, help_text="默认参数在同一历史上的对数损失")
+    is_active = models.BooleanField(default=True)
+    fitted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"FSRS[{self.cohort or 'global'}] n={self.sample_size}"
+
+class GradingCacheEntry(models.Model):
+    """主观题判分结果缓存：按 (题目内容, 归一化作答, 判分模板) 的哈希寻址。"""
+    cache_key = models.CharField(max_length=64, unique=True)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='grading_cache_entries')
+    result = models.JSONField(help_text="判分结果 score/feedback/analysis/fsrs_rating")
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+class TaskJob(models.Model):
+    """
+    后台任务的持久化状态（AI 解析、试卷判分、表格导入），多进程共享且重启不丢；
+    payload 保存重新派发所需的参数，heartbeat_at 用于识别执行进程已退出的任务。
+    """
+    KIND_CHOICES = (
+        ('parse', 'AI 解析'),
+        ('grading', '试卷判分'),
+        ('import', '题目导入'),
+    )
+    STATUS_CHOICES = (
+        ('pending', '排队中'),
+        ('processing', '处理中'),
+        ('completed', '已完成'),
+        ('failed', '失败'),
+    )
+
+    task_id = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    progress = models.CharField(max_length=50, blank=True, default='')
+    result = models.JSONField(default=dict, blank=True, help_text="阶段性或最终结果")
+    payload = models.JSONField(default=dict, blank=True, help_text="重新派发所需参数")
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='task_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'heartbeat_at'], name='quizzes_job_status_hb_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.task_id} ({self.status})"
@@ -1,6 +1,14 @@
+from django.db import models
 from rest_framework import serializers
 from .models import Question, QuizAttempt, KnowledgePoint, UserQuestionStatus, QuizExam, ExamQuestionResult
 from users.serializers import UserSerializer
+from .services.status_lookup import get_status_lookup
+
+class KnowledgePointFlatSerializer(serializers.ModelSerializer):
+    """不带子节点与题数的扁平知识点，用于嵌套展示与整树缓存拼装。"""
+    class Meta:
+        model = KnowledgePoint
+        fields = '__all__'
 
 class KnowledgePointSerializer(serializers.ModelSerializer):
     questions_count = serializers.IntegerField(source='questions.count', read_only=True)
@@ -16,8 +24,19 @@ class KnowledgePointSerializer(serializers.ModelSerializer):
             return KnowledgePointSerializer(obj.children.all(), many=True, context=self.context).data
         return []
 
+def _as_list(data):
+    return list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+
+class QuestionListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = _as_list(data)
+        lookup = get_status_lookup(self.context)
+        if lookup is not None:
+            lookup.load(item.pk for item in items)
+        return super().to_representation(items)
+
 class QuestionSerializer(serializers.ModelSerializer):
-    knowledge_point_detail = KnowledgePointSerializer(source='knowledge_point', read_only=True)
+    knowledge_point_detail = KnowledgePointFlatSerializer(source='knowledge_point', read_only=True)
     is_favorite = serializers.SerializerMethodField()
     is_mastered = serializers.SerializerMethodField()
     difficulty_level_display = serializers.CharField(source='get_difficulty_level_display', read_only=True)
@@ -25,26 +44,34 @@ class QuestionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = '__all__'
+        list_serializer_class = QuestionListSerializer
+
+    def _status(self, obj):
+        lookup = get_status_lookup(self.context)
+        return lookup.get(obj.pk) if lookup is not None else None
 
     def get_is_favorite(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            status = UserQuestionStatus.objects.filter(user=request.user, question=obj).first()
-            return status.is_favorite if status else False
-        return False
+        status = self._status(obj)
+        return status.is_favorite if status else False
 
     def get_is_mastered(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            status = UserQuestionStatus.objects.filter(user=request.user, question=obj).first()
-            return status.is_mastered if status else False
-        return False
+        status = self._status(obj)
+        return status.is_mastered if status else False
+
+class UserQuestionStatusListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = _as_list(data)
+        lookup = get_status_lookup(self.context)
+        if lookup is not None:
+            lookup.prime(items)
+        return super().to_representation(items)
 
 class UserQuestionStatusSerializer(serializers.ModelSerializer):
     question_detail = QuestionSerializer(source='question', read_only=True)
     class Meta:
         model = UserQuestionStatus
         fields = '__all__'
+        list_serializer_class = UserQuestionStatusListSerializer
 
 class QuizAttemptSerializer(serializers.ModelSerializer):
     class Meta:
@@ -52,11 +79,20 @@ class QuizAttemptSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('user', 'elo_change')
 
+class ExamQuestionResultListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = _as_list(data)
+        lookup = get_status_lookup(self.context)
+        if lookup is not None:
+            lookup.load(item.question_id for item in items)
+        return super().to_representation(items)
+
 class ExamQuestionResultSerializer(serializers.ModelSerializer):
     question_detail = QuestionSerializer(source='question', read_only=True)
     class Meta:
         model = ExamQuestionResult
         fields = '__all__'
+        list_serializer_class = ExamQuestionResultListSerializer
 
 class QuizExamSerializer(serializers.ModelSerializer):
     results = ExamQuestionResultSerializer(many=True, read_only=True)
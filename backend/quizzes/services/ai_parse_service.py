@@ -1,61 +1,172 @@
+import contextvars
 import datetime
-from typing import Any, Dict, List, Optional
+import hashlib
+import logging
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from django.core.cache import cache
+from django.conf import settings
+from django.db import connections
 
 from ai_service import AIService
+from quizzes.services.document_chunker import build_chunks, extract_docx_text
+from quizzes.services.job_store import create_job, get_job, job_state, mark_completed, update_progress
+
+
+logger = logging.getLogger(__name__)
 
 
 def build_parse_task_id() -> str:
     return datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
 
 
-def init_parse_task(task_id: str) -> None:
-    cache.set(f"parse_task_{task_id}", {"status": "processing", "progress": "0%", "data": []}, 3600)
+def init_parse_task(task_id: str, user_id: Optional[int] = None) -> None:
+    create_job(task_id, 'parse', user_id=user_id, result={"data": []})
 
 
 def get_parse_task(task_id: Optional[str]) -> Optional[Dict[str, Any]]:
-    if not task_id:
-        return None
-    return cache.get(f"parse_task_{task_id}")
+    job = get_job(task_id)
+    return job_state(job) if job else None
 
 
 def extract_raw_text(raw_text: str, file_obj) -> str:
     text = raw_text or ''
     if file_obj:
         if file_obj.name.endswith('.docx'):
-            import docx  # type: ignore
-
-            doc = docx.Document(file_obj)
-            text = "\n".join([p.text for p in doc.paragraphs])
+            text = extract_docx_text(file_obj)
         else:
             text = file_obj.read().decode('utf-8', errors='ignore')
     return text
 
 
-def _build_chunks(raw_text: str, chunk_size: int = 2000, overlap: int = 150) -> List[str]:
-    chunks = []
-    step = max(1, chunk_size - overlap)
-    for i in range(0, len(raw_text), step):
-        chunks.append(raw_text[i : i + chunk_size])
-    return chunks
+def _build_chunks(raw_text: str) -> List[str]:
+    return build_chunks(raw_text)
+
+
+MAX_PARSE_CHUNKS = 25  # 封顶约 3 万 token 的输入
+# 近重复判定：较短题干归一化后至少这么长，且为相邻分片中另一题的前缀/后缀
+NEAR_DUPLICATE_MIN_CHARS = 12
+
+_QUESTION_NUMBER_RE = re.compile(r'^(?:第?\s*[0-9一二三四五六七八九十百]+\s*[题、.．:：)）]|[（(]\s*[0-9一二三四五六七八九十]+\s*[)）])\s*')
+_NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_question_text(text: Any) -> str:
+    """题干归一化：全半角统一、去掉题号/空白/标点、小写，用于去重哈希。"""
+    value = unicodedata.normalize('NFKC', str(text or '')).strip()
+    value = _QUESTION_NUMBER_RE.sub('', value)
+    return _NON_WORD_RE.sub('', value).lower()
+
+
+def _fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def _is_fragment(short: str, long: str) -> bool:
+    return len(short) >= NEAR_DUPLICATE_MIN_CHARS and (long.startswith(short) or long.endswith(short))
+
+
+def merge_chunk_results(chunk_results: Sequence[Optional[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    """
+    按文档顺序合并各分片结果。完全重复按归一化题干哈希 O(1) 去重；
+    分片重叠区被截断的题目只会出现在相邻分片，只与上一分片的题目比较前缀/后缀，保留较完整的一份。
+    """
+    merged: List[Dict[str, Any]] = []
+    seen: Dict[str, int] = {}
+    previous: List[Tuple[str, int]] = []
+
+    for parsed in chunk_results:
+        if not parsed:
+            previous = []
+            continue
+        current: List[Tuple[str, int]] = []
+        for question in parsed:
+            normalized = normalize_question_text(question.get('text'))
+            if not normalized:
+                continue
+            key = _fingerprint(normalized)
+            if key in seen:
+                continue
+
+            duplicate_of = None
+            for prev_norm, prev_idx in previous:
+                if _is_fragment(normalized, prev_norm):
+                    # 当前是上一分片中某题的残片
+                    duplicate_of = prev_idx
+                    break
+                if _is_fragment(prev_norm, normalized):
+                    # 上一分片里是残片，用完整版本替换（位置不变）
+                    merged[prev_idx] = question
+                    current.append((normalized, prev_idx))
+                    duplicate_of = prev_idx
+                    break
+            if duplicate_of is not None:
+                seen[key] = duplicate_of
+                continue
+
+            seen[key] = len(merged)
+            current.append((normalized, len(merged)))
+            merged.append(question)
+        previous = current
+    return merged
+
+
+def _parse_chunk_in_worker(chunk: str) -> List[Dict[str, Any]]:
+    try:
+        return AIService.parse_questions_from_text(chunk)
+    finally:
+        # 工作线程若意外触发了 DB 访问，需释放线程私有连接
+        connections.close_all()
+
+
+def _publish(task_id: str, status: str, done: int, total: int, chunk_results, failed: int = 0) -> None:
+    result = {
+        "data": merge_chunk_results(chunk_results),
+        "completed_chunks": done,
+        "total_chunks": total,
+        "failed_chunks": failed,
+    }
+    if status == 'completed':
+        mark_completed(task_id, result)
+    else:
+        update_progress(task_id, f"{done}/{total}", result)
 
 
 def run_parse_task(raw_text: str, task_id: str) -> None:
+    """
+    分片并发解析：有界线程池扇出到 LLM，每完成一片就按文档顺序合并并发布阶段性结果，
+    前端轮询即可看到已解析出的题目。单个分片失败只记数，不影响其余分片。
+    """
     chunks = _build_chunks(raw_text)
-    total_chunks = len(chunks[:25])  # 封顶支持约 5 万字
-    all_questions: List[Dict[str, Any]] = []
-
-    for i, chunk in enumerate(chunks[:25]):
-        cache.set(
-            f"parse_task_{task_id}",
-            {"status": "processing", "progress": f"{i + 1}/{total_chunks}", "data": all_questions},
-            3600,
-        )
-
-        parsed = AIService.parse_questions_from_text(chunk)
-        for q in parsed:
-            if not any(existing.get('text') == q.get('text') for existing in all_questions):
-                all_questions.append(q)
-
-    cache.set(f"parse_task_{task_id}", {"status": "completed", "progress": "100%", "data": all_questions}, 3600)
+    if len(chunks) > MAX_PARSE_CHUNKS:
+        logger.warning("quizzes.preview_parse truncated: task_id=%s chunks=%s", task_id, len(chunks))
+        chunks = chunks[:MAX_PARSE_CHUNKS]
+    total = len(chunks)
+    chunk_results: List[Optional[List[Dict[str, Any]]]] = [None] * total
+    failed = 0
+    done = 0
+    _publish(task_id, 'processing', 0, total, chunk_results)
+
+    if chunks:
+        workers = min(max(1, int(getattr(settings, 'QUIZ_PARSE_CONCURRENCY', 4) or 4)), total)
+        logger.info("quizzes.preview_parse dispatch: task_id=%s chunks=%s workers=%s", task_id, total, workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            future_map = {
+                executor.submit(contextvars.copy_context().run, _parse_chunk_in_worker, chunk): idx
+                for idx, chunk in enumerate(chunks)
+            }
+            for future in as_completed(future_map):
+                idx = future_map[future]
+                try:
+                    chunk_results[idx] = future.result() or []
+                except Exception:  # noqa: BLE001
+                    logger.exception("quizzes.preview_parse chunk failed: task_id=%s chunk=%s", task_id, idx)
+                    chunk_results[idx] = []
+                    failed += 1
+                done += 1
+                if done < total:
+                    _publish(task_id, 'processing', done, total, chunk_results, failed)
+
+    _publish(task_id, 'completed', done, total, chunk_results, failed)
@@ -1,11 +1,13 @@
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
 from ai_engine.observability import record_schema_event
 from quizzes.models import KnowledgePoint, Question
 from quizzes import prompt_resources as quizzes_prompt_resources
+from quizzes.services import grading_cache
 from quizzes.services.ai_schema_guard import (
     validate_grading_payload,
     validate_question_list_payload,
@@ -157,7 +159,7 @@ class QuizAITaskService:
         return None
 
     @classmethod
-    def generate_ai_answer(cls, ai, question: Question) -> str:
+    def _ai_answer_chat_kwargs(cls, ai, question: Question) -> Dict[str, Any]:
         template = ai.get_template('quizzes', 'ai_answer_prompt.txt') or ''
         prompt = ai.format_template(
             template,
@@ -166,54 +168,89 @@ class QuizAITaskService:
             grading_points=question.grading_points or '无',
             correct_answer=question.correct_answer or '',
         )
-        return ai.simple_chat_text(
-            system_prompt=ai._get_system_prompt(
+        return {
+            'system_prompt': ai._get_system_prompt(
                 'quizzes',
                 'system_ai_answer_prompt.txt',
                 '你是金融431课程助教，输出结构清晰、可复习的标准答案与解析。',
             ),
-            user_prompt=prompt,
-            temperature=0.35,
-            max_tokens=2800,
-            operation='quizzes.generate_ai_answer',
-        ) or ''
+            'user_prompt': prompt,
+            'temperature': 0.35,
+            'max_tokens': 2800,
+            'operation': 'quizzes.generate_ai_answer',
+        }
 
     @classmethod
-    def grade_question(
+    def generate_ai_answer(cls, ai, question: Question) -> str:
+        return ai.simple_chat_text(**cls._ai_answer_chat_kwargs(ai, question)) or ''
+
+    @classmethod
+    async def agenerate_ai_answer(cls, ai, question: Question) -> str:
+        return await ai.asimple_chat_text(**cls._ai_answer_chat_kwargs(ai, question)) or ''
+
+    @classmethod
+    def _objective_grading_result(cls, ai, user_answer: Any, correct_answer: Any, max_score: float) -> Dict[str, Any]:
+        user_choice = ai.normalize_objective_answer(user_answer)
+        correct_choice = ai.normalize_objective_answer(correct_answer)
+        is_correct = bool(user_choice and user_choice == correct_choice)
+        return {
+            'score': max_score if is_correct else 0.0,
+            'feedback': (
+                f'判分依据：本题按标准答案唯一判分。你的作答为 {user_choice or "未作答"}，'
+                f'标准答案为 {correct_choice or "未设置"}。'
+                + ('作答与标准答案一致，因此给满分。' if is_correct else '两者不一致，因此本题不得分。')
+            ),
+            'analysis': (
+                f'标准答案：选择 {correct_choice or "（题库未设置）"}。'
+                + (
+                    '该选项满足题干条件并与题目设定一致。'
+                    if correct_choice
+                    else '请管理员补全该题标准答案后再进行训练。'
+                )
+            ),
+            'fsrs_rating': 4 if is_correct else 1,
+        }
+
+    @classmethod
+    def _lookup_grading_cache(
+        cls,
+        ai,
+        question_id: Optional[int],
+        question_text: str,
+        correct_answer: Any,
+        grading_points: Optional[str],
+        subjective_type: str,
+        max_score: float,
+        user_answer: Any,
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        if not question_id or not grading_cache.is_enabled():
+            return None, None
+        cache_key = grading_cache.build_cache_key(
+            ai,
+            question_id=question_id,
+            question_text=question_text,
+            correct_answer=correct_answer,
+            grading_points=grading_points,
+            subjective_type=subjective_type,
+            max_score=max_score,
+            user_answer=user_answer,
+        )
+        cached = grading_cache.get_cached_result(cache_key)
+        if cached is not None:
+            record_schema_event(operation='quizzes.grade_question', stage='cache_hit', success=True)
+        return cache_key, cached
+
+    @classmethod
+    def _grading_chat_kwargs(
         cls,
         ai,
         question_text: str,
         user_answer: Any,
         correct_answer: Any,
-        q_type: str,
         max_score: float,
-        grading_points: Optional[str] = None,
-        subjective_type: str = '主观题',
+        grading_points: Optional[str],
+        subjective_type: str,
     ) -> Dict[str, Any]:
-        max_score = float(max_score or 0)
-
-        if q_type == 'objective':
-            user_choice = ai.normalize_objective_answer(user_answer)
-            correct_choice = ai.normalize_objective_answer(correct_answer)
-            is_correct = bool(user_choice and user_choice == correct_choice)
-            return {
-                'score': max_score if is_correct else 0.0,
-                'feedback': (
-                    f'判分依据：本题按标准答案唯一判分。你的作答为 {user_choice or "未作答"}，'
-                    f'标准答案为 {correct_choice or "未设置"}。'
-                    + ('作答与标准答案一致，因此给满分。' if is_correct else '两者不一致，因此本题不得分。')
-                ),
-                'analysis': (
-                    f'标准答案：选择 {correct_choice or "（题库未设置）"}。'
-                    + (
-                        '该选项满足题干条件并与题目设定一致。'
-                        if correct_choice
-                        else '请管理员补全该题标准答案后再进行训练。'
-                    )
-                ),
-                'fsrs_rating': 4 if is_correct else 1,
-            }
-
         template = ai.get_template('quizzes', 'grading_prompt.txt') or ''
         _, normalized_subjective_type = ai.normalize_question_type('subjective', subjective_type)
         prompt = ai.format_template(
@@ -225,18 +262,28 @@ class QuizAITaskService:
             correct_answer=correct_answer or '无',
             user_answer=user_answer or '（空白）',
         )
-
-        response = ai.simple_chat(
-            system_prompt=ai._get_system_prompt(
+        return {
+            'system_prompt': ai._get_system_prompt(
                 'quizzes',
                 'system_grading_prompt.txt',
                 '你是严谨的金融431阅卷老师。仅输出 JSON 对象。',
             ),
-            user_prompt=prompt,
-            temperature=0.2,
-            max_tokens=2500,
-            operation='quizzes.grade_question',
-        )
+            'user_prompt': prompt,
+            'temperature': 0.2,
+            'max_tokens': 2500,
+            'operation': 'quizzes.grade_question',
+        }
+
+    @classmethod
+    def _finish_grading(
+        cls,
+        ai,
+        response,
+        correct_answer: Any,
+        max_score: float,
+        cache_key: Optional[str],
+        question_id: Optional[int],
+    ) -> Dict[str, Any]:
         content = ai.extract_content(response)
         parsed = cls.parse_grading_payload_with_repair(
             ai,
@@ -265,12 +312,75 @@ class QuizAITaskService:
             fsrs_rating = 2
         fsrs_rating = min(4, max(1, fsrs_rating))
 
-        return {
+        result = {
             'score': score,
             'feedback': str(parsed.get('feedback', '已评阅')).strip(),
             'analysis': str(parsed.get('analysis', '')).strip() or str(correct_answer or ''),
             'fsrs_rating': fsrs_rating,
         }
+        # 只缓存成功解析的结果，兜底结果每次都重新判分
+        if cache_key:
+            grading_cache.store_result(cache_key, question_id, result)
+        return result
+
+    @classmethod
+    def grade_question(
+        cls,
+        ai,
+        question_text: str,
+        user_answer: Any,
+        correct_answer: Any,
+        q_type: str,
+        max_score: float,
+        grading_points: Optional[str] = None,
+        subjective_type: str = '主观题',
+        question_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        max_score = float(max_score or 0)
+
+        if q_type == 'objective':
+            return cls._objective_grading_result(ai, user_answer, correct_answer, max_score)
+
+        cache_key, cached = cls._lookup_grading_cache(
+            ai, question_id, question_text, correct_answer, grading_points, subjective_type, max_score, user_answer
+        )
+        if cached is not None:
+            return cached
+
+        response = ai.simple_chat(**cls._grading_chat_kwargs(
+            ai, question_text, user_answer, correct_answer, max_score, grading_points, subjective_type
+        ))
+        return cls._finish_grading(ai, response, correct_answer, max_score, cache_key, question_id)
+
+    @classmethod
+    async def agrade_question(
+        cls,
+        ai,
+        question_text: str,
+        user_answer: Any,
+        correct_answer: Any,
+        q_type: str,
+        max_score: float,
+        grading_points: Optional[str] = None,
+        subjective_type: str = '主观题',
+        question_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """grade_question 的 asyncio 版本：LLM 调用走事件循环，缓存读写与少见的结构修复放到线程中。"""
+        max_score = float(max_score or 0)
+
+        if q_type == 'objective':
+            return cls._objective_grading_result(ai, user_answer, correct_answer, max_score)
+
+        cache_key, cached = await sync_to_async(cls._lookup_grading_cache)(
+            ai, question_id, question_text, correct_answer, grading_points, subjective_type, max_score, user_answer
+        )
+        if cached is not None:
+            return cached
+
+        response = await ai.asimple_chat(**cls._grading_chat_kwargs(
+            ai, question_text, user_answer, correct_answer, max_score, grading_points, subjective_type
+        ))
+        return await sync_to_async(cls._finish_grading)(ai, response, correct_answer, max_score, cache_key, question_id)
 
     @classmethod
     def generate_questions_from_text(
@@ -349,21 +459,23 @@ class QuizAITaskService:
         return normalized
 
     @classmethod
-    def parse_questions_from_text(cls, ai, raw_text: str) -> List[Dict[str, Any]]:
+    def _parse_chat_kwargs(cls, ai, raw_text: str) -> Dict[str, Any]:
         template = ai.get_template('quizzes', 'preview_parse_prompt.txt') or ''
         prompt = ai.format_template(template, raw_text=raw_text)
-
-        response = ai.simple_chat(
-            system_prompt=ai._get_system_prompt(
+        return {
+            'system_prompt': ai._get_system_prompt(
                 'quizzes',
                 'system_preview_parse_prompt.txt',
                 '你是题目清洗与结构化专家。仅输出 JSON 数组。',
             ),
-            user_prompt=prompt,
-            temperature=0.2,
-            max_tokens=3200,
-            operation='quizzes.preview_parse',
-        )
+            'user_prompt': prompt,
+            'temperature': 0.2,
+            'max_tokens': 3200,
+            'operation': 'quizzes.preview_parse',
+        }
+
+    @classmethod
+    def _finish_parse(cls, ai, response) -> List[Dict[str, Any]]:
         content = ai.extract_content(response)
         data = cls.parse_question_list_with_repair(
             ai,
@@ -392,3 +504,13 @@ class QuizAITaskService:
                 }
             )
         return normalized
+
+    @classmethod
+    def parse_questions_from_text(cls, ai, raw_text: str) -> List[Dict[str, Any]]:
+        response = ai.simple_chat(**cls._parse_chat_kwargs(ai, raw_text))
+        return cls._finish_parse(ai, response)
+
+    @classmethod
+    async def aparse_questions_from_text(cls, ai, raw_text: str) -> List[Dict[str, Any]]:
+        response = await ai.asimple_chat(**cls._parse_chat_kwargs(ai, raw_text))
+        return await sync_to_async(cls._finish_parse)(ai, response)
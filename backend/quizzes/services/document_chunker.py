@@ -0,0 +1,291 @@
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from ai_engine.config import get_llm_config
+
+
+# 每个中日韩字符约占多少 token（按模型族粗估，未知模型按 1:1 保守估计）
+_CJK_TOKENS_PER_CHAR = (
+    ('deepseek', 0.6),
+    ('qwen', 0.7),
+    ('glm', 0.7),
+    ('gpt-4o', 0.8),
+)
+_DEFAULT_CJK_TOKENS_PER_CHAR = 1.0
+_OTHER_CHARS_PER_TOKEN = 4.0
+
+_CJK_RE = re.compile(r'[\u3400-\u9fff\uf900-\ufaff\u3000-\u303f\uff00-\uffef]')
+
+# 题号：1. / 1、 / 1） / (1) / （1） / 第1题 / 例1
+_QUESTION_START_RE = re.compile(
+    r'^\s*(?:第\s*\d+\s*题|例\s*\d+|\d{1,3}\s*[.．、)）]|[（(]\s*\d{1,3}\s*[)）])(?!\d)'
+)
+# 大题标题：一、选择题 / 二．简答题 / 第三部分
+_SECTION_RE = re.compile(r'^\s*(?:[一二三四五六七八九十]{1,3}\s*[、.．]|第[一二三四五六七八九十]{1,3}[部分章节篇])')
+_SENTENCE_END_RE = re.compile(r'(?<=[。！？；!?;])')
+
+
+def _cjk_ratio(model: Optional[str] = None) -> float:
+    name = (model or get_llm_config().get('model') or '').lower()
+    for key, ratio in _CJK_TOKENS_PER_CHAR:
+        if key in name:
+            return ratio
+    return _DEFAULT_CJK_TOKENS_PER_CHAR
+
+
+def estimate_tokens(text: str, cjk_ratio: float = _DEFAULT_CJK_TOKENS_PER_CHAR) -> int:
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk - text.count(' ') - text.count('\n')
+    return int(cjk * cjk_ratio + max(0, other) / _OTHER_CHARS_PER_TOKEN) + 1
+
+
+def default_token_budget() -> int:
+    # 解析输出是结构化 JSON（约为输入的 2 倍），输入预算需给 max_tokens=3200 的输出留足余量
+    return max(200, int(getattr(settings, 'QUIZ_PARSE_CHUNK_TOKENS', 1200) or 1200))
+
+
+# ---------------------------------------------------------------------------
+# 切分
+# ---------------------------------------------------------------------------
+
+def _split_units(text: str) -> List[str]:
+    """
+    按行归组为“不可分单元”：以题号行开头的整道题（含选项、答案、解析），
+    大题标题单独成单元，题目之外的段落按空行分段。
+    """
+    units: List[List[str]] = []
+    current: List[str] = []
+    in_question = False
+
+    def flush():
+        nonlocal current
+        if any(line.strip() for line in current):
+            units.append(current)
+        current = []
+
+    for line in text.splitlines():
+        if _SECTION_RE.match(line):
+            flush()
+            units.append([line])
+            in_question = False
+        elif _QUESTION_START_RE.match(line):
+            flush()
+            current.append(line)
+            in_question = True
+        elif not line.strip():
+            if in_question:
+                current.append(line)
+            else:
+                flush()
+        else:
+            current.append(line)
+    flush()
+    return ['\n'.join(lines).strip('\n') for lines in units]
+
+
+_FALLBACK_SPLITTERS = (
+    (lambda u: re.split(r'\n\s*\n', u), '\n\n'),
+    (lambda u: re.split(r'\n(?=\s*[A-Ha-h]\s*[.．、:：)）])', u), '\n'),
+    (lambda u: _SENTENCE_END_RE.split(u), ''),
+)
+
+
+def _split_oversized(unit: str, budget: int, ratio: float) -> List[str]:
+    """单元本身超预算时依次退到段落、选项行、句末，最后才按字符硬切。"""
+    for splitter, separator in _FALLBACK_SPLITTERS:
+        parts = [p for p in splitter(unit) if p.strip()]
+        if len(parts) > 1:
+            return _pack(parts, budget, ratio, separator=separator)
+    step = max(1, int(budget / max(ratio, 0.25)))
+    return [unit[i:i + step] for i in range(0, len(unit), step)]
+
+
+def _pack(units: List[str], budget: int, ratio: float, separator: str = '\n\n') -> List[str]:
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for unit in units:
+        tokens = estimate_tokens(unit, ratio)
+        if tokens > budget:
+            if current:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(unit, budget, ratio))
+            continue
+        if current and current_tokens + tokens > budget:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def build_chunks(text: str, token_budget: Optional[int] = None, model: Optional[str] = None) -> List[str]:
+    """
+    按题号、段落与选项边界切分文档，并在 token 预算内尽量装满每一片，
+    使题目不会被截断在两个分片之间，同时减少 LLM 调用次数。
+    """
+    text = (text or '').replace('\r\n', '\n').replace('\r', '\n')
+    if not text.strip():
+        return []
+    budget = token_budget or default_token_budget()
+    return _pack(_split_units(text), budget, _cjk_ratio(model))
+
+
+# ---------------------------------------------------------------------------
+# docx 文本提取（保留表格与自动编号）
+# ---------------------------------------------------------------------------
+
+_CHINESE_DIGITS = '零一二三四五六七八九'
+
+
+def _to_chinese(n: int) -> str:
+    if n < 10:
+        return _CHINESE_DIGITS[n]
+    if n < 20:
+        return '十' + (_CHINESE_DIGITS[n % 10] if n % 10 else '')
+    if n < 100:
+        return _CHINESE_DIGITS[n // 10] + '十' + (_CHINESE_DIGITS[n % 10] if n % 10 else '')
+    return str(n)
+
+
+def _to_roman(n: int) -> str:
+    table = ((1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+             (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I'))
+    out = []
+    for value, symbol in table:
+        while n >= value:
+            out.append(symbol)
+            n -= value
+    return ''.join(out)
+
+
+def _format_number(n: int, fmt: str) -> str:
+    if fmt in ('upperLetter', 'lowerLetter'):
+        letter = chr(ord('A') + (n - 1) % 26)
+        return letter if fmt == 'upperLetter' else letter.lower()
+    if fmt in ('upperRoman', 'lowerRoman'):
+        roman = _to_roman(n)
+        return roman if fmt == 'upperRoman' else roman.lower()
+    if fmt.startswith(('chinese', 'ideograph', 'taiwanese', 'japanese')):
+        return _to_chinese(n)
+    if fmt in ('bullet', 'none'):
+        return ''
+    return str(n)
+
+
+def _w(tag: str) -> str:
+    from docx.oxml.ns import qn  # type: ignore
+
+    return qn(tag)
+
+
+def _numbering_levels(doc) -> Dict[Tuple[str, int], Tuple[str, str, int]]:
+    """numId/ilvl -> (numFmt, lvlText, start)，从 numbering.xml 解析。"""
+    try:
+        numbering = doc.part.numbering_part.element
+    except (KeyError, NotImplementedError, AttributeError):
+        return {}
+
+    abstract: Dict[str, Dict[int, Tuple[str, str, int]]] = {}
+    for node in numbering.findall(_w('w:abstractNum')):
+        levels = {}
+        for lvl in node.findall(_w('w:lvl')):
+            fmt = lvl.find(_w('w:numFmt'))
+            text = lvl.find(_w('w:lvlText'))
+            start = lvl.find(_w('w:start'))
+            levels[int(lvl.get(_w('w:ilvl'), 0))] = (
+                fmt.get(_w('w:val')) if fmt is not None else 'decimal',
+                text.get(_w('w:val')) if text is not None else '',
+                int(start.get(_w('w:val'))) if start is not None else 1,
+            )
+        abstract[node.get(_w('w:abstractNumId'))] = levels
+
+    mapping: Dict[Tuple[str, int], Tuple[str, str, int]] = {}
+    for num in numbering.findall(_w('w:num')):
+        ref = num.find(_w('w:abstractNumId'))
+        levels = abstract.get(ref.get(_w('w:val')) if ref is not None else None, {})
+        for ilvl, spec in levels.items():
+            mapping[(num.get(_w('w:numId')), ilvl)] = spec
+    return mapping
+
+
+class _NumberingRenderer:
+    def __init__(self, levels):
+        self.levels = levels
+        self.counters: Dict[str, Dict[int, int]] = {}
+
+    @staticmethod
+    def _num_pr(paragraph):
+        ppr = paragraph._p.pPr
+        if ppr is not None and ppr.numPr is not None and ppr.numPr.numId is not None:
+            return ppr.numPr
+        # “列表编号”等样式自带编号，沿样式继承链查找
+        style = paragraph.style
+        while style is not None:
+            style_ppr = style.element.pPr
+            if style_ppr is not None and style_ppr.numPr is not None and style_ppr.numPr.numId is not None:
+                return style_ppr.numPr
+            style = style.base_style
+        return None
+
+    def label(self, paragraph) -> str:
+        num_pr = self._num_pr(paragraph)
+        if num_pr is None:
+            return ''
+        num_id = str(num_pr.numId.val)
+        ilvl = int(num_pr.ilvl.val) if num_pr.ilvl is not None else 0
+        spec = self.levels.get((num_id, ilvl))
+        if spec is None:
+            return ''
+
+        counters = self.counters.setdefault(num_id, {})
+        counters[ilvl] = counters.get(ilvl, spec[2] - 1) + 1
+        for deeper in [lvl for lvl in counters if lvl > ilvl]:
+            del counters[deeper]
+
+        fmt, lvl_text, _ = spec
+        if fmt == 'bullet':
+            return ''
+
+        def repl(match):
+            level = int(match.group(1)) - 1
+            level_spec = self.levels.get((num_id, level), spec)
+            return _format_number(counters.get(level, level_spec[2]), level_spec[0])
+
+        return re.sub(r'%(\d)', repl, lvl_text or '%1.') + ' '
+
+
+def _table_lines(table) -> Iterator[str]:
+    for row in table.rows:
+        cells = []
+        for cell in row.cells:
+            text = cell.text.strip()
+            # 合并单元格在 python-docx 中会重复出现
+            if text and (not cells or cells[-1] != text):
+                cells.append(text)
+        if cells:
+            yield ' | '.join(cells)
+
+
+def extract_docx_text(file_obj) -> str:
+    """按正文顺序提取段落与表格，并还原自动编号（题号、选项字母），供切分器识别边界。"""
+    import docx  # type: ignore
+    from docx.table import Table  # type: ignore
+    from docx.text.paragraph import Paragraph  # type: ignore
+
+    doc = docx.Document(file_obj)
+    numbering = _NumberingRenderer(_numbering_levels(doc))
+    lines: List[str] = []
+    for child in doc.element.body.iterchildren():
+        if child.tag == _w('w:p'):
+            paragraph = Paragraph(child, doc)
+            lines.append(numbering.label(paragraph) + paragraph.text)
+        elif child.tag == _w('w:tbl'):
+            lines.extend(_table_lines(Table(child, doc)))
+            lines.append('')
+    return '\n'.join(lines)
@@ -0,0 +1,148 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+
+from core import cache as shared_cache
+from quizzes import fsrs_batch
+from quizzes.models import ExamQuestionResult, FSRSWeights, Question
+
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_COHORT = ''
+
+_WEIGHTS_CACHE_KEY = 'quizzes:fsrs:weights_table'
+_WEIGHTS_CACHE_TTL_SECONDS = 600
+
+
+def question_cohort(question: Question) -> str:
+    """题目所属分群：知识点学科前缀（如 MB/IF），无知识点时归入全局。"""
+    if not question.knowledge_point_id:
+        return GLOBAL_COHORT
+    return (question.knowledge_point.prefix_category or GLOBAL_COHORT).upper()
+
+
+def _load_weights_table() -> Dict[str, List[float]]:
+    def produce() -> Dict[str, List[float]]:
+        return {
+            row.cohort: list(row.weights)
+            for row in FSRSWeights.objects.filter(is_active=True)
+            if isinstance(row.weights, list) and len(row.weights) == len(fsrs_batch.DEFAULT_WEIGHTS)
+        }
+
+    return shared_cache.get_or_set(_WEIGHTS_CACHE_KEY, produce, _WEIGHTS_CACHE_TTL_SECONDS)
+
+
+def invalidate_weights_cache() -> None:
+    cache.delete(_WEIGHTS_CACHE_KEY)
+
+
+def get_weights_for_cohort(cohort: Optional[str]) -> Optional[List[float]]:
+    """分群参数 -> 全局拟合参数 -> None（调用方回退到 FSRS 默认参数）。"""
+    table = _load_weights_table()
+    return table.get((cohort or GLOBAL_COHORT).upper()) or table.get(GLOBAL_COHORT)
+
+
+def rating_from_score(score: float, max_score: float) -> int:
+    """历史结果未保存评级，按得分率还原：与判分阈值（<60% 记为答错）保持一致。"""
+    ratio = float(score or 0) / float(max_score) if max_score else 0.0
+    if ratio < 0.6:
+        return 1
+    if ratio < 0.8:
+        return 2
+    if ratio < 0.95:
+        return 3
+    return 4
+
+
+def load_review_sequences(cohorts: Optional[Iterable[str]] = None) -> Dict[str, List[List[Tuple[int, int]]]]:
+    """
+    从 ExamQuestionResult 还原每个 (用户, 题目) 的复习序列，按分群归组。
+    间隔按整天计，与 FSRS.update_status 的 elapsed_days 一致。
+    """
+    qs = ExamQuestionResult.objects.filter(question__isnull=False, max_score__gt=0)
+    wanted = {c.upper() for c in cohorts} if cohorts else None
+    rows = qs.values_list(
+        'exam__user_id',
+        'question_id',
+        'exam__created_at',
+        'score',
+        'max_score',
+        'question__knowledge_point__prefix_category',
+    ).order_by('exam__user_id', 'question_id', 'exam__created_at', 'id')
+
+    grouped: Dict[str, List[List[Tuple[int, int]]]] = {}
+    current_key = None
+    current_seq: List[Tuple[int, int]] = []
+    current_cohort = GLOBAL_COHORT
+    last_at = None
+
+    def flush():
+        if current_seq and (wanted is None or current_cohort in wanted):
+            grouped.setdefault(current_cohort, []).append(current_seq)
+
+    for user_id, question_id, created_at, score, max_score, prefix in rows.iterator(chunk_size=2000):
+        key = (user_id, question_id)
+        if key != current_key:
+            flush()
+            current_key = key
+            current_seq = []
+            current_cohort = (prefix or GLOBAL_COHORT).upper()
+            last_at = None
+        elapsed = max(0, (created_at - last_at).days) if last_at else 0
+        current_seq.append((elapsed, rating_from_score(score, max_score)))
+        last_at = created_at
+    flush()
+    return grouped
+
+
+def fit_cohort_weights(
+    cohorts: Optional[Sequence[str]] = None,
+    min_reviews: int = 200,
+    dry_run: bool = False,
+    **fit_kwargs: Any,
+) -> List[Dict[str, Any]]:
+    """
+    按分群拟合 w 并落库；全局参数基于全部历史拟合。
+    仅当拟合结果在历史上优于默认参数时才写入，样本不足的分群跳过。
+    """
+    grouped = load_review_sequences(cohorts)
+    targets: Dict[str, List[List[Tuple[int, int]]]] = dict(grouped)
+    if not cohorts:
+        targets[GLOBAL_COHORT] = [seq for seqs in grouped.values() for seq in seqs]
+
+    summaries = []
+    for cohort, sequences in sorted(targets.items()):
+        result = fsrs_batch.fit_weights(sequences, **fit_kwargs)
+        summary = {'cohort': cohort, **result, 'saved': False}
+        if result['sample_size'] < min_reviews:
+            summary['skipped'] = 'insufficient_reviews'
+        elif not result['improved']:
+            summary['skipped'] = 'no_improvement'
+        elif not dry_run:
+            FSRSWeights.objects.update_or_create(
+                cohort=cohort,
+                defaults={
+                    'weights': result['weights'],
+                    'sample_size': result['sample_size'],
+                    'log_loss': result['log_loss'],
+                    'baseline_log_loss': result['baseline_log_loss'],
+                    'is_active': True,
+                },
+            )
+            summary['saved'] = True
+        summaries.append(summary)
+        logger.info(
+            "quizzes.fsrs fit cohort=%s n=%s loss=%.4f baseline=%.4f saved=%s",
+            cohort or 'global',
+            result['sample_size'],
+            result['log_loss'],
+            result['baseline_log_loss'],
+            summary['saved'],
+        )
+
+    if not dry_run:
+        invalidate_weights_cache()
+    return summaries
+
@@ -0,0 +1,131 @@
+import datetime
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from quizzes.models import GradingCacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+_GRADING_TEMPLATES = ('grading_prompt.txt', 'system_grading_prompt.txt')
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, 'QUIZ_GRADING_CACHE_ENABLED', True))
+
+
+def normalize_answer_text(user_answer: Any) -> str:
+    """归一化作答文本：全半角统一、折叠空白，使“同一份答案”得到同一个键。"""
+    text = unicodedata.normalize('NFKC', str(user_answer or ''))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def template_fingerprint(ai) -> str:
+    digest = hashlib.sha256()
+    for name in _GRADING_TEMPLATES:
+        digest.update((ai.get_template('quizzes', name) or '').encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def build_cache_key(
+    ai,
+    question_id: int,
+    question_text: str,
+    correct_answer: Any,
+    grading_points: Optional[str],
+    subjective_type: str,
+    max_score: float,
+    user_answer: Any,
+) -> str:
+    # 题目内容也纳入哈希：即使绕过 Question.save 直接 update，编辑后也不会命中旧结果。
+    material = json.dumps(
+        [
+            int(question_id),
+            str(question_text or ''),
+            str(correct_answer or ''),
+            str(grading_points or ''),
+            str(subjective_type or ''),
+            float(max_score or 0),
+            normalize_answer_text(user_answer),
+            template_fingerprint(ai),
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def _ttl_seconds() -> int:
+    return max(0, int(getattr(settings, 'QUIZ_GRADING_CACHE_TTL_SECONDS', 7 * 86400) or 0))
+
+
+def get_cached_result(cache_key: str) -> Optional[Dict[str, Any]]:
+    try:
+        qs = GradingCacheEntry.objects.filter(cache_key=cache_key)
+        ttl = _ttl_seconds()
+        if ttl:
+            qs = qs.filter(created_at__gte=timezone.now() - datetime.timedelta(seconds=ttl))
+
+        entry = qs.only('id', 'result').first()
+        if entry is None or not isinstance(entry.result, dict):
+            return None
+
+        GradingCacheEntry.objects.filter(id=entry.id).update(
+            hit_count=F('hit_count') + 1,
+            last_hit_at=timezone.now(),
+        )
+    except Exception as exc:  # noqa: BLE001
+        # 缓存读取失败时回落到 LLM 判分
+        logger.warning("quizzes.grading_cache lookup failed: err=%s", exc)
+        return None
+    return dict(entry.result)
+
+
+def store_result(cache_key: str, question_id: int, result: Dict[str, Any]) -> None:
+    try:
+        GradingCacheEntry.objects.update_or_create(
+            cache_key=cache_key,
+            defaults={'question_id': question_id, 'result': result},
+        )
+    except Exception as exc:  # noqa: BLE001
+        # 缓存写入失败不影响判分主链路
+        logger.warning("quizzes.grading_cache store failed: question_id=%s err=%s", question_id, exc)
+
+
+def prune() -> int:
+    """
+    淘汰过期条目与超出容量的最早条目，由定时任务调用；
+    不放在写入路径上，避免每次判分都做全表计数。
+    """
+    deleted = 0
+    ttl = _ttl_seconds()
+    if ttl:
+        deleted, _ = GradingCacheEntry.objects.filter(
+            created_at__lt=timezone.now() - datetime.timedelta(seconds=ttl)
+        ).delete()
+
+    max_entries = max(0, int(getattr(settings, 'QUIZ_GRADING_CACHE_MAX_ENTRIES', 50000) or 0))
+    if not max_entries:
+        return deleted
+
+    overflow = GradingCacheEntry.objects.count() - max_entries
+    if overflow <= 0:
+        return deleted
+
+    # 超出容量时淘汰最早写入的条目
+    stale_ids = list(GradingCacheEntry.objects.order_by('created_at', 'id').values_list('id', flat=True)[:overflow])
+    evicted, _ = GradingCacheEntry.objects.filter(id__in=stale_ids).delete()
+    return deleted + evicted
+
+
+def invalidate_question(question_id: int) -> int:
+    deleted, _ = GradingCacheEntry.objects.filter(question_id=question_id).delete()
+    return deleted
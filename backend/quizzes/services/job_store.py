@@ -0,0 +1,158 @@
+import datetime
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ai_engine import ledger
+from quizzes.models import ExamQuestionResult, TaskJob
+from users.models import User
+
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+def create_job(
+    task_id: str,
+    kind: str,
+    user_id: Optional[int] = None,
+    payload: Optional[Dict[str, Any]] = None,
+    result: Optional[Dict[str, Any]] = None,
+) -> TaskJob:
+    job, _ = TaskJob.objects.update_or_create(
+        task_id=task_id,
+        defaults={
+            'kind': kind,
+            'status': 'pending',
+            'progress': '0%',
+            'result': result or {},
+            'payload': payload or {},
+            'error': '',
+            'user_id': user_id,
+            'started_at': None,
+            'heartbeat_at': timezone.now(),
+            'finished_at': None,
+        },
+    )
+    return job
+
+
+def requeue_job(task_id: str) -> None:
+    TaskJob.objects.filter(task_id=task_id).update(status='pending', heartbeat_at=timezone.now(), finished_at=None)
+
+
+def get_job(task_id: Optional[str]) -> Optional[TaskJob]:
+    if not task_id:
+        return None
+    return TaskJob.objects.filter(task_id=task_id).first()
+
+
+def job_state(job: TaskJob) -> Dict[str, Any]:
+    """轮询接口的返回结构：status/progress 加上 result 中的业务字段（与旧版缓存结构一致）。"""
+    state = {'status': job.status, 'progress': job.progress, **(job.result or {})}
+    if job.error:
+        state['error'] = job.error
+    return state
+
+
+def mark_started(task_id: str) -> None:
+    now = timezone.now()
+    TaskJob.objects.filter(task_id=task_id).exclude(status__in=TERMINAL_STATUSES).update(
+        status='processing', attempts=F('attempts') + 1, started_at=now, heartbeat_at=now
+    )
+
+
+def update_progress(task_id: str, progress: str, result: Optional[Dict[str, Any]] = None) -> None:
+    fields: Dict[str, Any] = {'progress': progress, 'heartbeat_at': timezone.now()}
+    if result is not None:
+        fields['result'] = result
+    TaskJob.objects.filter(task_id=task_id).update(**fields)
+
+
+def mark_completed(task_id: str, result: Optional[Dict[str, Any]] = None, progress: str = '100%') -> None:
+    now = timezone.now()
+    fields: Dict[str, Any] = {'status': 'completed', 'progress': progress, 'heartbeat_at': now, 'finished_at': now}
+    if result is not None:
+        fields['result'] = result
+    TaskJob.objects.filter(task_id=task_id).update(**fields)
+
+
+def mark_failed(task_id: str, error: str, result: Optional[Dict[str, Any]] = None) -> None:
+    now = timezone.now()
+    fields: Dict[str, Any] = {'status': 'failed', 'error': error[:2000], 'heartbeat_at': now, 'finished_at': now}
+    if result is not None:
+        fields['result'] = result
+    TaskJob.objects.filter(task_id=task_id).update(**fields)
+
+
+def run_job(task_id: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """在 Celery worker 或降级线程中执行任务并记录起止状态；函数自行标记完成/失败时不覆盖。"""
+    mark_started(task_id)
+    user = User.objects.filter(
+        id=TaskJob.objects.filter(task_id=task_id).values('user_id')[:1]
+    ).first()
+    try:
+        # 任务中的 LLM 调用计入发起用户的 token 台账与配额
+        with ledger.attribute(user=user):
+            value = fn(*args, **kwargs)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("quizzes.jobs failed: task_id=%s", task_id)
+        mark_failed(task_id, str(exc) or exc.__class__.__name__)
+        return None
+    TaskJob.objects.filter(task_id=task_id).exclude(status__in=TERMINAL_STATUSES).update(
+        status='completed', progress='100%', heartbeat_at=timezone.now(), finished_at=timezone.now()
+    )
+    return value
+
+
+# ---------------------------------------------------------------------------
+# 回收
+# ---------------------------------------------------------------------------
+
+def _redispatch(job: TaskJob) -> bool:
+    """仅判分任务可安全重放：结果在单个事务中落库，试卷尚无结果即说明上次执行未完成。"""
+    if job.kind != 'grading':
+        return False
+    from quizzes.services.task_dispatcher import dispatch_exam_grading
+
+    payload = job.payload or {}
+    exam_id = payload.get('exam_id')
+    if not exam_id or ExamQuestionResult.objects.filter(exam_id=exam_id).exists():
+        return False
+    dispatch_exam_grading(payload.get('user_id'), exam_id, payload.get('questions_data') or [], task_id=job.task_id)
+    return True
+
+
+def reap_stale_jobs(now: Optional[datetime.datetime] = None) -> Dict[str, int]:
+    """
+    执行进程退出（线程模式随 Web 进程重启、worker 被杀）后任务会停在 pending/processing。
+    超过心跳阈值的任务：判分任务在重试次数内重新派发，其余标记失败以便前端停止轮询。
+    """
+    now = now or timezone.now()
+    stale_before = now - datetime.timedelta(seconds=max(60, int(getattr(settings, 'QUIZ_JOB_STALE_SECONDS', 2100) or 2100)))
+    max_attempts = max(1, int(getattr(settings, 'QUIZ_JOB_MAX_ATTEMPTS', 3) or 3))
+
+    stale = TaskJob.objects.filter(status__in=('pending', 'processing'), heartbeat_at__lt=stale_before)
+    summary = {'requeued': 0, 'failed': 0}
+    for job in stale.iterator():
+        if job.attempts < max_attempts and _redispatch(job):
+            summary['requeued'] += 1
+            continue
+        mark_failed(job.task_id, '任务执行进程已退出，请重新提交')
+        summary['failed'] += 1
+    if summary['requeued'] or summary['failed']:
+        logger.warning("quizzes.jobs reaped stale jobs: %s", summary)
+    return summary
+
+
+def prune_finished_jobs(now: Optional[datetime.datetime] = None, days: Optional[int] = None) -> int:
+    now = now or timezone.now()
+    days = days or max(1, int(getattr(settings, 'QUIZ_JOB_RETENTION_DAYS', 7) or 7))
+    deleted, _ = TaskJob.objects.filter(
+        status__in=TERMINAL_STATUSES, finished_at__lt=now - datetime.timedelta(days=days)
+    ).delete()
+    return deleted
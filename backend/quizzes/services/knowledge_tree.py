@@ -0,0 +1,74 @@
+import hashlib
+import json
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models import Count
+from rest_framework.utils.encoders import JSONEncoder
+
+from core import cache as shared_cache
+from quizzes.models import KnowledgePoint, Question
+
+
+_CACHE_NAMESPACE = 'quizzes:kp_tree'
+_TREE_CACHE_TTL_SECONDS = 24 * 3600
+
+
+def get_tree_version() -> int:
+    return shared_cache.get_version(_CACHE_NAMESPACE)
+
+
+def bump_tree_version() -> None:
+    """知识点或题目归属变化时推进版本号，旧版本缓存自然失效。"""
+    shared_cache.bump_version(_CACHE_NAMESPACE)
+
+
+def build_tree() -> List[Dict[str, Any]]:
+    """
+    一次查询取全部知识点、一次分组聚合取各节点题目数，在内存中按邻接表拼装整棵树。
+    输出结构与原递归 KnowledgePointSerializer 一致（questions_count 为节点直属题数）。
+    """
+    from quizzes.serializers import KnowledgePointFlatSerializer
+
+    nodes = list(KnowledgePoint.objects.order_by('id'))
+    counts = dict(
+        Question.objects.filter(knowledge_point__isnull=False)
+        .values_list('knowledge_point_id')
+        .annotate(total=Count('id'))
+        .values_list('knowledge_point_id', 'total')
+    )
+
+    by_id: Dict[int, Dict[str, Any]] = {}
+    for row in KnowledgePointFlatSerializer(nodes, many=True).data:
+        row = dict(row)
+        row['questions_count'] = counts.get(row['id'], 0)
+        row['children'] = []
+        by_id[row['id']] = row
+
+    children: Dict[Optional[int], List[Dict[str, Any]]] = defaultdict(list)
+    for node in nodes:
+        children[node.parent_id].append(by_id[node.id])
+    for node_id, row in by_id.items():
+        row['children'] = children.get(node_id, [])
+    return children.get(None, [])
+
+
+def get_tree_blob() -> Tuple[bytes, str]:
+    """返回 (序列化后的整棵树 JSON, ETag)，按版本号缓存。"""
+    def produce() -> Tuple[bytes, str]:
+        body = json.dumps(build_tree(), cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return body, hashlib.sha1(body).hexdigest()
+
+    # 版本推进后首个请求回源，并发请求等待其结果而不是各自重建整棵树
+    key = shared_cache.versioned_key(_CACHE_NAMESPACE, 'blob')
+    return shared_cache.get_or_set(key, produce, _TREE_CACHE_TTL_SECONDS)
+
+
+def find_subtree(tree: List[Dict[str, Any]], node_id: int) -> Optional[Dict[str, Any]]:
+    stack = list(tree)
+    while stack:
+        node = stack.pop()
+        if node['id'] == node_id:
+            return node
+        stack.extend(node['children'])
+    return None
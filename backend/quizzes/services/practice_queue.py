@@ -0,0 +1,84 @@
+import datetime
+from typing import List, Optional
+
+from django.core.cache import cache
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from quizzes.models import Question, UserQuestionStatus
+
+
+# 硬性冷却：30分钟内复习过的题不再抽选，给大脑留出间隔时间
+REVIEW_COOLDOWN = datetime.timedelta(minutes=30)
+
+_NEW_CURSOR_TTL_SECONDS = 7 * 86400
+
+
+def _new_cursor_key(user_id: int) -> str:
+    return f'quizzes:practice:new_cursor:{user_id}'
+
+
+def get_new_question_cursor(user_id: int) -> int:
+    """
+    新题游标：id <= 游标的题目该用户都已有作答状态。
+    只会前移，状态行仅随题目/用户级联删除，因此游标始终是安全的下界。
+    """
+    try:
+        return int(cache.get(_new_cursor_key(user_id)) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _advance_new_question_cursor(user_id: int, cursor: int) -> None:
+    if cursor > get_new_question_cursor(user_id):
+        cache.set(_new_cursor_key(user_id), cursor, _NEW_CURSOR_TTL_SECONDS)
+
+
+def reset_new_question_cursor(user_id: int) -> None:
+    cache.delete(_new_cursor_key(user_id))
+
+
+def draw_due_question_ids(user, limit: int, now: Optional[datetime.datetime] = None) -> List[int]:
+    """按到期时间从早到晚取到期复习题，走 (user, is_mastered, next_review_at) 复合索引。"""
+    if limit <= 0:
+        return []
+    now = now or timezone.now()
+    return list(
+        UserQuestionStatus.objects.filter(
+            user=user,
+            is_mastered=False,
+            next_review_at__lte=now,
+        ).exclude(
+            last_review__gt=now - REVIEW_COOLDOWN  # 过滤掉最近 30 分钟内刚做过的题
+        ).order_by('next_review_at').values_list('question_id', flat=True)[:limit]
+    )
+
+
+def draw_new_question_ids(user, limit: int) -> List[int]:
+    """从新题游标之后按 id 顺序取没有任何作答状态的题目（已掌握题必然有状态行，一并排除）。"""
+    if limit <= 0:
+        return []
+
+    cursor = get_new_question_cursor(user.id)
+    attempted = UserQuestionStatus.objects.filter(user=user, question_id=OuterRef('pk'))
+    new_ids = list(
+        Question.objects.filter(id__gt=cursor)
+        .exclude(Exists(attempted))
+        .order_by('id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+    if new_ids:
+        # 第一道未作答题之前的题目均已作答，游标推进到它之前
+        _advance_new_question_cursor(user.id, new_ids[0] - 1)
+    else:
+        max_id = Question.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        _advance_new_question_cursor(user.id, max_id)
+    return new_ids
+
+
+def draw_practice_question_ids(user, limit: int, now: Optional[datetime.datetime] = None) -> List[int]:
+    # 1. 已到期需要复习的题目
+    due_ids = draw_due_question_ids(user, limit, now=now)
+    # 2. 如果复习的题不够本次抽题数量，用没做过的新题补足
+    return due_ids + draw_new_question_ids(user, limit - len(due_ids))
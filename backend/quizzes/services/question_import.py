@@ -0,0 +1,384 @@
+import codecs
+import csv
+import datetime
+import io
+import logging
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+
+from ai_service import AIService
+from quizzes.models import KnowledgePoint, Question, questions_bulk_written
+from quizzes.services.job_store import create_job, get_job, job_state, mark_completed, mark_failed, update_progress
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 200
+
+# 表头别名（不区分大小写），映射到统一的行字段名
+HEADER_ALIASES = {
+    'text': ('text', 'question', 'question_text', '题目', '题干'),
+    'answer': ('answer', 'correct_answer', '答案', '参考答案'),
+    'q_type': ('type', 'q_type', 'question_type', '题型'),
+    'subjective_type': ('subjective_type', '主观题类型'),
+    'difficulty_level': ('difficulty_level', '难度等级'),
+    'difficulty': ('difficulty', '难度'),
+    'options': ('options', '选项'),
+    'option_a': ('a', 'option_a', '选项a'),
+    'option_b': ('b', 'option_b', '选项b'),
+    'option_c': ('c', 'option_c', '选项c'),
+    'option_d': ('d', 'option_d', '选项d'),
+    'grading_points': ('grading_points', '得分点', '评分要点'),
+    'ai_answer': ('ai_answer', 'ai_explanation', 'analysis', '解析'),
+    'knowledge_point': ('knowledge_point', 'kp', 'kp_name', '知识点'),
+    'kp_id': ('kp_id', 'knowledge_point_id'),
+}
+
+_OPTION_SPLIT_RE = re.compile(r'\s*(?:\||\n|；|;)\s*')
+
+
+class ImportFileError(ValueError):
+    """整份文件无法读取（格式不支持、缺少题目列、编码错误等）。"""
+
+
+def build_question_fields(q_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把一条外部题目数据规范化为 Question 字段（题型/选项/答案/难度/得分点），
+    AI 预览确认入库与表格导入共用同一套 AIService 规范化规则。
+    """
+    q_type, subjective_type = AIService.normalize_question_type(
+        q_data.get('q_type') or q_data.get('type'),
+        q_data.get('subjective_type'),
+    )
+    text = str(q_data.get('question') or q_data.get('text') or '').strip()
+
+    options = AIService.normalize_options(q_data.get('options')) if q_type == 'objective' else {}
+    answer = q_data.get('answer') or q_data.get('correct_answer') or ''
+    if q_type == 'objective':
+        answer = AIService.normalize_objective_answer(answer, options)
+
+    difficulty_level = AIService.normalize_difficulty_level(q_data.get('difficulty_level'), q_data.get('difficulty'))
+
+    if q_type == 'objective':
+        grading_points = '无'
+    else:
+        grading_points = str(q_data.get('grading_points') or '').strip() or AIService.default_grading_points(subjective_type)
+
+    return {
+        'text': text,
+        'q_type': q_type,
+        'subjective_type': subjective_type if q_type == 'subjective' else None,
+        'options': options if q_type == 'objective' else {},
+        'correct_answer': str(answer).strip(),
+        'grading_points': grading_points,
+        'difficulty_level': difficulty_level,
+        # 与 Question.save 新建时的映射一致（bulk_create 不经过 save）
+        'difficulty': Question.DIFFICULTY_MAP.get(difficulty_level, 1200),
+    }
+
+
+# ---------------------------------------------------------------------------
+# 读取
+# ---------------------------------------------------------------------------
+
+def _column_map(headers: Iterable[Any]) -> Dict[int, str]:
+    lookup = {alias.lower(): field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+    mapping = {}
+    for idx, header in enumerate(headers):
+        field = lookup.get(str(header or '').strip().lower())
+        if field and field not in mapping.values():
+            mapping[idx] = field
+    if 'text' not in mapping.values():
+        raise ImportFileError('未找到题目列（表头需包含 text / question / 题目）')
+    return mapping
+
+
+def _sniff_encoding(fileobj) -> str:
+    # 教师端 Excel 另存的 CSV 常为 GBK，读取开头一段判断编码后再流式解码
+    head = fileobj.read(64 * 1024)
+    fileobj.seek(0)
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as exc:
+        # 截断在多字节字符中间不算编码错误
+        if exc.start < len(head) - 3:
+            return 'gb18030'
+    return 'utf-8'
+
+
+def iter_csv_rows(fileobj) -> Iterator[Tuple[int, Dict[str, str]]]:
+    stream = io.TextIOWrapper(fileobj, encoding=_sniff_encoding(fileobj), newline='')
+    try:
+        reader = csv.reader(stream)
+        headers = next(reader, None)
+        if headers is None:
+            return
+        mapping = _column_map(headers)
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue
+            yield reader.line_num, {field: values[idx] for idx, field in mapping.items() if idx < len(values)}
+    except UnicodeDecodeError as exc:
+        raise ImportFileError(f'文件编码无法识别: {exc}') from exc
+    finally:
+        stream.detach()
+
+
+def iter_xlsx_rows(fileobj) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    try:
+        import openpyxl  # type: ignore
+    except ImportError as exc:
+        raise ImportFileError('服务器未安装 openpyxl，暂不支持 xlsx 导入') from exc
+
+    try:
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as exc:  # noqa: BLE001
+        raise ImportFileError(f'xlsx 文件无法读取: {exc}') from exc
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        mapping = _column_map(headers)
+        for row_no, values in enumerate(rows, start=2):
+            if not any(v not in (None, '') for v in values):
+                continue
+            yield row_no, {
+                field: values[idx] for idx, field in mapping.items() if idx < len(values) and values[idx] is not None
+            }
+    finally:
+        workbook.close()
+
+
+def iter_table_rows(fileobj, filename: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    name = (filename or '').lower()
+    if name.endswith('.xlsx'):
+        return iter_xlsx_rows(fileobj)
+    if name.endswith(('.csv', '.txt')) or '.' not in name:
+        return iter_csv_rows(fileobj)
+    raise ImportFileError('仅支持 .csv 或 .xlsx 文件')
+
+
+# ---------------------------------------------------------------------------
+# 规范化与写入
+# ---------------------------------------------------------------------------
+
+def _row_payload(row: Dict[str, Any]) -> Dict[str, Any]:
+    columns = [row.get(f'option_{letter}') for letter in 'abcd']
+    if any(v not in (None, '') for v in columns):
+        options: Any = {letter.upper(): str(v or '').strip() for letter, v in zip('abcd', columns)}
+    else:
+        raw = str(row.get('options') or '').strip()
+        options = [part for part in _OPTION_SPLIT_RE.split(raw) if part] if raw else None
+
+    q_type = str(row.get('q_type') or '').strip()
+    if '客观' in q_type or 'choice' in q_type.lower():
+        q_type = 'objective'
+    elif q_type == '主观':
+        q_type = 'subjective'
+    elif not q_type:
+        # 未填题型：有选项按客观题（与旧版 CSV 导入的默认一致），没有选项只能是主观题
+        q_type = 'objective' if options else 'subjective'
+    difficulty_level = row.get('difficulty_level')
+    difficulty = row.get('difficulty')
+    if not difficulty_level and isinstance(difficulty, str) and not difficulty.strip().isdigit():
+        # “难度”列既可填 ELO 数值，也可直接填 entry/easy/... 等级
+        difficulty_level, difficulty = difficulty, None
+    return {
+        'text': row.get('text'),
+        'answer': row.get('answer'),
+        'q_type': q_type,
+        'subjective_type': row.get('subjective_type'),
+        'difficulty_level': difficulty_level,
+        'difficulty': difficulty,
+        'options': options,
+        'grading_points': row.get('grading_points'),
+    }
+
+
+def _normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    fields = build_question_fields(_row_payload(row))
+    fields['ai_answer'] = str(row.get('ai_answer') or '').strip()
+    if not fields['text']:
+        raise ValueError('题目内容为空')
+    if fields['q_type'] == 'objective' and not any(fields['options'].values()):
+        raise ValueError('客观题缺少选项')
+    return fields
+
+
+def _kp_reference(row: Dict[str, Any]) -> Tuple[Optional[int], Optional[str]]:
+    raw_id = row.get('kp_id')
+    kp_id = None
+    if raw_id not in (None, ''):
+        try:
+            kp_id = int(float(raw_id))
+        except (TypeError, ValueError):
+            raise ValueError(f'知识点 ID 无效: {raw_id}')
+    name = str(row.get('knowledge_point') or '').strip() or None
+    return kp_id, name
+
+
+class QuestionTableImporter:
+    """
+    表格题目导入：流式读取行，每 chunk_size 行做一次批量预处理
+    （规范化、知识点一次查询解析），再 bulk_create。
+    每段单独提交事务后再上报进度，任务进度对轮询方立即可见；中途失败时已提交的段保留，
+    结果中的 total_rows 即已处理行数。单行错误记录行号后跳过，不影响其余行。
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        default_kp_id: Optional[int] = None,
+        dry_run: bool = False,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.chunk_size = max(1, int(chunk_size))
+        self.default_kp_id = default_kp_id
+        self.dry_run = dry_run
+        self.progress = progress
+        self.result: Dict[str, Any] = {'total_rows': 0, 'count': 0, 'error_count': 0, 'errors': []}
+
+    def _error(self, row_no: int, message: str) -> None:
+        self.result['error_count'] += 1
+        if len(self.result['errors']) < MAX_REPORTED_ERRORS:
+            self.result['errors'].append({'row': row_no, 'error': message})
+
+    def run(self, rows: Iterable[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        chunk: List[Tuple[int, Dict[str, Any]]] = []
+        for row_no, row in rows:
+            chunk.append((row_no, row))
+            if len(chunk) >= self.chunk_size:
+                self._commit_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._commit_chunk(chunk)
+        self.result['errors'].sort(key=lambda e: e['row'])
+        return self.result
+
+    def _commit_chunk(self, chunk: List[Tuple[int, Dict[str, Any]]]) -> None:
+        with transaction.atomic():
+            self._flush(chunk)
+        # 进度写在段事务之外：在同一事务里写入的进度要等整个导入结束才对其他连接可见
+        if self.progress:
+            self.progress(self.result)
+
+    def _resolve_kps(self, refs: List[Tuple[Optional[int], Optional[str]]]) -> Tuple[set, Dict[str, int]]:
+        ids = {kp_id for kp_id, _ in refs if kp_id} | ({self.default_kp_id} if self.default_kp_id else set())
+        names = {name for _, name in refs if name}
+        if not ids and not names:
+            return set(), {}
+        found_ids = set()
+        by_name: Dict[str, int] = {}
+        for kp_id, name, code in KnowledgePoint.objects.filter(
+            Q(id__in=ids) | Q(name__in=names) | Q(code__in=names)
+        ).values_list('id', 'name', 'code').order_by('-id'):
+            found_ids.add(kp_id)
+            by_name[name] = kp_id
+            if code:
+                by_name[code] = kp_id
+        return found_ids, by_name
+
+    def _flush(self, chunk: List[Tuple[int, Dict[str, Any]]]) -> None:
+        self.result['total_rows'] += len(chunk)
+
+        # 预处理：整段规范化 + 收集知识点引用
+        prepared: List[Tuple[int, Dict[str, Any], Optional[int], Optional[str]]] = []
+        for row_no, row in chunk:
+            try:
+                fields = _normalize_row(row)
+                kp_id, kp_name = _kp_reference(row)
+            except ValueError as exc:
+                self._error(row_no, str(exc))
+                continue
+            prepared.append((row_no, fields, kp_id, kp_name))
+
+        found_ids, by_name = self._resolve_kps([(kp_id, name) for _, _, kp_id, name in prepared])
+        questions = []
+        for row_no, fields, kp_id, kp_name in prepared:
+            if kp_id is None and kp_name:
+                kp_id = by_name.get(kp_name)
+                if kp_id is None:
+                    self._error(row_no, f'知识点不存在: {kp_name}')
+                    continue
+            elif kp_id is not None and kp_id not in found_ids:
+                self._error(row_no, f'知识点不存在: {kp_id}')
+                continue
+            if kp_id is None and self.default_kp_id in found_ids:
+                kp_id = self.default_kp_id
+            questions.append(Question(knowledge_point_id=kp_id, **fields))
+
+        if not self.dry_run and questions:
+            created = Question.objects.bulk_create(questions)
+            try:
+                # 嵌套保存点：钩子里的 SQL 出错只回滚到这里，Postgres 上外层段事务仍可提交
+                with transaction.atomic():
+                    questions_bulk_written(created, created=True)
+            except Exception as exc:  # noqa: BLE001
+                # 索引失败不影响导入，可通过 rebuild_question_search 补齐
+                logger.warning("quizzes.import post-write hooks failed: %s", exc)
+        self.result['count'] += len(questions)
+
+
+def import_question_table(
+    fileobj,
+    filename: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    default_kp_id: Optional[int] = None,
+    dry_run: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    importer = QuestionTableImporter(
+        chunk_size=chunk_size, default_kp_id=default_kp_id, dry_run=dry_run, progress=progress
+    )
+    return importer.run(iter_table_rows(fileobj, filename))
+
+
+# ---------------------------------------------------------------------------
+# 后台任务
+# ---------------------------------------------------------------------------
+
+def build_import_task_id() -> str:
+    return datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+
+
+def init_import_task(task_id: str, user_id: Optional[int] = None) -> None:
+    create_job(task_id, 'import', user_id=user_id, result={"processed": 0, "count": 0, "error_count": 0})
+
+
+def get_import_task(task_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    job = get_job(task_id)
+    return job_state(job) if job else None
+
+
+def save_import_upload(task_id: str, file_obj) -> str:
+    """上传文件先落到共享存储，Celery worker 与 Web 进程可能不在同一台机器。"""
+    return default_storage.save(f"question_imports/{task_id}_{file_obj.name}", file_obj)
+
+
+def run_import_task(storage_path: str, filename: str, task_id: str, default_kp_id: Optional[int] = None) -> None:
+    def report(result: Dict[str, Any]) -> None:
+        update_progress(
+            task_id,
+            str(result['total_rows']),
+            {"processed": result['total_rows'], "count": result['count'], "error_count": result['error_count']},
+        )
+
+    try:
+        with default_storage.open(storage_path, 'rb') as fileobj:
+            result = import_question_table(fileobj, filename, default_kp_id=default_kp_id, progress=report)
+        mark_completed(task_id, {"processed": result['total_rows'], **result})
+    except ImportFileError as exc:
+        mark_failed(task_id, str(exc))
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("quizzes.import task failed: task_id=%s", task_id)
+        mark_failed(task_id, f'导入失败: {exc}')
+    finally:
+        default_storage.delete(storage_path)
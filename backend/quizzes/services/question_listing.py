@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db.models import F, Q, QuerySet
+from django.db.models.functions import Substr
+from django.utils.dateparse import parse_datetime
+
+from core import cache as shared_cache
+from quizzes.models import Question
+
+
+# 列表页默认只下发预览列；完整内容通过 questions/<id>/ 详情接口获取
+PREVIEW_FIELDS = (
+    'id',
+    'text',
+    'q_type',
+    'subjective_type',
+    'difficulty',
+    'difficulty_level',
+    'difficulty_level_display',
+    'knowledge_point',
+    'knowledge_point_name',
+    'created_at',
+)
+HEAVY_FIELDS = ('correct_answer', 'grading_points', 'ai_answer', 'options')
+ALL_FIELDS = PREVIEW_FIELDS + HEAVY_FIELDS
+
+PREVIEW_TEXT_LENGTH = 200
+
+_CACHE_NAMESPACE = 'quizzes:admin_list'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def resolve_fields(raw: Optional[str], default: str = 'full') -> Tuple[str, ...]:
+    """fields=preview | full | 逗号分隔的字段名（id 总是包含）。"""
+    value = (raw or default).strip().lower()
+    if value == 'preview':
+        return PREVIEW_FIELDS
+    if value in ('full', 'all', ''):
+        return ALL_FIELDS
+    wanted = {f.strip() for f in value.split(',') if f.strip()}
+    return ('id',) + tuple(f for f in ALL_FIELDS if f in wanted and f != 'id')
+
+
+def _db_columns(fields: Sequence[str], truncate_text: bool) -> Tuple[List[str], Dict[str, Any]]:
+    # id 与 created_at 始终取出，用于生成键集游标
+    columns: List[str] = ['id', 'created_at']
+    annotations: Dict[str, Any] = {}
+    for field in fields:
+        if field == 'text' and truncate_text:
+            annotations['text_preview'] = Substr('text', 1, PREVIEW_TEXT_LENGTH)
+        elif field == 'knowledge_point':
+            columns.append('knowledge_point_id')
+        elif field == 'knowledge_point_name':
+            annotations['kp_name'] = F('knowledge_point__name')
+        elif field == 'difficulty_level_display':
+            if 'difficulty_level' not in columns:
+                columns.append('difficulty_level')
+        elif field not in columns:
+            columns.append(field)
+    return columns, annotations
+
+
+def fetch_rows(
+    qs: QuerySet,
+    fields: Sequence[str],
+    truncate_text: bool = False,
+    start: int = 0,
+    stop: Optional[int] = None,
+) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    只从数据库取所需列（values 投影），避免加载大文本字段。
+    返回 [(输出行, 原始行)]，原始行带 id/created_at 供生成游标。
+    """
+    columns, annotations = _db_columns(fields, truncate_text)
+    level_labels = dict(Question.DIFFICULTY_LEVELS)
+    rows = []
+    for raw in qs.annotate(**annotations).values(*columns, *annotations.keys())[start:stop]:
+        row: Dict[str, Any] = {}
+        for field in fields:
+            if field == 'text':
+                row['text'] = raw['text_preview'] if truncate_text else raw['text']
+            elif field == 'knowledge_point':
+                row['knowledge_point'] = raw['knowledge_point_id']
+            elif field == 'knowledge_point_name':
+                row['knowledge_point_name'] = raw['kp_name'] or '无'
+            elif field == 'difficulty_level_display':
+                row['difficulty_level_display'] = level_labels.get(raw['difficulty_level'], raw['difficulty_level'])
+            elif field in ('correct_answer', 'grading_points', 'ai_answer'):
+                row[field] = raw[field] or ''
+            elif field == 'created_at':
+                row['created_at'] = raw['created_at'].isoformat() if raw['created_at'] else None
+            else:
+                row[field] = raw[field]
+        rows.append((row, raw))
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# 游标
+# ---------------------------------------------------------------------------
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception as exc:  # noqa: BLE001
+        raise InvalidCursor('无效的分页游标') from exc
+    if not isinstance(payload, dict):
+        raise InvalidCursor('无效的分页游标')
+    return payload
+
+
+def keyset_filter(qs: QuerySet, cursor: Optional[Dict[str, Any]]) -> QuerySet:
+    """
+    (created_at, id) 降序的键集分页：按游标定位后沿索引顺序取下一页，
+    深页与首页代价相同。
+    """
+    qs = qs.order_by('-created_at', '-id')
+    if not cursor:
+        return qs
+    created_at = parse_datetime(str(cursor.get('c') or ''))
+    last_id = cursor.get('i')
+    if created_at is None or not isinstance(last_id, int):
+        raise InvalidCursor('无效的分页游标')
+    return qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id))
+
+
+def keyset_cursor_for(raw_row: Dict[str, Any]) -> str:
+    return encode_cursor({'c': raw_row['created_at'].isoformat(), 'i': raw_row['id']})
+
+
+# ---------------------------------------------------------------------------
+# 总数
+# ---------------------------------------------------------------------------
+
+def get_list_version() -> int:
+    return shared_cache.get_version(_CACHE_NAMESPACE)
+
+
+def bump_list_version() -> None:
+    shared_cache.bump_version(_CACHE_NAMESPACE)
+
+
+def cached_total(qs: QuerySet, filters: Dict[str, Any]) -> int:
+    """按过滤条件缓存总数；题库任意增删改都会推进版本号使其失效。"""
+    signature = hashlib.sha1(json.dumps(filters, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    key = shared_cache.versioned_key(_CACHE_NAMESPACE, 'total', signature)
+    ttl = max(1, int(getattr(settings, 'QUIZ_ADMIN_LIST_TOTAL_TTL_SECONDS', 300) or 300))
+    return int(shared_cache.get_or_set(key, qs.count, ttl))
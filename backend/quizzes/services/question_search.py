@@ -0,0 +1,437 @@
+"""
+题库全文检索：对 Question.text / correct_answer / 知识点名称建立倒排索引。
+
+- 分词：中日韩连续字符切分为二元组（单字也单独入索引以支持单字查询），拉丁字母/数字按词切分；
+- 规范化后的词元存放在 QuestionSearchDocument.tokens（空格分隔），是所有后端的唯一数据源；
+- 后端：SQLite FTS5（bm25 排序）、PostgreSQL tsvector + GIN（ts_rank 排序）、纯 Python BM25 兜底。
+题目保存时增量更新索引，rebuild_question_search 命令可全量重建。
+"""
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, QuerySet, When
+from django.db.models.expressions import RawSQL
+
+from core import cache as shared_cache
+from quizzes.models import Question, QuestionSearchDocument
+
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'quizzes_question_fts'
+
+_CJK_RANGES = (
+    (0x3040, 0x30FF),   # 日文假名
+    (0x3400, 0x4DBF),   # CJK 扩展 A
+    (0x4E00, 0x9FFF),   # CJK 统一汉字
+    (0xAC00, 0xD7AF),   # 韩文音节
+    (0xF900, 0xFAFF),   # CJK 兼容汉字
+    (0x20000, 0x2FA1F),  # CJK 扩展 B-F 及兼容补充
+)
+_WORD_RE = re.compile(r'[0-9a-z]+')
+
+_CACHE_NAMESPACE = 'quizzes:search'
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return any(lo <= code <= hi for lo, hi in _CJK_RANGES)
+
+
+def _runs(text: str) -> Iterable[Tuple[bool, str]]:
+    """把文本切成 (是否 CJK, 片段) 的连续段，其余字符（标点、空白）作为分隔符。"""
+    text = unicodedata.normalize('NFKC', str(text or '')).lower()
+    buf: List[str] = []
+    buf_cjk = False
+    for ch in text:
+        cjk = _is_cjk(ch)
+        if cjk or ch.isalnum():
+            if buf and cjk != buf_cjk:
+                yield buf_cjk, ''.join(buf)
+                buf = []
+            buf_cjk = cjk
+            buf.append(ch)
+        elif buf:
+            yield buf_cjk, ''.join(buf)
+            buf = []
+    if buf:
+        yield buf_cjk, ''.join(buf)
+
+
+def tokenize(text: str, for_query: bool = False) -> List[str]:
+    """
+    文档分词：CJK 片段产出全部二元组及单字；拉丁片段按词产出。
+    查询分词：CJK 片段只产出二元组（片段为单字时才用单字），使多字查询近似短语匹配。
+    """
+    tokens: List[str] = []
+    for is_cjk, run in _runs(text):
+        if not is_cjk:
+            tokens.extend(_WORD_RE.findall(run) or [run])
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if not for_query:
+            tokens.extend(run)
+    return tokens
+
+
+def build_document_tokens(question: Question) -> str:
+    kp_name = question.knowledge_point.name if question.knowledge_point_id and question.knowledge_point else ''
+    parts = [question.text, question.correct_answer or '', kp_name]
+    return ' '.join(tokenize(' '.join(parts)))
+
+
+def _query_tokens(query: str) -> List[str]:
+    seen = []
+    for token in tokenize(query, for_query=True):
+        if token not in seen:
+            seen.append(token)
+    return seen
+
+
+# ---------------------------------------------------------------------------
+# 后端
+# ---------------------------------------------------------------------------
+
+class _SQLiteFTS5Backend:
+    name = 'sqlite_fts5'
+
+    @staticmethod
+    def available() -> bool:
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=%s", [FTS_TABLE])
+            return cursor.fetchone() is not None
+
+    def upsert(self, rows: Sequence[Tuple[int, str]]) -> None:
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(qid,) for qid, _ in rows])
+            cursor.executemany(f'INSERT INTO {FTS_TABLE}(rowid, tokens) VALUES (%s, %s)', list(rows))
+
+    def delete(self, question_ids: Sequence[int]) -> None:
+        if not question_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(qid,) for qid in question_ids])
+
+    def clear(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    @staticmethod
+    def _match(tokens: Sequence[str]) -> str:
+        return ' AND '.join('"{}"'.format(t.replace('"', '""')) for t in tokens)
+
+    def filter_queryset(self, qs: QuerySet, tokens: Sequence[str]) -> QuerySet:
+        # 把 FTS 表并入 FROM，与 MATCH 结果集按 rowid 连接，bm25 随连接行一并算出，不再逐行跑相关子查询
+        table = qs.model._meta.db_table
+        return qs.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[self._match(tokens)],
+        ).order_by(RawSQL(f'bm25({FTS_TABLE})', []).asc(), '-id')
+
+    def page_queryset(self, qs: QuerySet, tokens: Sequence[str], start: int, stop: Optional[int]) -> QuerySet:
+        return self.filter_queryset(qs, tokens)[start:stop]
+
+    def search(self, tokens: Sequence[str], limit: int) -> List[int]:
+        match = self._match(tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}), rowid DESC LIMIT %s',
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class _PostgresBackend:
+    """tokens 列上的表达式 GIN 索引（见迁移 0017），查询表达式需与索引表达式一致。"""
+    name = 'postgres'
+
+    @staticmethod
+    def available() -> bool:
+        return connection.vendor == 'postgresql'
+
+    def upsert(self, rows: Sequence[Tuple[int, str]]) -> None:
+        return None
+
+    def delete(self, question_ids: Sequence[int]) -> None:
+        return None
+
+    def clear(self) -> None:
+        return None
+
+    @staticmethod
+    def _tsquery(tokens: Sequence[str]) -> str:
+        return ' & '.join("'{}'".format(t.replace("'", "''").replace('\\', '')) for t in tokens)
+
+    def filter_queryset(self, qs: QuerySet, tokens: Sequence[str]) -> QuerySet:
+        # 与索引表按 question_id 连接，ts_rank 直接取连接行上的 tokens，不再逐行跑相关子查询
+        docs = QuestionSearchDocument._meta.db_table
+        table = qs.model._meta.db_table
+        query = self._tsquery(tokens)
+        return qs.extra(
+            tables=[docs],
+            where=[
+                f'{docs}.question_id = {table}.id',
+                f"to_tsvector('simple', {docs}.tokens) @@ to_tsquery('simple', %s)",
+            ],
+            params=[query],
+        ).order_by(
+            RawSQL(f"ts_rank(to_tsvector('simple', {docs}.tokens), to_tsquery('simple', %s))", [query]).desc(),
+            '-id',
+        )
+
+    def page_queryset(self, qs: QuerySet, tokens: Sequence[str], start: int, stop: Optional[int]) -> QuerySet:
+        return self.filter_queryset(qs, tokens)[start:stop]
+
+    def search(self, tokens: Sequence[str], limit: int) -> List[int]:
+        table = QuestionSearchDocument._meta.db_table
+        query = self._tsquery(tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT question_id FROM {table}
+                WHERE to_tsvector('simple', tokens) @@ to_tsquery('simple', %s)
+                ORDER BY ts_rank(to_tsvector('simple', tokens), to_tsquery('simple', %s)) DESC, question_id DESC
+                LIMIT %s
+                """,
+                [query, query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class _PythonBackend:
+    """
+    纯 Python BM25：按索引版本号懒加载进程内倒排表，数据库无全文能力时兜底。
+    """
+    name = 'python'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+
+    @staticmethod
+    def available() -> bool:
+        return True
+
+    def upsert(self, rows: Sequence[Tuple[int, str]]) -> None:
+        return None
+
+    def delete(self, question_ids: Sequence[int]) -> None:
+        return None
+
+    def clear(self) -> None:
+        return None
+
+    def _ensure_loaded(self) -> None:
+        version = get_index_version()
+        if self._version == version:
+            return
+        with self._lock:
+            if self._version == version:
+                return
+            postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+            lengths: Dict[int, int] = {}
+            for qid, tokens in QuestionSearchDocument.objects.values_list('question_id', 'tokens').iterator(chunk_size=2000):
+                counts = Counter(tokens.split())
+                lengths[qid] = sum(counts.values())
+                for token, tf in counts.items():
+                    postings[token][qid] = tf
+            self._postings = dict(postings)
+            self._lengths = lengths
+            self._version = version
+
+    def search(self, tokens: Sequence[str], limit: int) -> List[int]:
+        self._ensure_loaded()
+        lists = [self._postings.get(t) for t in tokens]
+        if not lists or any(not p for p in lists):
+            return []
+
+        candidates = set.intersection(*(set(p) for p in sorted(lists, key=len)))
+        n_docs = max(1, len(self._lengths))
+        avg_len = (sum(self._lengths.values()) / n_docs) or 1.0
+        scored = []
+        for qid in candidates:
+            doc_len = self._lengths.get(qid, 0)
+            score = 0.0
+            for postings in lists:
+                tf = postings[qid]
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_len / avg_len))
+            scored.append((-score, -qid))
+        scored.sort()
+        return [-neg_qid for _, neg_qid in scored[:limit]]
+
+    def filter_queryset(self, qs: QuerySet, tokens: Sequence[str]) -> QuerySet:
+        # 无法下推到数据库：取全部命中（不截断）再与其余过滤条件求交；只用于计数和过滤，不排序
+        return qs.filter(id__in=self.search(tokens, None))
+
+    def page_queryset(self, qs: QuerySet, tokens: Sequence[str], start: int, stop: Optional[int]) -> QuerySet:
+        # 相关度顺序只在进程内：先求出过滤后仍命中的 id，再只对本页 id 构造 CASE 排序
+        hits = self.search(tokens, None)
+        if not hits:
+            return qs.none()
+        allowed = set(qs.filter(id__in=hits).values_list('id', flat=True))
+        return order_by_ids(qs, [qid for qid in hits if qid in allowed][start:stop])
+
+
+_python_backend = _PythonBackend()
+
+
+def get_backend():
+    choice = str(getattr(settings, 'QUIZ_SEARCH_BACKEND', 'auto') or 'auto').lower()
+    backends = {
+        'sqlite_fts5': _SQLiteFTS5Backend,
+        'postgres': _PostgresBackend,
+    }
+    if choice in backends:
+        return backends[choice]()
+    if choice == 'auto':
+        for backend_cls in (_SQLiteFTS5Backend, _PostgresBackend):
+            try:
+                if backend_cls.available():
+                    return backend_cls()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("quizzes.search backend probe failed: backend=%s err=%s", backend_cls.name, exc)
+    return _python_backend
+
+
+def get_index_version() -> int:
+    return shared_cache.get_version(_CACHE_NAMESPACE)
+
+
+def _bump_index_version() -> None:
+    shared_cache.bump_version(_CACHE_NAMESPACE)
+
+
+# ---------------------------------------------------------------------------
+# 索引维护
+# ---------------------------------------------------------------------------
+
+def index_questions(questions: Iterable[Question]) -> int:
+    rows = [(q.id, build_document_tokens(q)) for q in questions if q.id]
+    if not rows:
+        return 0
+
+    with transaction.atomic():
+        existing = set(
+            QuestionSearchDocument.objects.filter(question_id__in=[qid for qid, _ in rows]).values_list('question_id', flat=True)
+        )
+        QuestionSearchDocument.objects.bulk_create(
+            [QuestionSearchDocument(question_id=qid, tokens=tokens) for qid, tokens in rows if qid not in existing]
+        )
+        updates = [QuestionSearchDocument(question_id=qid, tokens=tokens) for qid, tokens in rows if qid in existing]
+        if updates:
+            QuestionSearchDocument.objects.bulk_update(updates, ['tokens'])
+        get_backend().upsert(rows)
+    _bump_index_version()
+    return len(rows)
+
+
+def index_question(question: Question) -> None:
+    try:
+        index_questions([question])
+    except Exception as exc:  # noqa: BLE001
+        # 索引失败不影响题目保存，可通过 rebuild_question_search 补齐
+        logger.warning("quizzes.search index failed: question_id=%s err=%s", question.id, exc)
+
+
+def remove_questions(question_ids: Sequence[int]) -> None:
+    try:
+        get_backend().delete(list(question_ids))
+        _bump_index_version()
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("quizzes.search remove failed: ids=%s err=%s", list(question_ids)[:10], exc)
+
+
+def reindex_knowledge_point(kp_id: int, chunk_size: int = 500) -> int:
+    qs = Question.objects.filter(knowledge_point_id=kp_id).select_related('knowledge_point').order_by('id')
+    return _index_in_chunks(qs, chunk_size)
+
+
+def rebuild_index(chunk_size: int = 500) -> int:
+    backend = get_backend()
+    with transaction.atomic():
+        QuestionSearchDocument.objects.all().delete()
+        backend.clear()
+    return _index_in_chunks(Question.objects.select_related('knowledge_point').order_by('id'), chunk_size)
+
+
+def _index_in_chunks(qs: QuerySet, chunk_size: int) -> int:
+    chunk_size = max(1, int(chunk_size))
+    last_id = 0
+    total = 0
+    while True:
+        chunk = list(qs.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        total += index_questions(chunk)
+        last_id = chunk[-1].id
+    return total
+
+
+# ---------------------------------------------------------------------------
+# 查询
+# ---------------------------------------------------------------------------
+
+def search_question_ids(query: str, limit: Optional[int] = None) -> Optional[List[int]]:
+    """
+    返回按相关度排序的题目 id；查询中没有可检索的词元时返回 None，调用方回退到 icontains。
+    """
+    tokens = _query_tokens(query)
+    if not tokens:
+        return None
+    limit = max(1, int(limit or getattr(settings, 'QUIZ_SEARCH_MAX_RESULTS', 1000) or 1000))
+    try:
+        return get_backend().search(tokens, limit)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("quizzes.search query failed, fallback to python: err=%s", exc)
+        return _python_backend.search(tokens, limit)
+
+
+def order_by_ids(qs: QuerySet, ids: Sequence[int]) -> QuerySet:
+    """按给定 id 顺序（相关度）过滤并排序查询集。"""
+    if not ids:
+        return qs.none()
+    ranking = Case(*[When(id=qid, then=pos) for pos, qid in enumerate(ids)], output_field=IntegerField())
+    return qs.filter(id__in=ids).order_by(ranking)
+
+
+def filter_by_search(qs: QuerySet, query: str) -> QuerySet:
+    """
+    检索条件下推到 qs 所在的 SQL 中，与知识点/题型等过滤条件一起执行，
+    命中数不受 QUIZ_SEARCH_MAX_RESULTS 限制，count() 基于完整结果。
+    Python 后端返回的查询集不按相关度排序，取结果页请用 search_page。
+    """
+    tokens = _query_tokens(query)
+    if not tokens:
+        return qs.filter(text__icontains=query)
+    return get_backend().filter_queryset(qs, tokens)
+
+
+def search_page(qs: QuerySet, query: str, start: int = 0, stop: Optional[int] = None) -> QuerySet:
+    """
+    按相关度取检索结果的第 [start, stop) 条，返回的查询集即为该页，调用方不再切片。
+    qs 应已带上其余过滤条件。
+    """
+    tokens = _query_tokens(query)
+    if not tokens:
+        return qs.filter(text__icontains=query)[start:stop]
+    return get_backend().page_queryset(qs, tokens, start, stop)
@@ -0,0 +1,393 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from quizzes.models import KnowledgePoint, Question, questions_bulk_written
+
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = '2.0'
+DEFAULT_CHUNK_SIZE = 500
+
+FORMAT_REFERENCE = {
+    "question_type": "objective | subjective",
+    "subjective_type": "noun | short | essay | calculate",
+    "difficulty_elo": "800-1800 integer (harder = higher)",
+    "options": "list of 4 strings for objective, null for subjective",
+    "correct_answer": "option text for objective, reference answer for subjective",
+    "grading_points": "scoring rubric, required for subjective questions",
+    "difficulty_level": "entry | easy | normal | hard | extreme",
+}
+
+# 参与内容哈希的模型字段：导入时与库内行逐一比对，哈希一致即跳过写入
+HASH_FIELDS = (
+    'text',
+    'knowledge_point_id',
+    'q_type',
+    'subjective_type',
+    'difficulty_level',
+    'difficulty',
+    'options',
+    'correct_answer',
+    'grading_points',
+    'ai_answer',
+)
+
+
+def open_seed(path: str, mode: str, compressed: Optional[bool] = None):
+    """按扩展名透明处理 gzip（*.gz），统一以 UTF-8 文本读写。"""
+    if compressed is None:
+        compressed = path.endswith('.gz')
+    if compressed:
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def is_ndjson(path: str) -> bool:
+    name = path[:-3] if path.endswith('.gz') else path
+    return name.endswith(('.ndjson', '.jsonl'))
+
+
+# 可空文本列：NULL 与空串视为同一内容
+_BLANK_EQUIVALENT_FIELDS = {'correct_answer', 'grading_points', 'ai_answer'}
+
+
+def content_hash(fields: Dict[str, Any]) -> str:
+    payload = {name: fields.get(name) for name in HASH_FIELDS}
+    for name in _BLANK_EQUIVALENT_FIELDS:
+        payload[name] = payload[name] or ''
+
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# 导出
+# ---------------------------------------------------------------------------
+
+def export_record(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": row['id'],
+        "knowledge_point": row['knowledge_point__name'],
+        "parent_knowledge_point": row['knowledge_point__parent__name'],
+        "question_type": row['q_type'],
+        "subjective_type": row['subjective_type'],
+        "difficulty_elo": row['difficulty'],
+        "difficulty_level": row['difficulty_level'],
+        "question_text": row['text'],
+        "options": row['options'],
+        "correct_answer": row['correct_answer'],
+        "grading_points": row['grading_points'],
+        "ai_explanation": row['ai_answer'],
+    }
+
+
+def iter_export_records(kp_id: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """按主键分段读取（values 投影），内存只保留一个分段。"""
+    qs = Question.objects.all()
+    if kp_id:
+        qs = qs.filter(knowledge_point_id=kp_id)
+    columns = (
+        'id', 'knowledge_point__name', 'knowledge_point__parent__name', 'q_type', 'subjective_type',
+        'difficulty', 'difficulty_level', 'text', 'options', 'correct_answer', 'grading_points', 'ai_answer',
+    )
+    last_id = 0
+    while True:
+        rows = list(qs.filter(id__gt=last_id).order_by('id').values(*columns)[:chunk_size])
+        if not rows:
+            return
+        for row in rows:
+            yield export_record(row)
+        last_id = rows[-1]['id']
+
+
+def export_ndjson(path: str, kp_id: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    导出为 NDJSON：首行为格式头，其后每行一道题。
+    先写临时文件再原子替换，导出中途失败不会留下半个种子文件。
+    """
+    tmp_path = f'{path}.tmp'
+    total = 0
+    with open_seed(tmp_path, 'w', compressed=path.endswith('.gz')) as f:
+        header = {
+            "type": "header",
+            "format_version": FORMAT_VERSION,
+            "description": "UniMind.ai Question Bank - Structured Export",
+            "format_reference": FORMAT_REFERENCE,
+        }
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for record in iter_export_records(kp_id=kp_id, chunk_size=max(1, int(chunk_size))):
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            total += 1
+    os.replace(tmp_path, path)
+    return total
+
+
+# ---------------------------------------------------------------------------
+# 导入
+# ---------------------------------------------------------------------------
+
+def iter_seed_records(path: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    产出 (行号, 记录)。NDJSON 逐行流式读取；旧版 .json 整体文档仍兼容（一次性载入），
+    其中的 knowledge_points 数组转为 type=knowledge_point 的记录。无法解析的行产出 None。
+    """
+    if not is_ndjson(path):
+        with open_seed(path, 'r') as f:
+            data = json.load(f)
+        records = [dict(kp, type='knowledge_point') for kp in data.get('knowledge_points', [])]
+        records.extend(data.get('questions', []))
+        yield from enumerate(records, start=1)
+        return
+
+    with open_seed(path, 'r') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning("quizzes.seed invalid json line=%s", line_no)
+                record = None
+            yield line_no, record if isinstance(record, dict) or record is None else None
+
+
+class _KnowledgePointResolver:
+    """按名称解析知识点（与旧版种子脚本语义一致），已解析的名称缓存在内存中。"""
+
+    def __init__(self):
+        self._by_name: Dict[str, KnowledgePoint] = {}
+
+    def preload(self, names) -> None:
+        missing = {n for n in names if n and n not in self._by_name}
+        if missing:
+            for kp in KnowledgePoint.objects.filter(name__in=missing).order_by('-id'):
+                self._by_name[kp.name] = kp
+
+    def get(self, name: Optional[str], parent_name: Optional[str] = None, description: str = '') -> Optional[KnowledgePoint]:
+        if not name:
+            return None
+        kp = self._by_name.get(name)
+        if kp is None:
+            kp, _ = KnowledgePoint.objects.get_or_create(name=name, defaults={'description': description or ''})
+            self._by_name[name] = kp
+        if parent_name and parent_name != name:
+            parent = self.get(parent_name)
+            if kp.parent_id != parent.id:
+                kp.parent = parent
+                kp.save(update_fields=['parent'])
+        return kp
+
+    def sync(self, record: Dict[str, Any]) -> None:
+        kp = self.get(record.get('name'), record.get('parent_name'))
+        if kp is not None and record.get('description') and kp.description != record['description']:
+            kp.description = record['description']
+            kp.save(update_fields=['description'])
+
+
+def _kp_name(record: Dict[str, Any]) -> Optional[str]:
+    raw = record.get('knowledge_point_name') or record.get('knowledge_point') or record.get('kp_name')
+    return raw.get('name') if isinstance(raw, dict) else raw
+
+
+def _question_fields(record: Dict[str, Any], kp: Optional[KnowledgePoint]) -> Dict[str, Any]:
+    level = record.get('difficulty_level') or 'normal'
+    elo = record.get('difficulty_elo') or record.get('difficulty')
+    return {
+        'text': (record.get('text') or record.get('question_text') or '').strip(),
+        'knowledge_point_id': kp.id if kp else None,
+        'q_type': record.get('question_type') or record.get('q_type') or 'subjective',
+        'subjective_type': record.get('subjective_type'),
+        'difficulty_level': level,
+        'difficulty': elo if elo else Question.DIFFICULTY_MAP.get(level, 1200),
+        'options': record.get('options'),
+        'correct_answer': record.get('correct_answer') or '',
+        'grading_points': record.get('grading_points') or '',
+        'ai_answer': record.get('ai_explanation') or record.get('ai_answer') or '',
+    }
+
+
+def _apply_difficulty_rule(fields: Dict[str, Any], adding: bool) -> None:
+    # 与 Question.save 一致：新建或分值为默认值时按难度等级映射
+    if fields['difficulty_level'] and (adding or fields['difficulty'] == 1200):
+        fields['difficulty'] = Question.DIFFICULTY_MAP.get(fields['difficulty_level'], 1200)
+
+
+def _current_fields(question: Question) -> Dict[str, Any]:
+    return {name: getattr(question, name) for name in HASH_FIELDS}
+
+
+class SeedImporter:
+    """
+    流式导入：按 chunk_size 条分段，每段一次事务内批量匹配、bulk_create / bulk_update，
+    内容哈希一致的行直接跳过。每段提交后写检查点（含累计统计），中断后可从断点续跑。
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checkpoint_path: Optional[str] = None,
+        progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        self.chunk_size = max(1, int(chunk_size))
+        self.checkpoint_path = checkpoint_path
+        self.progress = progress
+        self.kps = _KnowledgePointResolver()
+        self.stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'errors': 0, 'resumed_from': 0}
+
+    # -- 检查点 --------------------------------------------------------------
+
+    @staticmethod
+    def _fingerprint(path: str) -> Dict[str, Any]:
+        stat = os.stat(path)
+        return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+    def _load_checkpoint(self, path: str) -> int:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get('source') != self._fingerprint(path):
+            # 种子文件已变化，旧检查点作废
+            return 0
+        # 断点前各段的统计随检查点一起保存，续跑后的结果覆盖整个文件
+        for key, value in (state.get('stats') or {}).items():
+            if key in self.stats and key != 'resumed_from':
+                self.stats[key] = int(value or 0)
+        return int(state.get('line') or 0)
+
+    def _save_checkpoint(self, path: str, line_no: int) -> None:
+        if not self.checkpoint_path:
+            return
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': self._fingerprint(path), 'line': line_no, 'stats': self.stats}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self) -> None:
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    # -- 导入 ----------------------------------------------------------------
+
+    def run(self, path: str) -> Dict[str, int]:
+        start_after = self._load_checkpoint(path)
+        self.stats['resumed_from'] = start_after
+        chunk: List[Dict[str, Any]] = []
+        last_line = start_after
+
+        for line_no, record in iter_seed_records(path):
+            if line_no <= start_after:
+                continue
+            last_line = line_no
+            if record is None:
+                self.stats['errors'] += 1
+                continue
+            rtype = record.get('type')
+            if rtype == 'header':
+                continue
+            if rtype == 'knowledge_point':
+                self.kps.sync(record)
+                continue
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+                self._save_checkpoint(path, last_line)
+
+        if chunk:
+            self._flush(chunk)
+        self.clear_checkpoint()
+        return self.stats
+
+    def _flush(self, records: List[Dict[str, Any]]) -> None:
+        self.kps.preload({_kp_name(r) for r in records} | {r.get('parent_knowledge_point') or r.get('parent_kp') for r in records})
+        prepared: List[Tuple[Optional[int], Dict[str, Any]]] = []
+        for record in records:
+            try:
+                kp = self.kps.get(_kp_name(record), record.get('parent_knowledge_point') or record.get('parent_kp'))
+                fields = _question_fields(record, kp)
+                qid = record.get('id')
+                qid = int(qid) if qid else None
+            except (TypeError, ValueError) as exc:
+                logger.warning("quizzes.seed bad record: %s", exc)
+                self.stats['errors'] += 1
+                continue
+            if not fields['text']:
+                self.stats['skipped'] += 1
+                continue
+            prepared.append((qid, fields))
+
+        with transaction.atomic():
+            by_id = Question.objects.in_bulk([qid for qid, _ in prepared if qid])
+            by_text: Dict[str, Question] = {}
+            texts = {fields['text'] for qid, fields in prepared if not qid}
+            if texts:
+                for question in Question.objects.filter(text__in=texts).order_by('-id'):
+                    by_text[question.text] = question
+
+            to_create: Dict[Any, Question] = {}
+            to_update: Dict[int, Question] = {}
+            for qid, fields in prepared:
+                existing = by_id.get(qid) if qid else by_text.get(fields['text'])
+                if existing is None:
+                    _apply_difficulty_rule(fields, adding=True)
+                    key = qid or ('text', fields['text'])
+                    if key in to_create:
+                        for name, value in fields.items():
+                            setattr(to_create[key], name, value)
+                    else:
+                        to_create[key] = Question(id=qid, **fields)
+                    continue
+                _apply_difficulty_rule(fields, adding=False)
+                if content_hash(fields) == content_hash(_current_fields(existing)):
+                    self.stats['unchanged'] += 1
+                    continue
+                for name, value in fields.items():
+                    setattr(existing, name, value)
+                to_update[existing.id] = existing
+
+            created = Question.objects.bulk_create(list(to_create.values()))
+            if any(isinstance(key, int) for key in to_create):
+                # 显式主键插入后随本段一起校正自增序列，中断续跑或并发新建题目不会撞上已用主键
+                self._reset_sequence()
+            if to_update:
+                Question.objects.bulk_update(list(to_update.values()), list(HASH_FIELDS))
+
+            try:
+                # 嵌套保存点：钩子里的 SQL 出错只回滚到这里，Postgres 上外层段事务仍可提交
+                with transaction.atomic():
+                    questions_bulk_written(created, created=True)
+                    questions_bulk_written(list(to_update.values()), created=False)
+            except Exception as exc:  # noqa: BLE001
+                # 索引失败不影响导入，可通过 rebuild_question_search 补齐
+                logger.warning("quizzes.seed post-write hooks failed: %s", exc)
+
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(to_update)
+        if self.progress:
+            self.progress(dict(self.stats))
+
+    @staticmethod
+    def _reset_sequence() -> None:
+        # sqlite 无需处理，sequence_reset_sql 返回空列表
+        statements = connection.ops.sequence_reset_sql(no_style(), [Question])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+
+def import_seed(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, checkpoint_path: Optional[str] = None, progress=None) -> Dict[str, int]:
+    return SeedImporter(chunk_size=chunk_size, checkpoint_path=checkpoint_path, progress=progress).run(path)
@@ -0,0 +1,121 @@
+import datetime
+from typing import Optional
+
+from django.core.cache import cache
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from core import cache as shared_cache
+from notifications.models import Notification
+from quizzes.models import Question, UserQuestionStatus, UserQuizStats
+
+
+# FSRS 预警: 稳定性 < 7天 且 下次复习在 3天内 的题目
+AT_RISK_STABILITY_DAYS = 7
+AT_RISK_WINDOW = datetime.timedelta(days=3)
+
+_QUESTION_TOTAL_CACHE_KEY = 'quizzes:stats:question_total'
+_QUESTION_TOTAL_TTL_SECONDS = 300
+
+
+def get_question_total() -> int:
+    return int(shared_cache.get_or_set(_QUESTION_TOTAL_CACHE_KEY, Question.objects.count, _QUESTION_TOTAL_TTL_SECONDS))
+
+
+def invalidate_question_total() -> None:
+    cache.delete(_QUESTION_TOTAL_CACHE_KEY)
+
+
+def _earliest(*values: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    present = [v for v in values if v is not None]
+    return min(present) if present else None
+
+
+def recompute_user_stats(user_id: int, now: Optional[datetime.datetime] = None) -> UserQuizStats:
+    """
+    单条聚合查询重算用户看板计数（走 user 前缀索引，只扫该用户的状态行）。
+    同时求出计数因时间推移而变化的最早时刻：
+    - 下一道题到期（review_count +1，若在预警窗口内则 at_risk -1）；
+    - 下一道低稳定性题进入 3 天预警窗口（at_risk +1）。
+    """
+    now = now or timezone.now()
+    window_end = now + AT_RISK_WINDOW
+    low_stability = Q(stability__lt=AT_RISK_STABILITY_DAYS)
+
+    agg = UserQuestionStatus.objects.filter(user_id=user_id).aggregate(
+        attempted=Count('id'),
+        review=Count('id', filter=Q(next_review_at__lte=now)),
+        at_risk=Count('id', filter=low_stability & Q(next_review_at__gt=now, next_review_at__lte=window_end)),
+        next_due=Min('next_review_at', filter=Q(next_review_at__gt=now)),
+        next_risk_enter=Min('next_review_at', filter=low_stability & Q(next_review_at__gt=window_end)),
+    )
+    next_risk_enter = agg['next_risk_enter'] - AT_RISK_WINDOW if agg['next_risk_enter'] else None
+
+    stats, _ = UserQuizStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'review_count': agg['review'],
+            'at_risk_count': agg['at_risk'],
+            'attempted_count': agg['attempted'],
+            'is_dirty': False,
+            'computed_at': now,
+            'valid_until': _earliest(agg['next_due'], next_risk_enter),
+        },
+    )
+    return stats
+
+
+def get_user_stats(user_id: int, now: Optional[datetime.datetime] = None) -> UserQuizStats:
+    """常态下只读一行；被作答事件置脏或越过 valid_until 时才重算。"""
+    now = now or timezone.now()
+    stats = UserQuizStats.objects.filter(user_id=user_id).first()
+    if stats is None or stats.is_dirty or (stats.valid_until is not None and stats.valid_until <= now):
+        stats = recompute_user_stats(user_id, now=now)
+    return stats
+
+
+def new_question_count(stats: UserQuizStats) -> int:
+    return max(0, get_question_total() - stats.attempted_count)
+
+
+def send_review_reminder_if_needed(user, stats: UserQuizStats, now: Optional[datetime.datetime] = None) -> bool:
+    # 自动生成复习提醒（每天至多一次，以统计行上的日期代替逐次查询通知表）
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    if stats.review_count <= 0 or stats.last_reminder_date == today:
+        return False
+
+    claimed = UserQuizStats.objects.filter(id=stats.id).exclude(last_reminder_date=today).update(last_reminder_date=today)
+    stats.last_reminder_date = today
+    if not claimed:
+        return False
+
+    Notification.objects.create(
+        recipient=user,
+        ntype='fsrs_reminder',
+        title='今日复习任务已就绪',
+        content=f'你有 {stats.review_count} 道题目已进入 FSRS 遗忘临界点。',
+        link='/tests',
+    )
+    return True
+
+
+def reconcile_all_user_stats(now: Optional[datetime.datetime] = None, chunk_size: int = 500) -> int:
+    """定期对账：重算全部已物化的统计行，纠正绕过事件置脏的写入造成的偏差。"""
+    now = now or timezone.now()
+    chunk_size = max(1, int(chunk_size))
+    last_user_id = 0
+    count = 0
+    while True:
+        user_ids = list(
+            UserQuizStats.objects.filter(user_id__gt=last_user_id)
+            .order_by('user_id')
+            .values_list('user_id', flat=True)[:chunk_size]
+        )
+        if not user_ids:
+            break
+        for user_id in user_ids:
+            recompute_user_stats(user_id, now=now)
+        last_user_id = user_ids[-1]
+        count += len(user_ids)
+    return count
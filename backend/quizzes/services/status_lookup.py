@@ -0,0 +1,53 @@
+from typing import Dict, Iterable, Optional
+
+from quizzes.models import UserQuestionStatus
+
+
+_REQUEST_ATTR = '_question_status_lookup'
+
+
+class QuestionStatusLookup:
+    """
+    请求级的 UserQuestionStatus 查找表：列表序列化前按整页题目 id 一次取回，
+    逐题的 is_favorite / is_mastered 只读内存。
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self._statuses: Dict[int, UserQuestionStatus] = {}
+        self._loaded: set = set()
+
+    def prime(self, statuses: Iterable[UserQuestionStatus]) -> None:
+        """用已经取到的状态行填充（错题/收藏列表本身就是状态行，无需再查）。"""
+        for status in statuses:
+            if status.user_id == self.user_id:
+                self._statuses[status.question_id] = status
+                self._loaded.add(status.question_id)
+
+    def load(self, question_ids: Iterable[Optional[int]]) -> None:
+        missing = {qid for qid in question_ids if qid is not None} - self._loaded
+        if not missing:
+            return
+        rows = UserQuestionStatus.objects.filter(user_id=self.user_id, question_id__in=missing).only(
+            'id', 'user_id', 'question_id', 'is_favorite', 'is_mastered'
+        )
+        for status in rows:
+            self._statuses[status.question_id] = status
+        self._loaded |= missing
+
+    def get(self, question_id: int) -> Optional[UserQuestionStatus]:
+        if question_id not in self._loaded:
+            self.load([question_id])
+        return self._statuses.get(question_id)
+
+
+def get_status_lookup(context) -> Optional[QuestionStatusLookup]:
+    """从序列化器上下文取当前请求的查找表；匿名请求返回 None。"""
+    request = (context or {}).get('request')
+    if request is None or not request.user.is_authenticated:
+        return None
+    lookup = getattr(request, _REQUEST_ATTR, None)
+    if lookup is None or lookup.user_id != request.user.id:
+        lookup = QuestionStatusLookup(request.user.id)
+        setattr(request, _REQUEST_ATTR, lookup)
+    return lookup
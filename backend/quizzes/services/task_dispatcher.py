@@ -1,23 +1,26 @@
 import logging
 import threading
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from django.conf import settings
 
 from quizzes.ai_workflow import run_exam_grading
 from quizzes.services.ai_parse_service import run_parse_task
-from quizzes.tasks import run_ai_parse_task, run_exam_grading_task
+from quizzes.services.job_store import create_job, requeue_job, run_job
+from quizzes.services.question_import import run_import_task
+from quizzes.tasks import run_ai_parse_task, run_exam_grading_task, run_question_import_task
 
 
 logger = logging.getLogger(__name__)
 
 
-def _start_thread_grading(user_id: int, exam_id: int, questions_data: List[Dict[str, Any]]) -> None:
-    thread = threading.Thread(
-        target=run_exam_grading,
-        args=(user_id, exam_id, questions_data),
-        daemon=True,
-    )
+def grading_task_id(exam_id: int) -> str:
+    return f"grading-{exam_id}"
+
+
+def _start_thread(target, *args, **kwargs) -> None:
+    # 降级线程同样经 run_job 写入任务表，进程退出后由 reap_stale_jobs 回收
+    thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
     thread.start()
 
 
@@ -30,19 +33,36 @@ def _has_active_celery_worker(timeout: float = 1.0) -> bool:
         return False
 
 
-def dispatch_exam_grading(user_id: int, exam_id: int, questions_data: List[Dict[str, Any]]) -> None:
+def dispatch_exam_grading(
+    user_id: int,
+    exam_id: int,
+    questions_data: List[Dict[str, Any]],
+    task_id: Optional[str] = None,
+) -> str:
+    if task_id:
+        requeue_job(task_id)
+    else:
+        task_id = grading_task_id(exam_id)
+        create_job(
+            task_id,
+            'grading',
+            user_id=user_id,
+            payload={'user_id': user_id, 'exam_id': exam_id, 'questions_data': questions_data},
+        )
+
     use_celery = bool(getattr(settings, "QUIZ_EXAM_GRADING_USE_CELERY", False))
     if not use_celery:
-        _start_thread_grading(user_id, exam_id, questions_data)
-        return
+        _start_thread(run_job, task_id, run_exam_grading, user_id, exam_id, questions_data)
+        return task_id
 
     try:
         if not _has_active_celery_worker():
             raise RuntimeError("no_active_celery_workers")
-        run_exam_grading_task.delay(user_id, exam_id, questions_data)
+        run_exam_grading_task.delay(user_id, exam_id, questions_data, task_id)
     except Exception as exc:
         logger.exception("Celery dispatch exam grading unavailable, fallback thread mode: %s", exc)
-        _start_thread_grading(user_id, exam_id, questions_data)
+        _start_thread(run_job, task_id, run_exam_grading, user_id, exam_id, questions_data)
+    return task_id
 
 
 def dispatch_ai_parse_task(raw_text: str, task_id: str) -> None:
@@ -50,5 +70,12 @@ def dispatch_ai_parse_task(raw_text: str, task_id: str) -> None:
         run_ai_parse_task.delay(raw_text, task_id)
     except Exception as exc:
         logger.exception("Celery dispatch AI parse failed, fallback thread mode: %s", exc)
-        thread = threading.Thread(target=run_parse_task, args=(raw_text, task_id), daemon=True)
-        thread.start()
+        _start_thread(run_job, task_id, run_parse_task, raw_text, task_id)
+
+
+def dispatch_question_import(storage_path: str, filename: str, task_id: str, default_kp_id: Optional[int] = None) -> None:
+    try:
+        run_question_import_task.delay(storage_path, filename, task_id, default_kp_id)
+    except Exception as exc:
+        logger.exception("Celery dispatch question import failed, fallback thread mode: %s", exc)
+        _start_thread(run_job, task_id, run_import_task, storage_path, filename, task_id, default_kp_id=default_kp_id)
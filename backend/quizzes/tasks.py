@@ -1,14 +1,56 @@
 from celery import shared_task
 
+from django.conf import settings
+
 from quizzes.ai_workflow import run_exam_grading
+from quizzes.services import grading_cache
 from quizzes.services.ai_parse_service import run_parse_task
+from quizzes.services.job_store import prune_finished_jobs, reap_stale_jobs, run_job
+from quizzes.services.question_import import run_import_task
+from quizzes.services.fsrs_tuning import fit_cohort_weights
+from quizzes.services.quiz_stats import reconcile_all_user_stats
 
 
 @shared_task(name='quizzes.run_exam_grading_task')
-def run_exam_grading_task(user_id: int, exam_id: int, questions_data):
-    run_exam_grading(user_id, exam_id, questions_data)
+def run_exam_grading_task(user_id: int, exam_id: int, questions_data, job_id=None):
+    if not job_id:
+        run_exam_grading(user_id, exam_id, questions_data)
+        return
+    run_job(job_id, run_exam_grading, user_id, exam_id, questions_data)
 
 
 @shared_task(name='quizzes.run_ai_parse_task')
 def run_ai_parse_task(raw_text: str, task_id: str):
-    run_parse_task(raw_text, task_id)
+    run_job(task_id, run_parse_task, raw_text, task_id)
+
+
+@shared_task(name='quizzes.run_question_import_task')
+def run_question_import_task(storage_path: str, filename: str, task_id: str, default_kp_id=None):
+    run_job(task_id, run_import_task, storage_path, filename, task_id, default_kp_id=default_kp_id)
+
+
+@shared_task(name='quizzes.reap_stale_jobs_task')
+def reap_stale_jobs_task():
+    summary = reap_stale_jobs()
+    summary['pruned'] = prune_finished_jobs()
+    return summary
+
+
+@shared_task(name='quizzes.prune_grading_cache_task')
+def prune_grading_cache_task():
+    return grading_cache.prune()
+
+
+@shared_task(name='quizzes.fit_fsrs_weights_task')
+def fit_fsrs_weights_task():
+    min_reviews = max(1, int(getattr(settings, 'QUIZ_FSRS_FIT_MIN_REVIEWS', 200) or 200))
+    summaries = fit_cohort_weights(min_reviews=min_reviews)
+    return [
+        {k: v for k, v in summary.items() if k != 'weights'}
+        for summary in summaries
+    ]
+
+
+@shared_task(name='quizzes.reconcile_user_quiz_stats_task')
+def reconcile_user_quiz_stats_task():
+    return reconcile_all_user_stats()
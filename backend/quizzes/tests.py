@@ -1,15 +1,44 @@
+import datetime
+import io
 import json
+import os
 import re
+import shutil
+import tempfile
+import threading
 from unittest.mock import patch
 
+import docx
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 
 from ai_service import AIService
 from ai_engine.service import AICallError
+from notifications.models import Notification
 from users.models import User
-from .models import KnowledgePoint
+from . import fsrs_batch
+from .ai_workflow import run_exam_grading
+from .fsrs import FSRS
+from .serializers import QuestionSerializer
+from .models import (
+    ExamQuestionResult, GradingCacheEntry, KnowledgePoint, Question, QuizExam, TaskJob, UserQuestionStatus, UserQuizStats,
+)
+from .services import grading_cache
+from .services.document_chunker import build_chunks, estimate_tokens, extract_docx_text
+from .services.ai_parse_service import get_parse_task, init_parse_task, merge_chunk_results, run_parse_task
+from .services.job_store import prune_finished_jobs, reap_stale_jobs, update_progress
+from .services.question_import import QuestionTableImporter, run_import_task
+from .services.question_sync import SeedImporter, export_ndjson, import_seed
+from .services.question_search import get_backend, search_question_ids, tokenize
+from .services.practice_queue import draw_practice_question_ids, get_new_question_cursor
+from .services.task_dispatcher import dispatch_exam_grading
 
 
 class AIPreviewGenerateViewTests(APITestCase):
@@ -167,3 +196,878 @@ class AIServiceBatchingTests(TestCase):
         self.assertEqual(result["score"], 8.0)
         self.assertEqual(result["fsrs_rating"], 3)
         self.assertIn("要点较完整", result["feedback"])
+
+
+class GradingCacheTests(TestCase):
+    def setUp(self):
+        self.question = Question.objects.create(
+            text="说明 IS 曲线右移的机制。",
+            q_type="subjective",
+            subjective_type="short",
+            correct_answer="从投资函数推导 IS 右移。",
+            grading_points="1. 原理 2. 机制 3. 结论",
+        )
+
+    def _grade(self, answer):
+        return AIService.grade_question(
+            question_text=self.question.text,
+            user_answer=answer,
+            correct_answer=self.question.correct_answer,
+            q_type="subjective",
+            max_score=10,
+            grading_points=self.question.grading_points,
+            subjective_type="简答题",
+            question_id=self.question.id,
+        )
+
+    @patch("ai_service.AIService.simple_chat")
+    def test_repeat_answer_hits_cache_until_question_edited(self, mock_simple_chat):
+        payload = {"score": 6, "feedback": "要点基本覆盖。", "analysis": "参考答案。", "fsrs_rating": 3}
+        mock_simple_chat.return_value = {"choices": [{"message": {"content": json.dumps(payload, ensure_ascii=False)}}]}
+
+        first = self._grade("投资增加，  总需求上升。")
+        second = self._grade("投资增加， 总需求上升。 ")
+        self.assertEqual(first, second)
+        self.assertEqual(mock_simple_chat.call_count, 1)
+
+        self.question.grading_points = "1. 原理 2. 机制 3. 结论 4. 图示"
+        self.question.save()
+        self._grade("投资增加，总需求上升。")
+        self.assertEqual(mock_simple_chat.call_count, 2)
+
+    @patch("ai_service.AIService.simple_chat")
+    def test_cache_read_failure_falls_back_to_llm(self, mock_simple_chat):
+        payload = {"score": 5, "feedback": "要点部分覆盖。", "analysis": "参考答案。", "fsrs_rating": 3}
+        mock_simple_chat.return_value = {"choices": [{"message": {"content": json.dumps(payload, ensure_ascii=False)}}]}
+
+        with patch("quizzes.services.grading_cache.GradingCacheEntry.objects.filter", side_effect=RuntimeError("db down")):
+            result = self._grade("投资增加。")
+
+        self.assertEqual(result["score"], 5)
+        self.assertEqual(mock_simple_chat.call_count, 1)
+
+    @override_settings(QUIZ_GRADING_CACHE_MAX_ENTRIES=2)
+    def test_prune_evicts_oldest_entries_over_capacity(self):
+        for i in range(4):
+            grading_cache.store_result(f"key-{i}", self.question.id, {"score": i})
+        self.assertEqual(GradingCacheEntry.objects.count(), 4)
+
+        self.assertEqual(grading_cache.prune(), 2)
+        self.assertEqual(
+            sorted(GradingCacheEntry.objects.values_list("cache_key", flat=True)), ["key-2", "key-3"]
+        )
+
+
+class ExamGradingWorkflowTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="testpass123", is_member=True)
+        self.objective = Question.objects.create(
+            text="公开市场买入对基础货币的影响？",
+            q_type="objective",
+            options={"A": "减少", "B": "增加", "C": "不变", "D": "不确定"},
+            correct_answer="B",
+        )
+        self.short = Question.objects.create(text="简述IS曲线右移机制。", q_type="subjective", subjective_type="short")
+        self.essay = Question.objects.create(text="论述货币政策传导。", q_type="subjective", subjective_type="essay")
+
+    @override_settings(QUIZ_EXAM_GRADING_CONCURRENCY=2)
+    @patch("quizzes.ai_workflow.AIService.grade_question")
+    def test_grading_keeps_submission_order_and_isolates_failures(self, mock_grade):
+        def _fake_grade(**kwargs):
+            if kwargs["q_type"] == "objective":
+                return {"score": 0, "feedback": "objective", "analysis": "", "fsrs_rating": 4}
+            if "论述" in kwargs["question_text"]:
+                raise AICallError("AI 服务暂时不可用", status_code=503, retryable=True)
+            return {"score": 7, "feedback": "short-ok", "analysis": "ref", "fsrs_rating": 3}
+
+        mock_grade.side_effect = _fake_grade
+        exam = QuizExam.objects.create(user=self.user)
+
+        run_exam_grading(
+            self.user.id,
+            exam.id,
+            [
+                {"question_id": self.essay.id, "answer": "略"},
+                {"question_id": self.objective.id, "answer": "B"},
+                {"question_id": self.short.id, "answer": "投资增加"},
+            ],
+        )
+
+        results = list(ExamQuestionResult.objects.filter(exam=exam).order_by("id"))
+        self.assertEqual([r.question_id for r in results], [self.essay.id, self.objective.id, self.short.id])
+        self.assertEqual(results[0].feedback, "评分服务异常")
+        self.assertEqual(results[1].score, 10)
+        self.assertEqual(results[2].score, 7)
+
+        exam.refresh_from_db()
+        self.assertEqual(exam.total_score, 17)
+        self.assertEqual(exam.max_score, 40)
+        self.assertEqual(UserQuestionStatus.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Notification.objects.filter(recipient=self.user, title="📝 评估完成").exists())
+
+    def test_persistence_query_count_does_not_grow_with_paper_size(self):
+        def _run(count):
+            questions = [
+                Question.objects.create(text=f"客观题{count}-{i}", q_type="objective", correct_answer="A")
+                for i in range(count)
+            ]
+            exam = QuizExam.objects.create(user=self.user)
+            payload = [{"question_id": q.id, "answer": "A"} for q in questions]
+            with CaptureQueriesContext(connection) as ctx:
+                run_exam_grading(self.user.id, exam.id, payload)
+            self.assertEqual(ExamQuestionResult.objects.filter(exam=exam).count(), count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(_run(3), _run(12))
+
+    @patch("quizzes.ai_workflow.AIService.grade_question")
+    def test_batch_fsrs_update_matches_sequential_updates_for_repeated_questions(self, mock_grade):
+        mock_grade.return_value = {"score": 8, "feedback": "ok", "analysis": "", "fsrs_rating": 3}
+        exam = QuizExam.objects.create(user=self.user)
+        payload = [
+            {"question_id": self.short.id, "answer": "投资增加"},
+            {"question_id": self.objective.id, "answer": "A"},
+            {"question_id": self.short.id, "answer": "投资增加"},
+        ]
+        with patch("quizzes.ai_workflow.FSRS.update_status", side_effect=AssertionError("per-row update")):
+            run_exam_grading(self.user.id, exam.id, payload)
+
+        now = timezone.now()
+        expected_short = UserQuestionStatus(user=self.user, question=self.short)
+        for _ in range(2):
+            expected_short = FSRS.update_status(expected_short, 3)
+        short = UserQuestionStatus.objects.get(user=self.user, question=self.short)
+        self.assertEqual((short.reps, short.wrong_count, short.last_correct), (2, 0, True))
+        self.assertAlmostEqual(short.stability, expected_short.stability, places=6)
+        self.assertAlmostEqual(short.difficulty, expected_short.difficulty, places=6)
+
+        objective = UserQuestionStatus.objects.get(user=self.user, question=self.objective)
+        self.assertEqual((objective.reps, objective.lapses, objective.wrong_count), (1, 0, 1))
+        self.assertAlmostEqual(objective.stability, FSRS.w[2], places=6)
+        self.assertGreater(objective.next_review_at, now)
+
+
+class PracticeQueueTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="practice_user", password="testpass123", is_member=True)
+        self.client.force_authenticate(user=self.user)
+        self.questions = [
+            Question.objects.create(text=f"练习题 {i}", q_type="single", correct_answer="A")
+            for i in range(6)
+        ]
+
+    def _status(self, question, next_review_at=None, **kwargs):
+        status_obj = UserQuestionStatus.objects.create(user=self.user, question=question, **kwargs)
+        if next_review_at is not None:
+            # next_review_at 为 auto_now_add，创建后再改写
+            UserQuestionStatus.objects.filter(id=status_obj.id).update(next_review_at=next_review_at)
+        return status_obj
+
+    def test_due_items_come_first_most_overdue_first(self):
+        now = timezone.now()
+        q0, q1, q2 = self.questions[:3]
+        self._status(q0, next_review_at=now - datetime.timedelta(days=1))
+        self._status(q1, next_review_at=now - datetime.timedelta(days=3))
+        self._status(q2, is_mastered=True)
+
+        ids = draw_practice_question_ids(self.user, 4, now=now)
+
+        self.assertEqual(ids[:2], [q1.id, q0.id])
+        self.assertEqual(ids[2:], [self.questions[3].id, self.questions[4].id])
+
+    def test_new_question_cursor_skips_attempted_prefix(self):
+        for question in self.questions[:3]:
+            self._status(question, next_review_at=timezone.now() + datetime.timedelta(days=5))
+
+        first = draw_practice_question_ids(self.user, 2)
+        self.assertEqual(first, [self.questions[3].id, self.questions[4].id])
+        self.assertEqual(get_new_question_cursor(self.user.id), self.questions[2].id)
+
+        # 抽到但未作答的新题不会被游标跳过
+        self._status(self.questions[4], next_review_at=timezone.now() + datetime.timedelta(days=5))
+        second = draw_practice_question_ids(self.user, 3)
+        self.assertEqual(second, [self.questions[3].id, self.questions[5].id])
+
+    def test_question_list_draw_uses_queue(self):
+        response = self.client.get("/api/quizzes/questions/", {"limit": 3})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = response.data["results"] if isinstance(response.data, dict) else response.data
+        self.assertEqual(sorted(row["id"] for row in rows), [q.id for q in self.questions[:3]])
+
+
+class FSRSBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="fsrs_user", password="testpass123")
+        self.questions = [
+            Question.objects.create(text=f"记忆题 {i}", q_type="single", correct_answer="A")
+            for i in range(4)
+        ]
+
+    def _statuses(self, now):
+        specs = [
+            dict(reps=0, stability=0.0, difficulty=0.0, last_review=None),
+            dict(reps=2, stability=3.0, difficulty=5.5, last_review=now - datetime.timedelta(days=4)),
+            dict(reps=5, stability=12.0, difficulty=7.0, last_review=now - datetime.timedelta(days=20)),
+            dict(reps=1, stability=0.6, difficulty=4.0, last_review=now - datetime.timedelta(days=1)),
+        ]
+        return [UserQuestionStatus(user=self.user, question=q, **spec) for q, spec in zip(self.questions, specs)]
+
+    def test_batch_update_matches_scalar_scheduler(self):
+        ratings = [3, 1, 4, 3]
+        now = timezone.now()
+        with patch("quizzes.fsrs.timezone.now", return_value=now):
+            expected = [FSRS.update_status(st, rating) for st, rating in zip(self._statuses(now), ratings)]
+        batch = fsrs_batch.update_statuses(self._statuses(now), ratings, now=now)
+
+        for exp, got in zip(expected, batch):
+            self.assertAlmostEqual(exp.stability, got.stability, places=6)
+            self.assertAlmostEqual(exp.difficulty, got.difficulty, places=6)
+            self.assertEqual((exp.reps, exp.lapses), (got.reps, got.lapses))
+            self.assertEqual(exp.next_review_at, got.next_review_at)
+
+    def test_retrievability_matches_forgetting_curve(self):
+        values = fsrs_batch.retrievability([0.0, 3.0, 12.0, 5.0], [10, 4, 0, -2])
+
+        self.assertEqual(values[0], 0.0)
+        self.assertAlmostEqual(values[1], (1 + FSRS.F * 4 / 3.0) ** -0.5, places=6)
+        self.assertEqual(values[2], 1.0)
+        self.assertEqual(values[3], 1.0)
+
+    def test_fit_weights_improves_log_loss_on_history(self):
+        # 历史上间隔 30 天仍大多记得：默认参数低估了稳定性
+        sequences = [[(0, 3), (30, 3), (30, 3)] for _ in range(40)] + [[(0, 3), (30, 1)] for _ in range(4)]
+        result = fsrs_batch.fit_weights(sequences, iterations=40)
+
+        self.assertTrue(result["improved"])
+        self.assertLess(result["log_loss"], result["baseline_log_loss"])
+        self.assertEqual(len(result["weights"]), len(FSRS.w))
+
+
+class QuizStatsViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="stats_user", password="testpass123", is_member=True)
+        self.client.force_authenticate(user=self.user)
+        self.questions = [
+            Question.objects.create(text=f"统计题 {i}", q_type="single", correct_answer="A")
+            for i in range(5)
+        ]
+        now = timezone.now()
+        # 已到期 1 道、3 天内到期的低稳定性题 1 道、远期 1 道
+        for question, offset, stability in [
+            (self.questions[0], datetime.timedelta(days=-1), 2.0),
+            (self.questions[1], datetime.timedelta(days=2), 3.0),
+            (self.questions[2], datetime.timedelta(days=10), 3.0),
+        ]:
+            st = UserQuestionStatus.objects.create(user=self.user, question=question, stability=stability)
+            UserQuestionStatus.objects.filter(id=st.id).update(next_review_at=now + offset)
+
+    def _stats(self):
+        response = self.client.get("/api/quizzes/stats/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_stats_match_live_counts_and_remind_once(self):
+        data = self._stats()
+
+        self.assertEqual(data, {"review_goal": 1, "new_questions": 2, "at_risk_count": 1})
+        self._stats()
+        self.assertEqual(Notification.objects.filter(recipient=self.user, ntype="fsrs_reminder").count(), 1)
+
+    def test_clean_stats_are_a_single_row_read(self):
+        self._stats()
+        with CaptureQueriesContext(connection) as ctx:
+            self._stats()
+        stats_queries = [q["sql"] for q in ctx.captured_queries if "quizzes_" in q["sql"]]
+        self.assertEqual(len(stats_queries), 1)
+        self.assertIn("quizzes_userquizstats", stats_queries[0])
+
+    def test_status_change_and_time_passing_refresh_stats(self):
+        self._stats()
+        self.client.post("/api/quizzes/favorite/toggle/", {"question_id": self.questions[3].id}, format="json")
+        self.assertTrue(UserQuizStats.objects.get(user=self.user).is_dirty)
+        # 收藏会创建状态行：不再算新题，且 next_review_at 为创建时刻，立即到期
+        self.assertEqual(self._stats(), {"review_goal": 2, "new_questions": 1, "at_risk_count": 1})
+
+        later = timezone.now() + datetime.timedelta(days=2, hours=1)
+        with patch("quizzes.views.timezone.now", return_value=later):
+            data = self._stats()
+        self.assertEqual(data["review_goal"], 3)
+        self.assertEqual(data["at_risk_count"], 0)
+
+
+class QuestionSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username="search_admin", password="testpass123", is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+        self.kp = KnowledgePoint.objects.create(code="MB-2001", name="货币乘数", level="kp")
+        self.q_supply = Question.objects.create(text="简述货币供给的内生性。货币供给受哪些因素影响？", correct_answer="央行与商业银行共同决定")
+        self.q_demand = Question.objects.create(text="凯恩斯货币需求理论的三大动机是什么？", correct_answer="交易、预防、投机")
+        self.q_kp = Question.objects.create(text="法定准备金率下调的影响", knowledge_point=self.kp, correct_answer="派生存款增加")
+        self.q_english = Question.objects.create(text="Explain the IS-LM model.", correct_answer="IS curve and LM curve")
+
+    def test_tokenize_uses_cjk_bigrams_and_words(self):
+        self.assertEqual(tokenize("货币供给", for_query=True), ["货币", "币供", "供给"])
+        self.assertEqual(tokenize("IS-LM 模型", for_query=True), ["is", "lm", "模型"])
+        self.assertIn("币", tokenize("货币"))
+
+    def test_backends_rank_and_match_substrings(self):
+        self.assertEqual(get_backend().name, "sqlite_fts5")
+        for backend in ("sqlite_fts5", "python"):
+            with self.subTest(backend=backend), override_settings(QUIZ_SEARCH_BACKEND=backend):
+                ids = search_question_ids("货币供给")
+                self.assertEqual(ids, [self.q_supply.id])
+                # 知识点名称同样参与检索
+                self.assertEqual(set(search_question_ids("货币")), {self.q_supply.id, self.q_demand.id, self.q_kp.id})
+                # 重复出现的词排序更靠前
+                self.assertEqual(search_question_ids("货币")[0], self.q_supply.id)
+                self.assertEqual(search_question_ids("货币乘数"), [self.q_kp.id])
+                self.assertEqual(search_question_ids("lm"), [self.q_english.id])
+
+    def test_index_follows_edits_renames_and_deletes(self):
+        self.q_demand.text = "托宾资产组合理论"
+        self.q_demand.save()
+        self.assertEqual(search_question_ids("货币需求"), [])
+        self.assertEqual(search_question_ids("资产组合"), [self.q_demand.id])
+
+        self.kp.name = "存款创造"
+        self.kp.save()
+        self.assertEqual(search_question_ids("存款创造"), [self.q_kp.id])
+
+        q_id = self.q_supply.id
+        self.q_supply.delete()
+        self.assertEqual(search_question_ids("货币供给"), [])
+        self.assertNotIn(q_id, search_question_ids("货币") or [])
+
+    def test_admin_list_search_is_ranked(self):
+        response = self.client.get("/api/quizzes/admin/questions/", {"search": "货币"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 3)
+        self.assertEqual(response.data["results"][0]["id"], self.q_supply.id)
+
+    def test_ranked_pages_join_the_match_set_once(self):
+        for backend in ("sqlite_fts5", "python"):
+            with self.subTest(backend=backend), override_settings(QUIZ_SEARCH_BACKEND=backend):
+                pages = []
+                for page in (1, 2):
+                    with CaptureQueriesContext(connection) as ctx:
+                        response = self.client.get(
+                            "/api/quizzes/admin/questions/", {"search": "货币", "page": page, "page_size": 1}
+                        )
+                    pages.append(response.data["results"][0]["id"])
+                    sql = " ".join(q["sql"] for q in ctx.captured_queries)
+                    # 相关度不再逐行跑相关子查询；Python 后端的 CASE 只覆盖本页（含探测下一页的一条）
+                    self.assertLessEqual(sql.count("MATCH"), 2)
+                    self.assertLessEqual(sql.count("WHEN"), 2)
+                self.assertEqual(pages[0], self.q_supply.id)
+                self.assertEqual(pages, search_question_ids("货币")[:2])
+
+    @override_settings(QUIZ_SEARCH_MAX_RESULTS=2)
+    def test_filters_apply_before_ranking_without_result_cap(self):
+        other_kp = KnowledgePoint.objects.create(code="MB-2002", name="利率", level="kp")
+        in_kp = [Question.objects.create(text=f"货币政策传导{i}", knowledge_point=other_kp) for i in range(3)]
+        # 排名更靠前的命中都不在筛选范围内，先截断再过滤会丢掉 in_kp
+        for i in range(3):
+            Question.objects.create(text=f"货币政策传导货币政策{i}")
+
+        for backend in ("sqlite_fts5", "python"):
+            with self.subTest(backend=backend), override_settings(QUIZ_SEARCH_BACKEND=backend):
+                response = self.client.get(
+                    "/api/quizzes/admin/questions/", {"search": "货币政策", "kp_id": other_kp.id}
+                )
+                self.assertEqual(response.data["total"], 3)
+                self.assertEqual({row["id"] for row in response.data["results"]}, {q.id for q in in_kp})
+
+                response = self.client.get("/api/quizzes/admin/questions/", {"search": "货币"})
+                self.assertEqual(response.data["total"], 9)
+
+
+class AdminQuestionListPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username="list_admin", password="testpass123", is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+        self.questions = [
+            Question.objects.create(text=f"第{i}题 " + "长" * 300, correct_answer="答案", ai_answer="解析" * 50)
+            for i in range(7)
+        ]
+        self.url = "/api/quizzes/admin/questions/"
+
+    def test_cursor_walk_visits_every_question_once_in_order(self):
+        seen = []
+        cursor = ""
+        while True:
+            response = self.client.get(self.url, {"cursor": cursor, "page_size": 3, "fields": "preview"})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(row["id"] for row in response.data["results"])
+            if not response.data["has_more"]:
+                break
+            cursor = response.data["next_cursor"]
+
+        self.assertEqual(seen, [q.id for q in reversed(self.questions)])
+
+    def test_preview_projection_skips_heavy_columns(self):
+        response = self.client.get(self.url, {"cursor": "", "fields": "preview", "total": "none"})
+
+        row = response.data["results"][0]
+        self.assertNotIn("ai_answer", row)
+        self.assertNotIn("correct_answer", row)
+        self.assertEqual(len(row["text"]), 200)
+        self.assertIsNone(response.data["total"])
+
+    def test_cached_total_is_invalidated_by_bank_changes(self):
+        first = self.client.get(self.url, {"cursor": ""})
+        self.assertEqual(first.data["total"], 7)
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(text="新增题")
+        second = self.client.get(self.url, {"cursor": ""})
+        self.assertEqual(second.data["total"], 8)
+
+    def test_legacy_page_mode_and_invalid_cursor(self):
+        response = self.client.get(self.url, {"page": 3, "page_size": 3})
+        self.assertEqual(response.data["total_pages"], 3)
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.questions[0].id])
+        self.assertIn("ai_answer", response.data["results"][0])
+
+        self.assertEqual(self.client.get(self.url, {"cursor": "not-a-cursor"}).status_code, 400)
+
+
+class KnowledgePointTreeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="tree_reader", password="testpass123")
+        self.client.force_authenticate(user=self.user)
+        self.root = KnowledgePoint.objects.create(code="MB", name="货币银行学", level="subject")
+        self.child = KnowledgePoint.objects.create(code="MB-1", name="货币供给", level="chapter", parent=self.root)
+        self.leaf = KnowledgePoint.objects.create(code="MB-1-1", name="乘数", level="kp", parent=self.child)
+        self.other = KnowledgePoint.objects.create(code="IF", name="国际金融", level="subject")
+        Question.objects.create(text="乘数题一", knowledge_point=self.leaf)
+        Question.objects.create(text="乘数题二", knowledge_point=self.leaf)
+        Question.objects.create(text="供给题", knowledge_point=self.child)
+        self.url = "/api/quizzes/knowledge-points/"
+
+    def test_tree_shape_and_counts(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        tree = response.json()
+        self.assertEqual([node["id"] for node in tree], [self.root.id, self.other.id])
+        child = tree[0]["children"][0]
+        self.assertEqual((child["id"], child["questions_count"]), (self.child.id, 1))
+        self.assertEqual(child["children"][0]["questions_count"], 2)
+        self.assertEqual(child["children"][0]["children"], [])
+
+        detail = self.client.get(f"{self.url}{self.child.id}/")
+        self.assertEqual(detail.data["children"][0]["id"], self.leaf.id)
+
+    def test_query_count_is_constant_and_cached(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                KnowledgePoint.objects.create(code=f"MB-1-{i + 2}", name=f"子点{i}", parent=self.child)
+        with CaptureQueriesContext(connection) as rebuilt:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(self.url)
+
+        self.assertEqual(len(cold.captured_queries), len(rebuilt.captured_queries))
+        self.assertLess(len(warm.captured_queries), len(cold.captured_queries))
+
+    def test_etag_and_invalidation_on_writes(self):
+        first = self.client.get(self.url)
+        etag = first["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # 事务提交前不换代，避免并发请求把未提交前的旧树按新版本写回缓存
+        with self.captureOnCommitCallbacks() as callbacks:
+            question = Question.objects.create(text="新题", knowledge_point=self.other)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for callback in callbacks:
+            callback()
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.json()[1]["questions_count"], 1)
+
+        question.knowledge_point = self.leaf
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save(update_fields=["knowledge_point"])
+        self.assertEqual(self.client.get(self.url).json()[1]["questions_count"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.child.delete()
+        self.assertEqual(self.client.get(self.url).json()[0]["children"], [])
+
+
+class QuestionStatusBatchingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="batch_member", password="testpass123", is_member=True)
+        self.client.force_authenticate(user=self.user)
+        self.kp = KnowledgePoint.objects.create(code="MB-9", name="利率", level="kp")
+
+    def _seed(self, count):
+        for i in range(count):
+            question = Question.objects.create(text=f"批量题{i}", knowledge_point=self.kp)
+            UserQuestionStatus.objects.create(
+                user=self.user, question=question, wrong_count=i + 1, is_favorite=True, is_mastered=i % 2 == 0
+            )
+
+    def _query_count(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), response
+
+    def test_status_lists_run_in_constant_queries(self):
+        for url in ("/api/quizzes/wrong-questions/", "/api/quizzes/favorites/"):
+            self._seed(2)
+            small, _ = self._query_count(url)
+            self._seed(8)
+            large, response = self._query_count(url)
+            self.assertEqual(small, large, url)
+            detail = response.data[0]["question_detail"]
+            self.assertTrue(detail["is_favorite"])
+            self.assertEqual(detail["knowledge_point_detail"]["name"], "利率")
+            self.assertNotIn("children", detail["knowledge_point_detail"])
+            UserQuestionStatus.objects.all().delete()
+
+    def test_question_serializer_batches_status_lookup(self):
+        self._seed(6)
+        Question.objects.create(text="未作答题", knowledge_point=self.kp)
+        request = Request(APIRequestFactory().get("/"))
+        request.user = self.user
+        questions = list(Question.objects.select_related("knowledge_point").order_by("id"))
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = QuestionSerializer(questions, many=True, context={"request": request}).data
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([row["is_mastered"] for row in data], [True, False, True, False, True, False, False])
+        self.assertFalse(data[-1]["is_favorite"])
+
+
+class QuestionSeedSyncTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        parent = KnowledgePoint.objects.create(name="货币银行学")
+        self.kp = KnowledgePoint.objects.create(name="货币供给", parent=parent)
+        for i in range(5):
+            Question.objects.create(
+                text=f"同步题{i}", knowledge_point=self.kp, q_type="objective",
+                options=["甲", "乙", "丙", "丁"], correct_answer="甲", difficulty_level="hard",
+            )
+
+    def test_gzip_round_trip_is_a_noop_on_rerun(self):
+        path = os.path.join(self.tmpdir, "bank.ndjson.gz")
+        self.assertEqual(export_ndjson(path, chunk_size=2), 5)
+
+        stats = import_seed(path, chunk_size=2)
+        self.assertEqual((stats["created"], stats["updated"], stats["unchanged"]), (0, 0, 5))
+
+        Question.objects.filter(text="同步题0").update(correct_answer="乙")
+        Question.objects.filter(text="同步题1").delete()
+        with patch.object(connection.ops, "sequence_reset_sql", return_value=[]) as mock_reset:
+            stats = import_seed(path, chunk_size=2)
+        self.assertEqual((stats["created"], stats["updated"], stats["unchanged"]), (1, 1, 3))
+        # 只有插入了显式主键的那一段校正序列
+        mock_reset.assert_called_once()
+        self.assertEqual(Question.objects.get(text="同步题0").correct_answer, "甲")
+        self.assertEqual(Question.objects.get(text="同步题1").knowledge_point.parent.name, "货币银行学")
+        self.assertEqual(search_question_ids("同步题1"), [Question.objects.get(text="同步题1").id])
+
+    def test_new_questions_matched_by_text_and_resumed_from_checkpoint(self):
+        path = os.path.join(self.tmpdir, "new.ndjson")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "header", "format_version": "2.0"}) + "\n")
+            for i in range(4):
+                f.write(json.dumps({"question_text": f"新题{i}", "knowledge_point": "新知识点", "difficulty_level": "easy"}, ensure_ascii=False) + "\n")
+            f.write("not json\n")
+        checkpoint = os.path.join(self.tmpdir, "new.checkpoint")
+
+        original_flush = SeedImporter._flush
+        flushes = []
+
+        def interrupted_flush(importer, records):
+            flushes.append(len(records))
+            if len(flushes) == 2:
+                raise RuntimeError("中断")
+            return original_flush(importer, records)
+
+        with patch.object(SeedImporter, "_flush", interrupted_flush):
+            with self.assertRaises(RuntimeError):
+                SeedImporter(chunk_size=2, checkpoint_path=checkpoint).run(path)
+        self.assertTrue(os.path.exists(checkpoint))
+
+        stats = SeedImporter(chunk_size=2, checkpoint_path=checkpoint).run(path)
+        self.assertEqual(stats["resumed_from"], 3)
+        # 断点前一段的统计从检查点恢复
+        self.assertEqual((stats["created"], stats["errors"]), (4, 1))
+        self.assertFalse(os.path.exists(checkpoint))
+        self.assertEqual(Question.objects.filter(text__startswith="新题", difficulty=1000).count(), 4)
+
+        stats = import_seed(path)
+        self.assertEqual((stats["created"], stats["unchanged"]), (0, 4))
+
+    def test_failing_post_write_hook_keeps_the_chunk(self):
+        path = os.path.join(self.tmpdir, "hook.ndjson")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"question_text": "钩子失败题", "knowledge_point": "货币供给"}, ensure_ascii=False) + "\n")
+
+        def broken_hook(questions, created=True):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM quizzes_no_such_table")
+
+        with patch("quizzes.services.question_sync.questions_bulk_written", side_effect=broken_hook):
+            with self.assertLogs("quizzes.services.question_sync", level="WARNING"):
+                stats = import_seed(path)
+
+        self.assertEqual(stats["created"], 1)
+        self.assertTrue(Question.objects.filter(text="钩子失败题").exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.gettempdir())
+class QuestionTableImportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username="import_admin", password="testpass123", is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+        self.kp = KnowledgePoint.objects.create(code="MB-7", name="汇率", level="kp")
+        self.url = "/api/quizzes/import-csv/"
+
+    def _upload(self, content, name="bank.csv", encoding="utf-8", **extra):
+        upload = SimpleUploadedFile(name, content.encode(encoding), content_type="text/csv")
+        return self.client.post(self.url, {"file": upload, **extra}, format="multipart")
+
+    def test_rows_are_normalized_and_errors_reported_per_row(self):
+        content = (
+            "题目,题型,选项,答案,难度,知识点\n"
+            "汇率由什么决定？,单选题,A. 供求|B. 利率|C. 税收|D. 关税,A,1450,汇率\n"
+            ",单选题,A|B|C|D,A,,\n"
+            "简述购买力平价,简答题,,参考答案,,不存在的知识点\n"
+            "解释汇率超调,名词解释,,答案,entry,MB-7\n"
+            "无选项的客观题,客观题,,A,,\n"
+        )
+        response = self._upload(content, kp_id=self.kp.id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "partial_success")
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual([e["row"] for e in response.data["errors"]], [3, 4, 6])
+
+        objective = Question.objects.get(text="汇率由什么决定？")
+        self.assertEqual(objective.options, {"A": "供求", "B": "利率", "C": "税收", "D": "关税"})
+        self.assertEqual((objective.correct_answer, objective.difficulty_level, objective.difficulty), ("A", "hard", 1400))
+        noun = Question.objects.get(text="解释汇率超调")
+        self.assertEqual((noun.subjective_type, noun.knowledge_point_id, noun.difficulty), ("noun", self.kp.id, 800))
+        self.assertEqual(search_question_ids("汇率超调"), [noun.id])
+
+    def test_gbk_csv_and_dry_run(self):
+        content = "question,type,answer\n什么是通货膨胀,subjective,物价持续上涨\n"
+        response = self._upload(content, encoding="gbk", dry_run="1")
+
+        self.assertEqual(response.data["count"], 1)
+        self.assertTrue(response.data["dry_run"])
+        self.assertFalse(Question.objects.exists())
+
+        self.assertEqual(self._upload("foo,bar\n1,2\n").status_code, 400)
+        self.assertEqual(self._upload("text\n题\n", name="bank.pdf").status_code, 400)
+
+    def test_background_import_reports_progress(self):
+        rows = "".join(f"第{i}题,简答题,答案{i}\n" for i in range(5))
+        with patch("quizzes.views.dispatch_question_import", side_effect=run_import_task):
+            response = self._upload("text,type,answer\n" + rows, background="1")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        result = self.client.get(self.url, {"task_id": response.data["task_id"]}).data
+        self.assertEqual((result["status"], result["count"], result["processed"]), ("completed", 5, 5))
+        self.assertEqual(Question.objects.count(), 5)
+
+    def test_failing_post_write_hook_keeps_the_chunk(self):
+        def broken_hook(questions, created=True):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM quizzes_no_such_table")
+
+        with patch("quizzes.services.question_import.questions_bulk_written", side_effect=broken_hook):
+            with self.assertLogs("quizzes.services.question_import", level="WARNING"):
+                result = QuestionTableImporter().run(iter([(2, {"text": "钩子失败题", "q_type": "简答题", "answer": "答"})]))
+
+        self.assertEqual(result["count"], 1)
+        self.assertTrue(Question.objects.filter(text="钩子失败题").exists())
+
+    def test_each_chunk_commits_before_progress_is_reported(self):
+        rows = [(i + 2, {"text": f"第{i}题", "q_type": "简答题", "answer": "答"}) for i in range(5)]
+        reported = []
+
+        def progress(result):
+            reported.append((result["total_rows"], Question.objects.count()))
+
+        original = Question.objects.bulk_create
+        calls = []
+
+        def failing_bulk_create(objs, *args, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 3:
+                raise RuntimeError("db down")
+            return original(objs, *args, **kwargs)
+
+        importer = QuestionTableImporter(chunk_size=2, progress=progress)
+        with patch.object(Question.objects, "bulk_create", side_effect=failing_bulk_create):
+            with self.assertRaises(RuntimeError):
+                importer.run(iter(rows))
+
+        # 第三段失败只回滚本段，前两段已提交且进度已上报
+        self.assertEqual(reported, [(2, 2), (4, 4)])
+        self.assertEqual(Question.objects.count(), 4)
+
+
+@override_settings(QUIZ_PARSE_CONCURRENCY=4)
+class ParsePipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_merge_dedups_exact_and_overlap_fragments_in_order(self):
+        full = "下列关于货币乘数的说法中，哪一项是正确的？"
+        merged = merge_chunk_results([
+            [{"text": "1. 什么是基础货币？"}, {"text": full[:15]}],
+            [{"text": full}, {"text": "（2）什么是基础货币"}, {"text": "名词解释：流动性陷阱"}],
+            None,
+            [{"text": "名词解释: 流动性陷阱。"}],
+        ])
+
+        self.assertEqual([q["text"] for q in merged], ["1. 什么是基础货币？", full, "名词解释：流动性陷阱"])
+
+    def test_chunks_run_concurrently_and_publish_partial_results(self):
+        barrier = threading.Barrier(3, timeout=5)
+        published = []
+
+        def fake_parse(chunk):
+            index = int(chunk.split("#")[1])
+            if index == 1:
+                raise AICallError("上游超时", status_code=504, retryable=True)
+            if index < 4:
+                barrier.wait()  # 前几个分片必须同时在途，串行执行会在此超时
+            return [{"text": f"第{index}段题目内容足够长以免被误判"}]
+
+        def fake_chunks(raw_text):
+            return [f"#{i}#" for i in range(5)]
+
+        def record_progress(task_id, progress, result=None):
+            published.append(result)
+            return update_progress(task_id, progress, result)
+
+        init_parse_task("t1")
+        with patch.object(AIService, "parse_questions_from_text", side_effect=fake_parse), \
+                patch("quizzes.services.ai_parse_service._build_chunks", side_effect=fake_chunks), \
+                patch("quizzes.services.ai_parse_service.update_progress", side_effect=record_progress):
+            run_parse_task("raw", "t1")
+
+        result = get_parse_task("t1")
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual(result["failed_chunks"], 1)
+        self.assertEqual([q["text"][:3] for q in result["data"]], ["第0段", "第2段", "第3段", "第4段"])
+        partial = [p for p in published if p["completed_chunks"]]
+        self.assertTrue(partial)
+        self.assertTrue(all(len(p["data"]) <= 4 for p in partial))
+
+
+class DocumentChunkerTests(TestCase):
+    def test_questions_are_never_split_across_chunks(self):
+        questions = [
+            f"{i}. 关于第{i}个货币政策工具的说法，下列哪一项是正确的？\nA. 选项甲\nB. 选项乙\nC. 选项丙\nD. 选项丁\n答案：A"
+            for i in range(1, 31)
+        ]
+        text = "一、单项选择题\n\n" + "\n\n".join(questions)
+
+        chunks = build_chunks(text, token_budget=200, model="deepseek-ai/DeepSeek-V3.2")
+
+        self.assertLess(len(chunks), len(questions))
+        for i in range(1, 31):
+            holders = [c for c in chunks if f"{i}. 关于第{i}个" in c]
+            self.assertEqual(len(holders), 1)
+            self.assertIn("答案：A", holders[0].split(f"{i}. 关于第{i}个")[1].split("\n\n")[0])
+        self.assertTrue(all(estimate_tokens(c, 0.6) <= 200 for c in chunks))
+
+    def test_oversized_question_falls_back_to_option_boundaries(self):
+        text = "1. " + "很长的题干" * 60 + "\nA. " + "选项" * 40 + "\nB. " + "选项" * 40
+
+        chunks = build_chunks(text, token_budget=150, model="unknown")
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(chunks[1].startswith("A. ") or chunks[-1].startswith("B. "))
+        self.assertEqual("".join(chunks).replace("\n", ""), text.replace("\n", ""))
+
+    def test_docx_keeps_auto_numbering_and_tables(self):
+        document = docx.Document()
+        document.add_paragraph("一、选择题")
+        document.add_paragraph("货币乘数取决于？", style="List Number")
+        document.add_paragraph("A. 准备金率")
+        document.add_paragraph("汇率由什么决定？", style="List Number")
+        table = document.add_table(rows=1, cols=2)
+        table.cell(0, 0).text = "A. 供求"
+        table.cell(0, 1).text = "B. 利率"
+        buffer = io.BytesIO()
+        document.save(buffer)
+        buffer.seek(0)
+
+        text = extract_docx_text(buffer)
+
+        self.assertIn("1. 货币乘数取决于？", text)
+        self.assertIn("2. 汇率由什么决定？\nA. 供求 | B. 利率", text)
+        self.assertEqual(build_chunks(text, token_budget=12)[2], "2. 汇率由什么决定？\nA. 供求 | B. 利率")
+
+
+def _run_inline(target, *args, **kwargs):
+    target(*args, **kwargs)
+
+
+@override_settings(QUIZ_EXAM_GRADING_USE_CELERY=False, QUIZ_JOB_STALE_SECONDS=600, QUIZ_JOB_MAX_ATTEMPTS=2)
+class TaskJobStoreTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="job_user", password="testpass123")
+        self.question = Question.objects.create(text="基础货币包括？", q_type="objective", correct_answer="A")
+
+    def _make_stale(self, task_id, minutes=30):
+        TaskJob.objects.filter(task_id=task_id).update(heartbeat_at=timezone.now() - datetime.timedelta(minutes=minutes))
+
+    def test_thread_mode_grading_is_recorded_in_job_table(self):
+        exam = QuizExam.objects.create(user=self.user)
+        with patch("quizzes.services.task_dispatcher._start_thread", side_effect=_run_inline):
+            task_id = dispatch_exam_grading(self.user.id, exam.id, [{"question_id": self.question.id, "answer": "A"}])
+
+        job = TaskJob.objects.get(task_id=task_id)
+        self.assertEqual((job.kind, job.status, job.attempts, job.user_id), ("grading", "completed", 1, self.user.id))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(ExamQuestionResult.objects.filter(exam=exam).count(), 1)
+
+    def test_reaper_requeues_unfinished_grading_and_fails_other_jobs(self):
+        exam = QuizExam.objects.create(user=self.user)
+        payload = [{"question_id": self.question.id, "answer": "A"}]
+        with patch("quizzes.services.task_dispatcher._start_thread"):
+            grading_id = dispatch_exam_grading(self.user.id, exam.id, payload)
+        init_parse_task("parse-1")
+        TaskJob.objects.filter(task_id=grading_id).update(status="processing", attempts=1)
+        self._make_stale(grading_id)
+        self._make_stale("parse-1")
+
+        with patch("quizzes.services.task_dispatcher._start_thread", side_effect=_run_inline):
+            self.assertEqual(reap_stale_jobs(), {"requeued": 1, "failed": 1})
+
+        grading = TaskJob.objects.get(task_id=grading_id)
+        self.assertEqual((grading.status, grading.attempts), ("completed", 2))
+        self.assertEqual(get_parse_task("parse-1")["status"], "failed")
+        self.assertEqual(ExamQuestionResult.objects.filter(exam=exam).count(), 1)
+
+        # 次数用尽后不再重试；已完成的任务按保留期清理
+        exam2 = QuizExam.objects.create(user=self.user)
+        with patch("quizzes.services.task_dispatcher._start_thread"):
+            exhausted_id = dispatch_exam_grading(self.user.id, exam2.id, payload)
+        TaskJob.objects.filter(task_id=exhausted_id).update(status="processing", attempts=2)
+        self._make_stale(exhausted_id)
+        self.assertEqual(reap_stale_jobs(), {"requeued": 0, "failed": 1})
+        self.assertEqual(prune_finished_jobs(now=timezone.now() + datetime.timedelta(days=8)), 3)
+
@@ -1,14 +1,14 @@
 import os
 import json
-import datetime
-import csv
-import io
 import logging
+from django.http import HttpResponse, HttpResponseNotModified
+from django.conf import settings
+from django.db.models import Prefetch
 from django.utils import timezone
 from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Question, QuizAttempt, UserQuestionStatus, KnowledgePoint, QuizExam
+from .models import Question, QuizAttempt, UserQuestionStatus, KnowledgePoint, QuizExam, ExamQuestionResult
 from .serializers import (
     QuestionSerializer, QuizAttemptSerializer, UserQuestionStatusSerializer, 
     KnowledgePointSerializer, QuizExamSerializer
@@ -18,8 +18,8 @@ from users.serializers import UserSerializer
 from users.views import IsMember
 import random
 from ai_service import AIService
+from ai_engine import ledger
 from ai_engine.service import AICallError
-from notifications.models import Notification
 from .ai_workflow import (
     grade_single_question_submission,
     mark_questions_reviewed,
@@ -31,7 +31,30 @@ from .services.ai_parse_service import (
     get_parse_task,
     init_parse_task,
 )
-from .services.task_dispatcher import dispatch_ai_parse_task, dispatch_exam_grading
+from .services.practice_queue import draw_practice_question_ids
+from .services.question_listing import (
+    InvalidCursor,
+    cached_total,
+    decode_cursor,
+    encode_cursor,
+    fetch_rows,
+    keyset_cursor_for,
+    keyset_filter,
+    resolve_fields,
+)
+from .services.knowledge_tree import find_subtree, get_tree_blob
+from .services.question_search import filter_by_search, search_page
+from .services.question_import import (
+    ImportFileError,
+    build_import_task_id,
+    get_import_task,
+    import_question_table,
+    init_import_task,
+    save_import_upload,
+)
+from .services.question_sync import export_ndjson
+from .services.quiz_stats import get_user_stats, new_question_count, send_review_reminder_if_needed
+from .services.task_dispatcher import dispatch_ai_parse_task, dispatch_exam_grading, dispatch_question_import
 
 logger = logging.getLogger(__name__)
 
@@ -45,60 +68,28 @@ class QuestionListView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        qs = Question.objects.all().order_by('-created_at')
+        qs = Question.objects.select_related('knowledge_point').order_by('-created_at')
         
         # Shared filters
         q = self.request.query_params.get('search')
         kp_id = self.request.query_params.get('kp')
         q_type = self.request.query_params.get('type')
         
-        if q: qs = qs.filter(text__icontains=q)
         if kp_id: qs = qs.filter(knowledge_point_id=kp_id)
         if q_type: qs = qs.filter(q_type=q_type)
 
-        if user.is_staff and not self.request.query_params.get('limit'):
-            return qs
-
-        if kp_id:
-            return qs
+        if (user.is_staff and not self.request.query_params.get('limit')) or kp_id:
+            # 这两种情况不分页，整份结果即一页
+            return search_page(qs, q) if q else qs
 
-        now = timezone.now()
-        # 硬性冷却：30分钟内复习过的题不再抽选，给大脑留出间隔时间
-        cooldown_time = now - datetime.timedelta(minutes=30)
         limit = self.request.query_params.get('limit', 10)
         try: limit = int(limit)
         except: limit = 10
 
-        # 获取所有符合条件的候选 ID，排除已掌握的题目
-        mastered_ids = UserQuestionStatus.objects.filter(user=user, is_mastered=True).values_list('question_id', flat=True)
-        
-        review_ids = list(UserQuestionStatus.objects.filter(
-            user=user, 
-            next_review_at__lte=now,
-            is_mastered=False
-        ).exclude(
-            last_review__gt=cooldown_time # 过滤掉最近 30 分钟内刚做过的题
-        ).values_list('question_id', flat=True))
-        
-        attempted_ids = UserQuestionStatus.objects.filter(user=user).values_list('question_id', flat=True)
-        
-        # 1. 已到期需要复习的题目
-        due_ids = review_ids[:limit]
-        
-        # 2. 如果复习的题不够本次抽题数量，用没做过的新题补足
-        needed = limit - len(due_ids)
-        new_ids = []
-        if needed > 0:
-            new_ids = list(Question.objects.exclude(
-                id__in=attempted_ids
-            ).exclude(
-                id__in=mastered_ids
-            ).values_list('id', flat=True)[:needed])
-            
-        final_ids = due_ids + new_ids
+        final_ids = draw_practice_question_ids(user, limit)
         
         random.shuffle(final_ids)
-        return Question.objects.filter(id__in=final_ids)
+        return Question.objects.select_related('knowledge_point').filter(id__in=final_ids)
 
     def perform_create(self, serializer):
         question = serializer.save()
@@ -106,7 +97,8 @@ class QuestionListView(generics.ListCreateAPIView):
             self.generate_ai_answer(question)
 
     def generate_ai_answer(self, question):
-        ai_answer = AIService.generate_ai_answer(question)
+        with ledger.attribute(user=self.request.user):
+            ai_answer = AIService.generate_ai_answer(question)
         if ai_answer:
             question.ai_answer = ai_answer
             question.save(update_fields=['ai_answer'])
@@ -129,7 +121,13 @@ class GradeSubjectiveView(APIView):
         max_score = question.get_max_score()
         
         try:
-            result = grade_single_question_submission(request.user, question, user_answer)
+            ledger.check_quota('quizzes.grade_question', ledger.scope_for(request.user))
+        except ledger.QuotaExceeded as e:
+            return Response({'error': e.message, 'category': 'quota_exceeded'}, status=429)
+
+        try:
+            with ledger.attribute(user=request.user):
+                result = grade_single_question_submission(request.user, question, user_answer)
             return Response({
                 'score': result['score'],
                 'max_score': max_score,
@@ -163,13 +161,19 @@ class WrongQuestionListView(generics.ListAPIView):
     serializer_class = UserQuestionStatusSerializer
     permission_classes = [IsMember]
     def get_queryset(self):
-        return UserQuestionStatus.objects.filter(user=self.request.user, wrong_count__gt=0).order_by('-wrong_count')
+        return (
+            UserQuestionStatus.objects.filter(user=self.request.user, wrong_count__gt=0)
+            .select_related('question__knowledge_point')
+            .order_by('-wrong_count')
+        )
 
 class FavoriteQuestionListView(generics.ListAPIView):
     serializer_class = UserQuestionStatusSerializer
     permission_classes = [IsMember]
     def get_queryset(self):
-        return UserQuestionStatus.objects.filter(user=self.request.user, is_favorite=True)
+        return UserQuestionStatus.objects.filter(user=self.request.user, is_favorite=True).select_related(
+            'question__knowledge_point'
+        )
 
 class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Question.objects.all()
@@ -204,33 +208,14 @@ class QuizStatsView(APIView):
     def get(self, request):
         user = request.user
         now = timezone.now()
-        
-        status_qs = UserQuestionStatus.objects.filter(user=user)
-        
-        # 今日复习任务 (Due Today)
-        review_count = status_qs.filter(next_review_at__lte=now).count()
-        
-        # FSRS 预警: 稳定性 < 7天 且 下次复习在 3天内 的题目
-        # 这代表短期记忆中容易遗忘的部分
-        at_risk_count = status_qs.filter(
-            stability__lt=7,
-            next_review_at__lte=now + datetime.timedelta(days=3),
-            next_review_at__gt=now
-        ).count()
-
-        attempted_ids = status_qs.values_list('question_id', flat=True)
-        new_questions_count = Question.objects.exclude(id__in=attempted_ids).count()
-        
-        # 自动生成复习提醒
-        if review_count > 0:
-            today_notif = Notification.objects.filter(recipient=user, ntype='fsrs_reminder', created_at__date=now.date()).exists()
-            if not today_notif:
-                Notification.objects.create(recipient=user, ntype='fsrs_reminder', title='今日复习任务已就绪', content=f'你有 {review_count} 道题目已进入 FSRS 遗忘临界点。', link='/tests')
+
+        stats = get_user_stats(user.id, now=now)
+        send_review_reminder_if_needed(user, stats, now=now)
 
         return Response({
-            'review_goal': review_count,
-            'new_questions': new_questions_count,
-            'at_risk_count': at_risk_count
+            'review_goal': stats.review_count,
+            'new_questions': new_question_count(stats),
+            'at_risk_count': stats.at_risk_count
         })
 
 class IsAdminUserOrReadOnly(permissions.BasePermission):
@@ -238,17 +223,44 @@ class IsAdminUserOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS: return True
         return bool(request.user and request.user.is_authenticated and request.user.is_staff)
 
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match') or ''
+    candidates = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    return f'"{etag}"' in candidates or '*' in candidates
+
 class KnowledgePointListView(generics.ListCreateAPIView):
-    # 只返回 parent__isnull=True 的顶层，序列化器会通过 children 把下面所有的全拉出来。
+    # 只返回 parent__isnull=True 的顶层，子节点挂在 children 下。
     queryset = KnowledgePoint.objects.filter(parent__isnull=True).order_by('id')
     serializer_class = KnowledgePointSerializer
     permission_classes = [IsAdminUserOrReadOnly]
 
+    def list(self, request, *args, **kwargs):
+        # 整棵树两次查询拼装后按版本号缓存序列化结果；知识点/题目写入时版本推进。
+        body, etag = get_tree_blob()
+        if _etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json; charset=utf-8')
+        response['ETag'] = f'"{etag}"'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
 class KnowledgePointDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = KnowledgePoint.objects.all()
     serializer_class = KnowledgePointSerializer
     permission_classes = [IsAdminUserOrReadOnly]
 
+    def retrieve(self, request, *args, **kwargs):
+        body, _ = get_tree_blob()
+        try:
+            node_id = int(kwargs.get(self.lookup_field))
+        except (TypeError, ValueError):
+            node_id = None
+        node = find_subtree(json.loads(body), node_id) if node_id is not None else None
+        if node is None:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(node)
+
 class SubmitExamView(APIView):
     permission_classes = [IsMember]
 
@@ -277,6 +289,10 @@ class SubmitExamView(APIView):
             'message': message,
         })
 
+_EXAM_RESULTS_PREFETCH = Prefetch(
+    'results', queryset=ExamQuestionResult.objects.select_related('question__knowledge_point')
+)
+
 class LatestExamReportView(APIView):
     """
     获取最近一次考试报告。
@@ -284,11 +300,11 @@ class LatestExamReportView(APIView):
     permission_classes = [IsMember]
 
     def get(self, request):
-        latest_exam = QuizExam.objects.filter(user=request.user).first()
+        latest_exam = QuizExam.objects.filter(user=request.user).prefetch_related(_EXAM_RESULTS_PREFETCH).first()
         if not latest_exam:
             return Response({'error': '报告不存在'}, status=404)
             
-        serializer = QuizExamSerializer(latest_exam)
+        serializer = QuizExamSerializer(latest_exam, context={'request': request})
         return Response(serializer.data)
 
 class ExamDetailView(generics.RetrieveAPIView):
@@ -300,7 +316,7 @@ class ExamDetailView(generics.RetrieveAPIView):
     permission_classes = [IsMember]
 
     def get_queryset(self):
-        return QuizExam.objects.filter(user=self.request.user)
+        return QuizExam.objects.filter(user=self.request.user).prefetch_related(_EXAM_RESULTS_PREFETCH)
 
 class GenerateBulkQuestionsView(APIView):
     permission_classes = [permissions.IsAdminUser]
@@ -312,7 +328,8 @@ class GenerateBulkQuestionsView(APIView):
         
         # 使用最新的解耦后的批量生成逻辑
         # 这会自动应用前缀动态 Prompt (MB, IF, CF等规则)
-        count = AIService.batch_generate_questions(KnowledgePoint.objects.filter(id=kp.id), count_per_kp=3)
+        with ledger.attribute(user=request.user):
+            count = AIService.batch_generate_questions(KnowledgePoint.objects.filter(id=kp.id), count_per_kp=3)
         
         if count == 0:
             return Response({'error': 'AI 生成失败或未生成任何题目'}, status=500)
@@ -335,13 +352,14 @@ class AIPreviewGenerateView(APIView):
             return Response({'error': '未提供知识点 ID'}, status=400)
         
         try:
-            questions = AIService.preview_generate_questions(
-                kp_ids,
-                count_per_kp=count,
-                target_types=target_types,
-                target_difficulty=target_difficulty,
-                target_type_ratio=target_type_ratio,
-            )
+            with ledger.attribute(user=request.user):
+                questions = AIService.preview_generate_questions(
+                    kp_ids,
+                    count_per_kp=count,
+                    target_types=target_types,
+                    target_difficulty=target_difficulty,
+                    target_type_ratio=target_type_ratio,
+                )
         except AICallError as e:
             return Response({'error': e.message}, status=e.status_code)
         except Exception:
@@ -405,14 +423,15 @@ class GenerateFromTextView(APIView):
         num_essay = request.data.get('num_essay', 1)
         num_calc = request.data.get('num_calc', 0)
 
-        generated = AIService.generate_questions_from_text(
-            text=text or '',
-            num_obj=num_obj,
-            num_short=num_short,
-            num_essay=num_essay,
-            num_calc=num_calc,
-            kp_id=kp_id,
-        )
+        with ledger.attribute(user=request.user):
+            generated = AIService.generate_questions_from_text(
+                text=text or '',
+                num_obj=num_obj,
+                num_short=num_short,
+                num_essay=num_essay,
+                num_calc=num_calc,
+                kp_id=kp_id,
+            )
         if not generated:
             return Response({'error': 'AI 生成失败'}, status=500)
 
@@ -433,7 +452,7 @@ class AIPreviewParseView(APIView):
         if not raw_text.strip(): return Response({'error': '内容为空'}, status=400)
 
         task_id = build_parse_task_id()
-        init_parse_task(task_id)
+        init_parse_task(task_id, user_id=request.user.id)
         dispatch_ai_parse_task(raw_text, task_id)
 
         return Response({'task_id': task_id, 'status': 'processing'})
@@ -462,157 +481,156 @@ class AdminQuestionListView(APIView):
     """
     管理员专用分页题目列表接口，支持搜索、知识点筛选和题型筛选。
     用于前端题库管理面板，性能优化版本，面向5000题以上的大规模题库。
+
+    分页：传 cursor（首页传空字符串）走 (created_at, id) 键集分页，深页与首页同价；
+    不传 cursor 时兼容旧的 page 偏移分页。两种模式都会返回 next_cursor。
+    fields=preview 只下发预览列（题干截断），完整内容走 questions/<id>/；
+    total=exact|cached|none 控制总数口径（游标模式默认 cached）。
     """
     permission_classes = [permissions.IsAdminUser]
+    max_page_size = 200
 
     def get(self, request):
-        qs = Question.objects.select_related('knowledge_point').order_by('-created_at')
+        qs = Question.objects.all()
 
         # 过滤条件
         search = request.query_params.get('search', '').strip()
         kp_id = request.query_params.get('kp_id')
         q_type = request.query_params.get('q_type')
 
-        if search:
-            qs = qs.filter(text__icontains=search)
         if kp_id and kp_id != '0':
             qs = qs.filter(knowledge_point_id=kp_id)
         if q_type and q_type != 'all':
             qs = qs.filter(q_type=q_type)
 
-        # 分页
-        total = qs.count()
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 50))
-        offset = (page - 1) * page_size
-        questions = qs[offset:offset + page_size]
-
-        data = []
-        for q in questions:
-            data.append({
-                'id': q.id,
-                'text': q.text,
-                'q_type': q.q_type,
-                'subjective_type': q.subjective_type,
-                'correct_answer': q.correct_answer or '',
-                'grading_points': q.grading_points or '',
-                'ai_answer': q.ai_answer or '',
-                'difficulty': q.difficulty,
-                'difficulty_level': q.difficulty_level,
-                'difficulty_level_display': q.get_difficulty_level_display(),
-                'options': q.options,
-                'knowledge_point': q.knowledge_point.id if q.knowledge_point else None,
-                'knowledge_point_name': q.knowledge_point.name if q.knowledge_point else '无',
-            })
+        try:
+            page_size = max(1, min(self.max_page_size, int(request.query_params.get('page_size', 50))))
+            page = max(1, int(request.query_params.get('page', 1)))
+        except (TypeError, ValueError):
+            return Response({'error': '分页参数无效'}, status=400)
 
-        return Response({
+        raw_cursor = request.query_params.get('cursor')
+        cursor_mode = raw_cursor is not None
+        try:
+            cursor = decode_cursor(raw_cursor) if raw_cursor else None
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=400)
+
+        fields = resolve_fields(request.query_params.get('fields'))
+        truncate_text = (request.query_params.get('fields') or '').strip().lower() == 'preview'
+        total_mode = request.query_params.get('total') or ('cached' if cursor_mode else 'exact')
+
+        if search:
+            # 检索结果按相关度排序（非单调键），按偏移翻页
+            offset = int((cursor or {}).get('o') or 0) if cursor_mode else (page - 1) * page_size
+            if offset < 0:
+                return Response({'error': '无效的分页游标'}, status=400)
+            rows = fetch_rows(search_page(qs, search, offset, offset + page_size + 1), fields, truncate_text)
+            qs = filter_by_search(qs, search)
+            has_more = len(rows) > page_size
+            next_cursor = encode_cursor({'o': offset + page_size}) if has_more else None
+        else:
+            if cursor_mode:
+                page_qs = keyset_filter(qs, cursor)
+                rows = fetch_rows(page_qs, fields, truncate_text, stop=page_size + 1)
+            else:
+                offset = (page - 1) * page_size
+                rows = fetch_rows(keyset_filter(qs, None), fields, truncate_text, start=offset, stop=offset + page_size + 1)
+            has_more = len(rows) > page_size
+            next_cursor = keyset_cursor_for(rows[page_size - 1][1]) if has_more else None
+
+        data = [row for row, _ in rows[:page_size]]
+
+        if total_mode == 'none':
+            total = None
+        elif total_mode == 'cached':
+            total = cached_total(qs, {'search': search, 'kp_id': kp_id, 'q_type': q_type})
+        else:
+            total = qs.count()
+
+        payload = {
             'total': total,
-            'page': page,
             'page_size': page_size,
-            'total_pages': (total + page_size - 1) // page_size,
-            'results': data
-        })
+            'results': data,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+        }
+        if not cursor_mode:
+            payload['page'] = page
+            payload['total_pages'] = (total + page_size - 1) // page_size if total is not None else None
+        return Response(payload)
 
 
 class ExportStructuredQuestionsView(APIView):
     """
     导出结构化题目数据（AI 可读格式）。
-    直接同步至服务器本地 seed_questions.json。
+    流式写入服务器本地 seed_questions.ndjson（compress=1 时为 .ndjson.gz），
+    可用 seed_questions.py 增量同步到其他环境。
     """
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request):
         kp_id = request.query_params.get('kp_id')
-        qs = Question.objects.select_related('knowledge_point').all()
-        if kp_id and kp_id != '0':
-            qs = qs.filter(knowledge_point_id=kp_id)
+        compress = request.query_params.get('compress') in ('1', 'true')
+        filename = 'seed_questions.ndjson.gz' if compress else 'seed_questions.ndjson'
 
-        structured = []
-        for q in qs:
-            structured.append({
-                "id": q.id,
-                "knowledge_point": q.knowledge_point.name if q.knowledge_point else None,
-                "question_type": q.q_type,
-                "subjective_type": q.subjective_type,
-                "difficulty_elo": q.difficulty,
-                "difficulty_level": q.difficulty_level,
-                "question_text": q.text,
-                "options": q.options,
-                "correct_answer": q.correct_answer,
-                "grading_points": q.grading_points,
-                "ai_explanation": q.ai_answer,
-            })
-
-        data = {
-            "total": len(structured),
-            "format_version": "1.1",
-            "description": "UniMind.ai Question Bank - Structured Export",
-            "format_reference": {
-                "question_type": "objective | subjective",
-                "subjective_type": "noun | short | essay | calculate",
-                "difficulty_elo": "800-1800 integer (harder = higher)",
-                "options": "list of 4 strings for objective, null for subjective",
-                "correct_answer": "option text for objective, reference answer for subjective",
-                "grading_points": "scoring rubric, required for subjective questions"
-            },
-            "questions": structured
-        }
-
-        # 持久化到服务器文件 (backend/seed_questions.json)
-        file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "seed_questions.json")
+        # 持久化到服务器文件 (backend/seed_questions.ndjson)
+        file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), filename)
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            total = export_ndjson(file_path, kp_id=kp_id if kp_id and kp_id != '0' else None)
             return Response({
                 "status": "success",
-                "total": len(structured),
-                "message": "已成功同步至服务器 seed_questions.json"
+                "total": total,
+                "message": f"已成功同步至服务器 {filename}"
             })
         except Exception as e:
             return Response({"error": f"写入文件失败: {str(e)}"}, status=500)
 
 class ImportCSVQuestionsView(APIView):
+    """
+    CSV / XLSX 题目导入：流式读取、统一规范化、逐行报错、分段 bulk_create。
+    大文件（或 background=1）转后台任务，前端以 task_id 轮询 GET 获取进度。
+    """
     permission_classes = [permissions.IsAdminUser]
-    
+
     def post(self, request):
         file_obj = request.FILES.get('file')
         if not file_obj:
             return Response({'error': '未上传文件'}, status=400)
-            
+
+        kp_id = request.data.get('kp_id')
         try:
-            decoded_file = file_obj.read().decode('utf-8-sig')
-            io_string = io.StringIO(decoded_file)
-            reader = csv.DictReader(io_string)
-            
-            count = 0
-            errors = []
-            
-            for row in reader:
-                try:
-                    # Expected CSV headers: text, answer, type(optional), difficulty(optional)
-                    # Mapping flexible headers
-                    text = row.get('text') or row.get('question') or row.get('题目')
-                    answer = row.get('answer') or row.get('correct_answer') or row.get('答案')
-                    q_type = row.get('type') or row.get('q_type') or row.get('题型') or 'objective'
-                    difficulty = row.get('difficulty') or row.get('难度') or '1000'
-                    
-                    if not text: continue
-                    
-                    # Clean type
-                    if '客观' in q_type or 'choice' in q_type: q_type = 'objective'
-                    elif '主观' in q_type: q_type = 'subjective'
-                    
-                    Question.objects.create(
-                        text=text,
-                        correct_answer=answer,
-                        q_type=q_type,
-                        difficulty=int(difficulty) if str(difficulty).isdigit() else 1000
-                    )
-                    count += 1
-                except Exception as e:
-                    errors.append(f"Row error: {str(e)}")
-            
-            return Response({'status': 'success', 'count': count, 'errors': errors[:5]})
-            
-        except Exception as e:
-            return Response({'error': f'CSV解析失败: {str(e)}'}, status=400)
+            kp_id = int(kp_id) if kp_id not in (None, '', '0') else None
+        except (TypeError, ValueError):
+            return Response({'error': '知识点 ID 无效'}, status=400)
+
+        threshold = int(getattr(settings, 'QUIZ_IMPORT_BACKGROUND_THRESHOLD_BYTES', 1024 * 1024) or 0)
+        background = str(request.data.get('background', '')).lower() in ('1', 'true')
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        if not dry_run and (background or (threshold and file_obj.size > threshold)):
+            task_id = build_import_task_id()
+            init_import_task(task_id, user_id=request.user.id)
+            storage_path = save_import_upload(task_id, file_obj)
+            dispatch_question_import(storage_path, file_obj.name, task_id, kp_id)
+            return Response({'task_id': task_id, 'status': 'processing'}, status=202)
+
+        try:
+            result = import_question_table(
+                file_obj,
+                file_obj.name,
+                chunk_size=getattr(settings, 'QUIZ_IMPORT_CHUNK_SIZE', 500),
+                default_kp_id=kp_id,
+                dry_run=dry_run,
+            )
+        except ImportFileError as e:
+            return Response({'error': str(e)}, status=400)
+
+        result['status'] = 'partial_success' if result['error_count'] else 'success'
+        result['dry_run'] = dry_run
+        return Response(result)
+
+    def get(self, request):
+        """前端轮询此接口获取后台导入进度"""
+        result = get_import_task(request.query_params.get('task_id'))
+        if not result: return Response({'error': '任务不存在'}, status=404)
+        return Response(result)
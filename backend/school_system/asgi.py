@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "school_system.settings")
 
-application = get_asgi_application()
+# 先初始化 Django，再导入依赖 ORM 的路由与中间件
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+from notifications.middleware import TokenAuthMiddlewareStack  # noqa: E402
+from notifications.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter(
+    {
+        "http": django_asgi_app,
+        "websocket": TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+    }
+)
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 import os
 from pathlib import Path
 
+from celery.schedules import crontab
 from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
@@ -81,6 +82,7 @@ INSTALLED_APPS = [
     "ai_assistant",
     "faq_system",
     "notifications",
+    "ai_engine",
 ]
 
 MIDDLEWARE = [
@@ -183,10 +185,73 @@ REST_FRAMEWORK = {
 ONLINE_USER_ACTIVE_WINDOW_SECONDS = _get_int("ONLINE_USER_ACTIVE_WINDOW_SECONDS", 300)
 LLM_REQUEST_TIMEOUT_SECONDS = _get_int("LLM_REQUEST_TIMEOUT_SECONDS", 120)
 LLM_REQUEST_MAX_RETRIES = _get_int("LLM_REQUEST_MAX_RETRIES", 1)
+LLM_HTTP_POOL_CONNECTIONS = _get_int("LLM_HTTP_POOL_CONNECTIONS", 4)
+LLM_HTTP_POOL_MAXSIZE = _get_int("LLM_HTTP_POOL_MAXSIZE", 16)
+LLM_ASYNC_MAX_CONNECTIONS = _get_int("LLM_ASYNC_MAX_CONNECTIONS", 100)
+# LLM 准入控制（跨进程共享，经由 CACHES）：0 表示该维度不限制
+LLM_GOVERNOR_ENABLED = _get_bool("LLM_GOVERNOR_ENABLED", default=True)
+LLM_MAX_CONCURRENCY = _get_int("LLM_MAX_CONCURRENCY", 32)
+LLM_RPM_LIMIT = _get_int("LLM_RPM_LIMIT", 0)
+LLM_TPM_LIMIT = _get_int("LLM_TPM_LIMIT", 0)
+LLM_RATE_LIMIT_COOLDOWN_SECONDS = _get_int("LLM_RATE_LIMIT_COOLDOWN_SECONDS", 5)
+# 重试策略：按优先级类别的单次超时与整体时间预算（含重试与退避等待），退避采用 decorrelated jitter
+LLM_OPERATION_TIMEOUTS = {
+    "interactive": _get_int("LLM_TIMEOUT_INTERACTIVE_SECONDS", 60),
+    "grading": _get_int("LLM_TIMEOUT_GRADING_SECONDS", 90),
+    "bulk": _get_int("LLM_TIMEOUT_BULK_SECONDS", 180),
+}
+LLM_RETRY_BUDGET_SECONDS = {
+    "interactive": _get_int("LLM_RETRY_BUDGET_INTERACTIVE_SECONDS", 90),
+    "grading": _get_int("LLM_RETRY_BUDGET_GRADING_SECONDS", 240),
+    "bulk": _get_int("LLM_RETRY_BUDGET_BULK_SECONDS", 420),
+}
+LLM_RETRY_BACKOFF_BASE_MS = _get_int("LLM_RETRY_BACKOFF_BASE_MS", 500)
+LLM_RETRY_BACKOFF_CAP_MS = _get_int("LLM_RETRY_BACKOFF_CAP_MS", 8000)
+# 对冲请求：首个请求超过近期延迟分位数仍未返回时再发一份，取先成功者（会增加上游调用量）
+LLM_HEDGE_ENABLED = _get_bool("LLM_HEDGE_ENABLED", default=False)
+LLM_HEDGE_OPERATIONS = _get_list("LLM_HEDGE_OPERATIONS", ["quizzes.grade_question"])
+LLM_HEDGE_PERCENTILE = _get_int("LLM_HEDGE_PERCENTILE", 95)
+LLM_HEDGE_MIN_DELAY_MS = _get_int("LLM_HEDGE_MIN_DELAY_MS", 2000)
+LLM_HEDGE_MAX_WORKERS = _get_int("LLM_HEDGE_MAX_WORKERS", 16)
+# 多上游与熔断：LLM_PROVIDERS 环境变量为 JSON 数组（name/base_url/model/api_key 或 api_key_env/weight），
+# 未配置时使用 LLM_BASE_URL/LLM_MODEL 单一上游。窗口内失败数与失败率均超过阈值后熔断，冷却后放行探测请求
+LLM_BREAKER_ENABLED = _get_bool("LLM_BREAKER_ENABLED", default=True)
+LLM_BREAKER_WINDOW_SECONDS = _get_int("LLM_BREAKER_WINDOW_SECONDS", 60)
+LLM_BREAKER_MIN_FAILURES = _get_int("LLM_BREAKER_MIN_FAILURES", 5)
+LLM_BREAKER_FAILURE_RATIO_PERCENT = _get_int("LLM_BREAKER_FAILURE_RATIO_PERCENT", 50)
+LLM_BREAKER_OPEN_SECONDS = _get_int("LLM_BREAKER_OPEN_SECONDS", 30)
+# AI 指标：小时汇总保留天数；Prometheus 抓取可用 Bearer 令牌代替管理员登录（留空则只允许管理员）
+AI_METRICS_RETENTION_DAYS = _get_int("AI_METRICS_RETENTION_DAYS", 90)
+AI_METRICS_SCRAPE_TOKEN = os.getenv("AI_METRICS_SCRAPE_TOKEN", "")
+# Token 台账与每日配额（按用户，0 表示不限）：总量与按 operation 前缀的单项配额，管理员默认豁免
+AI_DAILY_TOKEN_QUOTA = _get_int("AI_DAILY_TOKEN_QUOTA", 0)
+AI_OPERATION_DAILY_TOKEN_QUOTAS = {
+    "assistant.chat": _get_int("AI_CHAT_DAILY_TOKEN_QUOTA", 0),
+    "quizzes.grade_question": _get_int("AI_GRADING_DAILY_TOKEN_QUOTA", 0),
+}
+AI_TOKEN_QUOTA_EXEMPT_STAFF = _get_bool("AI_TOKEN_QUOTA_EXEMPT_STAFF", default=True)
+# 流式请求附带 stream_options.include_usage（上游需支持），否则按字符数估算 token
+LLM_STREAM_INCLUDE_USAGE = _get_bool("LLM_STREAM_INCLUDE_USAGE", default=False)
 AI_SCHEMA_REPAIR_MAX_RETRIES = _get_int("AI_SCHEMA_REPAIR_MAX_RETRIES", 1)
 AI_BULK_GENERATE_MAX_PER_REQUEST = _get_int("AI_BULK_GENERATE_MAX_PER_REQUEST", 3)
 AI_BULK_GENERATE_CONCURRENCY = _get_int("AI_BULK_GENERATE_CONCURRENCY", 2)
 QUIZ_EXAM_GRADING_USE_CELERY = _get_bool("QUIZ_EXAM_GRADING_USE_CELERY", default=True)
+QUIZ_EXAM_GRADING_CONCURRENCY = _get_int("QUIZ_EXAM_GRADING_CONCURRENCY", 4)
+QUIZ_PARSE_CONCURRENCY = _get_int("QUIZ_PARSE_CONCURRENCY", 4)
+QUIZ_PARSE_CHUNK_TOKENS = _get_int("QUIZ_PARSE_CHUNK_TOKENS", 1200)
+QUIZ_GRADING_CACHE_ENABLED = _get_bool("QUIZ_GRADING_CACHE_ENABLED", default=True)
+QUIZ_GRADING_CACHE_TTL_SECONDS = _get_int("QUIZ_GRADING_CACHE_TTL_SECONDS", 7 * 86400)
+QUIZ_GRADING_CACHE_MAX_ENTRIES = _get_int("QUIZ_GRADING_CACHE_MAX_ENTRIES", 50000)
+# auto | sqlite_fts5 | postgres | python
+QUIZ_SEARCH_BACKEND = os.getenv("QUIZ_SEARCH_BACKEND", "auto")
+QUIZ_SEARCH_MAX_RESULTS = _get_int("QUIZ_SEARCH_MAX_RESULTS", 1000)
+QUIZ_ADMIN_LIST_TOTAL_TTL_SECONDS = _get_int("QUIZ_ADMIN_LIST_TOTAL_TTL_SECONDS", 300)
+QUIZ_IMPORT_CHUNK_SIZE = _get_int("QUIZ_IMPORT_CHUNK_SIZE", 500)
+QUIZ_IMPORT_BACKGROUND_THRESHOLD_BYTES = _get_int("QUIZ_IMPORT_BACKGROUND_THRESHOLD_BYTES", 1024 * 1024)
+# 任务表：心跳超时判定进程已退出，判分任务在重试次数内重新派发
+QUIZ_JOB_STALE_SECONDS = _get_int("QUIZ_JOB_STALE_SECONDS", 2100)
+QUIZ_JOB_MAX_ATTEMPTS = _get_int("QUIZ_JOB_MAX_ATTEMPTS", 3)
+QUIZ_JOB_RETENTION_DAYS = _get_int("QUIZ_JOB_RETENTION_DAYS", 7)
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
 CHANNEL_LAYER_REDIS_URL = os.getenv("CHANNEL_LAYER_REDIS_URL", REDIS_URL)
@@ -199,6 +264,34 @@ CHANNEL_LAYERS = {
         },
     },
 }
+REALTIME_PUSH_ENABLED = _get_bool("REALTIME_PUSH_ENABLED", default=True)
+
+# 缓存：redis 供多个 gunicorn/uvicorn worker 共享；locmem / file 用于本地开发与测试
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem" if DEBUG else "redis").strip().lower()
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", REDIS_URL)
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "korson")
+CACHE_DEFAULT_TIMEOUT = _get_int("CACHE_DEFAULT_TIMEOUT", 300)
+if CACHE_BACKEND == "redis":
+    _cache_backend = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_REDIS_URL,
+    }
+elif CACHE_BACKEND == "file":
+    _cache_backend = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("CACHE_FILE_DIR", str(BASE_DIR / ".cache")),
+    }
+elif CACHE_BACKEND == "locmem":
+    _cache_backend = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+else:
+    raise ImproperlyConfigured(f"Unsupported CACHE_BACKEND: {CACHE_BACKEND}")
+CACHES = {
+    "default": {
+        **_cache_backend,
+        "KEY_PREFIX": CACHE_KEY_PREFIX,
+        "TIMEOUT": CACHE_DEFAULT_TIMEOUT,
+    },
+}
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL)
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
@@ -229,3 +322,28 @@ CELERY_BEAT_SCHEDULE_FILENAME = os.getenv(
 CELERY_BROKER_TRANSPORT_OPTIONS = {
     "visibility_timeout": _get_int("CELERY_VISIBILITY_TIMEOUT", 3600),
 }
+
+QUIZ_FSRS_FIT_HOUR = _get_int("QUIZ_FSRS_FIT_HOUR", 3)
+QUIZ_FSRS_FIT_MIN_REVIEWS = _get_int("QUIZ_FSRS_FIT_MIN_REVIEWS", 200)
+CELERY_BEAT_SCHEDULE = {
+    "quizzes-fit-fsrs-weights": {
+        "task": "quizzes.fit_fsrs_weights_task",
+        "schedule": crontab(hour=QUIZ_FSRS_FIT_HOUR, minute=30, day_of_week=0),
+    },
+    "quizzes-reconcile-user-quiz-stats": {
+        "task": "quizzes.reconcile_user_quiz_stats_task",
+        "schedule": crontab(minute=15),
+    },
+    "quizzes-prune-grading-cache": {
+        "task": "quizzes.prune_grading_cache_task",
+        "schedule": crontab(minute=45),
+    },
+    "quizzes-reap-stale-jobs": {
+        "task": "quizzes.reap_stale_jobs_task",
+        "schedule": crontab(minute="*/5"),
+    },
+    "ai-engine-rollup-metrics": {
+        "task": "ai_engine.rollup_metrics_task",
+        "schedule": crontab(minute="*/5"),
+    },
+}
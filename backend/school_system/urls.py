@@ -11,6 +11,7 @@ urlpatterns = [
     path("api/courses/", include("courses.urls")),
     path("api/articles/", include("articles.urls")),
     path("api/ai/", include("ai_assistant.urls")),
+    path("api/ai-engine/", include("ai_engine.urls")),
     path("api/qa/", include("faq_system.urls")),
     path("api/notifications/", include("notifications.urls")),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -4,7 +4,7 @@ from .views import (
     SystemConfigView, OnlineUserListView, UpdateEmailView, UpdatePasswordView,
     DailyPlanListView, DailyPlanDetailView, ResetEloView,
     ActivateMembershipView, ActivationCodeListView, ActivationCodeDetailView,
-    BIAnalyticsView, WeeklyCognitiveReportView, HeartbeatView
+    BIAnalyticsView, TokenUsageReportView, WeeklyCognitiveReportView, HeartbeatView
 )
 
 urlpatterns = [
@@ -24,5 +24,6 @@ urlpatterns = [
     path('admin/codes/', ActivationCodeListView.as_view(), name='activation-codes'),
     path('admin/codes/<int:pk>/', ActivationCodeDetailView.as_view(), name='activation-code-detail'),
     path('admin/bi/', BIAnalyticsView.as_view(), name='admin-bi'),
+    path('admin/bi/tokens/', TokenUsageReportView.as_view(), name='admin-bi-tokens'),
     path('me/weekly-report/', WeeklyCognitiveReportView.as_view(), name='weekly-report'),
 ]
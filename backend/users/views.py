@@ -169,6 +169,22 @@ class BIAnalyticsView(APIView):
             }
         })
 
+from ai_engine import ledger
+
+
+class TokenUsageReportView(APIView):
+    """AI token 用量报表：?days=7（1~90）、?user_id=、?operation=（前缀匹配）。"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            days = min(90, max(1, int(request.query_params.get('days', 7))))
+            user_id = int(request.query_params['user_id']) if request.query_params.get('user_id') else None
+        except (TypeError, ValueError):
+            return Response({'error': '参数格式错误'}, status=400)
+        operation = (request.query_params.get('operation') or '').strip() or None
+        return Response(ledger.summarize(days=days, user_id=user_id, operation=operation))
+
 class WeeklyCognitiveReportView(APIView):
     permission_classes = [IsMember]
 
@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { Bell, CheckCheck, MessageCircle, Info, Brain, Trash2 } from 'lucide-react';
 import { useNotificationStore } from '@/store/useNotificationStore';
+import { useAuthStore } from '@/store/useAuthStore';
 import {
   DropdownMenu,
   DropdownMenuContent,
@@ -26,16 +27,15 @@ import {
 } from "@/components/ui/alert-dialog";
 
 export const NotificationBell = () => {
-  const { notifications, unreadCount, fetchNotifications, fetchUnreadCount, markAsRead, clearAll } = useNotificationStore();
+  const { notifications, unreadCount, fetchNotifications, connect, markAsRead, clearAll } = useNotificationStore();
   const navigate = useNavigate();
   const [isOpen, setIsOpen] = useState(false);
   const [showClearAlert, setShowClearAlert] = useState(false);
 
-  useEffect(() => {
-    fetchUnreadCount();
-    const interval = setInterval(fetchUnreadCount, 5000); 
-    return () => clearInterval(interval);
-  }, []);
+  const token = useAuthStore(state => state.token);
+
+  // 登录、切换账号后 Token 变化，需要用新 Token 重新订阅
+  useEffect(() => connect(token), [token]);
 
   const handleOpen = (open: boolean) => {
     setIsOpen(open);
@@ -4,7 +4,7 @@ import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { ScrollArea } from '@/components/ui/scroll-area';
 import { Send, Sparkles, Loader2, Eraser } from 'lucide-react';
-import api from '@/lib/api';
+import api, { API_BASE_URL } from '@/lib/api';
 import { processMathContent } from '@/lib/utils';
 import { cn } from '@/lib/utils';
 import { useAuthStore } from '@/store/useAuthStore';
@@ -80,31 +80,26 @@ export const AIAssistant: React.FC = () => {
     }
   }, [messages, loading]);
 
-  useEffect(() => {
-    if (!selectedBot) return;
-    const lastMsg = messages[messages.length - 1];
-    const needsPolling = lastMsg && (lastMsg.role === 'user' || lastMsg.content === '[Thinking...]');
-    if (needsPolling) {
-      const timer = setInterval(() => {
-        api.get('/ai/history/', { params: { bot_id: selectedBot.id } }).then(res => {
-          if (res.data.length > 0) {
-            const processedHistory = res.data.map((m: any) => ({
-              ...m,
-              content: processMathContent(m.content)
-            }));
-            const newLastMsg = processedHistory[processedHistory.length - 1];
-            if (newLastMsg.content !== '[Thinking...]') {
-               setMessages(processedHistory);
-               setLoading(false);
-            } else if (messages.length !== processedHistory.length) {
-               setMessages(processedHistory);
-            }
-          }
-        });
-      }, 2000);
-      return () => clearInterval(timer);
+  // 解析 SSE 文本块：返回 [事件名, 数据] 列表与未完整的剩余部分
+  const parseSSE = (buffer: string): [[string, any][], string] => {
+    const blocks = buffer.split('\n\n');
+    const rest = blocks.pop() || '';
+    const events: [string, any][] = [];
+    for (const block of blocks) {
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (data) events.push([event, JSON.parse(data)]);
     }
-  }, [messages, selectedBot]);
+    return [events, rest];
+  };
+
+  const setLastAssistant = (content: string) => {
+    setMessages(prev => [...prev.slice(0, -1), { role: 'assistant', content }]);
+  };
 
   const handleSend = async () => {
     if (!selectedBot) return toast.error("请选择 AI 助教");
@@ -112,17 +107,56 @@ export const AIAssistant: React.FC = () => {
     const messageContent = input;
     setInput('');
     setLoading(true);
+    setMessages(prev => [...prev, { role: 'user', content: messageContent }, { role: 'assistant', content: '[Thinking...]' }]);
+
+    const token = localStorage.getItem('token');
+    const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+    if (token && token !== 'mock-token') headers.Authorization = `Token ${token}`;
+
     try {
-      await api.post('/ai/chat/', { message: messageContent, bot_id: selectedBot.id });
-      const res = await api.get('/ai/history/', { params: { bot_id: selectedBot.id } });
-      if (res.data.length > 0) {
-        setMessages(res.data.map((m: any) => ({ ...m, content: processMathContent(m.content) })));
-        setLoading(false);
+      const res = await fetch(`${API_BASE_URL}/ai/chat/stream/`, {
+        method: 'POST',
+        headers,
+        body: JSON.stringify({ message: messageContent, bot_id: selectedBot.id }),
+      });
+      if (!res.ok || !res.body) {
+        const data = await res.json().catch(() => ({}));
+        setMessages(prev => prev.slice(0, -2));
+        setInput(messageContent);
+        toast.error(data.error || "发送失败");
+        return;
+      }
+
+      // 增量文本逐段追加到最后一条助手消息，done 时以落库内容替换
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let reply = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const [events, rest] = parseSSE(buffer);
+        buffer = rest;
+        for (const [event, data] of events) {
+          if (event === 'delta') {
+            reply += data.content;
+            setLastAssistant(processMathContent(reply));
+          } else if (event === 'error') {
+            toast.error(data.error || "AI 助教暂时无法响应");
+          } else if (event === 'done') {
+            setLastAssistant(processMathContent(data.content));
+          }
+        }
       }
     } catch (error: any) {
-      toast.error("发送失败");
+      toast.error("连接中断");
+      const res = await api.get('/ai/history/', { params: { bot_id: selectedBot.id } }).catch(() => null);
+      if (res && res.data.length > 0) {
+        setMessages(res.data.map((m: any) => ({ ...m, content: processMathContent(m.content) })));
+      }
+    } finally {
       setLoading(false);
-      setInput(messageContent);
     }
   };
 
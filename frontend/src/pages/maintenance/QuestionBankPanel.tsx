@@ -157,10 +157,29 @@ export const QuestionBankPanel = ({ kpList, onEdit, onDelete }: { kpList: any[],
       if (!file) return;
       const fd = new FormData();
       fd.append('file', file);
+      const reportImport = (data: any) => {
+          if (data.error_count) {
+              const first = (data.errors || [])[0];
+              toast.warning(`导入 ${data.count} 道题目，${data.error_count} 行失败${first ? `（第 ${first.row} 行：${first.error}）` : ''}`);
+          } else {
+              toast.success(`成功导入 ${data.count} 道题目`);
+          }
+          fetchBank(1);
+      };
       try {
           const res = await api.post('/quizzes/import-csv/', fd);
-          toast.success(`成功导入 ${res.data.count} 道题目`);
-          fetchBank(1);
+          if (res.data.task_id) {
+              toast.info('文件较大，已转入后台导入');
+              const poll = setInterval(async () => {
+                  try {
+                      const checkRes = await api.get(`/quizzes/import-csv/?task_id=${res.data.task_id}`);
+                      if (checkRes.data.status === 'completed') { clearInterval(poll); reportImport(checkRes.data); }
+                      else if (checkRes.data.status === 'failed') { clearInterval(poll); toast.error(checkRes.data.error || "导入失败"); }
+                  } catch (err) { clearInterval(poll); }
+              }, 3000);
+          } else {
+              reportImport(res.data);
+          }
       } catch (e: any) {
           toast.error(e.response?.data?.error || "导入失败");
       }
@@ -291,7 +310,7 @@ export const QuestionBankPanel = ({ kpList, onEdit, onDelete }: { kpList: any[],
             <Button onClick={() => fileInputRef.current?.click()} variant="outline" className="h-8 px-3 rounded-xl text-[11px] font-bold border-black/10 gap-1.5">
                 <Upload className="w-3 h-3" /> 导入CSV
             </Button>
-            <input type="file" ref={fileInputRef} onChange={handleImportCSV} className="hidden" accept=".csv" />
+            <input type="file" ref={fileInputRef} onChange={handleImportCSV} className="hidden" accept=".csv,.xlsx" />
             <Button onClick={handleExport} variant="outline" className="h-8 px-3 rounded-xl text-[11px] font-bold border-black/10 gap-1.5">
                 <FileUp className="w-3 h-3" /> 导出AI结构化
             </Button>
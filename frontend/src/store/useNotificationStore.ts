@@ -1,8 +1,8 @@
 import { create } from 'zustand';
-import api from '@/lib/api';
+import api, { WS_BASE_URL } from '@/lib/api';
 
 interface Notification {
-  id: number;
+  id: number | null;
   ntype: string;
   title: string;
   content: string;
@@ -18,8 +18,12 @@ interface NotificationState {
   fetchUnreadCount: () => Promise<void>;
   markAsRead: (id?: number) => Promise<void>;
   clearAll: () => Promise<void>;
+  connect: (token: string | null) => () => void;
 }
 
+const HEARTBEAT_MS = 30000;
+const MAX_RETRY_MS = 30000;
+
 export const useNotificationStore = create<NotificationState>((set, get) => ({
   notifications: [],
   unreadCount: 0,
@@ -53,5 +57,50 @@ export const useNotificationStore = create<NotificationState>((set, get) => ({
       await api.delete('/notifications/clear/');
       set({ notifications: [], unreadCount: 0 });
     } catch (e) {}
+  },
+  // 订阅 /ws/notifications/ 推送，替代定时轮询未读数；返回取消订阅函数，Token 变化时由调用方重新订阅
+  connect: (token) => {
+    let socket: WebSocket | null = null;
+    let heartbeat: ReturnType<typeof setInterval> | undefined;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let retryMs = 1000;
+    let closed = false;
+
+    const open = () => {
+      if (!token || token === 'mock-token') return;
+      socket = new WebSocket(`${WS_BASE_URL}/ws/notifications/?token=${encodeURIComponent(token)}`);
+      socket.onopen = () => {
+        retryMs = 1000;
+        // 断线期间的通知不会补推，连上后以接口为准重新同步一次
+        get().fetchUnreadCount();
+        heartbeat = setInterval(() => socket?.readyState === WebSocket.OPEN && socket.send('ping'), HEARTBEAT_MS);
+      };
+      socket.onmessage = (e) => {
+        if (e.data === 'pong') return;
+        let data: any;
+        try { data = JSON.parse(e.data); } catch { return; }
+        if (data.event !== 'notification' || !data.notification) return;
+        const notif: Notification = data.notification;
+        set({
+          // 全站广播不带 id，列表在下次展开时重新拉取
+          notifications: notif.id === null ? get().notifications : [notif, ...get().notifications.filter(n => n.id !== notif.id)],
+          unreadCount: get().unreadCount + (notif.is_read ? 0 : 1),
+        });
+      };
+      socket.onclose = () => {
+        clearInterval(heartbeat);
+        if (closed) return;
+        retryTimer = setTimeout(open, retryMs);
+        retryMs = Math.min(retryMs * 2, MAX_RETRY_MS);
+      };
+    };
+
+    open();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      clearInterval(heartbeat);
+      socket?.close();
+    };
   }
 }));